@@ -40,7 +40,11 @@ try:
 except OptionalDependencyNotAvailable:
     from .utils.dummy_fastdeploy_objects import *  # noqa F403
 else:
-    from .pipelines import FastDeployRuntimeModel
+    from .pipelines import (
+        FastDeployPipelinePool,
+        FastDeployRuntimeModel,
+        FastDeployRuntimePool,
+    )
 
 try:
     if not is_paddle_available():
@@ -75,10 +79,15 @@ else:
         DDPMPipeline,
         DiffusionPipeline,
         DiTPipeline,
+        ImageEncodingCache,
         ImagePipelineOutput,
         KarrasVePipeline,
         LDMPipeline,
         LDMSuperResolutionPipeline,
+        MemoryPlan,
+        PipelineProfiler,
+        PipelineStepEvent,
+        PipelineStream,
         PNDMPipeline,
         RePaintPipeline,
         ScoreSdeVePipeline,
@@ -88,6 +97,7 @@ else:
         DDIMScheduler,
         DDPMScheduler,
         DEISMultistepScheduler,
+        DPMSolverAdaptiveScheduler,
         DPMSolverMultistepScheduler,
         DPMSolverSinglestepScheduler,
         EulerAncestralDiscreteScheduler,
@@ -126,6 +136,8 @@ else:
         AltDiffusionImg2ImgPipeline,
         AltDiffusionPipeline,
         CycleDiffusionPipeline,
+        DataParallelRunner,
+        GenerationResult,
         LDMTextToImagePipeline,
         PaintByExamplePipeline,
         SemanticStableDiffusionPipeline,
@@ -0,0 +1,444 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..utils import is_fastdeploy_available, is_paddle_available, logging
+from ..utils.benchmark_utils import Timer, benchmark_environment, save_benchmark_report
+from . import BasePPDiffusersCLICommand
+
+if is_paddle_available():
+    import paddle
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# the ways of calling a `FastDeployRuntimeModel`: numpy copies, tensors converted and bound per call, bound buffers
+FASTDEPLOY_IO_PATHS = ["copy", "zero_copy", "bound"]
+
+FASTDEPLOY_DTYPES = {"FP32": "float32", "FP16": "float16", "INT64": "int64", "INT32": "int32"}
+
+
+def load_fastdeploy_unet(pretrained_model_name_or_path: str, device: str = "cpu", cpu_thread_num: int = -1):
+    """Loads the UNet of a FastDeploy pipeline on the paddle inference backend of `device`."""
+    import fastdeploy as fd
+
+    from ..pipelines import FastDeployRuntimeModel
+
+    paddle.set_device(device)
+    option = fd.RuntimeOption()
+    option.use_paddle_backend()
+    if device == "gpu":
+        option.use_gpu()
+    else:
+        option.use_cpu()
+        option.set_cpu_thread_num(cpu_thread_num)
+    return FastDeployRuntimeModel.from_pretrained(
+        pretrained_model_name_or_path, subfolder="unet", runtime_options=option
+    )
+
+
+def fastdeploy_unet_inputs(unet, batch_size: int, height: int, width: int):
+    """Random inputs of a FastDeploy UNet: sample, timestep and text embeddings, and the shape of its output."""
+    # the sequence length and hidden size of the text embeddings of SD 1.x when they are dynamic
+    infos = [unet.model.get_input_info(i) for i in range(unet.model.num_inputs())]
+    dtypes = [FASTDEPLOY_DTYPES.get(str(info.dtype).split(".")[-1], "float32") for info in infos]
+    text_shape = [dim if dim > 0 else default for dim, default in zip(infos[2].shape[1:], [77, 768])]
+    inputs = {
+        infos[0].name: paddle.randn([batch_size, 4, height // 8, width // 8]).cast(dtypes[0]),
+        infos[1].name: paddle.to_tensor([981] * max(1, np.prod(infos[1].shape)), dtype=dtypes[1]).reshape(
+            [max(dim, 1) for dim in infos[1].shape]
+        ),
+        infos[2].name: paddle.randn([batch_size] + text_shape).cast(dtypes[2]),
+    }
+    output_shapes = {unet.model.get_output_info(0).name: [batch_size, 4, height // 8, width // 8]}
+    return inputs, output_shapes
+
+
+def fastdeploy_io_benchmark_command_factory(args):
+    return FastDeployIOBenchmarkCommand(
+        pretrained_model_name_or_path=args.pretrained_model_name_or_path,
+        device=args.device,
+        batch_size=args.batch_size,
+        height=args.height,
+        width=args.width,
+        steps=args.steps,
+        repeats=args.repeats,
+        output=args.output,
+    )
+
+
+def run_fastdeploy_io_benchmark(
+    runtime_model,
+    inputs: Dict[str, "paddle.Tensor"],
+    output_shapes: Dict[str, List[int]],
+    paths: Optional[List[str]] = None,
+    steps: int = 20,
+    repeats: int = 3,
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Measures the latency per call of a [`FastDeployRuntimeModel`] called `steps` times in a row with the same shapes,
+    as in a denoising loop, through the copying path of `__call__`, `zero_copy_infer` with tensors converted and bound
+    on every call, and `bound_infer`. The model work is the same for the three paths, so the differences are the per
+    step IO overhead.
+
+    Args:
+        runtime_model ([`FastDeployRuntimeModel`]): the model to benchmark.
+        inputs (`Dict[str, paddle.Tensor]`): the inputs of every call.
+        output_shapes (`Dict[str, List[int]]`): the shapes of the float32 outputs.
+        paths (`List[str]`, *optional*): names of the [`FASTDEPLOY_IO_PATHS`] to run, defaults to all of them.
+        steps (`int`, *optional*, defaults to 20): number of calls per timed run.
+        repeats (`int`, *optional*, defaults to 3): number of timed runs per path, the median is reported.
+        output (`str`, *optional*): where to write the report, it is not written if `None`.
+
+    Returns:
+        `Dict[str, Any]`: the report, with the latency per call of every path, its overhead over `"bound"` and the
+        largest difference of its outputs to the ones of `"copy"`.
+    """
+    paths = paths or FASTDEPLOY_IO_PATHS
+    for name in paths:
+        if name not in FASTDEPLOY_IO_PATHS:
+            raise ValueError(f"{name} is not a FastDeploy IO path, choose from {FASTDEPLOY_IO_PATHS}.")
+
+    def call(path):
+        if path == "copy":
+            return [paddle.to_tensor(output) for output in runtime_model(**inputs)]
+        if path == "zero_copy":
+            outputs = {name: paddle.zeros(shape, dtype="float32") for name, shape in output_shapes.items()}
+            share_with_raw_ptr = not next(iter(outputs.values())).place.is_cpu_place()
+            runtime_model.zero_copy_infer(inputs, outputs, share_with_raw_ptr=share_with_raw_ptr)
+            return list(outputs.values())
+        return list(runtime_model.bound_infer(inputs, output_shapes).values())
+
+    report = {
+        "environment": benchmark_environment(),
+        "settings": {
+            "inputs": {name: list(value.shape) for name, value in inputs.items()},
+            "output_shapes": output_shapes,
+            "steps": steps,
+            "repeats": repeats,
+        },
+        "results": {},
+    }
+    reference = None
+    for path in paths:
+        logger.info(f"Benchmarking the {path} path.")
+        # warmup, which also binds the buffers of `bound`
+        outputs = [output.numpy() for output in call(path)]
+        if reference is None:
+            reference = outputs
+        times = []
+        for _ in range(repeats):
+            with Timer() as timer:
+                for _ in range(steps):
+                    call(path)
+            times.append(timer.elapsed / steps)
+        report["results"][path] = {
+            "latency_ms": float(np.median(times)) * 1000,
+            "max_diff_to_reference": max(float(np.abs(a - b).max()) for a, b in zip(outputs, reference)),
+        }
+
+    if "bound" in report["results"]:
+        for result in report["results"].values():
+            result["overhead_ms_vs_bound"] = result["latency_ms"] - report["results"]["bound"]["latency_ms"]
+
+    if output is not None:
+        save_benchmark_report(report, output)
+    return report
+
+
+def fastdeploy_load_test_command_factory(args):
+    return FastDeployLoadTestCommand(
+        pretrained_model_name_or_path=args.pretrained_model_name_or_path,
+        stub_latency_ms=args.stub_latency_ms,
+        num_instances=args.num_instances,
+        concurrency=args.concurrency,
+        num_requests=args.num_requests,
+        steps=args.steps,
+        cpu_thread_num=args.cpu_thread_num,
+        batch_size=args.batch_size,
+        height=args.height,
+        width=args.width,
+        output=args.output,
+    )
+
+
+def run_fastdeploy_load_test(
+    runtime_model,
+    inputs_fn: Callable[[int], Dict[str, "paddle.Tensor"]],
+    output_shapes: Optional[Dict[str, List[int]]] = None,
+    num_instances: Optional[List[int]] = None,
+    concurrency: int = 4,
+    num_requests: int = 16,
+    steps: int = 10,
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Load tests [`FastDeployRuntimePool`]s of `runtime_model`: `concurrency` client threads send `num_requests`
+    requests, each of `steps` calls with the same inputs, as the UNet calls of a denoising loop. The outputs of every
+    request are compared to the ones of a call of `runtime_model` alone, to catch the requests receiving the outputs
+    of another one. Use a [`~utils.testing_utils.StubFastDeployRuntime`] to load test without a backend.
+
+    Args:
+        runtime_model ([`FastDeployRuntimeModel`]): the model to pool.
+        inputs_fn (`Callable[[int], Dict[str, paddle.Tensor]]`): returns the inputs of the request of an index.
+        output_shapes (`Dict[str, List[int]]`, *optional*): the shapes of the outputs, to bind them.
+        num_instances (`List[int]`, *optional*): the pool sizes to test, defaults to 1, 2 and 4.
+        concurrency (`int`, *optional*, defaults to 4): the number of client threads.
+        num_requests (`int`, *optional*, defaults to 16): the number of requests per pool size.
+        steps (`int`, *optional*, defaults to 10): the number of calls per request.
+        output (`str`, *optional*): where to write the report, it is not written if `None`.
+
+    Returns:
+        `Dict[str, Any]`: the report, with the throughput, latency percentiles and mismatched requests of every pool
+        size, and its speedup over the smallest pool.
+    """
+    from ..pipelines.fastdeploy_utils import FastDeployRuntimePool
+
+    num_instances = num_instances or [1, 2, 4]
+    requests = [inputs_fn(index) for index in range(num_requests)]
+    output_names = [runtime_model.model.get_output_info(i).name for i in range(runtime_model.model.num_outputs())]
+    references = [dict(zip(output_names, runtime_model(**inputs))) for inputs in requests]
+
+    report = {
+        "environment": benchmark_environment(),
+        "settings": {
+            "num_instances": num_instances,
+            "concurrency": concurrency,
+            "num_requests": num_requests,
+            "steps": steps,
+        },
+        "results": {},
+    }
+    for size in num_instances:
+        logger.info(f"Load testing a pool of {size} runtime instances.")
+        pool = FastDeployRuntimePool(runtime_model, num_instances=size)
+
+        def run_request(index):
+            start = time.perf_counter()
+            for _ in range(steps):
+                outputs = pool.bound_infer(requests[index], output_shapes=output_shapes)
+            latency = time.perf_counter() - start
+            matches = all(
+                np.allclose(outputs[name].numpy(), reference, atol=1e-5)
+                for name, reference in references[index].items()
+                if name in outputs
+            )
+            return latency, matches
+
+        with Timer() as timer, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run_request, range(num_requests)))
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        report["results"][str(size)] = {
+            "throughput_rps": num_requests / timer.elapsed,
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p95_ms": float(np.percentile(latencies, 95)),
+            "mismatched_requests": sum(not matches for _, matches in results),
+        }
+
+    base = report["results"][str(num_instances[0])]["throughput_rps"]
+    for result in report["results"].values():
+        result["speedup"] = result["throughput_rps"] / base
+
+    if output is not None:
+        save_benchmark_report(report, output)
+    return report
+
+
+class FastDeployIOBenchmarkCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        benchmark_parser = parser.add_parser(
+            "benchmark_fastdeploy_io", help="Measure the per step IO overhead of a FastDeploy UNet."
+        )
+        benchmark_parser.add_argument(
+            "--pretrained_model_name_or_path",
+            type=str,
+            required=True,
+            help="FastDeploy Stable Diffusion pipeline to load the `unet` from.",
+        )
+        benchmark_parser.add_argument(
+            "--device", type=str, default="cpu", choices=["cpu", "gpu"], help="Device of the runtime."
+        )
+        benchmark_parser.add_argument("--batch_size", type=int, default=2, help="UNet batch, 2 per image with CFG.")
+        benchmark_parser.add_argument("--height", type=int, default=512, help="Height of the images.")
+        benchmark_parser.add_argument("--width", type=int, default=512, help="Width of the images.")
+        benchmark_parser.add_argument("--steps", type=int, default=20, help="Calls per timed run.")
+        benchmark_parser.add_argument("--repeats", type=int, default=3, help="Timed runs per path.")
+        benchmark_parser.add_argument(
+            "--output", type=str, default="fastdeploy_io_benchmark.json", help="Path of the JSON report."
+        )
+        benchmark_parser.set_defaults(func=fastdeploy_io_benchmark_command_factory)
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str,
+        device: str = "cpu",
+        batch_size: int = 2,
+        height: int = 512,
+        width: int = 512,
+        steps: int = 20,
+        repeats: int = 3,
+        output: str = "fastdeploy_io_benchmark.json",
+    ):
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.device = device
+        self.batch_size = batch_size
+        self.height = height
+        self.width = width
+        self.steps = steps
+        self.repeats = repeats
+        self.output = output
+
+    def run(self):
+        if not is_fastdeploy_available():
+            raise ImportError("The FastDeploy IO benchmark requires `fastdeploy`, install it first.")
+        unet = load_fastdeploy_unet(self.pretrained_model_name_or_path, self.device)
+        inputs, output_shapes = fastdeploy_unet_inputs(unet, self.batch_size, self.height, self.width)
+        report = run_fastdeploy_io_benchmark(
+            unet, inputs, output_shapes, steps=self.steps, repeats=self.repeats, output=self.output
+        )
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'path':<12}{'latency ms':>12}{'overhead ms':>13}{'max diff':>10}"]
+        for name, result in report["results"].items():
+            lines.append(
+                f"{name:<12}{result['latency_ms']:>12.3f}{result.get('overhead_ms_vs_bound', float('nan')):>13.3f}"
+                f"{result['max_diff_to_reference']:>10.4f}"
+            )
+        return "\n".join(lines)
+
+
+class FastDeployLoadTestCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        load_test_parser = parser.add_parser(
+            "load_test_fastdeploy", help="Load test FastDeploy runtime pools of a UNet, or of a stub runtime."
+        )
+        load_test_parser.add_argument(
+            "--pretrained_model_name_or_path",
+            type=str,
+            default=None,
+            help="FastDeploy Stable Diffusion pipeline to load the `unet` from, a stub runtime is used if not set.",
+        )
+        load_test_parser.add_argument(
+            "--stub_latency_ms", type=float, default=20.0, help="Latency of the calls of the stub runtime."
+        )
+        load_test_parser.add_argument(
+            "--num_instances", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to test."
+        )
+        load_test_parser.add_argument("--concurrency", type=int, default=4, help="Number of client threads.")
+        load_test_parser.add_argument("--num_requests", type=int, default=16, help="Requests per pool size.")
+        load_test_parser.add_argument("--steps", type=int, default=10, help="UNet calls per request.")
+        load_test_parser.add_argument(
+            "--cpu_thread_num", type=int, default=-1, help="Threads of every CPU runtime, to share the cores."
+        )
+        load_test_parser.add_argument("--batch_size", type=int, default=2, help="UNet batch, 2 per image with CFG.")
+        load_test_parser.add_argument("--height", type=int, default=512, help="Height of the images.")
+        load_test_parser.add_argument("--width", type=int, default=512, help="Width of the images.")
+        load_test_parser.add_argument(
+            "--output", type=str, default="fastdeploy_load_test.json", help="Path of the JSON report."
+        )
+        load_test_parser.set_defaults(func=fastdeploy_load_test_command_factory)
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: Optional[str] = None,
+        stub_latency_ms: float = 20.0,
+        num_instances: Optional[List[int]] = None,
+        concurrency: int = 4,
+        num_requests: int = 16,
+        steps: int = 10,
+        cpu_thread_num: int = -1,
+        batch_size: int = 2,
+        height: int = 512,
+        width: int = 512,
+        output: str = "fastdeploy_load_test.json",
+    ):
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.stub_latency_ms = stub_latency_ms
+        self.num_instances = num_instances or [1, 2, 4]
+        self.concurrency = concurrency
+        self.num_requests = num_requests
+        self.steps = steps
+        self.cpu_thread_num = cpu_thread_num
+        self.batch_size = batch_size
+        self.height = height
+        self.width = width
+        self.output = output
+
+    def run(self):
+        if self.pretrained_model_name_or_path is None:
+            from ..pipelines.fastdeploy_utils import FastDeployRuntimeModel
+            from ..utils.testing_utils import (
+                StubFastDeployRuntime,
+                stub_fastdeploy_tensors,
+            )
+
+            shape = [self.batch_size, 4, self.height // 8, self.width // 8]
+            runtime = StubFastDeployRuntime(
+                inputs=[("sample", shape)], outputs=[("out", shape)], latency=self.stub_latency_ms / 1000
+            )
+            unet = FastDeployRuntimeModel(model=runtime)
+            output_shapes = {"out": shape}
+            # the stub runtime binds the paddle tensors themselves
+            tensors = stub_fastdeploy_tensors()
+
+            def inputs_fn(index):
+                return {"sample": paddle.full(shape, float(index))}
+
+        else:
+            if not is_fastdeploy_available():
+                raise ImportError("Load testing a FastDeploy UNet requires `fastdeploy`, install it first.")
+            unet = load_fastdeploy_unet(self.pretrained_model_name_or_path, "cpu", self.cpu_thread_num)
+            inputs, output_shapes = fastdeploy_unet_inputs(unet, self.batch_size, self.height, self.width)
+            sample_name = next(iter(inputs))
+
+            tensors = contextlib.nullcontext()
+
+            def inputs_fn(index):
+                return dict(inputs, **{sample_name: paddle.randn(inputs[sample_name].shape)})
+
+        with tensors:
+            report = run_fastdeploy_load_test(
+                unet,
+                inputs_fn,
+                output_shapes=output_shapes,
+                num_instances=self.num_instances,
+                concurrency=self.concurrency,
+                num_requests=self.num_requests,
+                steps=self.steps,
+                output=self.output,
+            )
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'instances':<11}{'req/s':>9}{'speedup':>9}{'p50 ms':>10}{'p95 ms':>10}{'mismatched':>12}"]
+        for size, result in report["results"].items():
+            lines.append(
+                f"{size:<11}{result['throughput_rps']:>9.2f}{result['speedup']:>9.2f}{result['latency_p50_ms']:>10.1f}"
+                f"{result['latency_p95_ms']:>10.1f}{result['mismatched_requests']:>12d}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,244 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..utils import is_paddle_available, logging
+from ..utils.benchmark_utils import Timer, benchmark_environment, save_benchmark_report
+from . import BasePPDiffusersCLICommand
+
+if is_paddle_available():
+    import paddle
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# the `StableDiffusionSAGPipeline` arguments of every benchmarked configuration
+SAG_BENCHMARK_CONFIGS = {
+    "cfg": {"sag_scale": 0.0},
+    "sag": {},
+    "sag_fused": {"fuse_sag_batch": True},
+    "sag_first_half": {"sag_end": 0.5},
+    "sag_first_half_fused": {"sag_end": 0.5, "fuse_sag_batch": True},
+}
+
+
+def sag_benchmark_command_factory(args):
+    return SAGBenchmarkCommand(
+        pretrained_model_name_or_path=args.pretrained_model_name_or_path,
+        configs=args.configs,
+        prompt=args.prompt,
+        num_inference_steps=args.num_inference_steps,
+        height=args.height,
+        width=args.width,
+        repeats=args.repeats,
+        seed=args.seed,
+        output=args.output,
+    )
+
+
+class UNetCallCounter:
+    """Context manager counting the forward calls of a model while it is active."""
+
+    def __init__(self, model):
+        self.model = model
+        self.count = 0
+
+    def _hook(self, layer, inputs, outputs):
+        self.count += 1
+
+    def __enter__(self):
+        self._handle = self.model.register_forward_post_hook(self._hook)
+        return self
+
+    def __exit__(self, *exc):
+        self._handle.remove()
+        return False
+
+
+def run_sag_benchmark(
+    pipeline,
+    configs: Optional[List[str]] = None,
+    prompt: str = "a photo of an astronaut riding a horse on mars",
+    num_inference_steps: int = 50,
+    height: Optional[int] = None,
+    width: Optional[int] = None,
+    repeats: int = 3,
+    seed: int = 0,
+    output: Optional[str] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Measures the latency of a [`StableDiffusionSAGPipeline`] with self-attention guidance disabled, applied on every
+    step, applied on a subset of the steps, and fused into the classifier free guidance batch.
+
+    Args:
+        pipeline ([`StableDiffusionSAGPipeline`]): the pipeline to benchmark.
+        configs (`List[str]`, *optional*): names of the [`SAG_BENCHMARK_CONFIGS`] to run, defaults to all of them.
+        prompt (`str`, *optional*): the prompt of every run.
+        num_inference_steps (`int`, *optional*, defaults to 50): the number of denoising steps.
+        height (`int`, *optional*): the height in pixels of the images, defaults to the one of the pipeline.
+        width (`int`, *optional*): the width in pixels of the images, defaults to the one of the pipeline.
+        repeats (`int`, *optional*, defaults to 3): number of timed runs per configuration, the median is reported.
+        seed (`int`, *optional*, defaults to 0): seed of the initial latents, shared by every run.
+        output (`str`, *optional*): where to write the report, it is not written if `None`.
+        kwargs: further arguments passed to the pipeline.
+
+    Returns:
+        `Dict[str, Any]`: the report, with the latency, the number of UNet calls and the largest pixel difference to
+        the images of the `"sag"` configuration of every configuration.
+    """
+    configs = configs or list(SAG_BENCHMARK_CONFIGS.keys())
+    for name in configs:
+        if name not in SAG_BENCHMARK_CONFIGS:
+            raise ValueError(f"{name} is not a SAG benchmark configuration, choose from {list(SAG_BENCHMARK_CONFIGS)}.")
+    pipeline.set_progress_bar_config(disable=True)
+
+    def generate(config):
+        generator = paddle.Generator().manual_seed(seed)
+        return pipeline(
+            prompt,
+            num_inference_steps=num_inference_steps,
+            height=height,
+            width=width,
+            generator=generator,
+            output_type="numpy",
+            **config,
+            **kwargs,
+        ).images
+
+    report = {
+        "environment": benchmark_environment(),
+        "settings": {
+            "prompt": prompt,
+            "num_inference_steps": num_inference_steps,
+            "height": height,
+            "width": width,
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "results": {},
+    }
+    reference_images = generate(SAG_BENCHMARK_CONFIGS["sag"])
+    for name in configs:
+        config = SAG_BENCHMARK_CONFIGS[name]
+        logger.info(f"Benchmarking {name}.")
+        # warmup
+        images = generate(config)
+        times = []
+        for _ in range(repeats):
+            with UNetCallCounter(pipeline.unet) as counter, Timer() as timer:
+                generate(config)
+            times.append(timer.elapsed)
+        report["results"][name] = {
+            "pipeline_kwargs": config,
+            "latency_s": float(np.median(times)),
+            "unet_calls": counter.count,
+            "max_pixel_diff_to_sag": float(np.abs(images - reference_images).max()),
+        }
+
+    for result in report["results"].values():
+        for name in ["cfg", "sag"]:
+            if name in report["results"]:
+                result[f"speedup_vs_{name}"] = report["results"][name]["latency_s"] / result["latency_s"]
+
+    if output is not None:
+        save_benchmark_report(report, output)
+    return report
+
+
+class SAGBenchmarkCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        benchmark_parser = parser.add_parser(
+            "benchmark_sag", help="Measure the latency of the self-attention guidance configurations."
+        )
+        benchmark_parser.add_argument(
+            "--pretrained_model_name_or_path",
+            type=str,
+            default="runwayml/stable-diffusion-v1-5",
+            help="Stable Diffusion checkpoint to load the SAG pipeline from.",
+        )
+        benchmark_parser.add_argument(
+            "--configs",
+            type=str,
+            nargs="+",
+            default=None,
+            help=f"Configurations to benchmark, defaults to all of {list(SAG_BENCHMARK_CONFIGS)}.",
+        )
+        benchmark_parser.add_argument(
+            "--prompt", type=str, default="a photo of an astronaut riding a horse on mars", help="The prompt."
+        )
+        benchmark_parser.add_argument("--num_inference_steps", type=int, default=50, help="Denoising steps.")
+        benchmark_parser.add_argument("--height", type=int, default=None, help="Height of the images.")
+        benchmark_parser.add_argument("--width", type=int, default=None, help="Width of the images.")
+        benchmark_parser.add_argument("--repeats", type=int, default=3, help="Timed runs per configuration.")
+        benchmark_parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        benchmark_parser.add_argument(
+            "--output", type=str, default="sag_benchmark.json", help="Path of the JSON report."
+        )
+        benchmark_parser.set_defaults(func=sag_benchmark_command_factory)
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str = "runwayml/stable-diffusion-v1-5",
+        configs: Optional[List[str]] = None,
+        prompt: str = "a photo of an astronaut riding a horse on mars",
+        num_inference_steps: int = 50,
+        height: Optional[int] = None,
+        width: Optional[int] = None,
+        repeats: int = 3,
+        seed: int = 0,
+        output: str = "sag_benchmark.json",
+    ):
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.configs = configs
+        self.prompt = prompt
+        self.num_inference_steps = num_inference_steps
+        self.height = height
+        self.width = width
+        self.repeats = repeats
+        self.seed = seed
+        self.output = output
+
+    def run(self):
+        from ..pipelines import StableDiffusionSAGPipeline
+
+        pipeline = StableDiffusionSAGPipeline.from_pretrained(self.pretrained_model_name_or_path)
+        report = run_sag_benchmark(
+            pipeline,
+            configs=self.configs,
+            prompt=self.prompt,
+            num_inference_steps=self.num_inference_steps,
+            height=self.height,
+            width=self.width,
+            repeats=self.repeats,
+            seed=self.seed,
+            output=self.output,
+        )
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'config':<24}{'latency s':>12}{'unet calls':>12}{'vs cfg':>8}{'vs sag':>8}{'max diff':>10}"]
+        for name, result in report["results"].items():
+            lines.append(
+                f"{name:<24}{result['latency_s']:>12.3f}{result['unet_calls']:>12}"
+                f"{result.get('speedup_vs_cfg', float('nan')):>8.2f}{result.get('speedup_vs_sag', float('nan')):>8.2f}"
+                f"{result['max_pixel_diff_to_sag']:>10.4f}"
+            )
+        return "\n".join(lines)
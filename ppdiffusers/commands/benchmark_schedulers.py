@@ -0,0 +1,356 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import inspect
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..utils import is_paddle_available, logging
+from ..utils.benchmark_utils import (
+    HostSyncCounter,
+    MemoryTracker,
+    Timer,
+    benchmark_environment,
+    save_benchmark_report,
+)
+from . import BasePPDiffusersCLICommand
+
+if is_paddle_available():
+    import paddle
+    import paddle.nn as nn
+
+    import ppdiffusers
+
+    from ..schedulers import DDIMScheduler, DDPMScheduler, KarrasDiffusionSchedulers
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+DEFAULT_STEPS = [5, 10, 20, 25, 50]
+REFERENCE_STEPS = 1000
+
+# the noise schedule of Stable Diffusion, shared by every benchmarked scheduler and the stub denoiser
+DEFAULT_SCHEDULE_CONFIG = {
+    "num_train_timesteps": 1000,
+    "beta_start": 0.00085,
+    "beta_end": 0.012,
+    "beta_schedule": "scaled_linear",
+    "prediction_type": "epsilon",
+    "clip_sample": False,
+}
+
+# schedulers of `ppdiffusers.schedulers` that cannot be driven by an epsilon-prediction text-to-image loop
+SKIPPED_SCHEDULERS = {
+    "DDIMInverseScheduler": "inverts an image into noise, it does not sample",
+    "IPNDMScheduler": "uses its own continuous-time noise schedule",
+    "KarrasVeScheduler": "requires the stochastic Karras VE sampling loop (`step_correct`)",
+    "RePaintScheduler": "requires a known image and mask",
+    "ScoreSdeVeScheduler": "requires the predictor-corrector score SDE loop",
+    "ScoreSdeVpScheduler": "requires a score model and the continuous-time SDE loop",
+    "UnCLIPScheduler": "only supports the `squaredcos_cap_v2` beta schedule",
+    "VQDiffusionScheduler": "operates on discrete latent codes",
+}
+
+# schedulers injecting fresh noise at every step, their trajectories can not be compared to the ODE reference
+STOCHASTIC_SCHEDULERS = ["DDPMScheduler", "EulerAncestralDiscreteScheduler", "KDPM2AncestralDiscreteScheduler"]
+
+
+def scheduler_benchmark_command_factory(args):
+    return SchedulerBenchmarkCommand(
+        schedulers=args.schedulers,
+        steps=args.steps,
+        batch_size=args.batch_size,
+        sample_size=args.sample_size,
+        seed=args.seed,
+        output=args.output,
+    )
+
+
+if is_paddle_available():
+
+    class GaussianDenoiser(nn.Layer):
+        """
+        A tiny deterministic stand-in for a UNet: the exact noise prediction for data distributed as independent
+        per-channel gaussians `N(mean_c, std_c**2)` under a variance preserving noise schedule. Its sampling
+        distribution is known in closed form, which makes accuracy measurements independent of any trained weights.
+
+        Args:
+            alphas_cumprod (`paddle.Tensor`): the cumulative product of `1 - beta` of the noise schedule.
+            num_channels (`int`, *optional*, defaults to 4): number of channels of the samples.
+        """
+
+        def __init__(self, alphas_cumprod: "paddle.Tensor", num_channels: int = 4):
+            super().__init__()
+            alphas_cumprod = np.array(alphas_cumprod.cast("float64").numpy())
+            self.train_sigmas = ((1 - alphas_cumprod) / alphas_cumprod) ** 0.5
+            self.data_mean = np.linspace(-0.5, 0.5, num_channels)
+            self.data_std = np.linspace(0.5, 1.0, num_channels)
+
+        def forward(self, sample: "paddle.Tensor", timestep) -> "paddle.Tensor":
+            # fractional timesteps (Karras style schedulers) are mapped to sigmas the same way the schedulers do
+            timestep = float(timestep)
+            sigma = np.interp(timestep, np.arange(len(self.train_sigmas)), self.train_sigmas)
+            alpha_prod = 1.0 / (1.0 + sigma**2)
+            mean = paddle.to_tensor(self.data_mean * alpha_prod**0.5, dtype=sample.dtype).reshape([1, -1, 1, 1])
+            var = paddle.to_tensor(
+                self.data_std**2 * alpha_prod + (1 - alpha_prod), dtype=sample.dtype
+            ).reshape([1, -1, 1, 1])
+            # E[noise | x_t] for x_t = sqrt(alpha_prod) * x_0 + sqrt(1 - alpha_prod) * noise
+            return (1 - alpha_prod) ** 0.5 * (sample - mean) / var
+
+
+def _sample(scheduler, model, noise, generator=None):
+    """Runs a full denoising loop, returns the final sample and per step statistics of the scheduler calls."""
+    accepts_generator = "generator" in set(inspect.signature(scheduler.step).parameters.keys())
+    extra_step_kwargs = {"generator": generator} if accepts_generator else {}
+
+    latents = noise * scheduler.init_noise_sigma
+    step_times, host_syncs, peak_bytes = [], [], []
+    for t in scheduler.timesteps:
+        with HostSyncCounter() as counter, MemoryTracker() as memory, Timer() as timer:
+            model_input = scheduler.scale_model_input(latents, t)
+        scale_time, scale_syncs, scale_bytes = timer.elapsed, counter.count, memory.peak_bytes
+
+        model_output = model(model_input, t)
+
+        with HostSyncCounter() as counter, MemoryTracker() as memory, Timer() as timer:
+            latents = scheduler.step(model_output, t, latents, **extra_step_kwargs).prev_sample
+        step_times.append(scale_time + timer.elapsed)
+        host_syncs.append(scale_syncs + counter.count)
+        peak_bytes.append(max(scale_bytes, memory.peak_bytes))
+
+    stats = {
+        "model_evaluations": len(step_times),
+        "time_per_step_ms": 1000 * float(np.mean(step_times)),
+        "total_scheduler_time_ms": 1000 * float(np.sum(step_times)),
+        "host_syncs_per_step": float(np.mean(host_syncs)),
+        "peak_step_memory_bytes": int(np.max(peak_bytes)),
+    }
+    return latents, stats
+
+
+def _moments(sample: "paddle.Tensor"):
+    sample = sample.cast("float64").transpose([1, 0, 2, 3]).reshape([sample.shape[1], -1]).numpy()
+    return sample.mean(axis=1), sample.std(axis=1)
+
+
+def benchmark_scheduler(
+    scheduler,
+    model: "GaussianDenoiser",
+    num_inference_steps: int,
+    noise: "paddle.Tensor",
+    reference: Dict[str, Any],
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Measures the cost and the accuracy of `scheduler` for a given number of inference steps.
+
+    Args:
+        scheduler ([`SchedulerMixin`]): the scheduler to benchmark.
+        model ([`GaussianDenoiser`]): the stub denoiser.
+        num_inference_steps (`int`): the number of inference steps passed to `set_timesteps`.
+        noise (`paddle.Tensor`): the initial unit gaussian noise, shared by every run.
+        reference (`Dict[str, Any]`): the reference statistics computed by [`compute_reference`].
+        seed (`int`, *optional*, defaults to 0): seed of the generator used by stochastic schedulers.
+
+    Returns:
+        `Dict[str, Any]`: timing, host synchronization, memory and error statistics of the run.
+    """
+    scheduler.set_timesteps(num_inference_steps)
+    generator = paddle.Generator().manual_seed(seed)
+    sample, stats = _sample(scheduler, model, noise, generator=generator)
+
+    mean, std = _moments(sample)
+    stats["num_inference_steps"] = num_inference_steps
+    # distance of the sample moments to the 1000 step DDPM reference, meaningful for every scheduler
+    stats["mean_error"] = float(np.abs(mean - reference["mean"]).mean())
+    stats["std_error"] = float(np.abs(std - reference["std"]).mean())
+    # distance of the sample itself to the 1000 step DDIM solution of the probability flow ODE started from the
+    # same noise, only meaningful for deterministic schedulers
+    stats["ode_rmse"] = float(paddle.sqrt(((sample - reference["ode_sample"]) ** 2).mean()))
+    return stats
+
+
+def compute_reference(model: "GaussianDenoiser", noise: "paddle.Tensor", seed: int = 0) -> Dict[str, Any]:
+    """
+    Computes the reference solutions the schedulers are compared to: the moments of a 1000 step DDPM sampling and the
+    sample of a 1000 step (deterministic) DDIM sampling started from `noise`.
+    """
+    ddpm = DDPMScheduler.from_config(DEFAULT_SCHEDULE_CONFIG)
+    ddpm.set_timesteps(REFERENCE_STEPS)
+    ddpm_sample, _ = _sample(ddpm, model, noise, generator=paddle.Generator().manual_seed(seed))
+    mean, std = _moments(ddpm_sample)
+
+    ddim = DDIMScheduler.from_config(DEFAULT_SCHEDULE_CONFIG)
+    ddim.set_timesteps(REFERENCE_STEPS)
+    ode_sample, _ = _sample(ddim, model, noise)
+
+    return {
+        "mean": mean,
+        "std": std,
+        "ode_sample": ode_sample,
+        # the sampling error of the reference itself, i.e. the noise floor of `mean_error` and `std_error`
+        "mean_error_to_data": float(np.abs(mean - model.data_mean).mean()),
+        "std_error_to_data": float(np.abs(std - model.data_std).mean()),
+    }
+
+
+def run_scheduler_benchmark(
+    schedulers: Optional[List[str]] = None,
+    steps: Optional[List[int]] = None,
+    batch_size: int = 4,
+    sample_size: int = 32,
+    seed: int = 0,
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Benchmarks the schedulers of `ppdiffusers.schedulers` against a deterministic stub denoiser and writes a JSON
+    report.
+
+    Args:
+        schedulers (`List[str]`, *optional*):
+            class names of the schedulers to benchmark, defaults to all the [`KarrasDiffusionSchedulers`].
+        steps (`List[int]`, *optional*, defaults to `[5, 10, 20, 25, 50]`): the step budgets to measure.
+        batch_size (`int`, *optional*, defaults to 4): batch size of the samples.
+        sample_size (`int`, *optional*, defaults to 32): height and width of the samples.
+        seed (`int`, *optional*, defaults to 0): seed of the initial noise and of the stochastic schedulers.
+        output (`str`, *optional*): where to write the report, it is not written if `None`.
+
+    Returns:
+        `Dict[str, Any]`: the report.
+    """
+    schedulers = schedulers or [e.name for e in KarrasDiffusionSchedulers]
+    steps = steps or DEFAULT_STEPS
+
+    reference_scheduler = DDPMScheduler.from_config(DEFAULT_SCHEDULE_CONFIG)
+    model = GaussianDenoiser(reference_scheduler.alphas_cumprod)
+    paddle.seed(seed)
+    noise = paddle.randn([batch_size, len(model.data_mean), sample_size, sample_size], dtype="float32")
+    reference = compute_reference(model, noise, seed=seed)
+
+    report = {
+        "environment": benchmark_environment(),
+        "settings": {
+            "schedule_config": DEFAULT_SCHEDULE_CONFIG,
+            "steps": steps,
+            "sample_shape": noise.shape,
+            "seed": seed,
+            "reference_steps": REFERENCE_STEPS,
+        },
+        "reference": {
+            "mean_error_to_data": reference["mean_error_to_data"],
+            "std_error_to_data": reference["std_error_to_data"],
+        },
+        "results": {},
+        "skipped": {},
+        "failed": {},
+    }
+
+    for name in schedulers:
+        if name in SKIPPED_SCHEDULERS:
+            report["skipped"][name] = SKIPPED_SCHEDULERS[name]
+            continue
+        scheduler_cls = getattr(ppdiffusers, name, None)
+        if scheduler_cls is None:
+            raise ValueError(f"{name} is not a scheduler of ppdiffusers.")
+        try:
+            scheduler = scheduler_cls.from_config(DEFAULT_SCHEDULE_CONFIG)
+        except ImportError as e:
+            # optional dependency (e.g. scipy) missing
+            report["skipped"][name] = str(e)
+            continue
+
+        runs = []
+        try:
+            for num_inference_steps in steps:
+                logger.info(f"Benchmarking {name} with {num_inference_steps} steps.")
+                runs.append(benchmark_scheduler(scheduler, model, num_inference_steps, noise, reference, seed=seed))
+        except Exception as e:
+            # keep benchmarking the other schedulers, the failure is part of the report
+            logger.warning(f"Benchmarking {name} failed: {e}")
+            report["failed"][name] = f"{e.__class__.__name__}: {e}"
+            continue
+        report["results"][name] = {"stochastic": name in STOCHASTIC_SCHEDULERS, "runs": runs}
+
+    if output is not None:
+        save_benchmark_report(report, output)
+    return report
+
+
+class SchedulerBenchmarkCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        benchmark_parser = parser.add_parser(
+            "benchmark_schedulers", help="Measure the cost and the accuracy per step of the schedulers."
+        )
+        benchmark_parser.add_argument(
+            "--schedulers", type=str, nargs="+", default=None, help="Scheduler class names, defaults to all."
+        )
+        benchmark_parser.add_argument(
+            "--steps", type=int, nargs="+", default=DEFAULT_STEPS, help="Numbers of inference steps to measure."
+        )
+        benchmark_parser.add_argument("--batch_size", type=int, default=4, help="Batch size of the samples.")
+        benchmark_parser.add_argument("--sample_size", type=int, default=32, help="Height and width of the samples.")
+        benchmark_parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        benchmark_parser.add_argument(
+            "--output", type=str, default="scheduler_benchmark.json", help="Path of the JSON report."
+        )
+        benchmark_parser.set_defaults(func=scheduler_benchmark_command_factory)
+
+    def __init__(
+        self,
+        schedulers: Optional[List[str]] = None,
+        steps: Optional[List[int]] = None,
+        batch_size: int = 4,
+        sample_size: int = 32,
+        seed: int = 0,
+        output: str = "scheduler_benchmark.json",
+    ):
+        self.schedulers = schedulers
+        self.steps = steps
+        self.batch_size = batch_size
+        self.sample_size = sample_size
+        self.seed = seed
+        self.output = output
+
+    def run(self):
+        if not is_paddle_available():
+            raise ImportError("`ppdiffusers-cli benchmark_schedulers` requires paddle to be installed.")
+        report = run_scheduler_benchmark(
+            schedulers=self.schedulers,
+            steps=self.steps,
+            batch_size=self.batch_size,
+            sample_size=self.sample_size,
+            seed=self.seed,
+            output=self.output,
+        )
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'scheduler':<36}{'steps':>6}{'nfe':>6}{'ms/step':>10}{'syncs':>8}{'mean err':>10}{'std err':>10}"]
+        for name, result in report["results"].items():
+            for run in result["runs"]:
+                lines.append(
+                    f"{name:<36}{run['num_inference_steps']:>6}{run['model_evaluations']:>6}"
+                    f"{run['time_per_step_ms']:>10.3f}{run['host_syncs_per_step']:>8.1f}"
+                    f"{run['mean_error']:>10.4f}{run['std_error']:>10.4f}"
+                )
+        for name, reason in report["skipped"].items():
+            lines.append(f"{name:<36}skipped: {reason}")
+        for name, error in report["failed"].items():
+            lines.append(f"{name:<36}failed: {error}")
+        return "\n".join(lines)
@@ -0,0 +1,304 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from argparse import ArgumentParser
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from ..utils import is_paddle_available, is_paddlenlp_available, logging
+from ..utils.benchmark_utils import (
+    HostSyncCounter,
+    MemoryTracker,
+    Timer,
+    benchmark_environment,
+    save_benchmark_report,
+)
+from . import BasePPDiffusersCLICommand
+
+if is_paddle_available():
+    import paddle
+    import paddle.nn.functional as F
+
+    from ..schedulers import VQDiffusionScheduler
+    from ..schedulers.scheduling_vq_diffusion import index_to_log_onehot
+
+if is_paddle_available() and is_paddlenlp_available():
+    from ..pipelines.vq_diffusion.pipeline_vq_diffusion import VQDiffusionPipeline
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+DEFAULT_TIMESTEPS = [99, 50, 1]
+DEFAULT_TRUNCATION_RATES = [0.86, 1.0]
+
+# the value `VQDiffusionPipeline.truncate` uses for log(0)
+INF = 1e9
+
+
+def vq_diffusion_benchmark_command_factory(args):
+    return VQDiffusionBenchmarkCommand(
+        num_classes=args.num_classes,
+        num_latent_pixels=args.num_latent_pixels,
+        batch_size=args.batch_size,
+        timesteps=args.timesteps,
+        truncation_rates=args.truncation_rates,
+        repeats=args.repeats,
+        seed=args.seed,
+        output=args.output,
+    )
+
+
+def _logaddexp(a, b):
+    return paddle.log(a.exp() + b.exp())
+
+
+def _logsumexp(x, axis=None, keepdim=False):
+    return paddle.log(x.exp().sum(axis=axis, keepdim=keepdim))
+
+
+def reference_log_Q_t(scheduler: "VQDiffusionScheduler", t: int, x_t, log_onehot_x_t, cumulative: bool):
+    """The transition matrix rows built from the log one-hot vectors of `x_t`, as in ppdiffusers <= 0.14."""
+    if cumulative:
+        a, b, c = scheduler.log_cumprod_at[t], scheduler.log_cumprod_bt[t], scheduler.log_cumprod_ct[t]
+    else:
+        a, b, c = scheduler.log_at[t], scheduler.log_bt[t], scheduler.log_ct[t]
+        log_onehot_x_t_transitioning_from_masked = log_onehot_x_t[:, -1, :].unsqueeze(1)
+    log_Q_t = _logaddexp(log_onehot_x_t[:, :-1, :] + a, b)
+    mask_class_mask = (x_t == scheduler.mask_class).unsqueeze(1).expand([-1, scheduler.num_embed - 1, -1])
+    log_Q_t = paddle.where(mask_class_mask, c, log_Q_t)
+    if not cumulative:
+        log_Q_t = paddle.concat((log_Q_t, log_onehot_x_t_transitioning_from_masked), axis=1)
+    return log_Q_t
+
+
+def reference_q_posterior(scheduler: "VQDiffusionScheduler", log_p_x_0, x_t, t):
+    """[`VQDiffusionScheduler.q_posterior`] as in ppdiffusers <= 0.14, indexing the schedules with a tensor `t`."""
+    log_onehot_x_t = index_to_log_onehot(x_t, scheduler.num_embed)
+    log_q_x_t_given_x_0 = reference_log_Q_t(scheduler, t, x_t, log_onehot_x_t, cumulative=True)
+    log_q_t_given_x_t_min_1 = reference_log_Q_t(scheduler, t, x_t, log_onehot_x_t, cumulative=False)
+    q = log_p_x_0 - log_q_x_t_given_x_0
+    q_log_sum_exp = _logsumexp(q, axis=1, keepdim=True)
+    q = q - q_log_sum_exp
+    a, b, c = scheduler.log_cumprod_at[t - 1], scheduler.log_cumprod_bt[t - 1], scheduler.log_cumprod_ct[t - 1]
+    c = c.expand([q.shape[0], 1, q.shape[2]])
+    q = paddle.concat((_logaddexp(q + a, b), c), axis=1)
+    return q + log_q_t_given_x_t_min_1 + q_log_sum_exp
+
+
+def reference_truncate(log_p_x_0, truncation_rate: float):
+    """[`VQDiffusionPipeline.truncate`] as in ppdiffusers <= 0.14, sorting the whole distribution twice."""
+    sorted_log_p_x_0, indices = paddle.topk(log_p_x_0, k=log_p_x_0.shape[1], axis=1)
+    keep_mask = (paddle.exp(sorted_log_p_x_0).cumsum(axis=1) < truncation_rate).cast("int64")
+    all_true = paddle.full_like(keep_mask[:, 0:1, :], 1)
+    keep_mask = paddle.concat((all_true, keep_mask), axis=1)[:, :-1, :]
+    keep_mask = paddle.take_along_axis(keep_mask, indices.argsort(1), axis=1).cast("bool")
+    return paddle.where(keep_mask, log_p_x_0, paddle.to_tensor(-INF, dtype=log_p_x_0.dtype))
+
+
+def _measure(fn: Callable, repeats: int):
+    """Runs `fn` `repeats` times after a warmup, returns its last output and its cost statistics."""
+    output = fn()
+    times, host_syncs, peak_bytes = [], [], []
+    for _ in range(repeats):
+        with HostSyncCounter() as counter, MemoryTracker() as memory, Timer() as timer:
+            output = fn()
+        times.append(timer.elapsed)
+        host_syncs.append(counter.count)
+        peak_bytes.append(memory.peak_bytes)
+    stats = {
+        "time_ms": 1000 * float(np.median(times)),
+        "host_syncs": float(np.mean(host_syncs)),
+        "peak_memory_bytes": int(np.max(peak_bytes)),
+    }
+    return output, stats
+
+
+def _max_error(output, reference) -> float:
+    # `log(0)` is represented by different large negative numbers, the pipeline clips them to -70 anyway
+    return float((output.clip(-70) - reference.clip(-70)).abs().max())
+
+
+def run_vq_diffusion_benchmark(
+    num_classes: int = 4097,
+    num_latent_pixels: int = 1024,
+    batch_size: int = 2,
+    timesteps: Optional[List[int]] = None,
+    truncation_rates: Optional[List[float]] = None,
+    repeats: int = 5,
+    seed: int = 0,
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Compares the cost and the outputs of [`VQDiffusionScheduler.q_posterior`] and [`VQDiffusionPipeline.truncate`]
+    with their previous implementations, on random predictions of the transformer.
+
+    Args:
+        num_classes (`int`, *optional*, defaults to 4097): number of classes including the mask class, 4097 for the
+            ITHQ checkpoint.
+        num_latent_pixels (`int`, *optional*, defaults to 1024): number of latent pixels, 32 x 32 for ITHQ.
+        batch_size (`int`, *optional*, defaults to 2): batch size of the predictions.
+        timesteps (`List[int]`, *optional*, defaults to `[99, 50, 1]`): the timesteps of the posterior to measure.
+        truncation_rates (`List[float]`, *optional*, defaults to `[0.86, 1.0]`): the truncation rates to measure.
+        repeats (`int`, *optional*, defaults to 5): number of timed runs per measurement, the median is reported.
+        seed (`int`, *optional*, defaults to 0): seed of the random predictions.
+        output (`str`, *optional*): where to write the report, it is not written if `None`.
+
+    Returns:
+        `Dict[str, Any]`: the report.
+    """
+    timesteps = timesteps or DEFAULT_TIMESTEPS
+    truncation_rates = truncation_rates or DEFAULT_TRUNCATION_RATES
+
+    scheduler = VQDiffusionScheduler(num_classes)
+    scheduler.set_timesteps(scheduler.config.num_train_timesteps)
+
+    paddle.seed(seed)
+    # peaked predictions, like those of a trained transformer
+    logits = 4 * paddle.randn([batch_size, num_classes - 1, num_latent_pixels])
+    log_p_x_0 = F.log_softmax(logits, axis=1).clip(-70)
+    # a quarter of the latent pixels are still masked
+    x_t = paddle.randint(0, num_classes - 1, [batch_size, num_latent_pixels])
+    x_t = paddle.where(paddle.rand(x_t.shape) < 0.25, paddle.full_like(x_t, scheduler.mask_class), x_t)
+
+    report = {
+        "environment": benchmark_environment(),
+        "settings": {
+            "num_classes": num_classes,
+            "num_latent_pixels": num_latent_pixels,
+            "batch_size": batch_size,
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "q_posterior": [],
+        "truncate": [],
+        "skipped": {},
+    }
+
+    for t in timesteps:
+        logger.info(f"Benchmarking q_posterior at timestep {t}.")
+        t_tensor = paddle.to_tensor(t)
+        reference, reference_stats = _measure(
+            lambda: reference_q_posterior(scheduler, log_p_x_0, x_t, t_tensor), repeats
+        )
+        posterior, stats = _measure(lambda: scheduler.q_posterior(log_p_x_0, x_t, t_tensor), repeats)
+        report["q_posterior"].append(
+            {"timestep": t, "reference": reference_stats, "current": stats, "max_error": _max_error(posterior, reference)}
+        )
+
+    if not is_paddlenlp_available():
+        # the pipeline module needs the text encoder of paddlenlp
+        report["skipped"]["truncate"] = "`VQDiffusionPipeline` requires paddlenlp to be installed"
+        truncation_rates = []
+    for truncation_rate in truncation_rates:
+        logger.info(f"Benchmarking truncate with truncation rate {truncation_rate}.")
+        reference, reference_stats = _measure(lambda: reference_truncate(log_p_x_0, truncation_rate), repeats)
+        truncated, stats = _measure(lambda: VQDiffusionPipeline.truncate(None, log_p_x_0, truncation_rate), repeats)
+        # classes right at the truncation rate may be decided differently, the cumulative sums are rounded differently
+        kept, reference_kept = truncated > -INF, reference > -INF
+        report["truncate"].append(
+            {
+                "truncation_rate": truncation_rate,
+                "reference": reference_stats,
+                "current": stats,
+                "mismatch_rate": float((kept != reference_kept).cast("float32").mean()),
+            }
+        )
+
+    if output is not None:
+        save_benchmark_report(report, output)
+    return report
+
+
+class VQDiffusionBenchmarkCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        benchmark_parser = parser.add_parser(
+            "benchmark_vq_diffusion",
+            help="Compare the VQ-Diffusion posterior and truncation with their previous implementations.",
+        )
+        benchmark_parser.add_argument(
+            "--num_classes", type=int, default=4097, help="Number of classes, including the mask class."
+        )
+        benchmark_parser.add_argument("--num_latent_pixels", type=int, default=1024, help="Number of latent pixels.")
+        benchmark_parser.add_argument("--batch_size", type=int, default=2, help="Batch size of the predictions.")
+        benchmark_parser.add_argument(
+            "--timesteps", type=int, nargs="+", default=DEFAULT_TIMESTEPS, help="Timesteps of the posterior."
+        )
+        benchmark_parser.add_argument(
+            "--truncation_rates",
+            type=float,
+            nargs="+",
+            default=DEFAULT_TRUNCATION_RATES,
+            help="Truncation rates of the predicted distributions.",
+        )
+        benchmark_parser.add_argument("--repeats", type=int, default=5, help="Timed runs per measurement.")
+        benchmark_parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        benchmark_parser.add_argument(
+            "--output", type=str, default="vq_diffusion_benchmark.json", help="Path of the JSON report."
+        )
+        benchmark_parser.set_defaults(func=vq_diffusion_benchmark_command_factory)
+
+    def __init__(
+        self,
+        num_classes: int = 4097,
+        num_latent_pixels: int = 1024,
+        batch_size: int = 2,
+        timesteps: Optional[List[int]] = None,
+        truncation_rates: Optional[List[float]] = None,
+        repeats: int = 5,
+        seed: int = 0,
+        output: str = "vq_diffusion_benchmark.json",
+    ):
+        self.num_classes = num_classes
+        self.num_latent_pixels = num_latent_pixels
+        self.batch_size = batch_size
+        self.timesteps = timesteps
+        self.truncation_rates = truncation_rates
+        self.repeats = repeats
+        self.seed = seed
+        self.output = output
+
+    def run(self):
+        if not is_paddle_available():
+            raise ImportError("`ppdiffusers-cli benchmark_vq_diffusion` requires paddle to be installed.")
+        report = run_vq_diffusion_benchmark(
+            num_classes=self.num_classes,
+            num_latent_pixels=self.num_latent_pixels,
+            batch_size=self.batch_size,
+            timesteps=self.timesteps,
+            truncation_rates=self.truncation_rates,
+            repeats=self.repeats,
+            seed=self.seed,
+            output=self.output,
+        )
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'function':<32}{'ref ms':>10}{'ms':>10}{'ref MB':>10}{'MB':>10}{'syncs':>8}{'error':>10}"]
+        for name, key, error in [
+            ("q_posterior", "timestep", "max_error"),
+            ("truncate", "truncation_rate", "mismatch_rate"),
+        ]:
+            for run in report[name]:
+                reference, current = run["reference"], run["current"]
+                lines.append(
+                    f"{f'{name} ({key}={run[key]})':<32}{reference['time_ms']:>10.2f}{current['time_ms']:>10.2f}"
+                    f"{reference['peak_memory_bytes'] / 2**20:>10.1f}{current['peak_memory_bytes'] / 2**20:>10.1f}"
+                    f"{current['host_syncs']:>8.1f}{run[error]:>10.2e}"
+                )
+        for name, reason in report["skipped"].items():
+            lines.append(f"{name:<32}skipped: {reason}")
+        return "\n".join(lines)
@@ -0,0 +1,412 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..utils import (
+    FASTDEPLOY_MODEL_NAME,
+    FASTDEPLOY_WEIGHTS_NAME,
+    is_paddle_available,
+    logging,
+)
+from . import BasePPDiffusersCLICommand
+
+if is_paddle_available():
+    import paddle
+    import paddle.nn as nn
+    from paddle.static import InputSpec
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# the runtimes of the FastDeploy Stable Diffusion pipelines
+FASTDEPLOY_COMPONENTS = ["text_encoder", "unet", "vae_encoder", "vae_decoder", "safety_checker"]
+
+
+def export_command_factory(args):
+    return ExportCommand(
+        pretrained_model_name_or_path=args.pretrained_model_name_or_path,
+        output_path=args.output_path,
+        components=args.components,
+        batch_size=args.batch_size,
+        height=args.height,
+        width=args.width,
+        fp16=args.fp16,
+        validate=not args.skip_validation,
+        atol=args.atol,
+    )
+
+
+if is_paddle_available():
+
+    class _TextEncoder(nn.Layer):
+        def __init__(self, text_encoder):
+            super().__init__()
+            self.text_encoder = text_encoder
+
+        def forward(self, input_ids):
+            return self.text_encoder(input_ids)[0]
+
+    class _UNet(nn.Layer):
+        def __init__(self, unet):
+            super().__init__()
+            self.unet = unet
+
+        def forward(self, sample, timestep, encoder_hidden_states):
+            return self.unet(sample, timestep, encoder_hidden_states, return_dict=False)[0]
+
+    class _VAEEncoder(nn.Layer):
+        def __init__(self, vae):
+            super().__init__()
+            self.vae = vae
+
+        def forward(self, sample):
+            # the mode of the latent distribution, so that the encoding is deterministic
+            return self.vae.encode(sample).latent_dist.mode()
+
+    class _VAEDecoder(nn.Layer):
+        def __init__(self, vae):
+            super().__init__()
+            self.vae = vae
+
+        def forward(self, latent_sample):
+            return self.vae.decode(latent_sample, return_dict=False)[0]
+
+    class _SafetyChecker(nn.Layer):
+        def __init__(self, safety_checker):
+            super().__init__()
+            self.safety_checker = safety_checker
+
+        def forward(self, clip_input, images):
+            return self.safety_checker.forward_fastdeploy(clip_input, images)
+
+
+def fastdeploy_input_specs(
+    pipeline,
+    batch_size: Optional[int] = None,
+    height: Optional[int] = None,
+    width: Optional[int] = None,
+) -> Dict[str, List["InputSpec"]]:
+    """
+    The inputs of the FastDeploy models of the components of a [`StableDiffusionPipeline`]. The `None` arguments are
+    dynamic axes of the models, the other ones are fixed, e.g. for the static shapes of TensorRT.
+
+    Args:
+        pipeline ([`StableDiffusionPipeline`]): the pipeline.
+        batch_size (`int`, *optional*): the number of images per call, the UNet runs twice as many with guidance.
+        height (`int`, *optional*): the height in pixels of the images.
+        width (`int`, *optional*): the width in pixels of the images.
+    """
+    vae_scale_factor = 2 ** (len(pipeline.vae.config.block_out_channels) - 1)
+    latent_height = height // vae_scale_factor if height is not None else None
+    latent_width = width // vae_scale_factor if width is not None else None
+    unet_batch_size = 2 * batch_size if batch_size is not None else None
+    latent_channels = pipeline.vae.config.latent_channels
+    # the pipelines pad the prompts to the length of the tokenizer
+    sequence_length = pipeline.tokenizer.model_max_length
+
+    unet_in_channels = pipeline.unet.config.in_channels
+    vae_in_channels = pipeline.vae.config.in_channels
+
+    specs = {
+        "text_encoder": [InputSpec([batch_size, sequence_length], "int64", "input_ids")],
+        "unet": [
+            InputSpec([unet_batch_size, unet_in_channels, latent_height, latent_width], "float32", "sample"),
+            InputSpec([1], "float32", "timestep"),
+            InputSpec(
+                [unet_batch_size, sequence_length, pipeline.unet.config.cross_attention_dim],
+                "float32",
+                "encoder_hidden_states",
+            ),
+        ],
+        "vae_encoder": [InputSpec([batch_size, vae_in_channels, height, width], "float32", "sample")],
+        "vae_decoder": [
+            InputSpec([batch_size, latent_channels, latent_height, latent_width], "float32", "latent_sample")
+        ],
+    }
+    if getattr(pipeline, "safety_checker", None) is not None:
+        size = pipeline.safety_checker.config.vision_config.image_size
+        specs["safety_checker"] = [
+            InputSpec([batch_size, 3, size, size], "float32", "clip_input"),
+            InputSpec([batch_size, height, width, 3], "float32", "images"),
+        ]
+    return specs
+
+
+def _export_layers(pipeline) -> Dict[str, "nn.Layer"]:
+    layers = {
+        "text_encoder": _TextEncoder(pipeline.text_encoder),
+        "unet": _UNet(pipeline.unet),
+        "vae_encoder": _VAEEncoder(pipeline.vae),
+        "vae_decoder": _VAEDecoder(pipeline.vae),
+    }
+    if getattr(pipeline, "safety_checker", None) is not None:
+        layers["safety_checker"] = _SafetyChecker(pipeline.safety_checker)
+    return layers
+
+
+def _validation_inputs(pipeline, specs: List["InputSpec"]) -> List[np.ndarray]:
+    # random inputs of the shapes of `specs`, which have no dynamic axis
+    rng = np.random.RandomState(0)
+    inputs = []
+    for spec in specs:
+        shape = list(spec.shape)
+        if spec.name == "input_ids":
+            inputs.append(rng.randint(0, pipeline.tokenizer.vocab_size, shape).astype(np.int64))
+        elif spec.name == "timestep":
+            inputs.append(np.full(shape, 500.0, dtype=np.float32))
+        elif spec.name == "images":
+            inputs.append(rng.rand(*shape).astype(np.float32))
+        else:
+            inputs.append(rng.randn(*shape).astype(np.float32))
+    return inputs
+
+
+def _run_inference_model(model_dir: str, inputs: List[np.ndarray]) -> List[np.ndarray]:
+    # paddle inference on cpu with the IR optimization passes of the FastDeploy paddle backend
+    config = paddle.inference.Config(
+        os.path.join(model_dir, FASTDEPLOY_MODEL_NAME), os.path.join(model_dir, FASTDEPLOY_WEIGHTS_NAME)
+    )
+    config.disable_gpu()
+    config.switch_ir_optim(True)
+    config.enable_memory_optim()
+    config.disable_glog_info()
+    predictor = paddle.inference.create_predictor(config)
+    for name, value in zip(predictor.get_input_names(), inputs):
+        handle = predictor.get_input_handle(name)
+        handle.reshape(value.shape)
+        handle.copy_from_cpu(value)
+    predictor.run()
+    return [predictor.get_output_handle(name).copy_to_cpu() for name in predictor.get_output_names()]
+
+
+def export_fastdeploy_pipeline(
+    pipeline,
+    output_path: str,
+    components: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    height: Optional[int] = None,
+    width: Optional[int] = None,
+    fp16: bool = False,
+    validate: bool = True,
+    atol: float = 1e-3,
+) -> Dict[str, Any]:
+    """
+    Exports the components of a [`StableDiffusionPipeline`] to static inference models (`inference.pdmodel` and
+    `inference.pdiparams` in a folder per component), with the tokenizer, scheduler and feature extractor and the
+    `model_index.json` of a [`FastDeployStableDiffusionPipeline`], which then loads the export with `from_pretrained`.
+
+    Args:
+        pipeline ([`StableDiffusionPipeline`]): the eager pipeline.
+        output_path (`str`): the directory of the export.
+        components (`List[str]`, *optional*):
+            The components to export, defaults to all of [`FASTDEPLOY_COMPONENTS`]. The pipeline configuration is only
+            written when all the components of the pipeline are exported.
+        batch_size (`int`, *optional*): fixes the number of images per call of the models, dynamic if `None`.
+        height (`int`, *optional*): fixes the height in pixels of the images, dynamic if `None`.
+        width (`int`, *optional*): fixes the width in pixels of the images, dynamic if `None`.
+        fp16 (`bool`, *optional*, defaults to `False`):
+            Converts the models to float16 for the GPU, keeping float32 inputs and outputs. The safety checker stays in
+            float32.
+        validate (`bool`, *optional*, defaults to `True`):
+            Runs every exported float32 model with paddle inference on the CPU, IR optimization passes included, and
+            compares its outputs to the ones of the eager component.
+        atol (`float`, *optional*, defaults to 1e-3):
+            The largest difference to the eager outputs, relative to their largest magnitude, of a valid export.
+
+    Returns:
+        `Dict[str, Any]`: the report, with the input shapes of every model and, with `validate`, the largest
+        difference of its outputs to the eager ones and whether it is below `atol`.
+    """
+    from ..pipelines.fastdeploy_utils import FastDeployRuntimeModel
+    from ..pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion import (
+        FastDeployStableDiffusionPipeline,
+    )
+
+    specs = fastdeploy_input_specs(pipeline, batch_size=batch_size, height=height, width=width)
+    layers = _export_layers(pipeline)
+    components = [name for name in (components or FASTDEPLOY_COMPONENTS) if name in layers]
+    # the shapes of the validation, the default size of the pipeline for the dynamic axes
+    vae_scale_factor = 2 ** (len(pipeline.vae.config.block_out_channels) - 1)
+    default_size = pipeline.unet.config.sample_size * vae_scale_factor
+    validation_specs = fastdeploy_input_specs(
+        pipeline, batch_size=batch_size or 1, height=height or default_size, width=width or default_size
+    )
+
+    report = {"output_path": output_path, "fp16": fp16, "components": {}}
+    for name in components:
+        layer = layers[name]
+        layer.eval()
+        model_dir = os.path.join(output_path, name)
+        result = {"inputs": {spec.name: list(spec.shape) for spec in specs[name]}}
+        if validate:
+            # the eager outputs, before `to_static` converts the layer
+            inputs = _validation_inputs(pipeline, validation_specs[name])
+            with paddle.no_grad():
+                expected = layer(*[paddle.to_tensor(value) for value in inputs])
+            expected = [value.numpy() for value in (expected if isinstance(expected, (list, tuple)) else [expected])]
+
+        logger.info(f"Exporting the {name} to {model_dir}.")
+        static_layer = paddle.jit.to_static(layer, input_spec=specs[name])
+        paddle.jit.save(static_layer, os.path.join(model_dir, FASTDEPLOY_MODEL_NAME.split(".")[0]))
+
+        if validate:
+            outputs = _run_inference_model(model_dir, inputs)
+            max_diff = 0.0
+            for output, expected_output in zip(outputs, expected):
+                scale = max(float(np.abs(expected_output.astype(np.float32)).max()), 1.0)
+                diff = np.abs(output.astype(np.float32) - expected_output.astype(np.float32)).max() / scale
+                max_diff = max(max_diff, float(diff))
+            result["max_diff"] = max_diff
+            result["valid"] = max_diff <= atol
+
+        if fp16 and name != "safety_checker":
+            model_file = os.path.join(model_dir, FASTDEPLOY_MODEL_NAME)
+            params_file = os.path.join(model_dir, FASTDEPLOY_WEIGHTS_NAME)
+            paddle.inference.convert_to_mixed_precision(
+                model_file,
+                params_file,
+                model_file + ".fp16",
+                params_file + ".fp16",
+                paddle.inference.PrecisionType.Half,
+                paddle.inference.PlaceType.GPU,
+                keep_io_types=True,
+            )
+            os.replace(model_file + ".fp16", model_file)
+            os.replace(params_file + ".fp16", params_file)
+        report["components"][name] = result
+
+    if set(components) != set(layers):
+        # the FastDeploy pipeline needs the runtimes of all the components, a partial export only writes its models,
+        # e.g. to replace them in a previous export
+        logger.info(
+            f"Only {', '.join(components)} were exported, the model_index.json of the FastDeploy pipeline is not"
+            " written."
+        )
+        return report
+
+    # the configuration of the FastDeploy pipeline, whose runtimes are loaded from the exported folders
+    runtimes = {name: FastDeployRuntimeModel() for name in FASTDEPLOY_COMPONENTS}
+    if "safety_checker" not in layers:
+        runtimes["safety_checker"] = None
+    fastdeploy_pipeline = FastDeployStableDiffusionPipeline(
+        tokenizer=pipeline.tokenizer,
+        scheduler=pipeline.scheduler,
+        feature_extractor=pipeline.feature_extractor if runtimes["safety_checker"] is not None else None,
+        requires_safety_checker=runtimes["safety_checker"] is not None,
+        **runtimes,
+    )
+    fastdeploy_pipeline.save_config(output_path)
+    for name in ["tokenizer", "scheduler", "feature_extractor"]:
+        component = getattr(fastdeploy_pipeline, name)
+        if component is not None:
+            component.save_pretrained(os.path.join(output_path, name))
+    return report
+
+
+class ExportCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        export_parser = parser.add_parser(
+            "export", help="Export the components of a Stable Diffusion pipeline to FastDeploy inference models."
+        )
+        export_parser.add_argument(
+            "--pretrained_model_name_or_path", type=str, required=True, help="Stable Diffusion pipeline to export."
+        )
+        export_parser.add_argument("--output_path", type=str, required=True, help="Directory of the export.")
+        export_parser.add_argument(
+            "--components",
+            type=str,
+            nargs="+",
+            default=None,
+            choices=FASTDEPLOY_COMPONENTS,
+            help="Components to export, all of them by default.",
+        )
+        export_parser.add_argument(
+            "--batch_size", type=int, default=None, help="Fixed number of images per call, dynamic if not set."
+        )
+        export_parser.add_argument("--height", type=int, default=None, help="Fixed image height, dynamic if not set.")
+        export_parser.add_argument("--width", type=int, default=None, help="Fixed image width, dynamic if not set.")
+        export_parser.add_argument(
+            "--fp16", action="store_true", help="Convert the models to float16 for the GPU, with float32 inputs."
+        )
+        export_parser.add_argument(
+            "--skip_validation", action="store_true", help="Do not compare the exported models to the eager ones."
+        )
+        export_parser.add_argument(
+            "--atol", type=float, default=1e-3, help="Largest relative difference to the eager outputs."
+        )
+        export_parser.set_defaults(func=export_command_factory)
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str,
+        output_path: str,
+        components: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+        height: Optional[int] = None,
+        width: Optional[int] = None,
+        fp16: bool = False,
+        validate: bool = True,
+        atol: float = 1e-3,
+    ):
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.output_path = output_path
+        self.components = components
+        self.batch_size = batch_size
+        self.height = height
+        self.width = width
+        self.fp16 = fp16
+        self.validate = validate
+        self.atol = atol
+
+    def run(self):
+        from ..pipelines import StableDiffusionPipeline
+
+        # the validation runs on the cpu
+        paddle.set_device("cpu")
+        pipeline = StableDiffusionPipeline.from_pretrained(self.pretrained_model_name_or_path)
+        report = export_fastdeploy_pipeline(
+            pipeline,
+            self.output_path,
+            components=self.components,
+            batch_size=self.batch_size,
+            height=self.height,
+            width=self.width,
+            fp16=self.fp16,
+            validate=self.validate,
+            atol=self.atol,
+        )
+        print(self.format_report(report))
+        invalid = [name for name, result in report["components"].items() if not result.get("valid", True)]
+        if invalid:
+            raise ValueError(
+                f"The exported {', '.join(invalid)} differ from the eager models by more than {self.atol}, see the"
+                " report above."
+            )
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'component':<16}{'max diff':>10}{'valid':>7}  inputs"]
+        for name, result in report["components"].items():
+            inputs = ", ".join(f"{key}{value}" for key, value in result["inputs"].items())
+            if "max_diff" in result:
+                lines.append(f"{name:<16}{result['max_diff']:>10.2e}{str(result['valid']):>7}  {inputs}")
+            else:
+                lines.append(f"{name:<16}{'-':>10}{'-':>7}  {inputs}")
+        return "\n".join(lines)
@@ -0,0 +1,178 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from . import BasePPDiffusersCLICommand
+
+
+def generate_command_factory(args):
+    return GenerateCommand(
+        pretrained_model_name_or_path=args.pretrained_model_name_or_path,
+        prompts_file=args.prompts_file,
+        output_dir=args.output_dir,
+        devices=args.devices,
+        num_workers=args.num_workers,
+        batch_size=args.batch_size,
+        num_inference_steps=args.num_inference_steps,
+        guidance_scale=args.guidance_scale,
+        height=args.height,
+        width=args.width,
+        seed=args.seed,
+        output_format=args.output_format,
+    )
+
+
+def read_prompts(path: str) -> Iterator[Union[str, Dict[str, Any]]]:
+    """
+    Reads the requests of a file lazily: a prompt per line of a text file, or a dictionary of the arguments of a
+    [`GenerationRequest`] per line of a `.jsonl` file. Empty lines are skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line) if path.endswith(".jsonl") else line
+
+
+class GenerateCommand(BasePPDiffusersCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        generate_parser = parser.add_parser(
+            "generate", help="Generate the images of a file of prompts with data parallel worker processes."
+        )
+        generate_parser.add_argument(
+            "--pretrained_model_name_or_path", type=str, required=True, help="Pipeline to generate the images with."
+        )
+        generate_parser.add_argument(
+            "--prompts_file",
+            type=str,
+            required=True,
+            help="A prompt per line, or a JSON dictionary of the arguments of a request per line of a `.jsonl` file.",
+        )
+        generate_parser.add_argument(
+            "--output_dir", type=str, required=True, help="Directory of the images and of their `metadata.jsonl`."
+        )
+        generate_parser.add_argument(
+            "--devices",
+            type=str,
+            nargs="+",
+            default=None,
+            help="Device of every worker, e.g. `gpu:0 gpu:1`, one worker per GPU by default.",
+        )
+        generate_parser.add_argument(
+            "--num_workers", type=int, default=None, help="Number of workers, the devices are repeated in turn."
+        )
+        generate_parser.add_argument("--batch_size", type=int, default=4, help="Requests of a chunk of a worker.")
+        generate_parser.add_argument("--num_inference_steps", type=int, default=50, help="Denoising steps.")
+        generate_parser.add_argument("--guidance_scale", type=float, default=7.5, help="Classifier free guidance.")
+        generate_parser.add_argument("--height", type=int, default=None, help="Height of the images.")
+        generate_parser.add_argument("--width", type=int, default=None, help="Width of the images.")
+        generate_parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the first request, the next requests use the next seeds."
+        )
+        generate_parser.add_argument(
+            "--output_format", type=str, default="png", choices=["png", "jpeg", "webp"], help="Format of the images."
+        )
+        generate_parser.set_defaults(func=generate_command_factory)
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str,
+        prompts_file: str,
+        output_dir: str,
+        devices: Optional[List[str]] = None,
+        num_workers: Optional[int] = None,
+        batch_size: int = 4,
+        num_inference_steps: int = 50,
+        guidance_scale: float = 7.5,
+        height: Optional[int] = None,
+        width: Optional[int] = None,
+        seed: Optional[int] = 0,
+        output_format: str = "png",
+    ):
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.prompts_file = prompts_file
+        self.output_dir = output_dir
+        self.devices = devices
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.height = height
+        self.width = width
+        self.seed = seed
+        self.output_format = output_format
+
+    def run(self):
+        from ..pipelines import DataParallelRunner
+
+        runner = DataParallelRunner(
+            self.pretrained_model_name_or_path,
+            devices=self.devices,
+            num_workers=self.num_workers,
+            batch_size=self.batch_size,
+            seed=self.seed,
+            output_dir=self.output_dir,
+            output_format=self.output_format,
+            request_defaults={
+                "num_inference_steps": self.num_inference_steps,
+                "guidance_scale": self.guidance_scale,
+                "height": self.height,
+                "width": self.width,
+            },
+        )
+        num_images = 0
+        with runner:
+            start = time.perf_counter()
+            with open(os.path.join(self.output_dir, "metadata.jsonl"), "w", encoding="utf-8") as f:
+                for result in runner.run(read_prompts(self.prompts_file)):
+                    metadata = {
+                        "file_name": os.path.basename(result.path),
+                        "prompt": result.request.prompt,
+                        "negative_prompt": result.request.negative_prompt,
+                        "seed": result.request.seed,
+                        "nsfw_content_detected": result.nsfw_content_detected,
+                        "worker": result.worker,
+                    }
+                    f.write(json.dumps(metadata) + "\n")
+                    num_images += 1
+            seconds = time.perf_counter() - start
+        report = {
+            "images": num_images,
+            "seconds": seconds,
+            "images_per_second": num_images / seconds if seconds > 0 else 0.0,
+            "workers": runner.metrics,
+        }
+        print(self.format_report(report))
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Any]) -> str:
+        lines = [f"{'worker':<8}{'device':<10}{'load s':>9}{'images':>9}{'chunks':>9}{'busy s':>10}{'img/s':>9}"]
+        for rank, metrics in report["workers"].items():
+            lines.append(
+                f"{rank:<8}{metrics['device']:<10}{metrics['load_seconds']:>9.1f}{metrics['images']:>9d}"
+                f"{metrics['chunks']:>9d}{metrics['busy_seconds']:>10.1f}{metrics['images_per_second']:>9.2f}"
+            )
+        lines.append(
+            f"{report['images']} images in {report['seconds']:.1f}s, {report['images_per_second']:.2f} images per"
+            " second."
+        )
+        return "\n".join(lines)
@@ -15,7 +15,13 @@
 
 from argparse import ArgumentParser
 
+from .benchmark_fastdeploy import FastDeployIOBenchmarkCommand, FastDeployLoadTestCommand
+from .benchmark_sag import SAGBenchmarkCommand
+from .benchmark_schedulers import SchedulerBenchmarkCommand
+from .benchmark_vq_diffusion import VQDiffusionBenchmarkCommand
 from .env import EnvironmentCommand
+from .export import ExportCommand
+from .generate import GenerateCommand
 
 
 def main():
@@ -24,6 +30,13 @@ def main():
 
     # Register commands
     EnvironmentCommand.register_subcommand(commands_parser)
+    SchedulerBenchmarkCommand.register_subcommand(commands_parser)
+    VQDiffusionBenchmarkCommand.register_subcommand(commands_parser)
+    SAGBenchmarkCommand.register_subcommand(commands_parser)
+    FastDeployIOBenchmarkCommand.register_subcommand(commands_parser)
+    FastDeployLoadTestCommand.register_subcommand(commands_parser)
+    ExportCommand.register_subcommand(commands_parser)
+    GenerateCommand.register_subcommand(commands_parser)
 
     # Let's go
     args = parser.parse_args()
@@ -31,13 +31,17 @@ else:
     from .ddim import DDIMPipeline
     from .ddpm import DDPMPipeline
     from .dit import DiTPipeline
+    from .image_cache import ImageEncodingCache
     from .latent_diffusion import LDMSuperResolutionPipeline
     from .latent_diffusion_uncond import LDMPipeline
+    from .memory_planner import MemoryPlan
     from .pipeline_utils import (
         AudioPipelineOutput,
         DiffusionPipeline,
         ImagePipelineOutput,
     )
+    from .pipeline_profiler import PipelineProfiler
+    from .pipeline_stream import PipelineStepEvent, PipelineStream
     from .pndm import PNDMPipeline
     from .repaint import RePaintPipeline
     from .score_sde_ve import ScoreSdeVePipeline
@@ -58,6 +62,7 @@ except OptionalDependencyNotAvailable:
     from ..utils.dummy_paddle_and_paddlenlp_objects import *  # noqa F403
 else:
     from .alt_diffusion import AltDiffusionImg2ImgPipeline, AltDiffusionPipeline
+    from .data_parallel import DataParallelRunner, GenerationResult
     from .latent_diffusion import LDMTextToImagePipeline
     from .paint_by_example import PaintByExamplePipeline
     from .semantic_stable_diffusion import SemanticStableDiffusionPipeline
@@ -97,7 +102,11 @@ try:
 except OptionalDependencyNotAvailable:
     from ..utils.dummy_fastdeploy_objects import *  # noqa F403
 else:
-    from .fastdeploy_utils import FastDeployRuntimeModel
+    from .fastdeploy_utils import (
+        FastDeployPipelinePool,
+        FastDeployRuntimeModel,
+        FastDeployRuntimePool,
+    )
 
 try:
     if not (is_paddle_available() and is_paddlenlp_available() and is_fastdeploy_available()):
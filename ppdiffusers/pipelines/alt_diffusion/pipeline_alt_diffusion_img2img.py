@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import inspect
 from typing import Callable, List, Optional, Union
 
@@ -33,8 +34,10 @@ from ...utils import (
     randn_tensor,
     replace_example_docstring,
 )
+from ..guidance_utils import get_guidance_scales, uses_classifier_free_guidance
+from ..image_cache import encode_latent_dist
 from ..pipeline_utils import DiffusionPipeline
-from ..stable_diffusion.safety_checker import StableDiffusionSafetyChecker
+from ..stable_diffusion.safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 from . import AltDiffusionPipelineOutput, RobertaSeriesModelWithTransformation
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -345,10 +348,8 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
 
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -419,14 +420,52 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
                 )
 
     def get_timesteps(self, num_inference_steps, strength):
+        # adaptive schedulers only know their next timestep, they can not start from the middle of the schedule
+        if not hasattr(self.scheduler.timesteps, "__getitem__"):
+            raise ValueError(
+                f"{self.scheduler.__class__.__name__} chooses its timesteps while sampling and does not support"
+                " `strength`, use a scheduler with a fixed schedule to start from an image."
+            )
+
         # get the original timestep using init_timestep
         init_timestep = min(int(num_inference_steps * strength), num_inference_steps)
 
         t_start = max(num_inference_steps - init_timestep, 0)
-        timesteps = self.scheduler.timesteps[t_start:]
+        # schedulers of order > 1 (e.g. Heun) evaluate the model `order` times per step
+        timesteps = self.scheduler.timesteps[t_start * self.scheduler.order :]
 
         return timesteps, num_inference_steps - t_start
 
+    def group_by_timesteps(self, num_inference_steps: int, strengths: List[float]) -> List[dict]:
+        """
+        Groups the samples by their timesteps: every group has the `rows` with the same number of denoising steps, its
+        `timesteps` and `num_inference_steps` as returned by `get_timesteps`, and its own copy of the `scheduler`
+        (the first group uses `self.scheduler`) since the state of multistep schedulers depends on the first step.
+        """
+        groups = {}
+        for row, sample_strength in enumerate(strengths):
+            timesteps, group_steps = self.get_timesteps(num_inference_steps, sample_strength)
+            if group_steps == 0:
+                raise ValueError(
+                    f"The strength {sample_strength} gives no denoising step with {num_inference_steps} inference steps."
+                )
+            if group_steps not in groups:
+                groups[group_steps] = {"rows": [], "timesteps": timesteps, "num_inference_steps": group_steps}
+            groups[group_steps]["rows"].append(row)
+        # the longest schedule first, the others join the loop later
+        groups = [groups[group_steps] for group_steps in sorted(groups, reverse=True)]
+        for k, group in enumerate(groups):
+            group["scheduler"] = self.scheduler if k == 0 else copy.deepcopy(self.scheduler)
+        return groups
+
+    @staticmethod
+    def _gather_group_latents(groups: List[dict]) -> paddle.Tensor:
+        if groups[0]["rows"] is None:
+            return groups[0]["latents"]
+        rows = sum([group["rows"] for group in groups], [])
+        latents = paddle.concat([group["latents"] for group in groups])
+        return paddle.gather(latents, paddle.to_tensor(np.argsort(rows)))
+
     def prepare_latents(self, image, timestep, batch_size, num_images_per_prompt, dtype, generator=None):
         if not isinstance(image, (paddle.Tensor, PIL.Image.Image, list)):
             raise ValueError(
@@ -444,11 +483,12 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
 
         if isinstance(generator, list):
             init_latents = [
-                self.vae.encode(image[i : i + 1]).latent_dist.sample(generator[i]) for i in range(batch_size)
+                encode_latent_dist(self.vae, image[i : i + 1], self.image_cache).sample(generator[i])
+                for i in range(batch_size)
             ]
             init_latents = paddle.concat(init_latents, axis=0)
         else:
-            init_latents = self.vae.encode(image).latent_dist.sample(generator)
+            init_latents = encode_latent_dist(self.vae, image, self.image_cache).sample(generator)
 
         init_latents = self.vae.config.scaling_factor * init_latents
 
@@ -485,9 +525,9 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
         self,
         prompt: Union[str, List[str]] = None,
         image: Union[paddle.Tensor, PIL.Image.Image] = None,
-        strength: float = 0.8,
+        strength: Union[float, List[float]] = 0.8,
         num_inference_steps: Optional[int] = 50,
-        guidance_scale: Optional[float] = 7.5,
+        guidance_scale: Union[float, List[float]] = 7.5,
         negative_prompt: Optional[Union[str, List[str]]] = None,
         num_images_per_prompt: Optional[int] = 1,
         eta: Optional[float] = 0.0,
@@ -498,6 +538,7 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
         return_dict: bool = True,
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
+        guidance_end: float = 1.0,
         **kwargs,
     ):
         r"""
@@ -510,21 +551,23 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
             image (`paddle.Tensor` or `PIL.Image.Image`):
                 `Image`, or tensor representing an image batch, that will be used as the starting point for the
                 process.
-            strength (`float`, *optional*, defaults to 0.8):
+            strength (`float` or `List[float]`, *optional*, defaults to 0.8):
                 Conceptually, indicates how much to transform the reference `image`. Must be between 0 and 1. `image`
                 will be used as a starting point, adding more noise to it the larger the `strength`. The number of
                 denoising steps depends on the amount of noise initially added. When `strength` is 1, added noise will
                 be maximum and the denoising process will run for the full number of iterations specified in
-                `num_inference_steps`. A value of 1, therefore, essentially ignores `image`.
+                `num_inference_steps`. A value of 1, therefore, essentially ignores `image`. A list gives the strength
+                of every prompt: the prompts are denoised together, each one only from its own starting timestep, so
+                the UNet runs `int(num_inference_steps * strength)` steps for every prompt.
             num_inference_steps (`int`, *optional*, defaults to 50):
                 The number of denoising steps. More denoising steps usually lead to a higher quality image at the
                 expense of slower inference. This parameter will be modulated by `strength`.
-            guidance_scale (`float`, *optional*, defaults to 7.5):
+            guidance_scale (`float` or `List[float]`, *optional*, defaults to 7.5):
                 Guidance scale as defined in [Classifier-Free Diffusion Guidance](https://arxiv.org/abs/2207.12598).
                 `guidance_scale` is defined as `w` of equation 2. of [Imagen
                 Paper](https://arxiv.org/pdf/2205.11487.pdf). Guidance scale is enabled by setting `guidance_scale >
                 1`. Higher guidance scale encourages to generate images that are closely linked to the text `prompt`,
-                usually at the expense of lower image quality.
+                usually at the expense of lower image quality. A list gives the guidance scale of every denoising step.
             negative_prompt (`str` or `List[str]`, *optional*):
                 The prompt or prompts not to guide the image generation. If not defined, one has to pass
                 `negative_prompt_embeds`. instead. Ignored when not using guidance (i.e., ignored if `guidance_scale`
@@ -555,6 +598,9 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
             callback_steps (`int`, *optional*, defaults to 1):
                 The frequency at which the `callback` function will be called. If not specified, the callback will be
                 called at every step.
+            guidance_end (`float`, *optional*, defaults to 1.0):
+                The fraction of the denoising steps after which classifier free guidance stops being applied. Steps
+                without guidance need a single batch UNet call instead of a doubled one.
         Examples:
 
         Returns:
@@ -569,7 +615,11 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
         image = init_image or image
 
         # 1. Check inputs. Raise error if not correct
-        self.check_inputs(prompt, strength, callback_steps, negative_prompt, prompt_embeds, negative_prompt_embeds)
+        strengths = strength if isinstance(strength, (list, tuple)) else [strength]
+        for sample_strength in strengths:
+            self.check_inputs(
+                prompt, sample_strength, callback_steps, negative_prompt, prompt_embeds, negative_prompt_embeds
+            )
 
         # 2. Define call parameters
         if prompt is not None and isinstance(prompt, str):
@@ -578,10 +628,12 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
             batch_size = len(prompt)
         else:
             batch_size = prompt_embeds.shape[0]
+        if len(strengths) not in [1, batch_size]:
+            raise ValueError(f"Got {len(strengths)} strengths for a batch of {batch_size} prompts.")
         # here `guidance_scale` is defined analog to the guidance weight `w` of equation (2)
         # of the Imagen paper: https://arxiv.org/pdf/2205.11487.pdf . `guidance_scale = 1`
         # corresponds to doing no classifier free guidance.
-        do_classifier_free_guidance = guidance_scale > 1.0
+        do_classifier_free_guidance = uses_classifier_free_guidance(guidance_scale, guidance_end)
 
         # 3. Encode input prompt
         prompt_embeds = self._encode_prompt(
@@ -596,10 +648,24 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
         # 4. Preprocess image
         image = preprocess(image)
 
-        # 5. set timesteps
+        # 5. set timesteps. The images with the same strength form a group, denoised by its own copy of the
+        # scheduler from its own first timestep of the shared schedule.
         self.scheduler.set_timesteps(num_inference_steps)
-        timesteps, num_inference_steps = self.get_timesteps(num_inference_steps, strength)
-        latent_timestep = timesteps[:1].tile((batch_size * num_images_per_prompt,))
+        timesteps = self.scheduler.timesteps
+        groups = self.group_by_timesteps(
+            num_inference_steps, [s for s in strengths for _ in range(num_images_per_prompt)]
+        )
+        if len(groups) > 1:
+            row_groups = np.zeros([batch_size * num_images_per_prompt], dtype="int64")
+            for k, group in enumerate(groups):
+                row_groups[group["rows"]] = k
+            latent_timestep = paddle.gather(
+                paddle.concat([group["timesteps"][:1] for group in groups]), paddle.to_tensor(row_groups)
+            )
+        else:
+            latent_timestep = groups[0]["timesteps"][:1].tile([batch_size * num_images_per_prompt])
+            groups[0]["rows"] = None
+        num_inference_steps = max(group["num_inference_steps"] for group in groups)
 
         # 6. Prepare latent variables
         latents = self.prepare_latents(
@@ -608,31 +674,74 @@ class AltDiffusionImg2ImgPipeline(DiffusionPipeline):
 
         # 7. Prepare extra step kwargs. TODO: Logic should ideally just be moved out of the pipeline
         extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
+        for group in groups:
+            group["extra_step_kwargs"] = dict(extra_step_kwargs)
+            if group["rows"] is not None:
+                group["latents"] = paddle.gather(latents, paddle.to_tensor(group["rows"]))
+                group["prompt_embeds"] = [
+                    paddle.gather(embeds, paddle.to_tensor(group["rows"]))
+                    for embeds in (prompt_embeds.chunk(2) if do_classifier_free_guidance else [prompt_embeds])
+                ]
+                if isinstance(extra_step_kwargs.get("generator"), list):
+                    group["extra_step_kwargs"]["generator"] = [extra_step_kwargs["generator"][r] for r in group["rows"]]
+            else:
+                group["latents"] = latents
+                group["prompt_embeds"] = prompt_embeds.chunk(2) if do_classifier_free_guidance else [prompt_embeds]
 
         # 8. Denoising loop
+        start_index = len(timesteps) - len(groups[0]["timesteps"])
+        timesteps = timesteps[start_index:]
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        guidance_scales = get_guidance_scales(guidance_scale, len(timesteps), guidance_end, self.scheduler.order)
         with self.progress_bar(total=num_inference_steps) as progress_bar:
             for i, t in enumerate(timesteps):
+                # the steps without guidance only need the text conditioned prediction
+                do_step_guidance = do_classifier_free_guidance and guidance_scales[i] > 1.0
+                # only the groups whose first timestep has been reached are denoised
+                active_groups = [group for group in groups if len(group["timesteps"]) >= len(timesteps) - i]
+                latent_model_input = [
+                    group["scheduler"].scale_model_input(group["latents"], t) for group in active_groups
+                ]
+                latent_model_input = (
+                    paddle.concat(latent_model_input) if len(latent_model_input) > 1 else latent_model_input[0]
+                )
+                # the unconditional embeddings of all the groups, then the text ones
+                encoder_hidden_states = [
+                    [group["prompt_embeds"][k] for group in active_groups]
+                    for k in ([0, 1] if do_step_guidance else [-1])
+                ]
+                encoder_hidden_states = paddle.concat(sum(encoder_hidden_states, []))
                 # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
-                latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
+                if do_step_guidance:
+                    latent_model_input = paddle.concat([latent_model_input] * 2)
 
                 # predict the noise residual
-                noise_pred = self.unet(latent_model_input, t, encoder_hidden_states=prompt_embeds).sample
+                noise_pred = self.unet(latent_model_input, t, encoder_hidden_states=encoder_hidden_states).sample
 
                 # perform guidance
-                if do_classifier_free_guidance:
+                if do_step_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                    noise_pred = noise_pred_uncond + guidance_scales[i] * (noise_pred_text - noise_pred_uncond)
 
                 # compute the previous noisy sample x_t -> x_t-1
-                latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+                if len(active_groups) > 1:
+                    noise_pred = noise_pred.split([group["latents"].shape[0] for group in active_groups])
+                else:
+                    noise_pred = [noise_pred]
+                for group, group_noise_pred in zip(active_groups, noise_pred):
+                    group["latents"] = (
+                        group["scheduler"]
+                        .step(group_noise_pred, t, group["latents"], **group["extra_step_kwargs"])
+                        .prev_sample
+                    )
 
                 # call the callback, if provided
                 if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
                     progress_bar.update()
                     if callback is not None and i % callback_steps == 0:
-                        callback(i, t, latents)
+                        callback(i, t, self._gather_group_latents(groups))
+
+        latents = self._gather_group_latents(groups)
 
         # 9. Post-processing
         image = self.decode_latents(latents)
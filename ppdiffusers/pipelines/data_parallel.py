@@ -0,0 +1,404 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import os
+import queue
+import random
+import time
+import traceback
+from dataclasses import dataclass, replace
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import PIL.Image
+
+import paddle
+
+from ..utils import ENCODED_IMAGE_FORMATS, encode_images, logging
+from .pipeline_utils import DiffusionPipeline
+from .stable_diffusion.batching import GenerationRequest
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+
+@dataclass
+class GenerationResult:
+    """
+    An image generated by a [`DataParallelRunner`].
+
+    Args:
+        index (`int`): the position of the request in the requests of the run.
+        request ([`GenerationRequest`]): the request, with its seed.
+        image (`PIL.Image.Image`, *optional*): the image, if the runner does not write the images to files.
+        path (`str`, *optional*): the file of the image, if the runner writes the images to files.
+        nsfw_content_detected (`bool`, *optional*): the flag of the safety checker, `None` without safety checker.
+        worker (`int`): the rank of the worker which generated the image.
+    """
+
+    index: int
+    request: GenerationRequest
+    image: Optional[PIL.Image.Image] = None
+    path: Optional[str] = None
+    nsfw_content_detected: Optional[bool] = None
+    worker: int = 0
+
+
+def _split_cpus(num_workers: int) -> List[Optional[List[int]]]:
+    # contiguous blocks of the cores available to the process, one per worker
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * num_workers
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < num_workers:
+        return [None] * num_workers
+    size = len(cpus) // num_workers
+    return [cpus[rank * size : (rank + 1) * size] for rank in range(num_workers)]
+
+
+def _generate(pipeline, requests: List[GenerationRequest], batch_size: int, call_kwargs: Dict[str, Any]):
+    if hasattr(pipeline, "generate_batch"):
+        output = pipeline.generate_batch(
+            requests, max_batch_size=batch_size, output_type="pil", return_dict=False, **call_kwargs
+        )
+        return output[0], output[1]
+    images, nsfw_content_detected = [], []
+    for request in requests:
+        output = pipeline(
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            height=request.height,
+            width=request.width,
+            guidance_scale=request.guidance_scale,
+            num_inference_steps=request.num_inference_steps,
+            generator=paddle.Generator().manual_seed(request.seed),
+            output_type="pil",
+            return_dict=False,
+            **call_kwargs,
+        )
+        images.append(output[0][0])
+        nsfw_content_detected.append(output[1][0] if output[1] is not None else None)
+    return images, nsfw_content_detected
+
+
+def _worker_main(
+    rank: int,
+    device: str,
+    cpus: Optional[List[int]],
+    pretrained_model_name_or_path: str,
+    from_pretrained_kwargs: Dict[str, Any],
+    call_kwargs: Dict[str, Any],
+    batch_size: int,
+    output_dir: Optional[str],
+    output_format: str,
+    tasks,
+    results,
+):
+    try:
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+        paddle.set_device(device)
+        start = time.perf_counter()
+        pipeline = DiffusionPipeline.from_pretrained(pretrained_model_name_or_path, **from_pretrained_kwargs)
+        pipeline.set_progress_bar_config(disable=True)
+        results.put(("ready", rank, time.perf_counter() - start))
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            start = time.perf_counter()
+            indices, requests = zip(*task)
+            images, nsfw_content_detected = _generate(pipeline, list(requests), batch_size, call_kwargs)
+            if nsfw_content_detected is None:
+                nsfw_content_detected = [None] * len(images)
+            paths = [None] * len(images)
+            if output_dir is not None:
+                extension = output_format.lower()
+                paths = [os.path.join(output_dir, f"{index:08d}.{extension}") for index in indices]
+                for path, data in zip(paths, encode_images(images, format=output_format)):
+                    with open(path, "wb") as f:
+                        f.write(data)
+                images = [None] * len(images)
+            chunk = [
+                GenerationResult(index, request, image, path, nsfw, rank)
+                for index, request, image, path, nsfw in zip(indices, requests, images, paths, nsfw_content_detected)
+            ]
+            results.put(("results", rank, chunk, time.perf_counter() - start))
+    except Exception:
+        results.put(("error", rank, traceback.format_exc()))
+
+
+class DataParallelRunner:
+    """
+    Generates images with copies of a pipeline in worker processes, each one on its own device or on its own CPU cores,
+    for the offline generation of large numbers of images. The requests are split into chunks on a shared queue, from
+    which every idle worker takes the next chunk, so that the faster workers take more of the work, and the results are
+    returned in the order of the requests.
+
+    The weights are downloaded once by the runner, then every worker loads them from the same local files, which the
+    workers of a host read from the page cache of the OS.
+
+    Args:
+        pretrained_model_name_or_path (`str` or `os.PathLike`):
+            The pipeline, see [`DiffusionPipeline.from_pretrained`].
+        devices (`List[str]`, *optional*):
+            The device of every worker, e.g. `["gpu:0", "gpu:1"]`, a device can be repeated to run several workers on
+            it. Defaults to one worker per GPU, or to `num_workers` workers on the CPU.
+        num_workers (`int`, *optional*):
+            The number of workers, the devices are repeated in turn if there are more workers than devices.
+        cpu_affinity (`List[List[int]]`, *optional*):
+            The cores of every worker. Defaults to equal blocks of the available cores for the workers on the CPU.
+        batch_size (`int`, *optional*, defaults to 4):
+            The number of requests of a chunk, which a worker generates with
+            [`~StableDiffusionPipeline.generate_batch`] if its pipeline has it.
+        seed (`int`, *optional*):
+            The seed of the requests without one is `seed` plus their index, so that a run can be reproduced whatever
+            the number of workers. A random seed is drawn for these requests if `None`.
+        output_dir (`str`, *optional*):
+            The directory the workers write the images to, as `{index:08d}.{output_format}`, instead of sending them to
+            the runner.
+        output_format (`str`, *optional*, defaults to `"png"`): the format of the image files, `"jpeg"` or `"webp"`.
+        request_defaults (`dict`, *optional*):
+            The default arguments of the requests given as prompts or dictionaries, e.g. `num_inference_steps`.
+        from_pretrained_kwargs (`dict`, *optional*): the arguments of [`DiffusionPipeline.from_pretrained`].
+        call_kwargs (`dict`, *optional*): the arguments shared by all the calls of the pipelines, e.g. `eta`.
+
+    Examples:
+
+    ```py
+    >>> runner = DataParallelRunner("runwayml/stable-diffusion-v1-5", devices=["gpu:0", "gpu:1"], output_dir="out")
+    >>> with runner:
+    ...     for result in runner.run(open("prompts.txt").read().splitlines()):
+    ...         print(result.index, result.path)
+    >>> runner.metrics
+    ```
+    """
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: Union[str, os.PathLike],
+        devices: Optional[List[str]] = None,
+        num_workers: Optional[int] = None,
+        cpu_affinity: Optional[List[List[int]]] = None,
+        batch_size: int = 4,
+        seed: Optional[int] = None,
+        output_dir: Optional[str] = None,
+        output_format: str = "png",
+        request_defaults: Optional[Dict[str, Any]] = None,
+        from_pretrained_kwargs: Optional[Dict[str, Any]] = None,
+        call_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        if devices is None:
+            if paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0:
+                devices = [f"gpu:{index}" for index in range(paddle.device.cuda.device_count())]
+            else:
+                devices = ["cpu"] * (num_workers or 1)
+        if num_workers is not None:
+            devices = [devices[rank % len(devices)] for rank in range(num_workers)]
+        if len(devices) < 1:
+            raise ValueError("A data parallel runner needs at least one worker.")
+        if output_format.lower() not in ENCODED_IMAGE_FORMATS:
+            raise ValueError(
+                f"`output_format` has to be one of {', '.join(ENCODED_IMAGE_FORMATS)}, but is {output_format}."
+            )
+        if cpu_affinity is None:
+            cpu_devices = [rank for rank, device in enumerate(devices) if device == "cpu"]
+            cpu_affinity = [None] * len(devices)
+            for rank, cpus in zip(cpu_devices, _split_cpus(len(cpu_devices))):
+                cpu_affinity[rank] = cpus
+        elif len(cpu_affinity) != len(devices):
+            raise ValueError(f"`cpu_affinity` has {len(cpu_affinity)} core sets for {len(devices)} workers.")
+
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.devices = devices
+        self.cpu_affinity = cpu_affinity
+        self.batch_size = batch_size
+        self.seed = seed
+        self.output_dir = output_dir
+        self.output_format = output_format.lower()
+        self.request_defaults = request_defaults or {}
+        self.from_pretrained_kwargs = from_pretrained_kwargs or {}
+        self.call_kwargs = call_kwargs or {}
+        # the largest number of chunks queued, generated or waiting to be reordered at once
+        self.max_pending_chunks = 2 * len(devices)
+        self.metrics = None
+        self._processes = []
+        self._tasks = None
+        self._results = None
+
+    @property
+    def num_workers(self) -> int:
+        return len(self.devices)
+
+    def _local_folder(self) -> str:
+        if os.path.isdir(self.pretrained_model_name_or_path):
+            return self.pretrained_model_name_or_path
+        # downloads the weights once, before the workers load them
+        return DiffusionPipeline.download(self.pretrained_model_name_or_path, **self.from_pretrained_kwargs)
+
+    def start(self):
+        """Starts the workers, and waits for all of them to load the pipeline."""
+        if self._processes:
+            return self
+        folder = self._local_folder()
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+        # the workers are spawned rather than forked, the paddle runtime of this process cannot be shared
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self.metrics = {}
+        for rank, (device, cpus) in enumerate(zip(self.devices, self.cpu_affinity)):
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    rank,
+                    device,
+                    cpus,
+                    folder,
+                    self.from_pretrained_kwargs,
+                    self.call_kwargs,
+                    self.batch_size,
+                    self.output_dir,
+                    self.output_format,
+                    self._tasks,
+                    self._results,
+                ),
+                daemon=True,
+            )
+            # the math libraries of a worker start as many threads as it has cores
+            num_threads = os.environ.get("OMP_NUM_THREADS")
+            if cpus is not None:
+                os.environ["OMP_NUM_THREADS"] = str(len(cpus))
+            try:
+                process.start()
+            finally:
+                if num_threads is None:
+                    os.environ.pop("OMP_NUM_THREADS", None)
+                else:
+                    os.environ["OMP_NUM_THREADS"] = num_threads
+            self._processes.append(process)
+            self.metrics[rank] = {
+                "device": device,
+                "cpus": cpus,
+                "load_seconds": None,
+                "images": 0,
+                "chunks": 0,
+                "busy_seconds": 0.0,
+                "images_per_second": 0.0,
+            }
+
+        while any(metrics["load_seconds"] is None for metrics in self.metrics.values()):
+            message = self._receive()
+            if message[0] != "ready":
+                raise RuntimeError(f"Unexpected message {message[0]} of worker {message[1]} before it was ready.")
+            self.metrics[message[1]]["load_seconds"] = message[2]
+        logger.info(f"Started {self.num_workers} workers on {', '.join(self.devices)}.")
+        return self
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                for rank, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        self.close(terminate=True)
+                        raise RuntimeError(f"Worker {rank} exited with code {process.exitcode}.")
+                continue
+            if message[0] == "error":
+                rank = message[1]
+                self.close(terminate=True)
+                raise RuntimeError(f"Worker {rank} on {self.devices[rank]} failed:\n{message[2]}")
+            return message
+
+    def _request(self, index: int, request: Union[str, Dict[str, Any], GenerationRequest]) -> GenerationRequest:
+        if isinstance(request, str):
+            request = GenerationRequest(**dict(self.request_defaults, prompt=request))
+        elif not isinstance(request, GenerationRequest):
+            request = GenerationRequest(**dict(self.request_defaults, **request))
+        if request.seed is None:
+            # a copy, the requests of the caller keep drawing their seed in the next runs
+            request = replace(request, seed=self.seed + index if self.seed is not None else random.getrandbits(32))
+        return request
+
+    def run(self, requests: Iterable[Union[str, Dict[str, Any], GenerationRequest]]) -> Iterator[GenerationResult]:
+        """
+        Generates the images of `requests`, prompts, dictionaries of the arguments of [`GenerationRequest`] or
+        [`GenerationRequest`]s, and yields their [`GenerationResult`]s in the order of the requests. The requests are
+        read lazily, so that `requests` can be a generator over millions of prompts.
+        """
+        self.start()
+        requests = enumerate(requests)
+        results = {}
+        next_index = 0
+        num_requests = 0
+        pending_chunks = 0
+        exhausted = False
+        try:
+            while True:
+                # the requests not yielded yet, queued, generated or waiting for the results of a slower chunk
+                while not exhausted and num_requests - next_index < self.max_pending_chunks * self.batch_size:
+                    chunk = [
+                        (index, self._request(index, request)) for index, request in islice(requests, self.batch_size)
+                    ]
+                    if not chunk:
+                        exhausted = True
+                        break
+                    self._tasks.put(chunk)
+                    num_requests += len(chunk)
+                    pending_chunks += 1
+                if pending_chunks == 0:
+                    return
+                _, rank, chunk, busy_seconds = self._receive()
+                pending_chunks -= 1
+                metrics = self.metrics[rank]
+                metrics["images"] += len(chunk)
+                metrics["chunks"] += 1
+                metrics["busy_seconds"] += busy_seconds
+                metrics["images_per_second"] = metrics["images"] / metrics["busy_seconds"]
+                results.update((result.index, result) for result in chunk)
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+        finally:
+            # the chunks of a run stopped early would be returned to the next run
+            if pending_chunks > 0:
+                self.close(terminate=True)
+
+    def close(self, terminate: bool = False):
+        """Stops the workers, once they are done with the queued chunks, or right away with `terminate`."""
+        if not self._processes:
+            return
+        for process in self._processes:
+            if terminate:
+                process.terminate()
+            else:
+                self._tasks.put(None)
+        for process in self._processes:
+            # a worker only exits once the results it sent are read
+            while process.is_alive():
+                try:
+                    self._results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            process.join()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close(terminate=exc[0] is not None)
+        return False
@@ -0,0 +1,176 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+from typing import Any, Optional
+
+import paddle
+import paddle.nn as nn
+
+from ..models.vae import DiagonalGaussianDistribution
+from ..utils import logging
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# the methods through which the pipelines call their components
+COMPONENT_ENTRY_POINTS = ["forward", "encode", "decode"]
+
+
+def get_place(device: Optional[str] = None):
+    """Returns the place of `device`, the current paddle device by default."""
+    return paddle.device._convert_to_place(device or paddle.get_device())
+
+
+def move_layer(layer: nn.Layer, device: str):
+    """
+    Moves `layer` to `device`, keeping the dtypes of its sublayers, which `Layer.to` resets without a dtype and which
+    e.g. the normalization layers and `ModelMixin.dtype` use.
+    """
+    dtypes = [(sublayer, sublayer._dtype) for sublayer in layer.sublayers(include_self=True)]
+    layer.to(device)
+    for sublayer, dtype in dtypes:
+        sublayer._dtype = dtype
+
+
+def to_place(value: Any, place) -> Any:
+    """
+    Moves the tensors of `value` to `place`, including the ones in lists, tuples, dictionaries, outputs and latent
+    distributions. The tensors already on `place` are not copied.
+    """
+    if isinstance(value, paddle.Tensor):
+        return value if value.place._equals(place) else value._copy_to(place, True)
+    if isinstance(value, DiagonalGaussianDistribution):
+        for name, item in vars(value).items():
+            if isinstance(item, paddle.Tensor):
+                setattr(value, name, to_place(item, place))
+        return value
+    if type(value) is dict:
+        return {key: to_place(item, place) for key, item in value.items()}
+    if isinstance(value, dict):
+        # the outputs of the models, which are dataclasses
+        for key in list(value.keys()):
+            value[key] = to_place(value[key], place)
+        return value
+    if isinstance(value, (list, tuple)):
+        items = [to_place(item, place) for item in value]
+        if hasattr(value, "_fields"):
+            return type(value)(*items)
+        return type(value)(items)
+    return value
+
+
+class OffloadGroup:
+    """
+    The components sharing an accelerator, of which a single one is staged on it at a time: calling a component of the
+    group moves the component staged before it back to its offload device.
+    """
+
+    def __init__(self):
+        self.resident = None
+
+    def offload(self):
+        if self.resident is not None:
+            self.resident.offload()
+
+
+class ComponentDeviceHook:
+    """
+    Runs a component of a pipeline on its own device. The entry points of the component ([`COMPONENT_ENTRY_POINTS`])
+    move their tensor arguments to the device of the component and their outputs back to the execution device of the
+    pipeline, the current paddle device, so that the pipelines are unchanged.
+
+    Args:
+        layer (`nn.Layer`): the component.
+        device (`str`): the device running the component, e.g. `"cpu"` or `"gpu:0"`.
+        offload_device (`str`, *optional*):
+            The device storing the component while it does not run. The component is then only moved to `device` when
+            it is called.
+        offload_group ([`OffloadGroup`], *optional*): the components of which a single one is on `device` at a time.
+    """
+
+    def __init__(
+        self,
+        layer: nn.Layer,
+        device: str,
+        offload_device: Optional[str] = None,
+        offload_group: Optional[OffloadGroup] = None,
+    ):
+        self.layer = layer
+        self.device = device
+        self.place = get_place(device)
+        self.offload_device = offload_device
+        self.offload_group = offload_group
+        # the number of times the component was moved to `device`
+        self.num_onloads = 0
+        self._methods = {}
+        self._depth = 0
+
+    def attach(self):
+        for name in COMPONENT_ENTRY_POINTS:
+            method = getattr(self.layer, name, None)
+            if callable(method):
+                self._methods[name] = method
+                setattr(self.layer, name, self._wrap(method))
+        self.layer._device_hook = self
+        move_layer(self.layer, self.offload_device or self.device)
+        return self
+
+    def detach(self):
+        for name in self._methods:
+            delattr(self.layer, name)
+        self._methods = {}
+        del self.layer._device_hook
+
+    def onload(self):
+        if self.offload_device is None or (self.offload_group is not None and self.offload_group.resident is self):
+            return
+        if self.offload_group is not None:
+            self.offload_group.offload()
+            self.offload_group.resident = self
+        move_layer(self.layer, self.device)
+        self.num_onloads += 1
+
+    def offload(self):
+        if self.offload_device is None:
+            return
+        move_layer(self.layer, self.offload_device)
+        if self.offload_group is not None and self.offload_group.resident is self:
+            self.offload_group.resident = None
+
+    def _wrap(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            # the calls of the component to its own entry points, e.g. `vae.forward` to `vae.decode`, stay on its device
+            if self._depth > 0:
+                return method(*args, **kwargs)
+            execution_place = get_place()
+            self.onload()
+            self._depth += 1
+            try:
+                args, kwargs = to_place((args, kwargs), self.place)
+                outputs = method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+            if self.offload_device is not None and self.offload_group is None:
+                self.offload()
+            return to_place(outputs, execution_place)
+
+        return wrapper
+
+
+def remove_device_hook(layer: nn.Layer):
+    """Removes the [`ComponentDeviceHook`] of `layer`, if any, leaving the layer on its current device."""
+    hook = getattr(layer, "_device_hook", None)
+    if hook is not None:
+        hook.detach()
@@ -15,10 +15,14 @@
 # limitations under the License.
 
 
+import copy
 import os
+import queue
 import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import numpy as np
 
@@ -37,7 +41,7 @@ from ..utils import (
 )
 from ..version import VERSION as __version__
 
-__all__ = ["FastDeployRuntimeModel"]
+__all__ = ["FastDeployRuntimeModel", "FastDeployRuntimePool", "FastDeployPipelinePool"]
 
 if is_paddle_available():
     import paddle
@@ -68,13 +72,68 @@ if is_fastdeploy_available():
 logger = logging.get_logger(__name__)
 
 
+class FastDeployIOBinding:
+    """
+    Input and output buffers bound once to a FastDeploy runtime, for the calls with the same shapes of a denoising
+    loop. A call copies its inputs into the input buffers in place and runs the runtime, which writes into the output
+    buffers: no tensor is allocated, converted or bound per call.
+
+    Args:
+        runtime (`fd.Runtime`): the runtime.
+        inputs (`Dict[str, paddle.Tensor]`): example inputs, giving the shapes and data types of the input buffers.
+        output_shapes (`Dict[str, List[int]]`): the shapes of the outputs.
+        output_dtype (`str`, *optional*, defaults to `"float32"`): the data type of the outputs.
+    """
+
+    def __init__(
+        self,
+        runtime,
+        inputs: Dict[str, "paddle.Tensor"],
+        output_shapes: Dict[str, List[int]],
+        output_dtype: str = "float32",
+    ):
+        self.runtime = runtime
+        self.inputs = {}
+        for name, value in inputs.items():
+            value = value if isinstance(value, paddle.Tensor) else paddle.to_tensor(value)
+            self.inputs[name] = paddle.zeros(value.shape, dtype=value.dtype)
+        self.outputs = {name: paddle.zeros(shape, dtype=output_dtype) for name, shape in output_shapes.items()}
+
+    def bind(self):
+        """Binds the buffers to the runtime, replacing the buffers bound before."""
+        for bind_tensor, buffers in [
+            (self.runtime.bind_input_tensor, self.inputs),
+            (self.runtime.bind_output_tensor, self.outputs),
+        ]:
+            for name, buffer in buffers.items():
+                # raw pointers for device memory, dlpack on cpu
+                fdtensor = pdtensor2fdtensor(buffer, name, share_with_raw_ptr=not buffer.place.is_cpu_place())
+                bind_tensor(name, fdtensor)
+
+    def __call__(self, **inputs) -> Dict[str, "paddle.Tensor"]:
+        for name, value in inputs.items():
+            buffer = self.inputs[name]
+            value = value if isinstance(value, paddle.Tensor) else paddle.to_tensor(value)
+            if value.dtype != buffer.dtype:
+                value = value.cast(buffer.dtype)
+            # in place, the buffer keeps its memory and so its binding
+            paddle.assign(value, output=buffer)
+        self.runtime.zero_copy_infer()
+        return self.outputs
+
+
 class FastDeployRuntimeModel:
+    # the number of distinct shapes with bound buffers, calls with further shapes use the copying path
+    max_bindings = 4
+
     def __init__(self, model=None, **kwargs):
         logger.info("`ppdiffusers.FastDeployRuntimeModel` is experimental and might change in the future.")
         self.model = model
         self.model_save_dir = kwargs.get("model_save_dir", None)
         self.latest_model_name = kwargs.get("latest_model_name", FASTDEPLOY_MODEL_NAME)
         self.latest_params_name = kwargs.get("latest_params_name", FASTDEPLOY_WEIGHTS_NAME)
+        self._bindings = {}
+        self._active_binding = None
 
     def zero_copy_infer(self, prebinded_inputs: dict, prebinded_outputs: dict, share_with_raw_ptr=True, **kwargs):
         """
@@ -94,10 +153,73 @@ class FastDeployRuntimeModel:
             output_fdtensor = pdtensor2fdtensor(outputs_tensor, outputs_name, share_with_raw_ptr=share_with_raw_ptr)
             self.model.bind_output_tensor(outputs_name, output_fdtensor)
 
-            self.model.zero_copy_infer()
+        self.model.zero_copy_infer()
+        self._active_binding = None
+
+    def bound_infer(
+        self,
+        inputs: Dict[str, "paddle.Tensor"],
+        output_shapes: Optional[Dict[str, List[int]]] = None,
+        output_dtype: str = "float32",
+    ) -> Dict[str, "paddle.Tensor"]:
+        """
+        Execute inference on input and output buffers allocated and bound once per shape, see [`FastDeployIOBinding`].
+        The calls of a denoising loop then only copy their inputs into the bound buffers.
+
+        The outputs are the bound buffers, overwritten by the next call with the same shapes: copy them to keep them.
+        Falls back to the copying path of [`~FastDeployRuntimeModel.__call__`] when `output_shapes` is unknown, or for
+        the shapes beyond the first `max_bindings` ones (dynamic shapes).
+
+        Arguments:
+            inputs (`dict(name, paddle.Tensor)`):
+                An input map from name to tensor.
+            output_shapes (`dict(name, List[int])`, *optional*):
+                The shapes of the outputs.
+            output_dtype (`str`, *optional*, defaults to `"float32"`):
+                The data type of the outputs.
+        Return:
+            An output map from name to tensor.
+        """
+        if output_shapes is not None:
+            key = (
+                tuple((name, tuple(value.shape)) for name, value in inputs.items()),
+                tuple((name, tuple(shape)) for name, shape in output_shapes.items()),
+            )
+            binding = self._bindings.get(key)
+            if binding is None and len(self._bindings) < self.max_bindings:
+                binding = self._bindings[key] = FastDeployIOBinding(self.model, inputs, output_shapes, output_dtype)
+            if binding is not None:
+                # the runtime holds a single set of bound tensors
+                if self._active_binding is not binding:
+                    binding.bind()
+                    self._active_binding = binding
+                return binding(**inputs)
+
+        outputs = self(**inputs)
+        output_names = [self.model.get_output_info(i).name for i in range(self.model.num_outputs())]
+        return {name: paddle.to_tensor(output) for name, output in zip(output_names, outputs)}
+
+    def clone(self) -> "FastDeployRuntimeModel":
+        """
+        Returns a model with a new instance of the runtime, which shares the weights of this one when the backend
+        allows it (see `fastdeploy.Runtime.clone`) and can run concurrently with it.
+        """
+        return FastDeployRuntimeModel(
+            model=self.model.clone(),
+            model_save_dir=self.model_save_dir,
+            latest_model_name=self.latest_model_name,
+            latest_params_name=self.latest_params_name,
+        )
+
+    def clear_bindings(self):
+        """Releases the buffers bound by [`~FastDeployRuntimeModel.bound_infer`]."""
+        self._bindings = {}
+        self._active_binding = None
 
     def __call__(self, **kwargs):
-        inputs = {k: np.array(v) for k, v in kwargs.items()}
+        # no copy of the numpy inputs
+        inputs = {k: np.asarray(v) for k, v in kwargs.items()}
+        self._active_binding = None
         return self.model.infer(inputs)
 
     @staticmethod
@@ -330,3 +452,142 @@ class FastDeployRuntimeModel:
             user_agent=user_agent,
             **kwargs,
         )
+
+
+class FastDeployRuntimePool:
+    """
+    Instances of a [`FastDeployRuntimeModel`], cloned so that they share its weights where the backend allows, with a
+    thread-safe checkout: each instance runs a single call at a time, and up to `num_instances` threads run calls
+    concurrently. The runtimes release the GIL while they run, so the calls of the threads run in parallel across the
+    CPU cores, limit the threads of each runtime (`RuntimeOption.set_cpu_thread_num`) to share the cores among them.
+
+    Args:
+        model ([`FastDeployRuntimeModel`]): the first instance of the pool.
+        num_instances (`int`, *optional*, defaults to 2): the number of instances.
+    """
+
+    def __init__(self, model: FastDeployRuntimeModel, num_instances: int = 2):
+        if num_instances < 1:
+            raise ValueError(f"A runtime pool needs at least one instance, got `num_instances={num_instances}`.")
+        self.instances = [model] + [model.clone() for _ in range(num_instances - 1)]
+        self._available = queue.Queue()
+        for instance in self.instances:
+            self._available.put(instance)
+
+    @property
+    def num_instances(self) -> int:
+        return len(self.instances)
+
+    @property
+    def model(self):
+        # the runtime of the first instance, for the names and shapes of the inputs and outputs
+        return self.instances[0].model
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Context manager waiting up to `timeout` seconds for an idle instance, which is returned to the pool on exit.
+        Raises a `TimeoutError` if no instance becomes idle in time.
+        """
+        try:
+            instance = self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No idle runtime instance out of {self.num_instances} after {timeout} seconds.")
+        try:
+            yield instance
+        finally:
+            self._available.put(instance)
+
+    def bound_infer(
+        self,
+        inputs: Dict[str, "paddle.Tensor"],
+        output_shapes: Optional[Dict[str, List[int]]] = None,
+        output_dtype: str = "float32",
+    ) -> Dict[str, "paddle.Tensor"]:
+        """
+        [`~FastDeployRuntimeModel.bound_infer`] on an idle instance. The outputs are copies: once returned to the
+        pool, the instance overwrites its bound outputs with the calls of other threads.
+        """
+        with self.checkout() as instance:
+            outputs = instance.bound_infer(inputs, output_shapes=output_shapes, output_dtype=output_dtype)
+            return {name: output.clone() for name, output in outputs.items()}
+
+    def __call__(self, **kwargs):
+        with self.checkout() as instance:
+            return instance(**kwargs)
+
+
+class FastDeployPipelinePool:
+    """
+    Instances of a FastDeploy pipeline serving concurrent requests. Every instance has its own runtimes, cloned from
+    the ones of `pipeline` (see [`FastDeployRuntimeModel.clone`]), and its own copy of the scheduler, whose state
+    changes during a call. The other components, such as the tokenizer, are shared. A request runs on the first
+    idle instance, so the UNet calls of up to `num_instances` requests run in parallel.
+
+    Args:
+        pipeline ([`DiffusionPipeline`]): a pipeline whose runtimes are [`FastDeployRuntimeModel`]s.
+        num_instances (`int`, *optional*, defaults to 2): the number of instances.
+
+    Examples:
+
+    ```py
+    >>> pool = FastDeployPipelinePool(FastDeployStableDiffusionPipeline.from_pretrained(model_dir), num_instances=4)
+    >>> futures = [pool.submit(prompt, num_inference_steps=50) for prompt in prompts]
+    >>> images = [future.result().images[0] for future in futures]
+    ```
+    """
+
+    def __init__(self, pipeline, num_instances: int = 2):
+        if num_instances < 1:
+            raise ValueError(f"A pipeline pool needs at least one instance, got `num_instances={num_instances}`.")
+        self.pipelines = [pipeline] + [self._clone_pipeline(pipeline) for _ in range(num_instances - 1)]
+        self._available = queue.Queue()
+        for instance in self.pipelines:
+            self._available.put(instance)
+        self._executor = ThreadPoolExecutor(max_workers=num_instances, thread_name_prefix="fastdeploy_pipeline")
+
+    @staticmethod
+    def _clone_pipeline(pipeline):
+        components = {}
+        for name, component in pipeline.components.items():
+            if isinstance(component, FastDeployRuntimeModel):
+                component = component.clone()
+            elif name == "scheduler":
+                component = copy.deepcopy(component)
+            components[name] = component
+        _, optional_parameters = pipeline._get_signature_keys(pipeline)
+        kwargs = {name: pipeline.config[name] for name in optional_parameters if name in pipeline.config}
+        return pipeline.__class__(**components, **kwargs)
+
+    @property
+    def num_instances(self) -> int:
+        return len(self.pipelines)
+
+    def _run(self, method: str, args, kwargs):
+        instance = self._available.get()
+        try:
+            return getattr(instance, method)(*args, **kwargs)
+        finally:
+            self._available.put(instance)
+
+    def submit(self, *args, **kwargs) -> Future:
+        """Queues a call of the pipeline with the given arguments, and returns the future of its output."""
+        return self._executor.submit(self._run, "__call__", args, kwargs)
+
+    def submit_method(self, method: str, *args, **kwargs) -> Future:
+        """Queues a call of `method`, e.g. `"img2img"` of the mega pipeline, and returns the future of its output."""
+        return self._executor.submit(self._run, method, args, kwargs)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.submit(*args, **kwargs).result()
+
+    def shutdown(self, wait: bool = True):
+        """Stops the pool once the queued requests are done, or right away without `wait`."""
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
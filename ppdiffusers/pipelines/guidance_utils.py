@@ -0,0 +1,59 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Union
+
+
+def uses_classifier_free_guidance(guidance_scale: Union[float, List[float]], guidance_end: float = 1.0) -> bool:
+    """
+    Whether some denoising step is guided, i.e. whether the unconditional embeddings are needed.
+    """
+    scales = guidance_scale if isinstance(guidance_scale, (list, tuple)) else [guidance_scale]
+    return guidance_end > 0 and max(scales) > 1.0
+
+
+def get_guidance_scales(
+    guidance_scale: Union[float, List[float]], num_timesteps: int, guidance_end: float = 1.0, order: int = 1
+) -> List[float]:
+    """
+    Returns the classifier free guidance scale of every iteration of a denoising loop over `num_timesteps` timesteps.
+    The iterations with a scale of at most 1 are not guided and only need the text conditioned prediction, so a single
+    batch UNet call.
+
+    Args:
+        guidance_scale (`float` or `List[float]`):
+            The guidance scale, or the guidance scale of every denoising step.
+        num_timesteps (`int`): the number of timesteps of the loop.
+        guidance_end (`float`, *optional*, defaults to 1.0):
+            The fraction of the denoising steps after which classifier free guidance stops being applied.
+        order (`int`, *optional*, defaults to 1):
+            The order of the scheduler, schedulers of order > 1 evaluate the model `order` times per step.
+    """
+    num_steps = (num_timesteps - 1) // order + 1
+    if isinstance(guidance_scale, (list, tuple)) and len(guidance_scale) != num_steps:
+        raise ValueError(f"Got {len(guidance_scale)} guidance scales for {num_steps} denoising steps.")
+    if not 0 <= guidance_end <= 1:
+        raise ValueError(f"`guidance_end` has to be between 0 and 1 but is {guidance_end}.")
+
+    guidance_scales = []
+    for i in range(num_timesteps):
+        # the first step of a higher order scheduler is a single evaluation, then `order` evaluations per step
+        step = (i + order - 1) // order
+        if (step + 1) / num_steps > guidance_end:
+            guidance_scales.append(1.0)
+        elif isinstance(guidance_scale, (list, tuple)):
+            guidance_scales.append(float(guidance_scale[step]))
+        else:
+            guidance_scales.append(float(guidance_scale))
+    return guidance_scales
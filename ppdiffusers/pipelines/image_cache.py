@@ -0,0 +1,137 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import paddle
+import PIL.Image
+
+from ..models.vae import DiagonalGaussianDistribution
+
+
+def hash_image(image: Union[paddle.Tensor, np.ndarray, PIL.Image.Image, List]) -> str:
+    """
+    Returns a hex digest identifying the content of an image (or a list of images): its pixels, shape and data type.
+    """
+    if isinstance(image, (list, tuple)):
+        digest = hashlib.sha256()
+        for item in image:
+            digest.update(hash_image(item).encode())
+        return digest.hexdigest()
+    if isinstance(image, PIL.Image.Image):
+        image = np.asarray(image)
+    elif isinstance(image, paddle.Tensor):
+        image = image.numpy()
+    image = np.ascontiguousarray(image)
+    digest = hashlib.sha256()
+    digest.update(f"{image.shape}{image.dtype}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _model_token(model) -> str:
+    # a token rather than `id(model)`, the id of a deleted model can be reused by a new one
+    token = getattr(model, "_image_cache_token", None)
+    if token is None:
+        token = uuid.uuid4().hex
+        setattr(model, "_image_cache_token", token)
+    return token
+
+
+class ImageEncodingCache:
+    """
+    A least recently used cache of the encodings of input images, such as the VAE posterior moments and the estimated
+    depth maps, bounded by the size of the cached tensors. Entries are keyed by the content of the image and the
+    model that encoded it, so a cache can be shared by several pipelines, see
+    [`~DiffusionPipeline.enable_image_cache`].
+
+    The cache assumes the weights of the models do not change, call [`~ImageEncodingCache.clear`] after updating them.
+
+    Args:
+        max_bytes (`int`, *optional*, defaults to 512 MiB): the total size of the cached tensors.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024**2):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def make_key(self, kind: str, models: Union[object, Tuple], image) -> str:
+        models = models if isinstance(models, tuple) else (models,)
+        return "-".join([kind] + [_model_token(model) for model in models] + [hash_image(image)])
+
+    def get(self, key: str) -> Optional[paddle.Tensor]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: str, value: paddle.Tensor):
+        num_bytes = value.numel().item() * value.element_size()
+        if num_bytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.num_bytes -= self._entries[key].numel().item() * self._entries[key].element_size()
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self.num_bytes += num_bytes
+        while self.num_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.num_bytes -= evicted.numel().item() * evicted.element_size()
+
+    def get_or_compute(
+        self, kind: str, models: Union[object, Tuple], image, compute: Callable[[], paddle.Tensor]
+    ) -> paddle.Tensor:
+        """
+        Returns the cached `kind` encoding of `image` by `models`, computing it with `compute` on a miss.
+
+        Args:
+            kind (`str`): the kind of encoding, e.g. `"vae_moments"`.
+            models (`object` or `Tuple`): the model(s) the encoding depends on.
+            image: the input of the encoding, anything [`hash_image`] accepts.
+            compute (`Callable`): computes the encoding on a miss.
+        """
+        key = self.make_key(kind, models, image)
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = compute()
+            self.put(key, value)
+        else:
+            self.hits += 1
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.num_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def encode_latent_dist(vae, image: paddle.Tensor, cache: Optional[ImageEncodingCache] = None):
+    """
+    Returns the latent distribution of `image` under `vae`, reusing the posterior moments stored in `cache`. Sampling
+    still happens per call, so different generators give different latents.
+    """
+    if cache is None:
+        return vae.encode(image).latent_dist
+    moments = cache.get_or_compute("vae_moments", vae, image, lambda: vae.encode(image).latent_dist.parameters)
+    return DiagonalGaussianDistribution(moments)
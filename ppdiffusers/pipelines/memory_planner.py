@@ -0,0 +1,250 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Union
+
+import numpy as np
+import paddle
+import paddle.nn as nn
+
+from ..utils import (
+    is_cutlass_fused_multihead_attention_available,
+    is_flash_attention_available,
+)
+
+# the attention of the UNet, from the fastest to the most memory saving
+ATTENTION_MODES = ["xformers", "default", "auto", "max"]
+
+MEMORY_UNITS = {
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+}
+
+# the feature maps a resnet or an attention block of the UNet or of the VAE holds at once, in multiples of its input:
+# the input, the normalized input, the convolution or projection outputs and the residual sum
+_WORKING_FEATURE_MAPS = 4
+
+
+def parse_memory_size(size: Union[int, str]) -> int:
+    """Returns the number of bytes of `size`, bytes or a string with a unit, e.g. `"8GB"` or `"7.5 GiB"`."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*", size)
+    unit = (match.group(2).lower() or "b") if match is not None else None
+    if unit not in MEMORY_UNITS:
+        raise ValueError(f"Cannot parse the memory size {size}, use e.g. `8GB`, `7.5GiB` or a number of bytes.")
+    return int(float(match.group(1)) * MEMORY_UNITS[unit])
+
+
+def format_memory_size(num_bytes: int) -> str:
+    return f"{num_bytes / 1024**3:.2f} GiB" if num_bytes >= 1024**3 else f"{num_bytes / 1024**2:.1f} MiB"
+
+
+def layer_bytes(layer: nn.Layer) -> int:
+    """Returns the number of bytes of the parameters and buffers of `layer`."""
+    tensors = list(layer.parameters()) + [buffer for buffer in layer.buffers() if buffer is not None]
+    return sum(int(np.prod(tensor.shape)) * tensor.element_size() for tensor in tensors)
+
+
+def _dtype_size(layer: nn.Layer) -> int:
+    for parameter in layer.parameters():
+        return parameter.element_size()
+    return 4
+
+
+def _attention_score_bytes(batch_size: int, heads: int, tokens: int, attention: str, element_size: int) -> int:
+    # the scores and their softmax, of the self attention over `tokens`
+    if attention == "xformers":
+        # the memory efficient kernels do not store the scores
+        return 0
+    if attention == "auto":
+        rows = max(heads // 2, 1)
+    elif attention == "max":
+        rows = 1
+    else:
+        rows = batch_size * heads
+    return 2 * rows * tokens * tokens * element_size
+
+
+def estimate_unet_activations(unet: nn.Layer, batch_size: int, height: int, width: int, attention: str) -> int:
+    """
+    Estimates the peak memory of the activations of a `UNet2DConditionModel` call on latents of `batch_size x height x
+    width`: the skip connections of all the down blocks, with the working feature maps and the self attention scores
+    of the largest block.
+    """
+    config = unet.config
+    element_size = _dtype_size(unet)
+    num_blocks = len(config.block_out_channels)
+    heads = config.attention_head_dim
+    if isinstance(heads, int):
+        heads = [heads] * num_blocks
+    skips, peak = 0, 0
+    for index, (channels, block_type) in enumerate(zip(config.block_out_channels, config.down_block_types)):
+        tokens = (height // 2**index) * (width // 2**index)
+        feature_map = batch_size * channels * tokens * element_size
+        skips += (config.layers_per_block + 1) * feature_map
+        working = _WORKING_FEATURE_MAPS * feature_map
+        if "Attn" in block_type:
+            working += _attention_score_bytes(batch_size, heads[index], tokens, attention, element_size)
+        peak = max(peak, working)
+    return skips + peak
+
+
+def estimate_vae_decoder_activations(vae: nn.Layer, batch_size: int, height: int, width: int) -> int:
+    """
+    Estimates the peak memory of the activations of an `AutoencoderKL` decoding `batch_size` images of `height x width`
+    pixels: the largest of the single head attention of the mid block and of the working feature maps of the up blocks.
+    """
+    config = vae.config
+    element_size = _dtype_size(vae)
+    channels = config.get("up_block_out_channels") or config.block_out_channels
+    scale_factor = 2 ** (len(channels) - 1)
+    latent_tokens = (height // scale_factor) * (width // scale_factor)
+    peak = _attention_score_bytes(batch_size, 1, latent_tokens, "default", element_size)
+    for index, block_channels in enumerate(channels):
+        tokens = (height // 2**index) * (width // 2**index)
+        peak = max(peak, _WORKING_FEATURE_MAPS * batch_size * block_channels * tokens * element_size)
+    return peak
+
+
+@dataclass
+class MemoryPlan:
+    """
+    The memory optimizations selected by [`~DiffusionPipeline.optimize_for`], with the estimates they were selected
+    from.
+
+    Args:
+        attention (`str`):
+            The attention of the UNet: `"xformers"` for the memory efficient kernels, `"default"`, or the `"auto"` and
+            `"max"` slicing of [`~DiffusionPipeline.enable_attention_slicing`].
+        vae_slicing (`bool`): whether the VAE decodes the images one at a time.
+        sequential_offload (`bool`): whether the components are staged on the device one at a time.
+        peak_bytes (`int`): the estimated peak memory of a call.
+        memory_budget (`int`): the memory the plan had to fit in.
+        fits (`bool`): whether the plan fits in the budget, the most memory saving plan is selected if none fits.
+        weight_bytes (`Dict[str, int]`): the memory of the weights of every component.
+        activation_bytes (`Dict[str, int]`): the estimated peak memory of the activations of the UNet and the VAE.
+    """
+
+    attention: str
+    vae_slicing: bool
+    sequential_offload: bool
+    peak_bytes: int
+    memory_budget: int
+    fits: bool
+    weight_bytes: Dict[str, int] = field(default_factory=dict)
+    activation_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def __str__(self):
+        lines = [f"{'component':<16}{'weights':>12}{'activations':>14}"]
+        for name, num_bytes in self.weight_bytes.items():
+            activations = self.activation_bytes.get(name)
+            lines.append(
+                f"{name:<16}{format_memory_size(num_bytes):>12}"
+                f"{format_memory_size(activations) if activations is not None else '-':>14}"
+            )
+        lines.append(
+            f"attention={self.attention}, vae_slicing={self.vae_slicing}, sequential_offload={self.sequential_offload}"
+        )
+        lines.append(
+            f"estimated peak {format_memory_size(self.peak_bytes)} of {format_memory_size(self.memory_budget)}"
+            f"{'' if self.fits else ', does not fit'}"
+        )
+        return "\n".join(lines)
+
+
+def plan_memory(
+    components: Dict[str, nn.Layer],
+    memory_budget: int,
+    batch_size: int,
+    height: int,
+    width: int,
+    do_classifier_free_guidance: bool = True,
+    memory_efficient_attention: bool = False,
+) -> MemoryPlan:
+    """
+    Selects the fastest combination of attention, VAE slicing and sequential offload whose estimated peak memory fits
+    in `memory_budget`. The weights are measured on the components, the activations of the UNet and of the VAE decoder
+    are estimated from their configs for `batch_size` images of `height x width` pixels. Attention slicing costs more
+    than VAE slicing, which runs once per call, and offloading costs more than both. The memory efficient attention
+    kernels are only considered with `memory_efficient_attention`.
+    """
+    weight_bytes = {name: layer_bytes(component) for name, component in components.items()}
+    unet, vae = components.get("unet"), components.get("vae")
+    vae_scale_factor = 2 ** (len(vae.config.block_out_channels) - 1) if vae is not None else 8
+    unet_batch_size = batch_size * (2 if do_classifier_free_guidance else 1)
+
+    attention_modes = ATTENTION_MODES if memory_efficient_attention else ATTENTION_MODES[1:]
+    if unet is None:
+        attention_modes = ["default"]
+    vae_slicing_modes = [False, True] if vae is not None and batch_size > 1 else [False]
+
+    candidates = []
+    for sequential_offload in [False, True]:
+        for attention in attention_modes:
+            for vae_slicing in vae_slicing_modes:
+                activation_bytes = {}
+                if unet is not None:
+                    activation_bytes["unet"] = estimate_unet_activations(
+                        unet, unet_batch_size, height // vae_scale_factor, width // vae_scale_factor, attention
+                    )
+                if vae is not None:
+                    activation_bytes["vae"] = estimate_vae_decoder_activations(
+                        vae, 1 if vae_slicing else batch_size, height, width
+                    )
+                if sequential_offload:
+                    peak_bytes = max(
+                        num_bytes + activation_bytes.get(name, 0) for name, num_bytes in weight_bytes.items()
+                    )
+                else:
+                    peak_bytes = sum(weight_bytes.values()) + max(activation_bytes.values(), default=0)
+                candidates.append(
+                    MemoryPlan(
+                        attention=attention,
+                        vae_slicing=vae_slicing,
+                        sequential_offload=sequential_offload,
+                        peak_bytes=peak_bytes,
+                        memory_budget=memory_budget,
+                        fits=peak_bytes <= memory_budget,
+                        weight_bytes=weight_bytes,
+                        activation_bytes=activation_bytes,
+                    )
+                )
+
+    for plan in candidates:
+        if plan.fits:
+            return plan
+    return min(candidates, key=lambda plan: plan.peak_bytes)
+
+
+def supports_memory_efficient_attention(device: str) -> bool:
+    """Whether the memory efficient attention kernels of paddle run on `device`, which they only do on the GPU."""
+    if not device.startswith("gpu"):
+        return False
+    return is_cutlass_fused_multihead_attention_available() or is_flash_attention_available()
+
+
+def device_memory(device: Optional[str] = None) -> Optional[int]:
+    """Returns the total memory of the GPU `device`, the current one by default, or `None` for the other devices."""
+    device = device or paddle.get_device()
+    if not device.startswith("gpu") or not paddle.device.is_compiled_with_cuda():
+        return None
+    return paddle.device.cuda.get_device_properties(device).total_memory
@@ -24,9 +24,10 @@ from paddlenlp.transformers import CLIPFeatureExtractor
 from ...models import AutoencoderKL, UNet2DConditionModel
 from ...schedulers import DDIMScheduler, LMSDiscreteScheduler, PNDMScheduler
 from ...utils import logging, randn_tensor
+from ..image_cache import encode_latent_dist
 from ..pipeline_utils import DiffusionPipeline
 from ..stable_diffusion import StableDiffusionPipelineOutput
-from ..stable_diffusion.safety_checker import StableDiffusionSafetyChecker
+from ..stable_diffusion.safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 from .image_encoder import PaintByExampleImageEncoder
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -188,10 +189,8 @@ class PaintByExamplePipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -279,12 +278,14 @@ class PaintByExamplePipeline(DiffusionPipeline):
         # encode the mask image into latents space so we can concatenate it to the latents
         if isinstance(generator, list):
             masked_image_latents = [
-                self.vae.encode(masked_image[i : i + 1]).latent_dist.sample(generator=generator[i])
+                encode_latent_dist(self.vae, masked_image[i : i + 1], self.image_cache).sample(generator=generator[i])
                 for i in range(batch_size)
             ]
             masked_image_latents = paddle.concat(masked_image_latents, axis=0)
         else:
-            masked_image_latents = self.vae.encode(masked_image).latent_dist.sample(generator=generator)
+            masked_image_latents = encode_latent_dist(self.vae, masked_image, self.image_cache).sample(
+                generator=generator
+            )
         masked_image_latents = self.vae.config.scaling_factor * masked_image_latents
 
         # duplicate mask and masked_image_latents for each generation per prompt, using mps friendly method
@@ -0,0 +1,262 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import paddle
+
+from ..utils import logging
+from ..utils.benchmark_utils import synchronize
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# the methods of the pipeline and of its components recorded as stages: (component, method, stage)
+PROFILED_METHODS = [
+    (None, "_encode_prompt", "text_encoding"),
+    (None, "prepare_latents", "prepare_latents"),
+    ("unet", "forward", "unet"),
+    ("scheduler", "step", "scheduler_step"),
+    ("vae", "encode", "vae_encode"),
+    (None, "decode_latents", "decode_latents"),
+    (None, "decode_latents_to_uint8", "decode_latents"),
+    ("vae", "decode", "vae_decode"),
+    (None, "run_safety_checker", "safety_checker"),
+    (None, "numpy_to_pil", "postprocessing"),
+]
+
+# the blocks of the UNet recorded as stages
+PROFILED_UNET_BLOCKS = ["down_blocks", "mid_block", "up_blocks"]
+
+
+def _memory_counters(device: str) -> Tuple[int, int]:
+    # the memory in use and its peak in the process, in bytes
+    if device.startswith("gpu"):
+        return paddle.device.cuda.memory_allocated(), paddle.device.cuda.max_memory_allocated()
+    memory = 0
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            memory = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    peak = memory
+    if resource is not None:
+        # the kilobytes of the resident set on Linux, its bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return memory, max(memory, peak)
+
+
+class PipelineProfiler:
+    """
+    Records the wall time and the peak memory of the stages of the calls of a pipeline: the text encoding, every
+    denoising step, the UNet and its down, mid and up blocks, the scheduler steps, the VAE, the safety checker and the
+    conversion to PIL images. Create it with [`~DiffusionPipeline.profile`] and run the calls in its `with` block. The
+    stages are recorded by wrapping the methods of the pipeline and of its components on entering the block, and the
+    wrappers are removed on leaving it, so that the pipeline runs unchanged outside of the block.
+
+    The memory is the one of the paddle allocator on the GPU, and the resident memory of the process on the CPU. Both
+    only keep the peak of the whole process: the peak of a stage is exact if the stage raised it, and is otherwise the
+    larger of its memory at its start and at its end.
+
+    Args:
+        pipeline ([`DiffusionPipeline`]): the profiled pipeline.
+        synchronize (`bool`, *optional*, defaults to `True`):
+            Wait for the device at the start and at the end of every stage, so that the GPU work is counted in the
+            stage which queued it rather than in the next one waiting for its results.
+
+    Examples:
+
+    ```py
+    >>> with pipe.profile() as profiler:
+    ...     pipe("a photo of an astronaut riding a horse on mars", height=768, width=768)
+    >>> print(profiler.summary_table())
+    >>> profiler.export_chrome_trace("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+    ```
+    """
+
+    def __init__(self, pipeline, synchronize: bool = True):
+        self.pipeline = pipeline
+        self.synchronize = synchronize
+        self.device = paddle.get_device()
+        self.events = []
+        self._patches = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = None
+        self._num_steps = 0
+
+    def _targets(self):
+        for component_name, method_name, stage in PROFILED_METHODS:
+            component = self.pipeline if component_name is None else getattr(self.pipeline, component_name, None)
+            if component is not None and callable(getattr(component, method_name, None)):
+                yield component, method_name, stage
+        unet = getattr(self.pipeline, "unet", None)
+        for name in PROFILED_UNET_BLOCKS:
+            blocks = getattr(unet, name, None)
+            if isinstance(blocks, paddle.nn.Layer) and not isinstance(blocks, paddle.nn.LayerList):
+                yield blocks, "forward", f"unet.{name}"
+            elif blocks is not None:
+                for index, block in enumerate(blocks):
+                    yield block, "forward", f"unet.{name}.{index}"
+
+    def __enter__(self):
+        if self._origin is None:
+            self._origin = time.perf_counter()
+        for component, method_name, stage in self._targets():
+            previous = component.__dict__.get(method_name)
+            setattr(component, method_name, self._wrap(getattr(component, method_name), stage))
+            self._patches.append((component, method_name, previous))
+        return self
+
+    def __exit__(self, *exc):
+        for component, method_name, previous in reversed(self._patches):
+            if previous is None:
+                delattr(component, method_name)
+            else:
+                setattr(component, method_name, previous)
+        self._patches = []
+        return False
+
+    def _begin(self) -> Tuple[float, int, int]:
+        if self.synchronize:
+            synchronize()
+        return (time.perf_counter(),) + _memory_counters(self.device)
+
+    def _end(self, stage: str, begin: Tuple[float, int, int], args: Optional[Dict[str, Any]] = None):
+        if self.synchronize:
+            synchronize()
+        end = time.perf_counter()
+        start, start_memory, start_peak = begin
+        memory, peak = _memory_counters(self.device)
+        thread = threading.current_thread()
+        event = {
+            "name": stage,
+            "start": start - self._origin,
+            "duration": end - start,
+            "memory_bytes": memory,
+            "peak_bytes": peak if peak > start_peak else max(start_memory, memory),
+            "thread_id": thread.ident,
+            "thread_name": thread.name,
+            "args": args or {},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def _wrap(self, method, stage: str):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            # a denoising step runs from the first call of the UNet to the end of the scheduler step
+            if stage == "unet" and getattr(self._local, "step", None) is None:
+                self._local.step = self._begin()
+            begin = self._begin()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                shapes = [list(arg.shape) for arg in args if isinstance(arg, paddle.Tensor)]
+                self._end(stage, begin, {"shapes": shapes} if shapes else None)
+                if stage == "scheduler_step" and getattr(self._local, "step", None) is not None:
+                    with self._lock:
+                        step = self._num_steps
+                        self._num_steps += 1
+                    self._end("denoising_step", self._local.step, {"step": step})
+                    self._local.step = None
+
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the statistics of every stage, in the order of their first call: the number of `calls`, the `total_ms`,
+        `mean_ms` and `max_ms` wall time, and the `peak_mib` memory.
+        """
+        summary = {}
+        for event in sorted(self.events, key=lambda event: event["start"]):
+            stats = summary.setdefault(
+                event["name"], {"calls": 0, "total_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0, "peak_mib": 0.0}
+            )
+            duration = event["duration"] * 1000
+            stats["calls"] += 1
+            stats["total_ms"] += duration
+            stats["max_ms"] = max(stats["max_ms"], duration)
+            stats["mean_ms"] = stats["total_ms"] / stats["calls"]
+            stats["peak_mib"] = max(stats["peak_mib"], event["peak_bytes"] / 1024**2)
+        return summary
+
+    def summary_table(self) -> str:
+        """Returns the [`~PipelineProfiler.summary`] as a table."""
+        lines = [f"{'stage':<24}{'calls':>7}{'total ms':>12}{'mean ms':>11}{'max ms':>11}{'peak MiB':>11}"]
+        for stage, stats in self.summary().items():
+            lines.append(
+                f"{stage:<24}{stats['calls']:>7d}{stats['total_ms']:>12.2f}{stats['mean_ms']:>11.2f}"
+                f"{stats['max_ms']:>11.2f}{stats['peak_mib']:>11.1f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Returns the events in the Chrome trace event format: a complete event per stage, with its memory in its
+        arguments, a counter event of the memory at the end of every stage and the names of the threads.
+        """
+        pid = os.getpid()
+        trace_events = []
+        threads = {}
+        for event in self.events:
+            threads[event["thread_id"]] = event["thread_name"]
+            start = event["start"] * 1e6
+            end = start + event["duration"] * 1e6
+            trace_events.append(
+                {
+                    "name": event["name"],
+                    "cat": "pipeline",
+                    "ph": "X",
+                    "ts": start,
+                    "dur": event["duration"] * 1e6,
+                    "pid": pid,
+                    "tid": event["thread_id"],
+                    "args": dict(event["args"], memory_bytes=event["memory_bytes"], peak_bytes=event["peak_bytes"]),
+                }
+            )
+            trace_events.append(
+                {
+                    "name": "memory",
+                    "ph": "C",
+                    "ts": end,
+                    "pid": pid,
+                    "args": {"MiB": event["memory_bytes"] / 1024**2},
+                }
+            )
+        for thread_id, thread_name in threads.items():
+            trace_events.append(
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}}
+            )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str):
+        """Writes the [`~PipelineProfiler.chrome_trace`] to the JSON file `path`."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        logger.info(f"Chrome trace of {len(self.events)} stages saved to {path}.")
+
+    def reset(self):
+        """Clears the recorded events."""
+        with self._lock:
+            self.events = []
+            self._num_steps = 0
@@ -0,0 +1,198 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import inspect
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+import paddle
+
+from ..utils import logging
+
+logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
+
+# marks the end of the events of a stream
+_DONE = object()
+
+
+class StreamCancelled(Exception):
+    """Raised from the step callback to stop the denoising loop of a cancelled [`PipelineStream`]."""
+
+
+@dataclass
+class PipelineStepEvent:
+    """
+    A denoising step of a [`PipelineStream`].
+
+    Args:
+        step (`int`): the index of the step in the denoising loop.
+        timestep (`int`): the timestep of the step.
+        latents (`paddle.Tensor`): the latents after the step.
+        elapsed (`float`): the seconds since the start of the call.
+        step_time (`float`): the seconds since the previous event.
+        images (`np.ndarray`, *optional*): the decoded latents, only at the preview steps.
+    """
+
+    step: int
+    timestep: int
+    latents: paddle.Tensor
+    elapsed: float
+    step_time: float
+    images: Optional[np.ndarray] = None
+
+
+class PipelineStream:
+    """
+    A call of a pipeline running in a background thread, which yields a [`PipelineStepEvent`] after every denoising
+    step and can be cancelled between two steps. Iterate over it (`for event in stream` or `async for event in
+    stream`) to receive the events, the output of the call is then available as `stream.output`. Create it with
+    [`~DiffusionPipeline.stream`].
+
+    Leaving the iteration early (`break`, an exception or the cancellation of the async task) or leaving a `with`
+    block cancels the call: the loop stops at the next step, and the cached GPU memory is released.
+
+    Args:
+        pipeline ([`DiffusionPipeline`]): a pipeline whose `__call__` takes a `callback(step, timestep, latents)`.
+        preview_steps (`int`, *optional*, defaults to 0):
+            Decode the latents of every `preview_steps`-th event into `event.images`, 0 disables the previews.
+        timeout (`float`, *optional*): cancel the call after `timeout` seconds.
+        args, kwargs: the arguments of the call.
+    """
+
+    def __init__(self, pipeline, *args, preview_steps: int = 0, timeout: Optional[float] = None, **kwargs):
+        if "callback" not in inspect.signature(pipeline.__call__).parameters:
+            raise ValueError(f"{pipeline.__class__.__name__} has no step callback and cannot be streamed.")
+        if preview_steps > 0 and not hasattr(pipeline, "decode_latents"):
+            raise ValueError(f"{pipeline.__class__.__name__} cannot decode previews of its latents.")
+        self.pipeline = pipeline
+        self.preview_steps = preview_steps
+        self.timeout = timeout
+        self.output = None
+        self.cancelled = False
+        self.timed_out = False
+        self._user_callback = kwargs.pop("callback", None)
+        self._user_callback_steps = kwargs.pop("callback_steps", 1)
+        self._events = queue.Queue()
+        self._cancel = threading.Event()
+        self._error = None
+        self._num_events = 0
+        self._start_time = self._last_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=args, kwargs=kwargs, daemon=True)
+        self._thread.start()
+
+    def _callback(self, step: int, timestep, latents: paddle.Tensor):
+        if self.timeout is not None and time.perf_counter() - self._start_time > self.timeout:
+            self.timed_out = True
+            self._cancel.set()
+        if self._cancel.is_set():
+            raise StreamCancelled()
+        if self._user_callback is not None and step % self._user_callback_steps == 0:
+            self._user_callback(step, timestep, latents)
+        images = None
+        if self.preview_steps > 0 and self._num_events % self.preview_steps == 0:
+            images = self.pipeline.decode_latents(latents)
+        now = time.perf_counter()
+        self._events.put(
+            PipelineStepEvent(
+                step=step,
+                timestep=int(timestep),
+                latents=latents,
+                elapsed=now - self._start_time,
+                step_time=now - self._last_time,
+                images=images,
+            )
+        )
+        self._num_events += 1
+        self._last_time = now
+
+    def _run(self, *args, **kwargs):
+        try:
+            self.output = self.pipeline(*args, callback=self._callback, callback_steps=1, **kwargs)
+        except StreamCancelled:
+            self.cancelled = True
+            logger.info(f"Cancelled the call of {self.pipeline.__class__.__name__} after {self._num_events} steps.")
+        except Exception as error:
+            self._error = error
+        finally:
+            if self.cancelled and paddle.is_compiled_with_cuda():
+                # the tensors of the cancelled call are released with its frames
+                paddle.device.cuda.empty_cache()
+            self._events.put(_DONE)
+
+    def cancel(self, wait: bool = True):
+        """
+        Stops the call at its next step. With `wait`, returns once the call has stopped.
+        """
+        self._cancel.set()
+        if wait:
+            self._thread.join()
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """
+        Waits for the end of the call and returns its output, `None` if it was cancelled. Raises the error of the call
+        if it failed.
+        """
+        self._thread.join(timeout)
+        if self._error is not None:
+            raise self._error
+        return self.output
+
+    def _next_event(self, event):
+        if event is _DONE:
+            # for the other consumers, if any
+            self._events.put(_DONE)
+            if self._error is not None:
+                raise self._error
+        return event
+
+    def __iter__(self):
+        try:
+            while True:
+                event = self._next_event(self._events.get())
+                if event is _DONE:
+                    return
+                yield event
+        finally:
+            if not self.done:
+                self.cancel()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                event = self._next_event(await loop.run_in_executor(None, self._events.get))
+                if event is _DONE:
+                    return
+                yield event
+        finally:
+            if not self.done:
+                self.cancel(wait=False)
+                await loop.run_in_executor(None, self._thread.join)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.done:
+            self.cancel()
+        return False
@@ -22,7 +22,7 @@ import tempfile
 import warnings
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import PIL
@@ -38,7 +38,6 @@ from huggingface_hub import (
 )
 from huggingface_hub.utils import EntryNotFoundError
 from packaging import version
-from PIL import Image
 from tqdm.auto import tqdm
 
 from ..configuration_utils import ConfigMixin
@@ -61,6 +60,7 @@ from ..utils import (
     is_paddlenlp_available,
     is_safetensors_available,
     logging,
+    numpy_to_pil,
     ppdiffusers_bos_dir_download,
     ppdiffusers_url_download,
 )
@@ -70,6 +70,13 @@ if is_paddle_available():
     import paddle
     import paddle.nn as nn
 
+    from .device_utils import (
+        ComponentDeviceHook,
+        OffloadGroup,
+        move_layer,
+        remove_device_hook,
+    )
+
 if is_paddlenlp_available():
     from paddlenlp.transformers import PretrainedModel
 
@@ -207,9 +214,12 @@ class DiffusionPipeline(ConfigMixin):
           components of the diffusion pipeline.
         - **_optional_components** (List[`str`]) -- list of all components that are optional so they don't have to be
           passed for the pipeline to function (should be overridden by subclasses).
+        - **image_cache** ([`ImageEncodingCache`], *optional*) -- cache of the encodings of the input images, see
+          [`~DiffusionPipeline.enable_image_cache`].
     """
     config_name = "model_index.json"
     _optional_components = []
+    image_cache = None
 
     def register_modules(self, **kwargs):
         # import it here to avoid circular import
@@ -388,6 +398,7 @@ class DiffusionPipeline(ConfigMixin):
         if paddle_device is None:
             return self
 
+        self.remove_device_hooks()
         module_names, _, _ = self.extract_init_dict(dict(self.config))
         for name in module_names.keys():
             module = getattr(self, name)
@@ -400,7 +411,7 @@ class DiffusionPipeline(ConfigMixin):
                         " support for`float16` operations on this device in Paddle. Please, remove the"
                         " `paddle_dtype=paddle.float16` argument, or use another device for inference."
                     )
-                module.to(paddle_device)
+                move_layer(module, paddle_device)
         return self
 
     @property
@@ -416,6 +427,151 @@ class DiffusionPipeline(ConfigMixin):
                 return module.place
         return "cpu"
 
+    def _device_components(self, names: Optional[List[str]] = None) -> Dict[str, "nn.Layer"]:
+        module_names, _, _ = self.extract_init_dict(dict(self.config))
+        components = {name: getattr(self, name) for name in module_names.keys()}
+        if names is None:
+            return {name: component for name, component in components.items() if isinstance(component, nn.Layer)}
+        for name in names:
+            if not isinstance(components.get(name), nn.Layer):
+                raise ValueError(f"`{name}` is not a paddle component of {self.__class__.__name__}.")
+        return {name: components[name] for name in names}
+
+    def set_device_map(self, device_map: Dict[str, str]):
+        r"""
+        Places the components of the pipeline on different devices, e.g. `{"text_encoder": "cpu", "safety_checker":
+        "cpu", "unet": "gpu:0", "vae": "gpu:0"}`. The tensors are moved at the boundaries of the components: their
+        inputs to the device of the component and their outputs back to the current paddle device, which runs the rest
+        of the pipeline. The components not in `device_map` stay where they are.
+
+        Args:
+            device_map (`Dict[str, str]`): the device of every placed component.
+        """
+        self.remove_device_hooks()
+        for name, component in self._device_components(list(device_map.keys())).items():
+            ComponentDeviceHook(component, device_map[name]).attach()
+        return self
+
+    def enable_sequential_offload(
+        self,
+        device: Optional[str] = None,
+        offload_device: str = "cpu",
+        components: Optional[List[str]] = None,
+    ):
+        r"""
+        Stages the components of the pipeline on `device` on demand: they are stored on `offload_device` and a
+        component is moved to `device` when it is called, after the component called before it is moved back. A
+        single component at a time uses the memory of `device`, e.g. the UNet during the denoising loop.
+
+        Args:
+            device (`str`, *optional*): the device running the components, the current paddle device by default.
+            offload_device (`str`, *optional*, defaults to `"cpu"`): the device storing the idle components.
+            components (`List[str]`, *optional*): the offloaded components, all the paddle components by default.
+        """
+        self.remove_device_hooks()
+        device = device or paddle.get_device()
+        offload_group = OffloadGroup()
+        for component in self._device_components(components).values():
+            ComponentDeviceHook(component, device, offload_device=offload_device, offload_group=offload_group).attach()
+        return self
+
+    def remove_device_hooks(self):
+        r"""
+        Removes the device map or the sequential offload of the pipeline, leaving every component on its current
+        device.
+        """
+        for component in self._device_components().values():
+            remove_device_hook(component)
+        return self
+
+    def optimize_for(
+        self,
+        memory_budget: Optional[Union[int, str]] = None,
+        batch_size: int = 1,
+        resolution: Optional[Union[int, Tuple[int, int]]] = None,
+        do_classifier_free_guidance: bool = True,
+        device: Optional[str] = None,
+    ) -> "MemoryPlan":  # noqa: F821
+        r"""
+        Enables the fastest combination of memory efficient attention, attention slicing, VAE slicing and sequential
+        offload whose estimated peak memory fits in `memory_budget`, for calls generating `batch_size` images of
+        `resolution`. The memory of the weights is measured on the components, and the activations of the UNet and of
+        the VAE decoder are estimated from their configs, so that nothing runs on the device. The attention processors,
+        the VAE slicing and the device hooks set before are replaced.
+
+        Args:
+            memory_budget (`int` or `str`, *optional*):
+                The memory available to the pipeline, in bytes or with a unit, e.g. `"8GB"` or `"7.5GiB"`. Defaults to
+                the total memory of the GPU.
+            batch_size (`int`, *optional*, defaults to 1): the number of images generated by a call.
+            resolution (`int` or `Tuple[int, int]`, *optional*):
+                The size or the `(height, width)` of the images, the default size of the UNet by default.
+            do_classifier_free_guidance (`bool`, *optional*, defaults to `True`):
+                Whether the calls use classifier free guidance, which doubles the batch of the UNet.
+            device (`str`, *optional*): the device running the pipeline, the current paddle device by default.
+
+        Returns:
+            [`MemoryPlan`]: the selected plan, with the estimates of every component. Printing it reports the plan.
+
+        Examples:
+
+        ```py
+        >>> pipe = StableDiffusionPipeline.from_pretrained("runwayml/stable-diffusion-v1-5")
+        >>> plan = pipe.optimize_for(memory_budget="6GB", batch_size=4, resolution=768)
+        >>> print(plan)
+        ```
+        """
+        from .memory_planner import (
+            device_memory,
+            parse_memory_size,
+            plan_memory,
+            supports_memory_efficient_attention,
+        )
+
+        device = device or paddle.get_device()
+        if memory_budget is None:
+            memory_budget = device_memory(device)
+            if memory_budget is None:
+                raise ValueError(f"Cannot read the memory of the device {device}, pass a `memory_budget`.")
+        components = self._device_components()
+        unet = components.get("unet")
+        if resolution is None:
+            vae_scale_factor = getattr(self, "vae_scale_factor", 8)
+            resolution = unet.config.sample_size * vae_scale_factor if unet is not None else 512
+        height, width = (resolution, resolution) if isinstance(resolution, int) else resolution
+        plan = plan_memory(
+            components,
+            parse_memory_size(memory_budget),
+            batch_size,
+            height,
+            width,
+            do_classifier_free_guidance=do_classifier_free_guidance,
+            memory_efficient_attention=supports_memory_efficient_attention(device),
+        )
+        if not plan.fits:
+            logger.warning(
+                f"No combination of optimizations is estimated to fit in {memory_budget}, using the one with the"
+                " lowest peak memory.\n" + str(plan)
+            )
+
+        self.remove_device_hooks()
+        self.disable_xformers_memory_efficient_attention()
+        self.disable_attention_slicing()
+        if plan.attention == "xformers":
+            self.enable_xformers_memory_efficient_attention()
+        elif plan.attention in ["auto", "max"]:
+            self.enable_attention_slicing(plan.attention)
+        vae = components.get("vae")
+        if vae is not None and hasattr(vae, "enable_slicing"):
+            if plan.vae_slicing:
+                vae.enable_slicing()
+            else:
+                vae.disable_slicing()
+        if plan.sequential_offload:
+            self.enable_sequential_offload(device)
+        logger.info(f"Memory plan of {self.__class__.__name__}:\n{plan}")
+        return plan
+
     @classmethod
     def from_pretrained(cls, pretrained_model_name_or_path: Optional[Union[str, os.PathLike]], **kwargs):
         r"""
@@ -524,6 +680,8 @@ class DiffusionPipeline(ConfigMixin):
             variant (`str`, *optional*):
                 If specified load weights from `variant` filename, *e.g.* pytorch_model.<variant>.bin. `variant` is
                 ignored when using `from_flax`.
+            device_map (`Dict[str, str]`, *optional*):
+                The devices of the components, see [`~DiffusionPipeline.set_device_map`].
 
         <Tip>
 
@@ -572,15 +730,15 @@ class DiffusionPipeline(ConfigMixin):
         runtime_options = kwargs.pop("runtime_options", None)
         return_cached_folder = kwargs.pop("return_cached_folder", False)
         variant = kwargs.pop("variant", None)
+        device_map = kwargs.pop("device_map", None)
         from_hf_hub = kwargs.pop("from_hf_hub", FROM_HF_HUB)
         cache_dir = (
             kwargs.pop("cache_dir", DIFFUSERS_CACHE) if from_hf_hub else kwargs.pop("cache_dir", PPDIFFUSERS_CACHE)
         )
 
         # 1. Download the checkpoints and configs
-        # use snapshot download here to get it working from from_pretrained
         if not os.path.isdir(pretrained_model_name_or_path):
-            config_dict = cls.load_config(
+            cached_folder = cls.download(
                 pretrained_model_name_or_path,
                 cache_dir=cache_dir,
                 resume_download=resume_download,
@@ -590,126 +748,12 @@ class DiffusionPipeline(ConfigMixin):
                 use_auth_token=use_auth_token,
                 revision=revision,
                 from_hf_hub=from_hf_hub,
+                custom_pipeline=custom_pipeline,
+                variant=variant,
             )
-
-            # retrieve all folder_names that contain relevant files
-            folder_names = [k for k, v in config_dict.items() if isinstance(v, list)]
-
-            if from_hf_hub:
-                if not local_files_only:
-                    info = model_info(
-                        pretrained_model_name_or_path,
-                        use_auth_token=use_auth_token,
-                        revision=revision,
-                    )
-                    model_filenames, variant_filenames = variant_compatible_siblings(info, variant=variant)
-                    model_folder_names = set([os.path.split(f)[0] for f in model_filenames])
-
-                    if revision in DEPRECATED_REVISION_ARGS and version.parse(
-                        version.parse(__version__).base_version
-                    ) >= version.parse("0.15.0"):
-                        info = model_info(
-                            pretrained_model_name_or_path,
-                            use_auth_token=use_auth_token,
-                            revision=None,
-                        )
-                        comp_model_filenames, _ = variant_compatible_siblings(info, variant=revision)
-                        comp_model_filenames = [
-                            ".".join(f.split(".")[:1] + f.split(".")[2:]) for f in comp_model_filenames
-                        ]
-
-                        if set(comp_model_filenames) == set(model_filenames):
-                            warnings.warn(
-                                f"You are loading the variant {revision} from {pretrained_model_name_or_path} via `revision='{revision}'` even though you can load it via `variant=`{revision}`. Loading model variants via `revision='{variant}'` is deprecated and will be removed in diffusers v1. Please use `variant='{revision}'` instead.",
-                                FutureWarning,
-                            )
-                        else:
-                            warnings.warn(
-                                f"You are loading the variant {revision} from {pretrained_model_name_or_path} via `revision='{revision}'`. This behavior is deprecated and will be removed in diffusers v1. One should use `variant='{revision}'` instead. However, it appears that {pretrained_model_name_or_path} currently does not have the required variant filenames in the 'main' branch. \n The Diffusers team and community would be very grateful if you could open an issue: https://github.com/huggingface/diffusers/issues/new with the title '{pretrained_model_name_or_path} is missing {revision} files' so that the correct variant file can be added.",
-                                FutureWarning,
-                            )
-
-                    # all filenames compatible with variant will be added
-                    allow_patterns = list(model_filenames)
-
-                    # allow all patterns from non-model folders
-                    # this enables downloading schedulers, tokenizers, ...
-                    allow_patterns += [os.path.join(k, "*") for k in folder_names if k not in model_folder_names]
-                    # also allow downloading config.jsons with the model
-                    allow_patterns += [os.path.join(k, "*.json") for k in model_folder_names]
-
-                    allow_patterns += [
-                        SCHEDULER_CONFIG_NAME,
-                        CONFIG_NAME,
-                        cls.config_name,
-                        CUSTOM_PIPELINE_FILE_NAME,
-                    ]
-
-                    if is_safetensors_available() and is_safetensors_compatible(model_filenames, variant=variant):
-                        ignore_patterns = ["*.bin", "*.msgpack"]
-
-                        safetensors_variant_filenames = set(
-                            [f for f in variant_filenames if f.endswith(".safetensors")]
-                        )
-                        safetensors_model_filenames = set([f for f in model_filenames if f.endswith(".safetensors")])
-                        if (
-                            len(safetensors_variant_filenames) > 0
-                            and safetensors_model_filenames != safetensors_variant_filenames
-                        ):
-                            logger.warn(
-                                f"\nA mixture of {variant} and non-{variant} filenames will be loaded.\nLoaded {variant} filenames:\n[{', '.join(safetensors_variant_filenames)}]\nLoaded non-{variant} filenames:\n[{', '.join(safetensors_model_filenames - safetensors_variant_filenames)}\nIf this behavior is not expected, please check your folder structure."
-                            )
-
-                    else:
-                        ignore_patterns = ["*.safetensors", "*.msgpack"]
-
-                        bin_variant_filenames = set([f for f in variant_filenames if f.endswith(".bin")])
-                        bin_model_filenames = set([f for f in model_filenames if f.endswith(".bin")])
-                        if len(bin_variant_filenames) > 0 and bin_model_filenames != bin_variant_filenames:
-                            logger.warn(
-                                f"\nA mixture of {variant} and non-{variant} filenames will be loaded.\nLoaded {variant} filenames:\n[{', '.join(bin_variant_filenames)}]\nLoaded non-{variant} filenames:\n[{', '.join(bin_model_filenames - bin_variant_filenames)}\nIf this behavior is not expected, please check your folder structure."
-                            )
-
-                else:
-                    # allow everything since it has to be downloaded anyways
-                    ignore_patterns = allow_patterns = None
-
-                if cls != DiffusionPipeline:
-                    requested_pipeline_class = cls.__name__
-                else:
-                    requested_pipeline_class = config_dict.get("_class_name", cls.__name__)
-                user_agent = {"pipeline_class": requested_pipeline_class}
-                if custom_pipeline is not None and not custom_pipeline.endswith(".py"):
-                    user_agent["custom_pipeline"] = custom_pipeline
-
-                user_agent = http_user_agent(user_agent)
-
-                # download all allow_patterns
-                cached_folder = snapshot_download(
-                    pretrained_model_name_or_path,
-                    cache_dir=cache_dir,
-                    resume_download=resume_download,
-                    proxies=proxies,
-                    local_files_only=local_files_only,
-                    use_auth_token=use_auth_token,
-                    revision=revision,
-                    allow_patterns=allow_patterns,
-                    ignore_patterns=ignore_patterns,
-                    user_agent=user_agent,
-                )
-            else:
-                cached_folder = ppdiffusers_bos_dir_download(
-                    pretrained_model_name_or_path,
-                    revision=revision,
-                    cache_dir=cache_dir,
-                    resume_download=resume_download,
-                    folder_names=folder_names,
-                    variant=variant,
-                    is_fastdeploy_model="fastdeploy" in cls.__name__.lower(),
-                )
         else:
             cached_folder = pretrained_model_name_or_path
-            config_dict = cls.load_config(cached_folder)
+        config_dict = cls.load_config(cached_folder)
 
         # retrieve which subfolders should load variants
         model_variants = {}
@@ -923,11 +967,178 @@ class DiffusionPipeline(ConfigMixin):
 
         # 5. Instantiate the pipeline
         model = pipeline_class(**init_kwargs)
+        if device_map is not None:
+            model.set_device_map(device_map)
 
         if return_cached_folder:
             return model, cached_folder
         return model
 
+    @classmethod
+    def download(cls, pretrained_model_name: str, **kwargs) -> str:
+        r"""
+        Download the checkpoints and configs of a pipeline from huggingface.co or from the BOS, without loading the
+        pipeline, e.g. to download them once before several processes load them.
+
+        Parameters:
+            pretrained_model_name (`str`):
+                The *repo id* of the pipeline, e.g. `"runwayml/stable-diffusion-v1-5"`.
+            cache_dir, resume_download, force_download, proxies, local_files_only, use_auth_token, revision, variant:
+                See [`~DiffusionPipeline.from_pretrained`].
+            from_hf_hub (`bool`, *optional*):
+                Whether to download from huggingface.co rather than from the BOS.
+            custom_pipeline (`str`, *optional*):
+                The custom pipeline reported in the user agent of the downloads from huggingface.co.
+
+        The other keyword arguments, e.g. the ones of [`~DiffusionPipeline.from_pretrained`] loading the pipeline, are
+        ignored.
+
+        Returns:
+            `str`: the path of the downloaded folder.
+        """
+        resume_download = kwargs.pop("resume_download", False)
+        force_download = kwargs.pop("force_download", False)
+        proxies = kwargs.pop("proxies", None)
+        local_files_only = kwargs.pop("local_files_only", HF_HUB_OFFLINE)
+        use_auth_token = kwargs.pop("use_auth_token", None)
+        revision = kwargs.pop("revision", None)
+        custom_pipeline = kwargs.pop("custom_pipeline", None)
+        variant = kwargs.pop("variant", None)
+        from_hf_hub = kwargs.pop("from_hf_hub", FROM_HF_HUB)
+        cache_dir = (
+            kwargs.pop("cache_dir", DIFFUSERS_CACHE) if from_hf_hub else kwargs.pop("cache_dir", PPDIFFUSERS_CACHE)
+        )
+
+        # use snapshot download here to get it working from from_pretrained
+        config_dict = cls.load_config(
+            pretrained_model_name,
+            cache_dir=cache_dir,
+            resume_download=resume_download,
+            force_download=force_download,
+            proxies=proxies,
+            local_files_only=local_files_only,
+            use_auth_token=use_auth_token,
+            revision=revision,
+            from_hf_hub=from_hf_hub,
+        )
+
+        # retrieve all folder_names that contain relevant files
+        folder_names = [k for k, v in config_dict.items() if isinstance(v, list)]
+
+        if from_hf_hub:
+            if not local_files_only:
+                info = model_info(
+                    pretrained_model_name,
+                    use_auth_token=use_auth_token,
+                    revision=revision,
+                )
+                model_filenames, variant_filenames = variant_compatible_siblings(info, variant=variant)
+                model_folder_names = set([os.path.split(f)[0] for f in model_filenames])
+
+                if revision in DEPRECATED_REVISION_ARGS and version.parse(
+                    version.parse(__version__).base_version
+                ) >= version.parse("0.15.0"):
+                    info = model_info(
+                        pretrained_model_name,
+                        use_auth_token=use_auth_token,
+                        revision=None,
+                    )
+                    comp_model_filenames, _ = variant_compatible_siblings(info, variant=revision)
+                    comp_model_filenames = [
+                        ".".join(f.split(".")[:1] + f.split(".")[2:]) for f in comp_model_filenames
+                    ]
+
+                    if set(comp_model_filenames) == set(model_filenames):
+                        warnings.warn(
+                            f"You are loading the variant {revision} from {pretrained_model_name} via `revision='{revision}'` even though you can load it via `variant=`{revision}`. Loading model variants via `revision='{variant}'` is deprecated and will be removed in diffusers v1. Please use `variant='{revision}'` instead.",
+                            FutureWarning,
+                        )
+                    else:
+                        warnings.warn(
+                            f"You are loading the variant {revision} from {pretrained_model_name} via `revision='{revision}'`. This behavior is deprecated and will be removed in diffusers v1. One should use `variant='{revision}'` instead. However, it appears that {pretrained_model_name} currently does not have the required variant filenames in the 'main' branch. \n The Diffusers team and community would be very grateful if you could open an issue: https://github.com/huggingface/diffusers/issues/new with the title '{pretrained_model_name} is missing {revision} files' so that the correct variant file can be added.",
+                            FutureWarning,
+                        )
+
+                # all filenames compatible with variant will be added
+                allow_patterns = list(model_filenames)
+
+                # allow all patterns from non-model folders
+                # this enables downloading schedulers, tokenizers, ...
+                allow_patterns += [os.path.join(k, "*") for k in folder_names if k not in model_folder_names]
+                # also allow downloading config.jsons with the model
+                allow_patterns += [os.path.join(k, "*.json") for k in model_folder_names]
+
+                allow_patterns += [
+                    SCHEDULER_CONFIG_NAME,
+                    CONFIG_NAME,
+                    cls.config_name,
+                    CUSTOM_PIPELINE_FILE_NAME,
+                ]
+
+                if is_safetensors_available() and is_safetensors_compatible(model_filenames, variant=variant):
+                    ignore_patterns = ["*.bin", "*.msgpack"]
+
+                    safetensors_variant_filenames = set(
+                        [f for f in variant_filenames if f.endswith(".safetensors")]
+                    )
+                    safetensors_model_filenames = set([f for f in model_filenames if f.endswith(".safetensors")])
+                    if (
+                        len(safetensors_variant_filenames) > 0
+                        and safetensors_model_filenames != safetensors_variant_filenames
+                    ):
+                        logger.warn(
+                            f"\nA mixture of {variant} and non-{variant} filenames will be loaded.\nLoaded {variant} filenames:\n[{', '.join(safetensors_variant_filenames)}]\nLoaded non-{variant} filenames:\n[{', '.join(safetensors_model_filenames - safetensors_variant_filenames)}\nIf this behavior is not expected, please check your folder structure."
+                        )
+
+                else:
+                    ignore_patterns = ["*.safetensors", "*.msgpack"]
+
+                    bin_variant_filenames = set([f for f in variant_filenames if f.endswith(".bin")])
+                    bin_model_filenames = set([f for f in model_filenames if f.endswith(".bin")])
+                    if len(bin_variant_filenames) > 0 and bin_model_filenames != bin_variant_filenames:
+                        logger.warn(
+                            f"\nA mixture of {variant} and non-{variant} filenames will be loaded.\nLoaded {variant} filenames:\n[{', '.join(bin_variant_filenames)}]\nLoaded non-{variant} filenames:\n[{', '.join(bin_model_filenames - bin_variant_filenames)}\nIf this behavior is not expected, please check your folder structure."
+                        )
+
+            else:
+                # allow everything since it has to be downloaded anyways
+                ignore_patterns = allow_patterns = None
+
+            if cls != DiffusionPipeline:
+                requested_pipeline_class = cls.__name__
+            else:
+                requested_pipeline_class = config_dict.get("_class_name", cls.__name__)
+            user_agent = {"pipeline_class": requested_pipeline_class}
+            if custom_pipeline is not None and not custom_pipeline.endswith(".py"):
+                user_agent["custom_pipeline"] = custom_pipeline
+
+            user_agent = http_user_agent(user_agent)
+
+            # download all allow_patterns
+            cached_folder = snapshot_download(
+                pretrained_model_name,
+                cache_dir=cache_dir,
+                resume_download=resume_download,
+                proxies=proxies,
+                local_files_only=local_files_only,
+                use_auth_token=use_auth_token,
+                revision=revision,
+                allow_patterns=allow_patterns,
+                ignore_patterns=ignore_patterns,
+                user_agent=user_agent,
+            )
+        else:
+            cached_folder = ppdiffusers_bos_dir_download(
+                pretrained_model_name,
+                revision=revision,
+                cache_dir=cache_dir,
+                resume_download=resume_download,
+                folder_names=folder_names,
+                variant=variant,
+                is_fastdeploy_model="fastdeploy" in cls.__name__.lower(),
+            )
+        return cached_folder
+
     @classmethod
     def from_pretrained_original_ckpt(cls, pretrained_model_name_or_path: Optional[Union[str, os.PathLike]], **kwargs):
         from .stable_diffusion.convert_from_ckpt import (
@@ -1012,18 +1223,9 @@ class DiffusionPipeline(ConfigMixin):
     @staticmethod
     def numpy_to_pil(images):
         """
-        Convert a numpy image or a batch of images to a PIL image.
+        Convert a numpy image or a batch of images, either float in `[0, 1]` or uint8, to a PIL image.
         """
-        if images.ndim == 3:
-            images = images[None, ...]
-        images = (images * 255).round().astype("uint8")
-        if images.shape[-1] == 1:
-            # special case for grayscale (single channel) images
-            pil_images = [Image.fromarray(image.squeeze(), mode="L") for image in images]
-        else:
-            pil_images = [Image.fromarray(image) for image in images]
-
-        return pil_images
+        return numpy_to_pil(images)
 
     def progress_bar(self, iterable=None, total=None):
         if not hasattr(self, "_progress_bar_config"):
@@ -1043,6 +1245,61 @@ class DiffusionPipeline(ConfigMixin):
     def set_progress_bar_config(self, **kwargs):
         self._progress_bar_config = kwargs
 
+    def stream(self, *args, preview_steps: int = 0, timeout: Optional[float] = None, **kwargs):
+        r"""
+        Runs the pipeline in a background thread and returns a [`PipelineStream`] yielding a [`PipelineStepEvent`] with
+        the latents and the timing of every denoising step. The call can be cancelled between two steps, e.g. when a
+        client disconnects, instead of running its remaining steps.
+
+        Args:
+            preview_steps (`int`, *optional*, defaults to 0):
+                Decode the latents of every `preview_steps`-th step into `event.images`, 0 disables the previews.
+            timeout (`float`, *optional*):
+                Cancel the call after `timeout` seconds.
+            args, kwargs:
+                The arguments of the pipeline call.
+
+        Examples:
+
+        ```py
+        >>> from ppdiffusers import StableDiffusionPipeline
+
+        >>> pipe = StableDiffusionPipeline.from_pretrained("runwayml/stable-diffusion-v1-5")
+        >>> stream = pipe.stream("a photo of an astronaut riding a horse on mars", preview_steps=10, timeout=30)
+        >>> for event in stream:
+        ...     if event.images is not None:
+        ...         send_preview(event.images)
+        >>> image = stream.output.images[0] if not stream.cancelled else None
+        ```
+        """
+        from .pipeline_stream import PipelineStream
+
+        return PipelineStream(self, *args, preview_steps=preview_steps, timeout=timeout, **kwargs)
+
+    def profile(self, synchronize: bool = True):
+        r"""
+        Returns a [`PipelineProfiler`] recording the wall time and the peak memory of the stages of the calls of the
+        pipeline run in its `with` block, e.g. the text encoding, the denoising steps, the blocks of the UNet and the
+        VAE decoding. The pipeline is only instrumented inside of the block.
+
+        Args:
+            synchronize (`bool`, *optional*, defaults to `True`):
+                Wait for the device at the boundaries of the stages, so that the GPU time is counted in the stage which
+                queued it.
+
+        Examples:
+
+        ```py
+        >>> with pipe.profile() as profiler:
+        ...     pipe("a photo of an astronaut riding a horse on mars")
+        >>> print(profiler.summary_table())
+        >>> profiler.export_chrome_trace("trace.json")
+        ```
+        """
+        from .pipeline_profiler import PipelineProfiler
+
+        return PipelineProfiler(self, synchronize=synchronize)
+
     def enable_xformers_memory_efficient_attention(self, attention_op: Optional[str] = None):
         r"""
         Enable memory efficient attention as implemented in xformers.
@@ -1120,6 +1377,33 @@ class DiffusionPipeline(ConfigMixin):
         # set slice_size = `None` to disable `attention slicing`
         self.enable_attention_slicing(None)
 
+    def enable_image_cache(
+        self, cache: Optional["ImageEncodingCache"] = None, max_bytes: int = 512 * 1024**2  # noqa: F821
+    ):
+        r"""
+        Cache the encodings of the input images (VAE posterior moments, depth maps) of the image-conditioned pipelines.
+        Calls on an image seen before, e.g. with another prompt, seed or strength, then skip its encoding.
+
+        Args:
+            cache ([`ImageEncodingCache`], *optional*):
+                The cache to use, pass the `image_cache` of another pipeline to share it. A new cache is created if
+                `None`.
+            max_bytes (`int`, *optional*, defaults to 512 MiB):
+                The size bound of the new cache.
+        """
+        if cache is None:
+            from .image_cache import ImageEncodingCache
+
+            cache = ImageEncodingCache(max_bytes=max_bytes)
+        self.image_cache = cache
+        return cache
+
+    def disable_image_cache(self):
+        r"""
+        Disable the cache of the input image encodings enabled by [`~DiffusionPipeline.enable_image_cache`].
+        """
+        self.image_cache = None
+
     def set_attention_slice(self, slice_size: Optional[int]):
         module_names, _, _ = self.extract_init_dict(dict(self.config))
         for module_name in module_names:
@@ -59,7 +59,9 @@ def _preprocess_mask(mask: Union[List, PIL.Image.Image, paddle.Tensor]):
     if isinstance(mask[0], PIL.Image.Image):
         w, h = mask[0].size
         w, h = map(lambda x: x - x % 32, (w, h))  # resize to integer multiple of 32
-        mask = [np.array(m.convert("L").resize((w, h), resample=PIL_INTERPOLATION["nearest"]))[None, :] for m in mask]
+        mask = [
+            np.array(m.convert("L").resize((w, h), resample=PIL_INTERPOLATION["nearest"]))[None, None] for m in mask
+        ]
         mask = np.concatenate(mask, axis=0)
         mask = mask.astype(np.float32) / 255.0
         mask[mask < 0.5] = 0
@@ -81,8 +83,8 @@ class RePaintPipeline(DiffusionPipeline):
     @paddle.no_grad()
     def __call__(
         self,
-        image: Union[paddle.Tensor, PIL.Image.Image],
-        mask_image: Union[paddle.Tensor, PIL.Image.Image],
+        image: Union[paddle.Tensor, PIL.Image.Image, List[PIL.Image.Image]],
+        mask_image: Union[paddle.Tensor, PIL.Image.Image, List[PIL.Image.Image]],
         num_inference_steps: int = 250,
         eta: float = 0.0,
         jump_length: int = 10,
@@ -94,10 +96,12 @@ class RePaintPipeline(DiffusionPipeline):
     ) -> Union[ImagePipelineOutput, Tuple]:
         r"""
         Args:
-            image (`paddle.Tensor` or `PIL.Image.Image`):
-                The original image to inpaint on.
-            mask_image (`paddle.Tensor` or `PIL.Image.Image`):
-                The mask_image where 0.0 values define which part of the original image to inpaint (change).
+            image (`paddle.Tensor`, `PIL.Image.Image` or `List[PIL.Image.Image]`):
+                The original image(s) to inpaint on.
+            mask_image (`paddle.Tensor`, `PIL.Image.Image` or `List[PIL.Image.Image]`):
+                The mask_image where 0.0 values define which part of the original image to inpaint (change). Every
+                image of the batch can have its own mask. A single mask is applied to all images, and a single image
+                is inpainted with every mask of the batch.
             num_inference_steps (`int`, *optional*, defaults to 1000):
                 The number of denoising steps. More denoising steps usually lead to a higher quality image at the
                 expense of slower inference.
@@ -131,6 +135,19 @@ class RePaintPipeline(DiffusionPipeline):
         original_image = original_image.cast(self.unet.dtype)
         mask_image = _preprocess_mask(mask_image)
         mask_image = mask_image.cast(self.unet.dtype)
+        if mask_image.ndim == 3:
+            mask_image = mask_image.unsqueeze(1)
+
+        if original_image.shape[0] != mask_image.shape[0]:
+            if original_image.shape[0] == 1:
+                original_image = original_image.expand([mask_image.shape[0]] + original_image.shape[1:])
+            elif mask_image.shape[0] == 1:
+                mask_image = mask_image.expand([original_image.shape[0]] + mask_image.shape[1:])
+            else:
+                raise ValueError(
+                    f"Got {original_image.shape[0]} images and {mask_image.shape[0]} masks, pass either one mask per"
+                    " image, a single mask or a single image."
+                )
 
         batch_size = original_image.shape[0]
 
@@ -148,10 +165,12 @@ class RePaintPipeline(DiffusionPipeline):
         self.scheduler.set_timesteps(num_inference_steps, jump_length, jump_n_sample)
         self.scheduler.eta = eta
 
-        t_last = self.scheduler.timesteps[0] + 1
-        generator = generator[0] if isinstance(generator, list) else generator
-        for i, t in enumerate(self.progress_bar(self.scheduler.timesteps)):
-            if t < t_last:
+        # the jump schedule is walked on the host, `undo_steps` marks where it goes back up in time
+        timesteps = self.scheduler.timesteps.tolist()
+        undo_steps = self.scheduler.undo_steps
+        t_last = timesteps[0] + 1
+        for i, t in enumerate(self.progress_bar(timesteps)):
+            if not undo_steps[i]:
                 # predict the noise residual
                 model_output = self.unet(image, t).sample
                 # compute previous image: x_t -> x_t-1
@@ -1,3 +1,5 @@
+import math
+
 import paddle
 from paddle.fluid.framework import in_dygraph_mode
 
@@ -198,3 +200,60 @@ def quantile(x, q, axis=None, keepdim=False):
 
     """
     return _compute_quantile(x, q, axis=axis, keepdim=keepdim, ignore_nan=False)
+
+
+def topk_quantile(x, q):
+    """
+    Compute the quantiles of the last axis of the input with a single partial sort.
+
+    Only the values above the lowest requested quantile are sorted (with ``paddle.topk``), which is much cheaper than
+    sorting the whole axis for the high quantiles used as thresholds. The interpolation matches ``quantile``.
+
+    Args:
+        x (Tensor): The input Tensor, it's data type can be float16, float32, float64. NaN values are not supported.
+        q (float|list|tuple): The q for calculate quantile, which should be in range [0, 1]. If q is a list or tuple,
+            it holds one q for each entry of the first axis of ``x``.
+
+    Returns:
+        Tensor, the quantiles, of shape ``x.shape[:-1]`` and data type float64.
+
+    Examples:
+        .. code-block:: python
+
+            import paddle
+
+            y = paddle.arange(0, 8 ,dtype="float32").reshape([2, 4])
+            y1 = topk_quantile(y, q=[0.5, 0.9])
+            # Tensor(shape=[2], dtype=float64, place=Place(cpu), stop_gradient=True,
+            #        [1.50000000, 6.70000000])
+    """
+    if isinstance(q, (int, float)):
+        q = [q] * x.shape[0]
+    elif not isinstance(q, (list, tuple)):
+        raise TypeError("Type of q should be int, float, list or tuple.")
+    elif len(q) != x.shape[0]:
+        raise ValueError(f"q should hold one value per entry of the first axis of x ({x.shape[0]}), got {len(q)}.")
+    if any(q_num < 0 or q_num > 1 for q_num in q):
+        raise ValueError("q should be in range [0, 1]")
+
+    # positions in the ascending order, as in `quantile`
+    last_index = x.shape[-1] - 1
+    indices = [q_num * last_index for q_num in q]
+    indices_below = [math.floor(index) for index in indices]
+    indices_upper = [math.ceil(index) for index in indices]
+
+    # the largest values in descending order, down to the lowest position needed
+    k = last_index + 1 - min(indices_below)
+    sorted_tensor, _ = paddle.topk(x, k=k, axis=-1, largest=True)
+
+    index_shape = [x.shape[0]] + [1] * (len(x.shape) - 1)
+    gather_shape = list(x.shape[:-1]) + [1]
+    positions_below = paddle.to_tensor([last_index - i for i in indices_below], dtype="int64").reshape(index_shape)
+    positions_upper = paddle.to_tensor([last_index - i for i in indices_upper], dtype="int64").reshape(index_shape)
+    tensor_below = paddle.take_along_axis(sorted_tensor, positions_below.expand(gather_shape), axis=-1)
+    tensor_upper = paddle.take_along_axis(sorted_tensor, positions_upper.expand(gather_shape), axis=-1)
+    weights = paddle.to_tensor(
+        [index - below for index, below in zip(indices, indices_below)], dtype="float64"
+    ).reshape(index_shape)
+    out = paddle.lerp(tensor_below.astype("float64"), tensor_upper.astype("float64"), weights)
+    return out.squeeze(-1)
@@ -16,18 +16,19 @@ import inspect
 from itertools import repeat
 from typing import Callable, List, Optional, Union
 
+import numpy as np
 import paddle
 
 from paddlenlp.transformers import CLIPFeatureExtractor, CLIPTextModel, CLIPTokenizer
 
 from ...models import AutoencoderKL, UNet2DConditionModel
 from ...pipeline_utils import DiffusionPipeline
-from ...pipelines.stable_diffusion.safety_checker import StableDiffusionSafetyChecker
+from ...pipelines.stable_diffusion.safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 from ...schedulers import KarrasDiffusionSchedulers
 from ...utils import logging, randn_tensor
 from . import SemanticStableDiffusionPipelineOutput
 
-from .custom_quantile import quantile
+from .custom_quantile import topk_quantile
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 EXAMPLE_DOC_STRING = """
@@ -502,6 +503,29 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
         # 6. Prepare extra step kwargs.
         extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
 
+        # 7. Per concept semantic guidance parameters, the concepts are handled together along a leading axis
+        if enable_edit_guidance:
+
+            def per_concept(value, default=None):
+                if isinstance(value, list):
+                    return value
+                return [default if value is None else value] * enabled_editing_prompts
+
+            edit_guidance_scales = paddle.to_tensor(
+                [
+                    -scale if reverse else scale
+                    for scale, reverse in zip(
+                        per_concept(edit_guidance_scale), per_concept(reverse_editing_direction)
+                    )
+                ],
+                dtype=text_embeddings.dtype,
+            ).reshape([enabled_editing_prompts, 1, 1, 1, 1])
+            edit_thresholds = per_concept(edit_threshold)
+            edit_concept_weights = np.array(edit_weights if edit_weights else per_concept(1.0), dtype="float64")
+            edit_warmup_steps_c = np.array(per_concept(edit_warmup_steps))
+            # concepts without cooldown are guided until the last step
+            edit_cooldown_steps_c = np.array(per_concept(edit_cooldown_steps, default=float("inf")), dtype="float64")
+
         # Initialize edit_momentum to None
         edit_momentum = None
 
@@ -524,7 +548,10 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
             if do_classifier_free_guidance:
                 noise_pred_out = noise_pred.chunk(2 + enabled_editing_prompts)  # [b,4, 64, 64]
                 noise_pred_uncond, noise_pred_text = noise_pred_out[0], noise_pred_out[1]
-                noise_pred_edit_concepts = noise_pred_out[2:]
+                # [c, b, 4, 64, 64]
+                noise_pred_edit_concepts = noise_pred[2 * noise_pred_uncond.shape[0] :].reshape(
+                    [enabled_editing_prompts, *noise_pred_uncond.shape]
+                )
 
                 # default text guidance
                 noise_guidance = guidance_scale * (noise_pred_text - noise_pred_uncond)
@@ -539,9 +566,7 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
                 self.text_estimates[i] = noise_pred_text.detach()
 
                 if self.edit_estimates is None and enable_edit_guidance:
-                    self.edit_estimates = paddle.zeros(
-                        (num_inference_steps + 1, len(noise_pred_edit_concepts), *noise_pred_edit_concepts[0].shape)
-                    )
+                    self.edit_estimates = paddle.zeros((num_inference_steps + 1, *noise_pred_edit_concepts.shape))
 
                 if self.sem_guidance is None:
                     self.sem_guidance = paddle.zeros((num_inference_steps + 1, *noise_pred_text.shape))
@@ -550,93 +575,39 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
                     edit_momentum = paddle.zeros_like(noise_guidance)
 
                 if enable_edit_guidance:
-                    concept_weights = paddle.zeros(
-                        (len(noise_pred_edit_concepts), noise_guidance.shape[0]),
-                        dtype=noise_guidance.dtype,
+                    self.edit_estimates[i] = noise_pred_edit_concepts
+                    warmup_mask = i >= edit_warmup_steps_c
+                    cooldown_mask = i >= edit_cooldown_steps_c
+
+                    noise_guidance_edit = (noise_pred_edit_concepts - noise_pred_uncond) * edit_guidance_scales
+
+                    # keep, for every concept, image and channel, the values above the `edit_threshold` quantile
+                    # (computed in float32 at least)
+                    noise_guidance_edit_abs = paddle.abs(noise_guidance_edit)
+                    quantile_input = noise_guidance_edit_abs.flatten(3)
+                    if quantile_input.dtype != paddle.float32:
+                        quantile_input = quantile_input.cast(paddle.float32)
+                    tmp = topk_quantile(quantile_input, edit_thresholds).cast(noise_guidance_edit.dtype)
+                    noise_guidance_edit = paddle.where(
+                        noise_guidance_edit_abs >= tmp[:, :, :, None, None],
+                        noise_guidance_edit,
+                        paddle.zeros_like(noise_guidance_edit),
                     )
-                    noise_guidance_edit = paddle.zeros(
-                        (len(noise_pred_edit_concepts), *noise_guidance.shape),
-                        dtype=noise_guidance.dtype,
-                    )
-                    # noise_guidance_edit = torch.zeros_like(noise_guidance)
-                    warmup_inds = []
-                    for c, noise_pred_edit_concept in enumerate(noise_pred_edit_concepts):
-                        self.edit_estimates[i, c] = noise_pred_edit_concept
-                        if isinstance(edit_guidance_scale, list):
-                            edit_guidance_scale_c = edit_guidance_scale[c]
-                        else:
-                            edit_guidance_scale_c = edit_guidance_scale
-
-                        if isinstance(edit_threshold, list):
-                            edit_threshold_c = edit_threshold[c]
-                        else:
-                            edit_threshold_c = edit_threshold
-                        if isinstance(reverse_editing_direction, list):
-                            reverse_editing_direction_c = reverse_editing_direction[c]
-                        else:
-                            reverse_editing_direction_c = reverse_editing_direction
-                        if edit_weights:
-                            edit_weight_c = edit_weights[c]
-                        else:
-                            edit_weight_c = 1.0
-                        if isinstance(edit_warmup_steps, list):
-                            edit_warmup_steps_c = edit_warmup_steps[c]
-                        else:
-                            edit_warmup_steps_c = edit_warmup_steps
-
-                        if isinstance(edit_cooldown_steps, list):
-                            edit_cooldown_steps_c = edit_cooldown_steps[c]
-                        elif edit_cooldown_steps is None:
-                            edit_cooldown_steps_c = i + 1
-                        else:
-                            edit_cooldown_steps_c = edit_cooldown_steps
-                        if i >= edit_warmup_steps_c:
-                            warmup_inds.append(c)
-                        if i >= edit_cooldown_steps_c:
-                            noise_guidance_edit[c, :, :, :, :] = paddle.zeros_like(noise_pred_edit_concept)
-                            continue
-
-                        noise_guidance_edit_tmp = noise_pred_edit_concept - noise_pred_uncond
-                        # tmp_weights = (noise_pred_text - noise_pred_edit_concept).sum(dim=(1, 2, 3))
-                        tmp_weights = (noise_guidance - noise_pred_edit_concept).sum((1, 2, 3))
-
-                        tmp_weights = paddle.full_like(tmp_weights, edit_weight_c)  # * (1 / enabled_editing_prompts)
-                        if reverse_editing_direction_c:
-                            noise_guidance_edit_tmp = noise_guidance_edit_tmp * -1
-                        concept_weights[c, :] = tmp_weights
-
-                        noise_guidance_edit_tmp = noise_guidance_edit_tmp * edit_guidance_scale_c
-
-                        # quantile function expects float32
-                        if noise_guidance_edit_tmp.dtype == paddle.float32:
-                            tmp = quantile(
-                                paddle.abs(noise_guidance_edit_tmp).flatten(2),
-                                edit_threshold_c,
-                                axis=2,
-                                keepdim=False,
-                            )
-                        else:
-                            tmp = quantile(
-                                paddle.abs(noise_guidance_edit_tmp).flatten(2).cast(paddle.float32),
-                                edit_threshold_c,
-                                axis=2,
-                                keepdim=False,
-                            ).cast(noise_guidance_edit_tmp.dtype)
-
-                        noise_guidance_edit_tmp = paddle.where(
-                            paddle.abs(noise_guidance_edit_tmp) >= tmp[:, :, None, None],
-                            noise_guidance_edit_tmp,
-                            paddle.zeros_like(noise_guidance_edit_tmp),
-                        )
-                        noise_guidance_edit[c, :, :, :, :] = noise_guidance_edit_tmp
-
-                        # noise_guidance_edit = noise_guidance_edit + noise_guidance_edit_tmp
 
-                    warmup_inds = paddle.to_tensor(warmup_inds)
-                    if len(noise_pred_edit_concepts) > warmup_inds.shape[0] > 0:
-                        # concept_weights = concept_weights.to("cpu")  # Offload to cpu
-                        # noise_guidance_edit = noise_guidance_edit.to("cpu")
+                    # concepts past their cooldown do not contribute
+                    if cooldown_mask.any():
+                        noise_guidance_edit = paddle.where(
+                            paddle.to_tensor(~cooldown_mask).reshape([enabled_editing_prompts, 1, 1, 1, 1]),
+                            noise_guidance_edit,
+                            paddle.zeros_like(noise_guidance_edit),
+                        )
+                    concept_weights = paddle.to_tensor(
+                        np.where(cooldown_mask, 0.0, edit_concept_weights), dtype=noise_guidance.dtype
+                    )
+                    concept_weights = concept_weights.unsqueeze(1).tile([1, noise_guidance.shape[0]])
 
+                    warmup_inds = paddle.to_tensor(np.nonzero(warmup_mask)[0])
+                    if enabled_editing_prompts > warmup_inds.shape[0] > 0:
                         concept_weights_tmp = paddle.index_select(concept_weights, warmup_inds, 0)
                         concept_weights_tmp = paddle.where(
                             concept_weights_tmp < 0, paddle.zeros_like(concept_weights_tmp), concept_weights_tmp
@@ -648,15 +619,12 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
                         noise_guidance_edit_tmp = paddle.einsum(
                             "cb,cbijk->bijk", concept_weights_tmp, noise_guidance_edit_tmp
                         )
-                        noise_guidance_edit_tmp = noise_guidance_edit_tmp
                         noise_guidance = noise_guidance + noise_guidance_edit_tmp
 
                         self.sem_guidance[i] = noise_guidance_edit_tmp.detach()
 
                         del noise_guidance_edit_tmp
                         del concept_weights_tmp
-                        concept_weights = concept_weights
-                        noise_guidance_edit = noise_guidance_edit
 
                     concept_weights = paddle.where(
                         concept_weights < 0, paddle.zeros_like(concept_weights), concept_weights
@@ -669,7 +637,7 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
 
                     edit_momentum = edit_mom_beta * edit_momentum + (1 - edit_mom_beta) * noise_guidance_edit
 
-                    if warmup_inds.shape[0] == len(noise_pred_edit_concepts):
+                    if warmup_inds.shape[0] == enabled_editing_prompts:
                         noise_guidance = noise_guidance + noise_guidance_edit
                         self.sem_guidance[i] = noise_guidance_edit.detach()
 
@@ -690,10 +658,8 @@ class SemanticStableDiffusionPipeline(DiffusionPipeline):
         image = self.decode_latents(latents)
 
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(text_embeddings.dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, text_embeddings.dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
 
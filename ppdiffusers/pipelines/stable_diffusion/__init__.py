@@ -53,6 +53,8 @@ try:
 except OptionalDependencyNotAvailable:
     from ...utils.dummy_paddle_and_paddlenlp_objects import *  # noqa F403
 else:
+    from .batching import GenerationRequest
+    from .inversion_utils import DiffusionInversion, InversionCache
     from .pipeline_cycle_diffusion import CycleDiffusionPipeline
     from .pipeline_stable_diffusion import StableDiffusionPipeline
     from .pipeline_stable_diffusion_all_in_one import StableDiffusionPipelineAllinOne
@@ -0,0 +1,88 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+
+@dataclass
+class GenerationRequest:
+    """
+    An image to generate with [`~StableDiffusionPipeline.generate_batch`].
+
+    Args:
+        prompt (`str`): the prompt.
+        negative_prompt (`str`, *optional*): the negative prompt.
+        height (`int`, *optional*): the height in pixels of the image, defaults to the one of the pipeline.
+        width (`int`, *optional*): the width in pixels of the image, defaults to the one of the pipeline.
+        seed (`int`, *optional*):
+            The seed of the initial latents, the image is then the one of a single call with the generator
+            `paddle.Generator().manual_seed(seed)`. A random seed is drawn if `None`.
+        guidance_scale (`float` or `List[float]`, *optional*, defaults to 7.5): the classifier free guidance scale.
+        num_inference_steps (`int`, *optional*, defaults to 50): the number of denoising steps.
+    """
+
+    prompt: str
+    negative_prompt: Optional[str] = None
+    height: Optional[int] = None
+    width: Optional[int] = None
+    seed: Optional[int] = None
+    guidance_scale: Union[float, List[float]] = 7.5
+    num_inference_steps: int = 50
+
+
+def group_requests(
+    requests: List[GenerationRequest],
+    default_size: int,
+    max_batch_size: int = 8,
+    max_batch_pixels: Optional[int] = None,
+) -> List[List[int]]:
+    """
+    Groups the indices of `requests` into sub-batches of requests with the same image size and denoising settings,
+    which can share the UNet calls of a single pipeline call. The sub-batches follow the order of their first request.
+
+    Args:
+        requests (`List[GenerationRequest]`): the requests.
+        default_size (`int`): the height and width of the requests without one.
+        max_batch_size (`int`, *optional*, defaults to 8): the largest number of images of a sub-batch.
+        max_batch_pixels (`int`, *optional*):
+            The largest number of pixels of a sub-batch, so that the sub-batches of smaller images hold more images.
+    """
+    groups = OrderedDict()
+    for index, request in enumerate(requests):
+        guidance_scale = request.guidance_scale
+        if isinstance(guidance_scale, (list, tuple)):
+            guidance_scale = tuple(guidance_scale)
+        key = (
+            request.height or default_size,
+            request.width or default_size,
+            request.num_inference_steps,
+            guidance_scale,
+        )
+        groups.setdefault(key, []).append(index)
+
+    batches = []
+    for (height, width, _, _), rows in groups.items():
+        batch_size = max_batch_size
+        if max_batch_pixels is not None:
+            batch_size = max(1, min(batch_size, max_batch_pixels // (height * width)))
+        batches.extend(rows[start : start + batch_size] for start in range(0, len(rows), batch_size))
+    return batches
+
+
+def request_seeds(requests: List[GenerationRequest]) -> List[int]:
+    """Returns the seed of every request, drawing the ones left to `None`."""
+    return [request.seed if request.seed is not None else random.getrandbits(32) for request in requests]
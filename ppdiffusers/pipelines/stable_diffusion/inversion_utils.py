@@ -0,0 +1,110 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+import paddle
+
+from ..image_cache import hash_image
+
+
+@dataclass
+class DiffusionInversion:
+    """
+    The result of inverting a source image, reusable by every edit of that image.
+
+    Args:
+        latents (`paddle.Tensor`):
+            The latents the edit starts from, e.g. the inverted noise of DDIM inversion or the noised image latents of
+            CycleDiffusion.
+        timesteps (`List[int]`):
+            The timesteps the per step entries refer to, in the order of the edit.
+        prompt_embeds (`paddle.Tensor`, *optional*):
+            The embeddings of the source caption (without the unconditional embeddings).
+        step_latents (`List[paddle.Tensor]`, *optional*):
+            The latents of the source trajectory at every step of `timesteps`.
+        step_noise (`List[paddle.Tensor]`, *optional*):
+            The noise steering the edit at every step of `timesteps` (CycleDiffusion).
+        cross_attention_maps (`Dict[str, Dict[int, paddle.Tensor]]`, *optional*):
+            The reference cross attention probabilities of the source image, by attention processor and timestep
+            (Pix2Pix Zero).
+        config (`Dict[str, Any]`):
+            The arguments the inversion was computed with, an edit only reuses the entries computed with its own
+            arguments.
+    """
+
+    latents: paddle.Tensor
+    timesteps: List[int]
+    prompt_embeds: Optional[paddle.Tensor] = None
+    step_latents: Optional[List[paddle.Tensor]] = None
+    step_noise: Optional[List[paddle.Tensor]] = None
+    cross_attention_maps: Optional[Dict[str, Dict[int, paddle.Tensor]]] = None
+    config: Dict[str, Any] = field(default_factory=dict)
+
+    def matches(self, **config) -> bool:
+        """Whether the inversion was computed with the given arguments."""
+        return all(self.config.get(key) == value for key, value in config.items())
+
+    def save(self, path: str):
+        """Saves the inversion to `path` with `paddle.save`."""
+        paddle.save({f.name: getattr(self, f.name) for f in fields(self)}, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DiffusionInversion":
+        """Loads an inversion saved with [`~DiffusionInversion.save`]."""
+        state = paddle.load(path)
+        return cls(**state)
+
+
+class InversionCache:
+    """
+    A least recently used cache of [`DiffusionInversion`], keyed by the content of the source image and the
+    arguments of the inversion.
+
+    Args:
+        max_entries (`int`, *optional*, defaults to 8): the number of inversions kept.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(image, **config) -> str:
+        """Builds the cache key of `image` inverted with the arguments `config` (JSON serializable values)."""
+        return hash_image(image) + json.dumps(config, sort_keys=True, default=str)
+
+    def get(self, key: str) -> Optional[DiffusionInversion]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: str, inversion: DiffusionInversion):
+        self._entries[key] = inversion
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -27,9 +27,11 @@ from ...configuration_utils import FrozenDict
 from ...models import AutoencoderKL, UNet2DConditionModel
 from ...schedulers import DDIMScheduler
 from ...utils import PIL_INTERPOLATION, deprecate, logging, randn_tensor
+from ...utils.paddle_utils import get_rng_state_tracker
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .inversion_utils import DiffusionInversion, InversionCache
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -416,10 +418,8 @@ class CycleDiffusionPipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -435,11 +435,19 @@ class CycleDiffusionPipeline(DiffusionPipeline):
 
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion_img2img.StableDiffusionImg2ImgPipeline.get_timesteps
     def get_timesteps(self, num_inference_steps, strength):
+        # adaptive schedulers only know their next timestep, they can not start from the middle of the schedule
+        if not hasattr(self.scheduler.timesteps, "__getitem__"):
+            raise ValueError(
+                f"{self.scheduler.__class__.__name__} chooses its timesteps while sampling and does not support"
+                " `strength`, use a scheduler with a fixed schedule to start from an image."
+            )
+
         # get the original timestep using init_timestep
         init_timestep = min(int(num_inference_steps * strength), num_inference_steps)
 
         t_start = max(num_inference_steps - init_timestep, 0)
-        timesteps = self.scheduler.timesteps[t_start:]
+        # schedulers of order > 1 (e.g. Heun) evaluate the model `order` times per step
+        timesteps = self.scheduler.timesteps[t_start * self.scheduler.order :]
 
         return timesteps, num_inference_steps - t_start
 
@@ -492,11 +500,133 @@ class CycleDiffusionPipeline(DiffusionPipeline):
 
         return latents, clean_latents
 
+    @paddle.no_grad()
+    def invert(
+        self,
+        source_prompt: Union[str, List[str]],
+        image: Union[paddle.Tensor, PIL.Image.Image],
+        strength: float = 0.8,
+        num_inference_steps: Optional[int] = 50,
+        source_guidance_scale: Optional[float] = 1,
+        num_images_per_prompt: Optional[int] = 1,
+        eta: Optional[float] = 0.1,
+        generator: Optional[Union[paddle.Generator, List[paddle.Generator]]] = None,
+        inversion_cache: Optional[InversionCache] = None,
+    ) -> DiffusionInversion:
+        r"""
+        Runs the source branch of CycleDiffusion: encodes and noises `image`, then records the noise that steers the
+        source latents along their posterior at every step. Any number of target prompts can then be edited from the
+        returned inversion without running the source branch again.
+
+        Args:
+            source_prompt (`str` or `List[str]`):
+                The source prompt or prompts describe the input image.
+            image (`paddle.Tensor` or `PIL.Image.Image`):
+                `Image`, or tensor representing an image batch, that will be used as the starting point for the
+                process.
+            strength (`float`, *optional*, defaults to 0.8):
+                How much to transform the reference `image`, see the pipeline call.
+            num_inference_steps (`int`, *optional*, defaults to 50):
+                The number of denoising steps, modulated by `strength`.
+            source_guidance_scale (`float`, *optional*, defaults to 1):
+                Guidance scale for the source prompt.
+            num_images_per_prompt (`int`, *optional*, defaults to 1):
+                The number of images to generate per prompt.
+            eta (`float`, *optional*, defaults to 0.1):
+                Corresponds to parameter eta (η) in the DDIM paper: https://arxiv.org/abs/2010.02502.
+            generator (`paddle.Generator`, *optional*):
+                One or a list of paddle generator(s) to make generation deterministic.
+            inversion_cache (`InversionCache`, *optional*):
+                A cache of inversions. An image already inverted with the same prompt, settings, scheduler config and
+                generator state is not inverted again, its cached inversion (and so its noise sample) is returned.
+
+        Returns:
+            [`DiffusionInversion`]: the noised image latents, and the source latents and noise of every step.
+        """
+        self.check_inputs(source_prompt, strength, 1)
+
+        inversion_config = {
+            "source_prompt": source_prompt,
+            "strength": strength,
+            "num_inference_steps": num_inference_steps,
+            "source_guidance_scale": source_guidance_scale,
+            "num_images_per_prompt": num_images_per_prompt,
+            "eta": eta,
+            "scheduler": [self.scheduler.__class__.__name__, dict(self.scheduler.config)],
+            # the generator draws the noised latents and the posterior samples
+            "generator": get_rng_state_tracker().state_key(generator),
+        }
+        if inversion_cache is not None:
+            cache_key = inversion_cache.make_key(image, **inversion_config)
+            inversion = inversion_cache.get(cache_key)
+            if inversion is not None:
+                return inversion
+
+        batch_size = 1 if isinstance(source_prompt, str) else len(source_prompt)
+        # with a source guidance scale of 1 the guided prediction is the conditional one
+        do_source_guidance = source_guidance_scale != 1
+        source_prompt_embeds = self._encode_prompt(source_prompt, num_images_per_prompt, do_source_guidance, None)
+
+        image = preprocess(image)
+
+        self.scheduler.set_timesteps(num_inference_steps)
+        timesteps, num_inference_steps = self.get_timesteps(num_inference_steps, strength)
+        latent_timestep = timesteps[:1].tile([batch_size * num_images_per_prompt])
+
+        latents, clean_latents = self.prepare_latents(
+            image, latent_timestep, batch_size, num_images_per_prompt, source_prompt_embeds.dtype, generator
+        )
+        source_latents = latents
+
+        extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
+        generator = extra_step_kwargs.pop("generator", None)
+
+        step_latents, step_noise = [], []
+        with self.progress_bar(total=num_inference_steps) as progress_bar:
+            for t in timesteps:
+                source_latent_model_input = (
+                    paddle.concat([source_latents] * 2) if do_source_guidance else source_latents
+                )
+                source_latent_model_input = self.scheduler.scale_model_input(source_latent_model_input, t)
+                source_noise_pred = self.unet(
+                    source_latent_model_input, t, encoder_hidden_states=source_prompt_embeds
+                ).sample
+                if do_source_guidance:
+                    source_noise_pred_uncond, source_noise_pred_text = source_noise_pred.chunk(2)
+                    source_noise_pred = source_noise_pred_uncond + source_guidance_scale * (
+                        source_noise_pred_text - source_noise_pred_uncond
+                    )
+
+                # Sample source_latents from the posterior distribution.
+                prev_source_latents = posterior_sample(
+                    self.scheduler, source_latents, t, clean_latents, generator=generator, **extra_step_kwargs
+                )
+                # Compute noise.
+                noise = compute_noise(
+                    self.scheduler, prev_source_latents, source_latents, t, source_noise_pred, **extra_step_kwargs
+                )
+                source_latents = prev_source_latents
+                step_latents.append(source_latents)
+                step_noise.append(noise)
+                progress_bar.update()
+
+        inversion = DiffusionInversion(
+            latents=latents,
+            timesteps=[int(t) for t in timesteps],
+            prompt_embeds=source_prompt_embeds[-batch_size * num_images_per_prompt :],
+            step_latents=step_latents,
+            step_noise=step_noise,
+            config=inversion_config,
+        )
+        if inversion_cache is not None:
+            inversion_cache.put(cache_key, inversion)
+        return inversion
+
     @paddle.no_grad()
     def __call__(
         self,
         prompt: Union[str, List[str]],
-        source_prompt: Union[str, List[str]],
+        source_prompt: Union[str, List[str]] = None,
         image: Union[paddle.Tensor, PIL.Image.Image] = None,
         strength: float = 0.8,
         num_inference_steps: Optional[int] = 50,
@@ -512,6 +642,7 @@ class CycleDiffusionPipeline(DiffusionPipeline):
         return_dict: bool = True,
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
+        inversion: Optional[DiffusionInversion] = None,
         **kwargs,
     ):
         r"""
@@ -573,6 +704,9 @@ class CycleDiffusionPipeline(DiffusionPipeline):
             callback_steps (`int`, *optional*, defaults to 1):
                 The frequency at which the `callback` function will be called. If not specified, the callback will be
                 called at every step.
+            inversion (`DiffusionInversion`, *optional*):
+                The inversion of the image returned by [`~CycleDiffusionPipeline.invert`]. `source_prompt`, `image`
+                and `generator` are then unused and the UNet only runs on the target prompt.
 
         Returns:
             [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] or `tuple`:
@@ -587,6 +721,27 @@ class CycleDiffusionPipeline(DiffusionPipeline):
 
         # 1. Check inputs
         self.check_inputs(prompt, strength, callback_steps)
+        if inversion is not None:
+            if not inversion.matches(strength=strength, num_inference_steps=num_inference_steps, eta=eta):
+                raise ValueError(
+                    "The inversion was computed with `strength`, `num_inference_steps` and `eta`"
+                    f" {[inversion.config.get(k) for k in ['strength', 'num_inference_steps', 'eta']]}, but got"
+                    f" {[strength, num_inference_steps, eta]}."
+                )
+            return self._edit_from_inversion(
+                prompt,
+                inversion,
+                guidance_scale=guidance_scale,
+                negative_prompt=negative_prompt,
+                num_images_per_prompt=num_images_per_prompt,
+                eta=eta,
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_prompt_embeds,
+                output_type=output_type,
+                return_dict=return_dict,
+                callback=callback,
+                callback_steps=callback_steps,
+            )
 
         # 2. Define call parameters
         batch_size = 1 if isinstance(prompt, str) else len(prompt)
@@ -706,3 +861,73 @@ class CycleDiffusionPipeline(DiffusionPipeline):
             return (image, has_nsfw_concept)
 
         return StableDiffusionPipelineOutput(images=image, nsfw_content_detected=has_nsfw_concept)
+
+    def _edit_from_inversion(
+        self,
+        prompt,
+        inversion,
+        guidance_scale,
+        negative_prompt,
+        num_images_per_prompt,
+        eta,
+        prompt_embeds,
+        negative_prompt_embeds,
+        output_type,
+        return_dict,
+        callback,
+        callback_steps,
+    ):
+        do_classifier_free_guidance = guidance_scale > 1.0
+        prompt_embeds = self._encode_prompt(
+            prompt,
+            num_images_per_prompt,
+            do_classifier_free_guidance,
+            negative_prompt=negative_prompt,
+            prompt_embeds=prompt_embeds,
+            negative_prompt_embeds=negative_prompt_embeds,
+        )
+
+        self.scheduler.set_timesteps(inversion.config["num_inference_steps"])
+        timesteps, num_inference_steps = self.get_timesteps(
+            inversion.config["num_inference_steps"], inversion.config["strength"]
+        )
+        if [int(t) for t in timesteps] != inversion.timesteps:
+            raise ValueError(
+                f"The inversion was computed on the timesteps {inversion.timesteps}, but the scheduler gives"
+                f" {[int(t) for t in timesteps]}."
+            )
+
+        extra_step_kwargs = self.prepare_extra_step_kwargs(None, eta)
+        extra_step_kwargs.pop("generator", None)
+
+        latents = inversion.latents
+        num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        with self.progress_bar(total=num_inference_steps) as progress_bar:
+            for i, t in enumerate(timesteps):
+                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
+                noise_pred = self.unet(latent_model_input, t, encoder_hidden_states=prompt_embeds).sample
+
+                if do_classifier_free_guidance:
+                    noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+                # the recorded source noise replaces the variance noise of the step
+                latents = self.scheduler.step(
+                    noise_pred, t, latents, variance_noise=inversion.step_noise[i], **extra_step_kwargs
+                ).prev_sample
+
+                if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
+                    progress_bar.update()
+                    if callback is not None and i % callback_steps == 0:
+                        callback(i, t, latents)
+
+        image = self.decode_latents(latents)
+        image, has_nsfw_concept = self.run_safety_checker(image, prompt_embeds.dtype)
+        if output_type == "pil":
+            image = self.numpy_to_pil(image)
+
+        if not return_dict:
+            return (image, has_nsfw_concept)
+
+        return StableDiffusionPipelineOutput(images=image, nsfw_content_detected=has_nsfw_concept)
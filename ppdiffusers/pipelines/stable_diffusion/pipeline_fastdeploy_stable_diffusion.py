@@ -158,8 +158,9 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
                 f" {self.tokenizer.model_max_length} tokens: {removed_text}"
             )
 
-        text_embeddings = self.text_encoder(input_ids=text_input_ids.astype(np.int64))[0]
-        text_embeddings = np.repeat(text_embeddings, num_images_per_prompt, axis=0)
+        text_embeddings = self._infer_text_encoder(text_input_ids)
+        text_embeddings = paddle.repeat_interleave(text_embeddings, num_images_per_prompt, axis=0)
+
         # get unconditional embeddings for classifier free guidance
         if do_classifier_free_guidance:
             uncond_tokens: List[str]
@@ -189,16 +190,29 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
                 truncation=True,
                 return_tensors="np",
             )
-            uncond_embeddings = self.text_encoder(input_ids=uncond_input.input_ids.astype(np.int64))[0]
-            uncond_embeddings = np.repeat(uncond_embeddings, num_images_per_prompt, axis=0)
+            uncond_embeddings = self._infer_text_encoder(uncond_input.input_ids)
+            uncond_embeddings = paddle.repeat_interleave(uncond_embeddings, num_images_per_prompt, axis=0)
 
             # For classifier free guidance, we need to do two forward passes.
             # Here we concatenate the unconditional and text embeddings into a single batch
             # to avoid doing two forward passes
-            text_embeddings = np.concatenate([uncond_embeddings, text_embeddings])
+            text_embeddings = paddle.concat([uncond_embeddings, text_embeddings])
 
         return text_embeddings
 
+    def _infer_text_encoder(self, input_ids):
+        # the last hidden states, computed on the device without leaving it
+        input_name = self.text_encoder.model.get_input_info(0).name
+        output_info = self.text_encoder.model.get_output_info(0)
+        output_shapes = None
+        if output_info.shape[-1] > 0:
+            output_shapes = {output_info.name: [input_ids.shape[0], input_ids.shape[1], output_info.shape[-1]]}
+        outputs = self.text_encoder.bound_infer(
+            {input_name: paddle.to_tensor(input_ids, dtype="int64")}, output_shapes=output_shapes
+        )
+        # a copy, the next call overwrites the bound output
+        return outputs[output_info.name].clone()
+
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
             safety_checker_input = self.feature_extractor(
@@ -221,16 +235,13 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
         latents = 1 / 0.18215 * latents
         latents_shape = latents.shape
         vae_output_shape = [latents_shape[0], 3, latents_shape[2] * 8, latents_shape[3] * 8]
-        images_vae = paddle.zeros(vae_output_shape, dtype="float32")
 
         vae_input_name = self.vae_decoder.model.get_input_info(0).name
         vae_output_name = self.vae_decoder.model.get_output_info(0).name
 
-        self.vae_decoder.zero_copy_infer(
-            prebinded_inputs={vae_input_name: latents},
-            prebinded_outputs={vae_output_name: images_vae},
-            share_with_raw_ptr=True,
-        )
+        images_vae = self.vae_decoder.bound_infer(
+            {vae_input_name: latents}, output_shapes={vae_output_name: vae_output_shape}
+        )[vae_output_name]
 
         images_vae = paddle.clip(images_vae / 2 + 0.5, 0, 1)
         images = images_vae.transpose([0, 2, 3, 1])
@@ -275,9 +286,11 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
 
         latents_shape = (batch_size, num_channels_latents, height // 8, width // 8)
         if latents is None:
-            latents = generator.randn(*latents_shape).astype(dtype)
-        elif latents.shape != latents_shape:
+            latents = paddle.to_tensor(generator.randn(*latents_shape), dtype=dtype)
+        elif tuple(latents.shape) != latents_shape:
             raise ValueError(f"Unexpected latents shape, got {latents.shape}, expected {latents_shape}")
+        elif isinstance(latents, np.ndarray):
+            latents = paddle.to_tensor(latents, dtype=dtype)
 
         # scale the initial noise by the standard deviation required by the scheduler
         latents = latents * float(self.scheduler.init_noise_sigma)
@@ -384,8 +397,6 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
             generator,
             latents,
         )
-        if isinstance(latents, np.ndarray):
-            latents = paddle.to_tensor(latents)
         # 6. Prepare extra step kwargs.
         extra_step_kwargs = self.prepare_extra_step_kwargs(eta)
         # 7. Denoising loop
@@ -398,11 +409,7 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
         unet_output_name = self.unet.model.get_output_info(0).name
         unet_input_names = [self.unet.model.get_input_info(i).name for i in range(self.unet.model.num_inputs())]
         with self.progress_bar(total=num_inference_steps) as progress_bar:
-            text_embeddings = paddle.to_tensor(text_embeddings, dtype="float32")
             for i, t in enumerate(timesteps):
-                noise_pred_unet = paddle.zeros(
-                    [2 * batch_size * num_images_per_prompt, 4, height // 8, width // 8], dtype="float32"
-                )
                 # expand the latents if we are doing classifier free guidance
                 latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
                 if scheduler_support_kwagrs_scale_input:
@@ -410,20 +417,22 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
                 else:
                     latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
-                # predict the noise residual
-                self.unet.zero_copy_infer(
-                    prebinded_inputs={
+                # predict the noise residual, in the buffers bound at the first step
+                noise_pred_unet = self.unet.bound_infer(
+                    {
                         unet_input_names[0]: latent_model_input,
                         unet_input_names[1]: t,
                         unet_input_names[2]: text_embeddings,
                     },
-                    prebinded_outputs={unet_output_name: noise_pred_unet},
-                    share_with_raw_ptr=True,
-                )
+                    output_shapes={unet_output_name: [latent_model_input.shape[0], 4, height // 8, width // 8]},
+                )[unet_output_name]
                 # perform guidance
                 if do_classifier_free_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred_unet.chunk(2)
                     noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                else:
+                    # the next step overwrites the bound output, and multistep schedulers keep their inputs
+                    noise_pred = noise_pred_unet.clone()
                 # compute the previous noisy sample x_t -> x_t-1
                 if scheduler_support_kwagrs_step:
                     scheduler_output = self.scheduler.step(
@@ -448,7 +457,7 @@ class FastDeployStableDiffusionPipeline(DiffusionPipeline):
         image = self.decode_latents(latents)
         print("decoder latency:", time.perf_counter() - time_start_decoder)
         # 9. Run safety checker
-        image, has_nsfw_concept = self.run_safety_checker(image, text_embeddings.dtype)
+        image, has_nsfw_concept = self.run_safety_checker(image, image.dtype)
 
         # 10. Convert to PIL
         if output_type == "pil":
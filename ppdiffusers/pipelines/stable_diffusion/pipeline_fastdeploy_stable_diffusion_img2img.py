@@ -138,6 +138,7 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
         )
         self.register_to_config(requires_safety_checker=requires_safety_checker)
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline._encode_prompt
     def _encode_prompt(self, prompt, num_images_per_prompt, do_classifier_free_guidance, negative_prompt):
         r"""
         Encodes the prompt into text encoder hidden states.
@@ -173,8 +174,8 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
                 f" {self.tokenizer.model_max_length} tokens: {removed_text}"
             )
 
-        text_embeddings = self.text_encoder(input_ids=text_input_ids.astype(np.int64))[0]
-        text_embeddings = np.repeat(text_embeddings, num_images_per_prompt, axis=0)
+        text_embeddings = self._infer_text_encoder(text_input_ids)
+        text_embeddings = paddle.repeat_interleave(text_embeddings, num_images_per_prompt, axis=0)
 
         # get unconditional embeddings for classifier free guidance
         if do_classifier_free_guidance:
@@ -205,16 +206,31 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
                 truncation=True,
                 return_tensors="np",
             )
-            uncond_embeddings = self.text_encoder(input_ids=uncond_input.input_ids.astype(np.int64))[0]
-            uncond_embeddings = np.repeat(uncond_embeddings, num_images_per_prompt, axis=0)
+            uncond_embeddings = self._infer_text_encoder(uncond_input.input_ids)
+            uncond_embeddings = paddle.repeat_interleave(uncond_embeddings, num_images_per_prompt, axis=0)
 
             # For classifier free guidance, we need to do two forward passes.
             # Here we concatenate the unconditional and text embeddings into a single batch
             # to avoid doing two forward passes
-            text_embeddings = np.concatenate([uncond_embeddings, text_embeddings])
+            text_embeddings = paddle.concat([uncond_embeddings, text_embeddings])
 
         return text_embeddings
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline._infer_text_encoder
+    def _infer_text_encoder(self, input_ids):
+        # the last hidden states, computed on the device without leaving it
+        input_name = self.text_encoder.model.get_input_info(0).name
+        output_info = self.text_encoder.model.get_output_info(0)
+        output_shapes = None
+        if output_info.shape[-1] > 0:
+            output_shapes = {output_info.name: [input_ids.shape[0], input_ids.shape[1], output_info.shape[-1]]}
+        outputs = self.text_encoder.bound_infer(
+            {input_name: paddle.to_tensor(input_ids, dtype="int64")}, output_shapes=output_shapes
+        )
+        # a copy, the next call overwrites the bound output
+        return outputs[output_info.name].clone()
+
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
             safety_checker_input = self.feature_extractor(
@@ -233,14 +249,22 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
             has_nsfw_concept = None
         return image, has_nsfw_concept
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline.decode_latents
     def decode_latents(self, latents):
         latents = 1 / 0.18215 * latents
-        image = np.concatenate(
-            [self.vae_decoder(latent_sample=latents[i : i + 1])[0] for i in range(latents.shape[0])]
-        )
-        image = np.clip(image / 2 + 0.5, 0, 1)
-        image = image.transpose([0, 2, 3, 1])
-        return image
+        latents_shape = latents.shape
+        vae_output_shape = [latents_shape[0], 3, latents_shape[2] * 8, latents_shape[3] * 8]
+
+        vae_input_name = self.vae_decoder.model.get_input_info(0).name
+        vae_output_name = self.vae_decoder.model.get_output_info(0).name
+
+        images_vae = self.vae_decoder.bound_infer(
+            {vae_input_name: latents}, output_shapes={vae_output_name: vae_output_shape}
+        )[vae_output_name]
+
+        images_vae = paddle.clip(images_vae / 2 + 0.5, 0, 1)
+        images = images_vae.transpose([0, 2, 3, 1])
+        return images.numpy()
 
     def prepare_extra_step_kwargs(self, eta):
         # prepare extra kwargs for the scheduler step, since not all schedulers have the same signature
@@ -271,6 +295,13 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
             )
 
     def get_timesteps(self, num_inference_steps, strength):
+        # adaptive schedulers only know their next timestep, they can not start from the middle of the schedule
+        if not hasattr(self.scheduler.timesteps, "__getitem__"):
+            raise ValueError(
+                f"{self.scheduler.__class__.__name__} chooses its timesteps while sampling and does not support"
+                " `strength`, use a scheduler with a fixed schedule to start from an image."
+            )
+
         # get the original timestep using init_timestep
         offset = self.scheduler.config.get("steps_offset", 0)
         init_timestep = int(num_inference_steps * strength) + offset
@@ -278,15 +309,23 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
 
         t_start = max(num_inference_steps - init_timestep + offset, 0)
         timesteps = self.scheduler.timesteps
-        timesteps = timesteps[t_start:]
+        # schedulers of order > 1 (e.g. Heun) evaluate the model `order` times per step
+        timesteps = timesteps[t_start * self.scheduler.order :]
         return timesteps, num_inference_steps - t_start
 
     def prepare_latents(self, image, timestep, batch_size, num_images_per_prompt, dtype, generator=None, noise=None):
         if generator is None:
             generator = np.random
 
-        image = image.astype(dtype)
-        init_latents = self.vae_encoder(sample=image)[0]
+        if isinstance(image, np.ndarray):
+            image = paddle.to_tensor(image)
+        image = image.cast(dtype)
+        vae_input_name = self.vae_encoder.model.get_input_info(0).name
+        vae_output_name = self.vae_encoder.model.get_output_info(0).name
+        vae_output_shape = [image.shape[0], 4, image.shape[2] // 8, image.shape[3] // 8]
+        init_latents = self.vae_encoder.bound_infer(
+            {vae_input_name: image}, output_shapes={vae_output_name: vae_output_shape}
+        )[vae_output_name]
         init_latents = 0.18215 * init_latents
 
         if batch_size > init_latents.shape[0] and batch_size % init_latents.shape[0] != 0:
@@ -294,18 +333,18 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
                 f"Cannot duplicate `image` of batch size {init_latents.shape[0]} to {batch_size} text prompts."
             )
         else:
-            init_latents = np.concatenate([init_latents] * num_images_per_prompt, axis=0)
+            init_latents = paddle.concat([init_latents] * num_images_per_prompt, axis=0)
 
         # add noise to latents using the timesteps
         if noise is None:
-            noise = paddle.to_tensor(generator.randn(*init_latents.shape).astype(dtype))
+            noise = paddle.to_tensor(generator.randn(*init_latents.shape), dtype=dtype)
         elif list(noise.shape) != list(init_latents.shape):
             raise ValueError(f"Unexpected noise shape, got {noise.shape}, expected {init_latents.shape}")
         elif isinstance(noise, np.ndarray):
             noise = paddle.to_tensor(noise, dtype=dtype)
 
         # get latents
-        init_latents = self.scheduler.add_noise(paddle.to_tensor(init_latents), noise, timestep)
+        init_latents = self.scheduler.add_noise(init_latents, noise, timestep)
         latents = init_latents
 
         return latents
@@ -416,21 +455,30 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
 
         # 8. Denoising loop
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        unet_output_name = self.unet.model.get_output_info(0).name
+        unet_input_names = [self.unet.model.get_input_info(i).name for i in range(self.unet.model.num_inputs())]
         with self.progress_bar(total=num_inference_steps) as progress_bar:
-            text_embeddings = paddle.to_tensor(text_embeddings)
             for i, t in enumerate(timesteps):
                 # expand the latents if we are doing classifier free guidance
                 latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
                 latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
                 # predict the noise residual
-                noise_pred = self.unet.zero_copy_infer(
-                    sample=latent_model_input, timestep=t, encoder_hidden_states=text_embeddings
-                )[0]
+                noise_pred = self.unet.bound_infer(
+                    {
+                        unet_input_names[0]: latent_model_input,
+                        unet_input_names[1]: t,
+                        unet_input_names[2]: text_embeddings,
+                    },
+                    output_shapes={unet_output_name: [latent_model_input.shape[0], 4] + latent_model_input.shape[2:]},
+                )[unet_output_name]
                 # perform guidance
                 if do_classifier_free_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
                     noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                else:
+                    # the next step overwrites the bound output, and multistep schedulers keep their inputs
+                    noise_pred = noise_pred.clone()
 
                 # compute the previous noisy sample x_t -> x_t-1
                 scheduler_output = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs)
@@ -443,10 +491,10 @@ class FastDeployStableDiffusionImg2ImgPipeline(DiffusionPipeline):
                         callback(i, t, latents)
 
         # 9. Post-processing
-        image = self.decode_latents(latents.numpy())
+        image = self.decode_latents(latents)
 
         # 10. Run safety checker
-        image, has_nsfw_concept = self.run_safety_checker(image, text_embeddings.dtype)
+        image, has_nsfw_concept = self.run_safety_checker(image, image.dtype)
 
         # 11. Convert to PIL
         if output_type == "pil":
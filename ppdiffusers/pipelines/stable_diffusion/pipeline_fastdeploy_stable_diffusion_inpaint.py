@@ -137,6 +137,7 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
         )
         self.register_to_config(requires_safety_checker=requires_safety_checker)
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline._encode_prompt
     def _encode_prompt(self, prompt, num_images_per_prompt, do_classifier_free_guidance, negative_prompt):
         r"""
         Encodes the prompt into text encoder hidden states.
@@ -172,8 +173,8 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
                 f" {self.tokenizer.model_max_length} tokens: {removed_text}"
             )
 
-        text_embeddings = self.text_encoder(input_ids=text_input_ids.astype(np.int64))[0]
-        text_embeddings = np.repeat(text_embeddings, num_images_per_prompt, axis=0)
+        text_embeddings = self._infer_text_encoder(text_input_ids)
+        text_embeddings = paddle.repeat_interleave(text_embeddings, num_images_per_prompt, axis=0)
 
         # get unconditional embeddings for classifier free guidance
         if do_classifier_free_guidance:
@@ -204,16 +205,31 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
                 truncation=True,
                 return_tensors="np",
             )
-            uncond_embeddings = self.text_encoder(input_ids=uncond_input.input_ids.astype(np.int64))[0]
-            uncond_embeddings = np.repeat(uncond_embeddings, num_images_per_prompt, axis=0)
+            uncond_embeddings = self._infer_text_encoder(uncond_input.input_ids)
+            uncond_embeddings = paddle.repeat_interleave(uncond_embeddings, num_images_per_prompt, axis=0)
 
             # For classifier free guidance, we need to do two forward passes.
             # Here we concatenate the unconditional and text embeddings into a single batch
             # to avoid doing two forward passes
-            text_embeddings = np.concatenate([uncond_embeddings, text_embeddings])
+            text_embeddings = paddle.concat([uncond_embeddings, text_embeddings])
 
         return text_embeddings
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline._infer_text_encoder
+    def _infer_text_encoder(self, input_ids):
+        # the last hidden states, computed on the device without leaving it
+        input_name = self.text_encoder.model.get_input_info(0).name
+        output_info = self.text_encoder.model.get_output_info(0)
+        output_shapes = None
+        if output_info.shape[-1] > 0:
+            output_shapes = {output_info.name: [input_ids.shape[0], input_ids.shape[1], output_info.shape[-1]]}
+        outputs = self.text_encoder.bound_infer(
+            {input_name: paddle.to_tensor(input_ids, dtype="int64")}, output_shapes=output_shapes
+        )
+        # a copy, the next call overwrites the bound output
+        return outputs[output_info.name].clone()
+
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
             safety_checker_input = self.feature_extractor(
@@ -232,14 +248,22 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
             has_nsfw_concept = None
         return image, has_nsfw_concept
 
+    # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_fastdeploy_stable_diffusion.FastDeployStableDiffusionPipeline.decode_latents
     def decode_latents(self, latents):
         latents = 1 / 0.18215 * latents
-        image = np.concatenate(
-            [self.vae_decoder(latent_sample=latents[i : i + 1])[0] for i in range(latents.shape[0])]
-        )
-        image = np.clip(image / 2 + 0.5, 0, 1)
-        image = image.transpose([0, 2, 3, 1])
-        return image
+        latents_shape = latents.shape
+        vae_output_shape = [latents_shape[0], 3, latents_shape[2] * 8, latents_shape[3] * 8]
+
+        vae_input_name = self.vae_decoder.model.get_input_info(0).name
+        vae_output_name = self.vae_decoder.model.get_output_info(0).name
+
+        images_vae = self.vae_decoder.bound_infer(
+            {vae_input_name: latents}, output_shapes={vae_output_name: vae_output_shape}
+        )[vae_output_name]
+
+        images_vae = paddle.clip(images_vae / 2 + 0.5, 0, 1)
+        images = images_vae.transpose([0, 2, 3, 1])
+        return images.numpy()
 
     def prepare_extra_step_kwargs(self, eta):
         # prepare extra kwargs for the scheduler step, since not all schedulers have the same signature
@@ -276,30 +300,36 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
         latents_shape = (batch_size, num_channels_latents, height // 8, width // 8)
         if latents is None:
             latents = paddle.to_tensor(generator.randn(*latents_shape), dtype=dtype)
-        elif latents.shape != latents_shape:
+        elif tuple(latents.shape) != latents_shape:
             raise ValueError(f"Unexpected latents shape, got {latents.shape}, expected {latents_shape}")
+        elif isinstance(latents, np.ndarray):
+            latents = paddle.to_tensor(latents, dtype=dtype)
 
         # scale the initial noise by the standard deviation required by the scheduler
         latents = latents * float(self.scheduler.init_noise_sigma)
         return latents
 
     def prepare_mask_latents(self, mask, masked_image, batch_size, dtype, do_classifier_free_guidance):
-        mask = mask.astype(dtype)
-        masked_image = masked_image.astype(dtype)
+        mask = paddle.to_tensor(mask, dtype=dtype)
+        masked_image = paddle.to_tensor(masked_image, dtype=dtype)
 
         # encode the mask image into latents space so we can concatenate it to the latents
-        masked_image_latents = self.vae_encoder(sample=masked_image)[0]
+        vae_input_name = self.vae_encoder.model.get_input_info(0).name
+        vae_output_name = self.vae_encoder.model.get_output_info(0).name
+        vae_output_shape = [masked_image.shape[0], 4, masked_image.shape[2] // 8, masked_image.shape[3] // 8]
+        masked_image_latents = self.vae_encoder.bound_infer(
+            {vae_input_name: masked_image}, output_shapes={vae_output_name: vae_output_shape}
+        )[vae_output_name]
         masked_image_latents = 0.18215 * masked_image_latents
 
         # duplicate mask and masked_image_latents for each generation per prompt, using mps friendly method
-        mask = mask.repeat(batch_size, 0)
-        masked_image_latents = masked_image_latents.repeat(batch_size, 0)
+        mask = paddle.repeat_interleave(mask, batch_size, axis=0)
+        masked_image_latents = paddle.repeat_interleave(masked_image_latents, batch_size, axis=0)
 
-        mask = np.concatenate([mask] * 2) if do_classifier_free_guidance else mask
+        mask = paddle.concat([mask] * 2) if do_classifier_free_guidance else mask
         masked_image_latents = (
-            np.concatenate([masked_image_latents] * 2) if do_classifier_free_guidance else masked_image_latents
+            paddle.concat([masked_image_latents] * 2) if do_classifier_free_guidance else masked_image_latents
         )
-        masked_image_latents = masked_image_latents.astype(dtype)
         return mask, masked_image_latents
 
     def __call__(
@@ -427,8 +457,6 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
         )
         num_channels_mask = mask.shape[1]
         num_channels_masked_image = masked_image_latents.shape[1]
-        mask = paddle.to_tensor(mask)
-        masked_image_latents = paddle.to_tensor(masked_image_latents)
 
         # 8. Check that sizes of mask, masked image and latents match
         unet_input_channels = NUM_UNET_INPUT_CHANNELS
@@ -446,8 +474,9 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
 
         # 10. Denoising loop
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        unet_output_name = self.unet.model.get_output_info(0).name
+        unet_input_names = [self.unet.model.get_input_info(i).name for i in range(self.unet.model.num_inputs())]
         with self.progress_bar(total=num_inference_steps) as progress_bar:
-            text_embeddings = paddle.to_tensor(text_embeddings, dtype="float32")
             for i, t in enumerate(timesteps):
                 # expand the latents if we are doing classifier free guidance
                 latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
@@ -456,14 +485,22 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
                 latent_model_input = paddle.concat([latent_model_input, mask, masked_image_latents], axis=1)
 
                 # predict the noise residual
-                noise_pred = self.unet.zero_copy_infer(
-                    sample=latent_model_input, timestep=t, encoder_hidden_states=text_embeddings
-                )[0]
+                noise_pred = self.unet.bound_infer(
+                    {
+                        unet_input_names[0]: latent_model_input,
+                        unet_input_names[1]: t,
+                        unet_input_names[2]: text_embeddings,
+                    },
+                    output_shapes={unet_output_name: [latent_model_input.shape[0], 4] + latent_model_input.shape[2:]},
+                )[unet_output_name]
 
                 # perform guidance
                 if do_classifier_free_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
                     noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                else:
+                    # the next step overwrites the bound output, and multistep schedulers keep their inputs
+                    noise_pred = noise_pred.clone()
 
                 # compute the previous noisy sample x_t -> x_t-1
                 scheduler_output = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs)
@@ -476,10 +513,10 @@ class FastDeployStableDiffusionInpaintPipeline(DiffusionPipeline):
                         callback(i, t, latents)
 
         # 11. Post-processing
-        image = self.decode_latents(latents.numpy())
+        image = self.decode_latents(latents)
 
         # 12. Run safety checker
-        image, has_nsfw_concept = self.run_safety_checker(image, text_embeddings.dtype)
+        image, has_nsfw_concept = self.run_safety_checker(image, image.dtype)
 
         # 13. Convert to PIL
         if output_type == "pil":
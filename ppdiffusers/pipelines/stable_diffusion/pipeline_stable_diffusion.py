@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import inspect
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Callable, Dict, List, Optional, Union
 
 import paddle
@@ -23,10 +24,20 @@ from paddlenlp.transformers import CLIPFeatureExtractor, CLIPTextModel, CLIPToke
 from ...configuration_utils import FrozenDict
 from ...models import AutoencoderKL, UNet2DConditionModel
 from ...schedulers import KarrasDiffusionSchedulers
-from ...utils import deprecate, logging, randn_tensor, replace_example_docstring
+from ...utils import (
+    ENCODED_IMAGE_FORMATS,
+    deprecate,
+    encode_images,
+    logging,
+    pd_to_uint8,
+    randn_tensor,
+    replace_example_docstring,
+)
+from ..guidance_utils import get_guidance_scales, uses_classifier_free_guidance
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .batching import GenerationRequest, group_requests, request_seeds
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -316,14 +327,29 @@ class StableDiffusionPipeline(DiffusionPipeline):
 
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
 
+    def _run_safety_checker_and_convert(self, image, dtype, output_type, return_dict):
+        with paddle.no_grad():
+            image, has_nsfw_concept = self.run_safety_checker(image, dtype)
+        if output_type == "pil":
+            image = self.numpy_to_pil(image)
+        elif output_type in ENCODED_IMAGE_FORMATS:
+            image = encode_images(image, output_type)
+        if not return_dict:
+            return (image, has_nsfw_concept)
+        return StableDiffusionPipelineOutput(images=image, nsfw_content_detected=has_nsfw_concept)
+
+    def _safety_checker_executor(self) -> ThreadPoolExecutor:
+        # a single worker, so that the outputs are completed in the order of the calls
+        if getattr(self, "_safety_checker_worker", None) is None:
+            self._safety_checker_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="safety_checker")
+        return self._safety_checker_worker
+
     def decode_latents(self, latents):
         latents = 1 / self.vae.config.scaling_factor * latents
         image = self.vae.decode(latents).sample
@@ -332,6 +358,11 @@ class StableDiffusionPipeline(DiffusionPipeline):
         image = image.transpose([0, 2, 3, 1]).cast("float32").numpy()
         return image
 
+    def decode_latents_to_uint8(self, latents):
+        latents = 1 / self.vae.config.scaling_factor * latents
+        image = self.vae.decode(latents).sample
+        return pd_to_uint8(image, value_range=(-1.0, 1.0))
+
     def prepare_extra_step_kwargs(self, generator, eta):
         # prepare extra kwargs for the scheduler step, since not all schedulers have the same signature
         # eta (η) is only used with the DDIMScheduler, it will be ignored for other schedulers.
@@ -419,7 +450,7 @@ class StableDiffusionPipeline(DiffusionPipeline):
         height: Optional[int] = None,
         width: Optional[int] = None,
         num_inference_steps: int = 50,
-        guidance_scale: float = 7.5,
+        guidance_scale: Union[float, List[float]] = 7.5,
         negative_prompt: Optional[Union[str, List[str]]] = None,
         num_images_per_prompt: Optional[int] = 1,
         eta: float = 0.0,
@@ -432,6 +463,8 @@ class StableDiffusionPipeline(DiffusionPipeline):
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
         cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        guidance_end: float = 1.0,
+        async_safety_checker: bool = False,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -447,12 +480,12 @@ class StableDiffusionPipeline(DiffusionPipeline):
             num_inference_steps (`int`, *optional*, defaults to 50):
                 The number of denoising steps. More denoising steps usually lead to a higher quality image at the
                 expense of slower inference.
-            guidance_scale (`float`, *optional*, defaults to 7.5):
+            guidance_scale (`float` or `List[float]`, *optional*, defaults to 7.5):
                 Guidance scale as defined in [Classifier-Free Diffusion Guidance](https://arxiv.org/abs/2207.12598).
                 `guidance_scale` is defined as `w` of equation 2. of [Imagen
                 Paper](https://arxiv.org/pdf/2205.11487.pdf). Guidance scale is enabled by setting `guidance_scale >
                 1`. Higher guidance scale encourages to generate images that are closely linked to the text `prompt`,
-                usually at the expense of lower image quality.
+                usually at the expense of lower image quality. A list gives the guidance scale of every denoising step.
             negative_prompt (`str` or `List[str]`, *optional*):
                 The prompt or prompts not to guide the image generation. If not defined, one has to pass
                 `negative_prompt_embeds`. instead. If not defined, one has to pass `negative_prompt_embeds`. instead.
@@ -477,7 +510,8 @@ class StableDiffusionPipeline(DiffusionPipeline):
                 argument.
             output_type (`str`, *optional*, defaults to `"pil"`):
                 The output format of the generate image. Choose between
-                [PIL](https://pillow.readthedocs.io/en/stable/): `PIL.Image.Image` or `np.array`.
+                [PIL](https://pillow.readthedocs.io/en/stable/): `PIL.Image.Image` or `np.array`, or `"png"`, `"jpeg"`
+                and `"webp"` for the `bytes` of the encoded images, e.g. to serve them.
             return_dict (`bool`, *optional*, defaults to `True`):
                 Whether or not to return a [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] instead of a
                 plain tuple.
@@ -491,6 +525,12 @@ class StableDiffusionPipeline(DiffusionPipeline):
                 A kwargs dictionary that if specified is passed along to the `AttnProcessor` as defined under
                 `self.processor` in
                 [diffusers.cross_attention](https://github.com/huggingface/diffusers/blob/main/src/diffusers/models/cross_attention.py).
+            guidance_end (`float`, *optional*, defaults to 1.0):
+                The fraction of the denoising steps after which classifier free guidance stops being applied. Steps
+                without guidance need a single batch UNet call instead of a doubled one.
+            async_safety_checker (`bool`, *optional*, defaults to `False`):
+                Whether to run the safety checker and the conversion to PIL images on a worker thread and return a
+                `concurrent.futures.Future` of the output, so that the next call can start denoising meanwhile.
 
         Examples:
 
@@ -499,7 +539,7 @@ class StableDiffusionPipeline(DiffusionPipeline):
             [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] if `return_dict` is True, otherwise a `tuple.
             When returning a tuple, the first element is a list with the generated images, and the second element is a
             list of `bool`s denoting whether the corresponding generated image likely represents "not-safe-for-work"
-            (nsfw) content, according to the `safety_checker`.
+            (nsfw) content, according to the `safety_checker`. With `async_safety_checker`, the future of the output.
         """
         # 0. Default height and width to unet
         height = height or self.unet.config.sample_size * self.vae_scale_factor
@@ -521,7 +561,7 @@ class StableDiffusionPipeline(DiffusionPipeline):
         # here `guidance_scale` is defined analog to the guidance weight `w` of equation (2)
         # of the Imagen paper: https://arxiv.org/pdf/2205.11487.pdf . `guidance_scale = 1`
         # corresponds to doing no classifier free guidance.
-        do_classifier_free_guidance = guidance_scale > 1.0
+        do_classifier_free_guidance = uses_classifier_free_guidance(guidance_scale, guidance_end)
 
         # 3. Encode input prompt
         prompt_embeds = self._encode_prompt(
@@ -554,24 +594,28 @@ class StableDiffusionPipeline(DiffusionPipeline):
 
         # 7. Denoising loop
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        guidance_scales = get_guidance_scales(guidance_scale, len(timesteps), guidance_end, self.scheduler.order)
+        text_prompt_embeds = prompt_embeds.chunk(2)[1] if do_classifier_free_guidance else prompt_embeds
         with self.progress_bar(total=num_inference_steps) as progress_bar:
             for i, t in enumerate(timesteps):
+                # the steps without guidance only need the text conditioned prediction
+                do_step_guidance = do_classifier_free_guidance and guidance_scales[i] > 1.0
                 # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                latent_model_input = paddle.concat([latents] * 2) if do_step_guidance else latents
                 latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
                 # predict the noise residual
                 noise_pred = self.unet(
                     latent_model_input,
                     t,
-                    encoder_hidden_states=prompt_embeds,
+                    encoder_hidden_states=prompt_embeds if do_step_guidance else text_prompt_embeds,
                     cross_attention_kwargs=cross_attention_kwargs,
                 ).sample
 
                 # perform guidance
-                if do_classifier_free_guidance:
+                if do_step_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                    noise_pred = noise_pred_uncond + guidance_scales[i] * (noise_pred_text - noise_pred_uncond)
 
                 # compute the previous noisy sample x_t -> x_t-1
                 latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
@@ -583,25 +627,126 @@ class StableDiffusionPipeline(DiffusionPipeline):
                         callback(i, t, latents)
 
         if output_type == "latent":
-            image = latents
-            has_nsfw_concept = None
-        elif output_type == "pil":
-            # 8. Post-processing
-            image = self.decode_latents(latents)
+            output = (latents, None)
+            if async_safety_checker:
+                future = Future()
+                future.set_result(output if not return_dict else StableDiffusionPipelineOutput(*output))
+                return future
+        else:
+            # 8. Post-processing, to uint8 images on the device for the PIL and encoded images
+            if output_type == "pil" or output_type in ENCODED_IMAGE_FORMATS:
+                image = self.decode_latents_to_uint8(latents)
+            else:
+                image = self.decode_latents(latents)
 
-            # 9. Run safety checker
-            image, has_nsfw_concept = self.run_safety_checker(image, prompt_embeds.dtype)
+            # 9. Run safety checker and convert to PIL, on the worker thread with `async_safety_checker`
+            if async_safety_checker:
+                return self._safety_checker_executor().submit(
+                    self._run_safety_checker_and_convert, image, prompt_embeds.dtype, output_type, return_dict
+                )
+            output = self._run_safety_checker_and_convert(image, prompt_embeds.dtype, output_type, return_dict=False)
 
-            # 10. Convert to PIL
-            image = self.numpy_to_pil(image)
-        else:
-            # 8. Post-processing
-            image = self.decode_latents(latents)
+        if not return_dict:
+            return output
 
-            # 9. Run safety checker
-            image, has_nsfw_concept = self.run_safety_checker(image, prompt_embeds.dtype)
+        return StableDiffusionPipelineOutput(images=output[0], nsfw_content_detected=output[1])
+
+    @paddle.no_grad()
+    def generate_batch(
+        self,
+        requests: List[Union[GenerationRequest, Dict[str, Any]]],
+        max_batch_size: int = 8,
+        max_batch_pixels: Optional[int] = None,
+        output_type: Optional[str] = "pil",
+        return_dict: bool = True,
+        **kwargs,
+    ):
+        r"""
+        Generates the images of a list of heterogeneous requests, with their own prompt, size, seed and guidance. The
+        distinct prompts are encoded in a single text encoder pass, then the requests with the same size and denoising
+        settings are generated together in sub-batches, run back to back.
+
+        Args:
+            requests (`List[GenerationRequest]` or `List[dict]`):
+                The requests, [`GenerationRequest`] or dictionaries of its arguments.
+            max_batch_size (`int`, *optional*, defaults to 8):
+                The largest number of images generated by a single call.
+            max_batch_pixels (`int`, *optional*):
+                The largest number of pixels generated by a single call, e.g. `4 * 512 * 512` to generate 4 images of
+                512x512 or 16 images of 256x256 at once. Bounds the memory of the calls for images of mixed sizes.
+            output_type (`str`, *optional*, defaults to `"pil"`):
+                The output format of the generate image. Choose between
+                [PIL](https://pillow.readthedocs.io/en/stable/): `PIL.Image.Image` or `np.array`, or `"png"`, `"jpeg"`
+                and `"webp"` for the `bytes` of the encoded images, e.g. to serve them.
+            return_dict (`bool`, *optional*, defaults to `True`):
+                Whether or not to return a [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] instead of a
+                plain tuple.
+            kwargs:
+                The arguments shared by all the calls, e.g. `eta` or `guidance_end`. The safety checker of every
+                sub-batch runs on a worker thread while the next sub-batch is denoised.
+
+        Returns:
+            [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] or `tuple`: the list of the images and the
+            list of the nsfw flags (or `None`), in the order of the requests.
+        """
+        requests = [
+            request if isinstance(request, GenerationRequest) else GenerationRequest(**request) for request in requests
+        ]
+        guidance_end = kwargs.get("guidance_end", 1.0)
+        do_classifier_free_guidance = any(
+            uses_classifier_free_guidance(request.guidance_scale, guidance_end) for request in requests
+        )
+
+        # 1. Encode the distinct prompts at once
+        texts = list(dict.fromkeys((request.prompt, request.negative_prompt or "") for request in requests))
+        text_indices = {text: index for index, text in enumerate(texts)}
+        prompt_embeds = self._encode_prompt(
+            [prompt for prompt, _ in texts],
+            1,
+            do_classifier_free_guidance,
+            [negative_prompt for _, negative_prompt in texts],
+        )
+        negative_prompt_embeds = None
+        if do_classifier_free_guidance:
+            negative_prompt_embeds, prompt_embeds = prompt_embeds.chunk(2)
+
+        # 2. Generate the sub-batches of requests of the same shape
+        seeds = request_seeds(requests)
+        default_size = self.unet.config.sample_size * self.vae_scale_factor
+        futures = []
+        for rows in group_requests(requests, default_size, max_batch_size, max_batch_pixels):
+            request = requests[rows[0]]
+            indices = paddle.to_tensor(
+                [text_indices[(requests[row].prompt, requests[row].negative_prompt or "")] for row in rows]
+            )
+            future = self(
+                height=request.height or default_size,
+                width=request.width or default_size,
+                num_inference_steps=request.num_inference_steps,
+                guidance_scale=request.guidance_scale,
+                generator=[paddle.Generator().manual_seed(seeds[row]) for row in rows],
+                prompt_embeds=paddle.gather(prompt_embeds, indices),
+                negative_prompt_embeds=(
+                    paddle.gather(negative_prompt_embeds, indices) if negative_prompt_embeds is not None else None
+                ),
+                output_type=output_type,
+                async_safety_checker=True,
+                **kwargs,
+            )
+            futures.append((rows, future))
+
+        images = [None] * len(requests)
+        has_nsfw_concept = [None] * len(requests)
+        for rows, future in futures:
+            output = future.result()
+            for k, row in enumerate(rows):
+                images[row] = output.images[k]
+                if output.nsfw_content_detected is not None:
+                    has_nsfw_concept[row] = output.nsfw_content_detected[k]
+        if all(flag is None for flag in has_nsfw_concept):
+            has_nsfw_concept = None
 
         if not return_dict:
-            return (image, has_nsfw_concept)
+            return (images, has_nsfw_concept)
 
-        return StableDiffusionPipelineOutput(images=image, nsfw_content_detected=has_nsfw_concept)
+        return StableDiffusionPipelineOutput(images=images, nsfw_content_detected=has_nsfw_concept)
@@ -42,7 +42,7 @@ from ...schedulers import (
 from ...utils import PIL_INTERPOLATION, deprecate, logging
 from ...utils.testing_utils import load_image
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -582,10 +582,8 @@ class StableDiffusionPipelineAllinOne(DiffusionPipeline):
 
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -673,13 +671,21 @@ class StableDiffusionPipelineAllinOne(DiffusionPipeline):
         return latents
 
     def get_timesteps(self, num_inference_steps, strength):
+        # adaptive schedulers only know their next timestep, they can not start from the middle of the schedule
+        if not hasattr(self.scheduler.timesteps, "__getitem__"):
+            raise ValueError(
+                f"{self.scheduler.__class__.__name__} chooses its timesteps while sampling and does not support"
+                " `strength`, use a scheduler with a fixed schedule to start from an image."
+            )
+
         # get the original timestep using init_timestep
         offset = self.scheduler.config.get("steps_offset", 0)
         init_timestep = int(num_inference_steps * strength) + offset
         init_timestep = min(init_timestep, num_inference_steps)
 
         t_start = max(num_inference_steps - init_timestep + offset, 0)
-        timesteps = self.scheduler.timesteps[t_start:]
+        # schedulers of order > 1 (e.g. Heun) evaluate the model `order` times per step
+        timesteps = self.scheduler.timesteps[t_start * self.scheduler.order :]
 
         return timesteps, num_inference_steps - t_start
 
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import inspect
 import math
+import time
 from typing import Any, Callable, Dict, List, Optional, Union
 
 import numpy as np
@@ -29,7 +31,7 @@ from ...schedulers import KarrasDiffusionSchedulers
 from ...utils import logging, randn_tensor, replace_example_docstring
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)
 
@@ -69,64 +71,106 @@ EXAMPLE_DOC_STRING = """
 """
 
 
+class AttentionCaptured(Exception):
+    """Raised by [`AttentionStore`] to stop a UNet forward once every attention map it needs has been captured."""
+
+
 class AttentionStore:
+    """
+    Accumulates the cross attention maps at resolution `attn_res` produced by a UNet forward. The maps are summed into
+    a single buffer per UNet location as they are produced, maps at other resolutions and self attention maps are
+    dropped right away.
+    """
+
     @staticmethod
     def get_empty_store():
-        return {"down": [], "mid": [], "up": []}
+        return {"down": None, "mid": None, "up": None}
 
-    def __call__(self, attn, is_cross: bool, place_in_unet: str):
-        if self.cur_att_layer >= 0 and is_cross:
-            if attn.shape[1] == self.attn_res**2:
-                self.step_store[place_in_unet].append(attn)
+    @staticmethod
+    def get_empty_count():
+        return {"down": 0, "mid": 0, "up": 0}
+
+    def __call__(self, attn, is_cross: bool, place_in_unet: str, block_name: Optional[str] = None):
+        if not is_cross or attn.shape[1] != self.attn_res**2:
+            return
+
+        cross_maps = attn.reshape([-1, self.attn_res, self.attn_res, attn.shape[-1]])
+        cross_maps_sum = cross_maps.sum(0)
+        if self.step_store[place_in_unet] is not None:
+            cross_maps_sum = self.step_store[place_in_unet] + cross_maps_sum
+        self.step_store[place_in_unet] = cross_maps_sum
+        self.step_count[place_in_unet] += cross_maps.shape[0]
+        if block_name is not None:
+            self.captured_blocks.add(block_name)
 
         self.cur_att_layer += 1
-        if self.cur_att_layer == self.num_att_layers:
-            self.cur_att_layer = 0
-            self.between_steps()
+        if self.stop_when_captured and self.cur_att_layer == self.num_att_layers:
+            # the remaining layers of the UNet do not contribute to the stored maps
+            raise AttentionCaptured()
 
     def between_steps(self):
+        if self.num_att_layers < 0:
+            self.num_att_layers = self.cur_att_layer
+        self.cur_att_layer = 0
         self.attention_store = self.step_store
+        self.attention_count = self.step_count
         self.step_store = self.get_empty_store()
+        self.step_count = self.get_empty_count()
 
     def get_average_attention(self):
-        average_attention = self.attention_store
+        average_attention = {
+            location: attention / self.attention_count[location]
+            for location, attention in self.attention_store.items()
+            if attention is not None
+        }
         return average_attention
 
     def aggregate_attention(self, from_where: List[str]) -> paddle.Tensor:
         """Aggregates the attention across the different layers and heads at the specified resolution."""
-        out = []
-        attention_maps = self.get_average_attention()
-        for location in from_where:
-            for item in attention_maps[location]:
-                cross_maps = item.reshape([-1, self.attn_res, self.attn_res, item.shape[-1]])
-                out.append(cross_maps)
-        out = paddle.concat(out, axis=0)
-        out = out.sum(0) / out.shape[0]
-        return out
+        out = [
+            self.attention_store[location] for location in from_where if self.attention_store.get(location) is not None
+        ]
+        if len(out) == 0:
+            raise ValueError(
+                f"No cross attention map of resolution {self.attn_res} was captured in {from_where}, make sure"
+                " `attn_res` matches one of the attention resolutions of the UNet."
+            )
+        count = sum(self.attention_count[location] for location in from_where)
+        out = paddle.add_n(out) if len(out) > 1 else out[0]
+        return out / count
 
     def reset(self):
         self.cur_att_layer = 0
         self.step_store = self.get_empty_store()
+        self.step_count = self.get_empty_count()
         self.attention_store = {}
+        self.attention_count = {}
 
     def __init__(self, attn_res=16):
         """
-        Initialize an empty AttentionStore :param step_index: used to visualize only a specific step in the diffusion
-        process
+        Initialize an empty AttentionStore.
+
+        `num_att_layers` is the number of maps captured by a forward, it is counted during the first one. Afterwards,
+        when `stop_when_captured` is set, the forward is interrupted with [`AttentionCaptured`] after the last map.
         """
         self.num_att_layers = -1
         self.cur_att_layer = 0
         self.step_store = self.get_empty_store()
+        self.step_count = self.get_empty_count()
         self.attention_store = {}
+        self.attention_count = {}
         self.curr_step_index = 0
         self.attn_res = attn_res
+        self.captured_blocks = set()
+        self.stop_when_captured = False
 
 
 class AttendExciteCrossAttnProcessor:
-    def __init__(self, attnstore, place_in_unet):
+    def __init__(self, attnstore, place_in_unet, block_name=None):
         super().__init__()
         self.attnstore = attnstore
         self.place_in_unet = place_in_unet
+        self.block_name = block_name
 
     def __call__(self, attn: CrossAttention, hidden_states, encoder_hidden_states=None, attention_mask=None):
         batch_size, sequence_length, _ = hidden_states.shape
@@ -149,7 +193,7 @@ class AttendExciteCrossAttnProcessor:
         if not attention_probs.stop_gradient:
             # TODO must flatten （0, 1)
             # [bs, num_heads, q_len, k_len] -> [bs*num_heads, q_len, k_len]
-            self.attnstore(attention_probs.flatten(0, 1), is_cross, self.place_in_unet)
+            self.attnstore(attention_probs.flatten(0, 1), is_cross, self.place_in_unet, self.block_name)
 
         hidden_states = paddle.matmul(attention_probs, value)
         hidden_states = attn.batch_to_head_dim(hidden_states)
@@ -389,10 +433,8 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -495,25 +537,21 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
     def _compute_max_attention_per_index(
         attention_maps: paddle.Tensor,
         indices: List[int],
-    ) -> List[paddle.Tensor]:
+    ) -> paddle.Tensor:
         """Computes the maximum attention value for each of the tokens we wish to alter."""
-        attention_for_text = attention_maps[:, :, 1:-1]
-        attention_for_text *= 100
+        attention_for_text = attention_maps[:, :, 1:-1] * 100
         attention_for_text = F.softmax(attention_for_text, axis=-1)
 
         # Shift indices since we removed the first token
         indices = [index - 1 for index in indices]
 
-        # Extract the maximum values
-        max_indices_list = []
-        for i in indices:
-            image = attention_for_text[:, :, i]
-            smoothing = GaussianSmoothing()
-            input = F.pad(image.unsqueeze(0).unsqueeze(0), (1, 1, 1, 1), mode="reflect")
-            image = smoothing(input).squeeze(0).squeeze(0)
-            # paddle.max donot support float16
-            max_indices_list.append(image.max())
-        return max_indices_list
+        # Smooth the maps of all the tokens at once, [height, width, tokens] -> [tokens, 1, height, width]
+        images = paddle.index_select(attention_for_text, paddle.to_tensor(indices), axis=-1)
+        images = images.transpose([2, 0, 1]).unsqueeze(1)
+        smoothing = GaussianSmoothing()
+        images = smoothing(F.pad(images, (1, 1, 1, 1), mode="reflect"))
+        # paddle.max donot support float16
+        return images.reshape([len(indices), -1]).max(axis=-1)
 
     def _aggregate_and_get_max_attention_per_token(
         self,
@@ -530,20 +568,77 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
         return max_attention_per_index
 
     @staticmethod
-    def _compute_loss(max_attention_per_index: List[paddle.Tensor]) -> paddle.Tensor:
+    def _compute_loss(max_attention_per_index: paddle.Tensor) -> paddle.Tensor:
         """Computes the attend-and-excite loss using the maximum attention value for each token."""
-        losses = [max(0, 1.0 - curr_max) for curr_max in max_attention_per_index]
-        loss = max(losses)
+        if isinstance(max_attention_per_index, (list, tuple)):
+            max_attention_per_index = paddle.stack(max_attention_per_index)
+        loss = (1.0 - max_attention_per_index).clip(min=0).max()
         return loss
 
     @staticmethod
     def _update_latent(latents: paddle.Tensor, loss: paddle.Tensor, step_size: float) -> paddle.Tensor:
         """Update the latent according to the computed loss."""
         loss.stop_gradient = False
-        grad_cond = paddle.autograd.grad(loss, [latents], retain_graph=True)[0]
+        # the graph of the loss is only differentiated once, free it right away
+        grad_cond = paddle.autograd.grad(loss, [latents])[0]
         latents = latents - step_size * grad_cond
         return latents
 
+    @contextlib.contextmanager
+    def _checkpoint_uncaptured_blocks(self):
+        """
+        Enables gradient checkpointing in the UNet blocks none of whose attention maps are captured, so that their
+        activations are recomputed during the backward pass instead of being kept alive. The blocks holding captured
+        layers are left untouched: their attention maps have to be part of the graph.
+        """
+        blocks = []
+        if self.attention_store.num_att_layers >= 0:
+            for prefix, block_list in [("down_blocks", self.unet.down_blocks), ("up_blocks", self.unet.up_blocks)]:
+                for i, block in enumerate(block_list):
+                    if f"{prefix}.{i}" not in self.attention_store.captured_blocks and hasattr(
+                        block, "gradient_checkpointing"
+                    ):
+                        blocks.append((block, block.gradient_checkpointing, block.training))
+        try:
+            for block, _, _ in blocks:
+                # only the block itself is switched to training mode, the checkpointing is gated on it
+                block.gradient_checkpointing = True
+                block.training = True
+            yield
+        finally:
+            for block, gradient_checkpointing, training in blocks:
+                block.gradient_checkpointing = gradient_checkpointing
+                block.training = training
+
+    def _capture_attention(
+        self,
+        latents: paddle.Tensor,
+        t: int,
+        text_embeddings: paddle.Tensor,
+        cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        gradient_checkpointing: bool = False,
+    ):
+        """
+        Runs the UNet with gradients enabled until the last attention map used by the loss has been stored. The
+        output of the UNet is not needed, so the layers after the last captured one are skipped.
+        """
+        checkpointing = self._checkpoint_uncaptured_blocks() if gradient_checkpointing else contextlib.nullcontext()
+        self.attention_store.stop_when_captured = self.attention_store.num_att_layers > 0
+        try:
+            with checkpointing:
+                self.unet(
+                    latents,
+                    t,
+                    encoder_hidden_states=text_embeddings,
+                    cross_attention_kwargs=cross_attention_kwargs,
+                )
+        except AttentionCaptured:
+            pass
+        finally:
+            self.attention_store.stop_when_captured = False
+        self.unet.clear_gradients()
+        self.attention_store.between_steps()
+
     def _perform_iterative_refinement_step(
         self,
         latents: paddle.Tensor,
@@ -554,10 +649,14 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
         step_size: float,
         t: int,
         max_refinement_steps: int = 20,
+        cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        gradient_checkpointing: bool = False,
+        deadline: Optional[float] = None,
     ):
         """
         Performs the iterative latent refinement introduced in the paper. Here, we continuously update the latent code
-        according to our loss objective until the given threshold is reached for all tokens.
+        according to our loss objective until the given threshold is reached for all tokens, `max_refinement_steps`
+        updates have been made or the `deadline` (a `time.perf_counter()` value) has passed.
         """
         iteration = 0
         target_loss = max(0, 1.0 - threshold)
@@ -566,8 +665,7 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
 
             latents = latents.clone().detach()
             latents.stop_gradient = False
-            self.unet(latents, t, encoder_hidden_states=text_embeddings).sample
-            self.unet.clear_gradients()
+            self._capture_attention(latents, t, text_embeddings, cross_attention_kwargs, gradient_checkpointing)
 
             # Get max activation value for each subject token
             max_attention_per_index = self._aggregate_and_get_max_attention_per_token(
@@ -579,26 +677,28 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
             if loss != 0:
                 latents = self._update_latent(latents, loss, step_size)
 
-            logger.info(f"\t Try {iteration}. loss: {loss}")
+            logger.info(f"\t Try {iteration}. loss: {loss.item()}")
 
             if iteration >= max_refinement_steps:
                 logger.info(f"\t Exceeded max number of iterations ({max_refinement_steps})! ")
                 break
+            if deadline is not None and time.perf_counter() >= deadline:
+                logger.info("\t Exceeded the refinement time budget! ")
+                break
 
         # Run one more time but don't compute gradients and update the latents.
         # We just need to compute the new loss - the grad update will occur below
         latents = latents.clone().detach()
         latents.stop_gradient = False
 
-        _ = self.unet(latents, t, encoder_hidden_states=text_embeddings).sample
-        self.unet.clear_gradients()
+        self._capture_attention(latents, t, text_embeddings, cross_attention_kwargs, gradient_checkpointing)
 
         # Get max activation value for each subject token
         max_attention_per_index = self._aggregate_and_get_max_attention_per_token(
             indices=indices,
         )
         loss = self._compute_loss(max_attention_per_index)
-        logger.info(f"\t Finished with loss of: {loss}")
+        logger.info(f"\t Finished with loss of: {loss.item()}")
         return loss, latents, max_attention_per_index
 
     def register_attention_control(self):
@@ -616,11 +716,12 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
 
             cross_att_count += 1
             attn_procs[name] = AttendExciteCrossAttnProcessor(
-                attnstore=self.attention_store, place_in_unet=place_in_unet
+                attnstore=self.attention_store,
+                place_in_unet=place_in_unet,
+                block_name=name.split(".attentions.")[0],
             )
 
         self.unet.set_attn_processor(attn_procs)
-        self.attention_store.num_att_layers = cross_att_count
 
     def get_indices(self, prompt: str) -> Dict[str, int]:
         """Utility function to list the indices of the tokens you wish to alte"""
@@ -654,6 +755,9 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
         thresholds: dict = {0: 0.05, 10: 0.5, 20: 0.8},
         scale_factor: int = 20,
         attn_res: int = 16,
+        max_refinement_steps: int = 20,
+        refinement_time_budget: Optional[float] = None,
+        gradient_checkpointing: bool = True,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -726,6 +830,16 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
                 Scale factor that controls the step size of each Attend and Excite update.
             attn_res (`int`, *optional*, default to 16):
                 The resolution of most semantic attention map.
+            max_refinement_steps (`int`, *optional*, default to 20):
+                Maximum number of latent updates of one iterative refinement (at the steps listed in `thresholds`).
+            refinement_time_budget (`float`, *optional*):
+                Wall-clock time, in seconds, that attend-and-excite may spend in total. Once it is exhausted, the
+                running iterative refinement stops and the remaining steps are plain denoising steps, as if
+                `max_iter_to_alter` had been reached. There is no limit if `None`.
+            gradient_checkpointing (`bool`, *optional*, defaults to `True`):
+                Whether to recompute, during the backward pass of attend-and-excite, the activations of the UNet blocks
+                whose attention maps are not used by the loss instead of storing them. This lowers the memory of the
+                refinement at the cost of some extra compute and does not change the results.
 
         Examples:
 
@@ -796,6 +910,7 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
         extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
 
         self.attention_store = AttentionStore(attn_res=attn_res)
+        original_attn_processors = self.unet.attn_processors
         self.register_attention_control()
 
         # default config for step size from original repo
@@ -812,86 +927,105 @@ class StableDiffusionAttendAndExcitePipeline(DiffusionPipeline):
         for ind in token_indices:
             indices = indices + [ind] * num_images_per_prompt
 
+        deadline = None if refinement_time_budget is None else time.perf_counter() + refinement_time_budget
+
+        # the loss is only differentiated w.r.t. the latents, freezing the UNet weights keeps autograd from tracking
+        # the branches depending on the weights alone (e.g. the time embedding)
+        unet_parameters = [(parameter, parameter.stop_gradient) for parameter in self.unet.parameters()]
+        for parameter, _ in unet_parameters:
+            parameter.stop_gradient = True
+
         # 7. Denoising loop
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
-        with self.progress_bar(total=num_inference_steps) as progress_bar:
-            for i, t in enumerate(timesteps):
-                # Attend and excite process
-                with paddle.set_grad_enabled(True):
-                    latents = latents.clone().detach()
-                    latents.stop_gradient = False
-                    updated_latents = []
-                    for latent, index, text_embedding in zip(latents, indices, text_embeddings):
-                        # Forward pass of denoising with text conditioning
-                        latent = latent.unsqueeze(0)
-                        text_embedding = text_embedding.unsqueeze(0)
-
-                        self.unet(
-                            latent,
-                            t,
-                            encoder_hidden_states=text_embedding,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                        ).sample
-                        self.unet.clear_gradients()
-
-                        # Get max activation value for each subject token
-                        max_attention_per_index = self._aggregate_and_get_max_attention_per_token(
-                            indices=index,
-                        )
-
-                        loss = self._compute_loss(max_attention_per_index=max_attention_per_index)
-
-                        # If this is an iterative refinement step, verify we have reached the desired threshold for all
-                        if i in thresholds.keys() and loss > 1.0 - thresholds[i]:
-                            loss, latent, max_attention_per_index = self._perform_iterative_refinement_step(
-                                latents=latent,
-                                indices=index,
-                                loss=loss,
-                                threshold=thresholds[i],
-                                text_embeddings=text_embedding,
-                                step_size=step_size[i],
-                                t=t,
-                            )
-
-                        # Perform gradient update
-                        if i < max_iter_to_alter:
-                            if loss != 0:
-                                latent = self._update_latent(
-                                    latents=latent,
-                                    loss=loss,
-                                    step_size=step_size[i],
+        try:
+            with self.progress_bar(total=num_inference_steps) as progress_bar:
+                for i, t in enumerate(timesteps):
+                    # Attend and excite process, the latents are only updated before `max_iter_to_alter` and at the
+                    # iterative refinement steps
+                    within_budget = deadline is None or time.perf_counter() < deadline
+                    if within_budget and (i < max_iter_to_alter or i in thresholds.keys()):
+                        with paddle.set_grad_enabled(True):
+                            latents = latents.clone().detach()
+                            latents.stop_gradient = False
+                            updated_latents = []
+                            for latent, index, text_embedding in zip(latents, indices, text_embeddings):
+                                # Forward pass of denoising with text conditioning
+                                latent = latent.unsqueeze(0)
+                                text_embedding = text_embedding.unsqueeze(0)
+
+                                self._capture_attention(
+                                    latent, t, text_embedding, cross_attention_kwargs, gradient_checkpointing
                                 )
-                            logger.info(f"Iteration {i} | Loss: {loss.item():0.4f}")
-
-                        updated_latents.append(latent)
-
-                    latents = paddle.concat(updated_latents, axis=0)
-
-                # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
-                latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
-                # predict the noise residual
-                noise_pred = self.unet(
-                    latent_model_input,
-                    t,
-                    encoder_hidden_states=prompt_embeds,
-                    cross_attention_kwargs=cross_attention_kwargs,
-                ).sample
-
-                # perform guidance
-                if do_classifier_free_guidance:
-                    noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
-
-                # compute the previous noisy sample x_t -> x_t-1
-                latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+                                # Get max activation value for each subject token
+                                max_attention_per_index = self._aggregate_and_get_max_attention_per_token(
+                                    indices=index,
+                                )
 
-                # call the callback, if provided
-                if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
-                    progress_bar.update()
-                    if callback is not None and i % callback_steps == 0:
-                        callback(i, t, latents)
+                                loss = self._compute_loss(max_attention_per_index=max_attention_per_index)
+
+                                # If this is an iterative refinement step, verify we have reached the desired
+                                # threshold for all
+                                if i in thresholds.keys() and loss > 1.0 - thresholds[i]:
+                                    loss, latent, max_attention_per_index = self._perform_iterative_refinement_step(
+                                        latents=latent,
+                                        indices=index,
+                                        loss=loss,
+                                        threshold=thresholds[i],
+                                        text_embeddings=text_embedding,
+                                        step_size=step_size[i],
+                                        t=t,
+                                        max_refinement_steps=max_refinement_steps,
+                                        cross_attention_kwargs=cross_attention_kwargs,
+                                        gradient_checkpointing=gradient_checkpointing,
+                                        deadline=deadline,
+                                    )
+
+                                # Perform gradient update
+                                if i < max_iter_to_alter:
+                                    if loss != 0:
+                                        latent = self._update_latent(
+                                            latents=latent,
+                                            loss=loss,
+                                            step_size=step_size[i],
+                                        )
+                                    logger.info(f"Iteration {i} | Loss: {loss.item():0.4f}")
+
+                                updated_latents.append(latent.detach())
+
+                            latents = paddle.concat(updated_latents, axis=0)
+
+                    # expand the latents if we are doing classifier free guidance
+                    latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                    latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
+
+                    # predict the noise residual
+                    noise_pred = self.unet(
+                        latent_model_input,
+                        t,
+                        encoder_hidden_states=prompt_embeds,
+                        cross_attention_kwargs=cross_attention_kwargs,
+                    ).sample
+
+                    # perform guidance
+                    if do_classifier_free_guidance:
+                        noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                        noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+                    # compute the previous noisy sample x_t -> x_t-1
+                    latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+
+                    # call the callback, if provided
+                    if i == len(timesteps) - 1 or (
+                        (i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0
+                    ):
+                        progress_bar.update()
+                        if callback is not None and i % callback_steps == 0:
+                            callback(i, t, latents)
+        finally:
+            self.unet.set_attn_processor(original_attn_processors)
+            for parameter, stop_gradient in unet_parameters:
+                parameter.stop_gradient = stop_gradient
 
         # 8. Post-processing
         image = self.decode_latents(latents)
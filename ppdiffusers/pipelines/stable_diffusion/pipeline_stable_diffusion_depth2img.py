@@ -31,7 +31,10 @@ from ...configuration_utils import FrozenDict
 from ...models import AutoencoderKL, UNet2DConditionModel
 from ...schedulers import KarrasDiffusionSchedulers
 from ...utils import PIL_INTERPOLATION, deprecate, logging, randn_tensor
+from ..guidance_utils import get_guidance_scales, uses_classifier_free_guidance
+from ..image_cache import encode_latent_dist
 from ..pipeline_utils import DiffusionPipeline, ImagePipelineOutput
+from .safety_checker import preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -264,10 +267,8 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -342,11 +343,19 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
 
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion_img2img.StableDiffusionImg2ImgPipeline.get_timesteps
     def get_timesteps(self, num_inference_steps, strength):
+        # adaptive schedulers only know their next timestep, they can not start from the middle of the schedule
+        if not hasattr(self.scheduler.timesteps, "__getitem__"):
+            raise ValueError(
+                f"{self.scheduler.__class__.__name__} chooses its timesteps while sampling and does not support"
+                " `strength`, use a scheduler with a fixed schedule to start from an image."
+            )
+
         # get the original timestep using init_timestep
         init_timestep = min(int(num_inference_steps * strength), num_inference_steps)
 
         t_start = max(num_inference_steps - init_timestep, 0)
-        timesteps = self.scheduler.timesteps[t_start:]
+        # schedulers of order > 1 (e.g. Heun) evaluate the model `order` times per step
+        timesteps = self.scheduler.timesteps[t_start * self.scheduler.order :]
 
         return timesteps, num_inference_steps - t_start
 
@@ -368,11 +377,12 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
 
         if isinstance(generator, list):
             init_latents = [
-                self.vae.encode(image[i : i + 1]).latent_dist.sample(generator[i]) for i in range(batch_size)
+                encode_latent_dist(self.vae, image[i : i + 1], self.image_cache).sample(generator[i])
+                for i in range(batch_size)
             ]
             init_latents = paddle.concat(init_latents, axis=0)
         else:
-            init_latents = self.vae.encode(image).latent_dist.sample(generator)
+            init_latents = encode_latent_dist(self.vae, image, self.image_cache).sample(generator)
 
         init_latents = self.vae.config.scaling_factor * init_latents
 
@@ -415,11 +425,21 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
             width, height = image[0].shape[-2:]
 
         if depth_map is None:
-            pixel_values = self.feature_extractor(images=image, return_tensors="pd").pixel_values
-            # The DPT-Hybrid model uses batch-norm layers which are not compatible with fp16.
-            # TODO DPTModel `expand_as`` donot supoort float16
-            with paddle.amp.auto_cast(True, level="O2"):
-                depth_map = self.depth_estimator(pixel_values).predicted_depth.cast("float32")
+
+            def estimate_depth():
+                pixel_values = self.feature_extractor(images=image, return_tensors="pd").pixel_values
+                # The DPT-Hybrid model uses batch-norm layers which are not compatible with fp16.
+                # TODO DPTModel `expand_as`` donot supoort float16
+                with paddle.amp.auto_cast(True, level="O2"):
+                    return self.depth_estimator(pixel_values).predicted_depth.cast("float32")
+
+            if self.image_cache is None:
+                depth_map = estimate_depth()
+            else:
+                # keyed by the raw images, a hit also skips the feature extraction
+                depth_map = self.image_cache.get_or_compute(
+                    "depth", (self.feature_extractor, self.depth_estimator), image, estimate_depth
+                )
         else:
             depth_map = depth_map.cast("float32")
 
@@ -451,7 +471,7 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
         depth_map: Optional[paddle.Tensor] = None,
         strength: float = 0.8,
         num_inference_steps: Optional[int] = 50,
-        guidance_scale: Optional[float] = 7.5,
+        guidance_scale: Union[float, List[float]] = 7.5,
         negative_prompt: Optional[Union[str, List[str]]] = None,
         num_images_per_prompt: Optional[int] = 1,
         eta: Optional[float] = 0.0,
@@ -462,6 +482,7 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
         return_dict: bool = True,
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
+        guidance_end: float = 1.0,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -482,12 +503,12 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
             num_inference_steps (`int`, *optional*, defaults to 50):
                 The number of denoising steps. More denoising steps usually lead to a higher quality image at the
                 expense of slower inference. This parameter will be modulated by `strength`.
-            guidance_scale (`float`, *optional*, defaults to 7.5):
+            guidance_scale (`float` or `List[float]`, *optional*, defaults to 7.5):
                 Guidance scale as defined in [Classifier-Free Diffusion Guidance](https://arxiv.org/abs/2207.12598).
                 `guidance_scale` is defined as `w` of equation 2. of [Imagen
                 Paper](https://arxiv.org/pdf/2205.11487.pdf). Guidance scale is enabled by setting `guidance_scale >
                 1`. Higher guidance scale encourages to generate images that are closely linked to the text `prompt`,
-                usually at the expense of lower image quality.
+                usually at the expense of lower image quality. A list gives the guidance scale of every denoising step.
             negative_prompt (`str` or `List[str]`, *optional*):
                 The prompt or prompts not to guide the image generation. If not defined, one has to pass
                 `negative_prompt_embeds`. instead. Ignored when not using guidance (i.e., ignored if `guidance_scale`
@@ -518,6 +539,9 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
             callback_steps (`int`, *optional*, defaults to 1):
                 The frequency at which the `callback` function will be called. If not specified, the callback will be
                 called at every step.
+            guidance_end (`float`, *optional*, defaults to 1.0):
+                The fraction of the denoising steps after which classifier free guidance stops being applied. Steps
+                without guidance need a single batch UNet call instead of a doubled one.
 
         Examples:
 
@@ -558,7 +582,7 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
         # here `guidance_scale` is defined analog to the guidance weight `w` of equation (2)
         # of the Imagen paper: https://arxiv.org/pdf/2205.11487.pdf . `guidance_scale = 1`
         # corresponds to doing no classifier free guidance.
-        do_classifier_free_guidance = guidance_scale > 1.0
+        do_classifier_free_guidance = uses_classifier_free_guidance(guidance_scale, guidance_end)
 
         # 3. Encode input prompt
         prompt_embeds = self._encode_prompt(
@@ -597,20 +621,29 @@ class StableDiffusionDepth2ImgPipeline(DiffusionPipeline):
 
         # 9. Denoising loop
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        guidance_scales = get_guidance_scales(guidance_scale, len(timesteps), guidance_end, self.scheduler.order)
+        # the inputs of the steps without guidance, which only need the text conditioned prediction
+        text_prompt_embeds, text_depth_mask = prompt_embeds, depth_mask
+        if do_classifier_free_guidance:
+            text_prompt_embeds, text_depth_mask = prompt_embeds.chunk(2)[1], depth_mask.chunk(2)[1]
         with self.progress_bar(total=num_inference_steps) as progress_bar:
             for i, t in enumerate(timesteps):
+                do_step_guidance = do_classifier_free_guidance and guidance_scales[i] > 1.0
                 # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                latent_model_input = paddle.concat([latents] * 2) if do_step_guidance else latents
                 latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
-                latent_model_input = paddle.concat([latent_model_input, depth_mask], axis=1)
+                latent_model_input = paddle.concat(
+                    [latent_model_input, depth_mask if do_step_guidance else text_depth_mask], axis=1
+                )
 
                 # predict the noise residual
-                noise_pred = self.unet(latent_model_input, t, encoder_hidden_states=prompt_embeds).sample
+                encoder_hidden_states = prompt_embeds if do_step_guidance else text_prompt_embeds
+                noise_pred = self.unet(latent_model_input, t, encoder_hidden_states=encoder_hidden_states).sample
 
                 # perform guidance
-                if do_classifier_free_guidance:
+                if do_step_guidance:
                     noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                    noise_pred = noise_pred_uncond + guidance_scales[i] * (noise_pred_text - noise_pred_uncond)
 
                 # compute the previous noisy sample x_t -> x_t-1
                 latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
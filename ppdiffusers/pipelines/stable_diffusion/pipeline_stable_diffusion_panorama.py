@@ -11,19 +11,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import inspect
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import paddle
 
 from paddlenlp.transformers import CLIPFeatureExtractor, CLIPTextModel, CLIPTokenizer
 
 from ...models import AutoencoderKL, UNet2DConditionModel
-from ...schedulers import DDIMScheduler, PNDMScheduler
+from ...schedulers import DDIMScheduler
 from ...utils import logging, randn_tensor, replace_example_docstring
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -91,9 +93,6 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
     ):
         super().__init__()
 
-        if isinstance(scheduler, PNDMScheduler):
-            logger.error("PNDMScheduler for this pipeline is currently not supported.")
-
         if safety_checker is None and requires_safety_checker:
             logger.warning(
                 f"You have disabled the safety checker for {self.__class__} by passing `safety_checker=None`. Ensure"
@@ -279,10 +278,8 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -394,6 +391,35 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
             views.append((h_start, h_end, w_start, w_end))
         return views
 
+    def get_views_batch(
+        self, views: List[Tuple[int, int, int, int]], latent_height: int, latent_width: int, view_batch_size: int = 1
+    ) -> List[Tuple[paddle.Tensor, int, int, int]]:
+        """
+        Groups consecutive views into batches denoised by a single UNet call. Views are clipped to the latents like
+        slices are, only views of the same size are batched together.
+
+        Returns:
+            `List[Tuple[paddle.Tensor, int, int, int]]`: for every batch, the indices of its latent pixels in the
+            flattened latents (view by view, row-major), the number of views and the height and width of the views.
+        """
+        batches = []
+        for h_start, h_end, w_start, w_end in views:
+            rows = np.arange(*slice(h_start, h_end).indices(latent_height))
+            cols = np.arange(*slice(w_start, w_end).indices(latent_width))
+            if len(rows) == 0 or len(cols) == 0:
+                continue
+            index = (rows[:, None] * latent_width + cols[None, :]).reshape([-1])
+            size = (len(rows), len(cols))
+            if len(batches) == 0 or batches[-1][0] != size or len(batches[-1][1]) == view_batch_size:
+                batches.append((size, []))
+            batches[-1][1].append(index)
+
+        views_batch = []
+        for (view_height, view_width), indices in batches:
+            index = paddle.to_tensor(np.concatenate(indices), dtype="int64")
+            views_batch.append((index, len(indices), view_height, view_width))
+        return views_batch
+
     @paddle.no_grad()
     @replace_example_docstring(EXAMPLE_DOC_STRING)
     def __call__(
@@ -415,6 +441,7 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
         cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        view_batch_size: int = 1,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -475,6 +502,9 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
                 A kwargs dictionary that if specified is passed along to the `AttnProcessor` as defined under
                 `self.processor` in
                 [diffusers.cross_attention](https://github.com/huggingface/diffusers/blob/main/src/diffusers/models/cross_attention.py).
+            view_batch_size (`int`, *optional*, defaults to 1):
+                The number of views denoised together by a single UNet call. Larger values are faster when memory
+                allows, a 512x2048 panorama has 25 views.
 
         Examples:
 
@@ -535,8 +565,27 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
 
         # 6. Define panorama grid and initialize views for synthesis.
         views = self.get_views(height, width)
-        count = paddle.zeros_like(latents)
-        value = paddle.zeros_like(latents)
+        latents_shape = latents.shape
+        views_batch = self.get_views_batch(views, latents_shape[2], latents_shape[3], view_batch_size)
+        # every batch of views keeps its own scheduler state, so that multistep schedulers see the history of their
+        # own views only
+        views_scheduler_status = [copy.deepcopy(self.scheduler.__dict__) for _ in views_batch]
+
+        # the number of views covering every latent pixel does not change between steps
+        count = paddle.zeros([1, 1, latents_shape[2] * latents_shape[3]], dtype=latents.dtype)
+        for index, _, _, _ in views_batch:
+            count = paddle.index_add(count, index, 2, paddle.ones([1, 1, index.shape[0]], dtype=latents.dtype))
+
+        if do_classifier_free_guidance:
+            negative_prompt_embeds, prompt_embeds = prompt_embeds.chunk(2)
+        # the text embeddings of every batch size, views first, then images
+        prompt_embeds_batch = {}
+        for _, num_views, _, _ in views_batch:
+            if num_views not in prompt_embeds_batch:
+                embeds = [prompt_embeds] * num_views
+                if do_classifier_free_guidance:
+                    embeds = [negative_prompt_embeds] * num_views + embeds
+                prompt_embeds_batch[num_views] = paddle.concat(embeds)
 
         # 7. Prepare extra step kwargs. TODO: Logic should ideally just be moved out of the pipeline
         extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
@@ -545,23 +594,33 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
         # Each denoising step also includes refinement of the latents with respect to the
         # views.
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+        batch_size, num_channels = latents_shape[:2]
         with self.progress_bar(total=num_inference_steps) as progress_bar:
             for i, t in enumerate(timesteps):
-                count.zero_()
-                value.zero_()
+                latents = latents.reshape([batch_size, num_channels, -1])
+                value = paddle.zeros_like(latents)
 
                 # generate views
-                # Here, we iterate through different spatial crops of the latents and denoise them. These
+                # Here, we iterate through batches of spatial crops of the latents and denoise them. These
                 # denoised (latent) crops are then averaged to produce the final latent
                 # for the current timestep via MultiDiffusion. Please see Sec. 4.1 in the
                 # MultiDiffusion paper for more details: https://arxiv.org/abs/2302.08113
-                for h_start, h_end, w_start, w_end in views:
-                    # get the latents corresponding to the current view coordinates
-                    latents_for_view = latents[:, :, h_start:h_end, w_start:w_end]
+                for j, (index, num_views, view_height, view_width) in enumerate(views_batch):
+                    # get the latents corresponding to the current views, stacked along the batch axis view by view
+                    latents_for_view = paddle.index_select(latents, index, axis=2)
+                    latents_for_view = latents_for_view.reshape(
+                        [batch_size, num_channels, num_views, view_height, view_width]
+                    )
+                    latents_for_view = latents_for_view.transpose([2, 0, 1, 3, 4]).reshape(
+                        [num_views * batch_size, num_channels, view_height, view_width]
+                    )
+
+                    # restore the scheduler state of the views
+                    self.scheduler.__dict__.update(views_scheduler_status[j])
 
                     # expand the latents if we are doing classifier free guidance
                     latent_model_input = (
-                        paddle.concat([latents_for_view] * 2) if do_classifier_free_guidance else latents
+                        paddle.concat([latents_for_view] * 2) if do_classifier_free_guidance else latents_for_view
                     )
                     latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
@@ -569,7 +628,7 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
                     noise_pred = self.unet(
                         latent_model_input,
                         t,
-                        encoder_hidden_states=prompt_embeds,
+                        encoder_hidden_states=prompt_embeds_batch[num_views],
                         cross_attention_kwargs=cross_attention_kwargs,
                     ).sample
 
@@ -582,11 +641,21 @@ class StableDiffusionPanoramaPipeline(DiffusionPipeline):
                     latents_view_denoised = self.scheduler.step(
                         noise_pred, t, latents_for_view, **extra_step_kwargs
                     ).prev_sample
-                    value[:, :, h_start:h_end, w_start:w_end] += latents_view_denoised
-                    count[:, :, h_start:h_end, w_start:w_end] += 1
+
+                    # save the scheduler state of the views, the containers it mutates belong to these views only
+                    views_scheduler_status[j] = dict(self.scheduler.__dict__)
+
+                    # accumulate the denoised views
+                    latents_view_denoised = latents_view_denoised.reshape(
+                        [num_views, batch_size, num_channels, view_height * view_width]
+                    )
+                    latents_view_denoised = latents_view_denoised.transpose([1, 2, 0, 3]).reshape(
+                        [batch_size, num_channels, -1]
+                    )
+                    value = paddle.index_add(value, index, 2, latents_view_denoised)
 
                 # take the MultiDiffusion step. Eq. 5 in MultiDiffusion paper: https://arxiv.org/abs/2302.08113
-                latents = paddle.where(count > 0, value / count, value)
+                latents = paddle.where(count > 0, value / count, value).reshape(latents_shape)
 
                 # call the callback, if provided
                 if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import inspect
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Union
 
@@ -48,9 +49,11 @@ from ...utils import (
     randn_tensor,
     replace_example_docstring,
 )
+from ...utils.paddle_utils import get_rng_state_tracker
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .inversion_utils import DiffusionInversion, InversionCache, hash_image
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -66,10 +69,13 @@ class Pix2PixInversionPipelineOutput(BaseOutput):
         images (`List[PIL.Image.Image]` or `np.ndarray`)
             List of denoised PIL images of length `batch_size` or numpy array of shape `(batch_size, height, width,
             num_channels)`. PIL images or numpy array present the denoised images of the diffusion pipeline.
+        inversion (`DiffusionInversion`, *optional*)
+            The inversion of the image, pass it to the pipeline call to edit the image without inverting it again.
     """
 
     latents: paddle.Tensor
     images: Union[List[PIL.Image.Image], np.ndarray]
+    inversion: Optional[DiffusionInversion] = None
 
 
 EXAMPLE_DOC_STRING = """
@@ -315,6 +321,8 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         "caption_processor",
         "inverse_scheduler",
     ]
+    # number of prompt lists whose embeddings `get_embeds` keeps
+    _embeds_cache_size = 16
 
     def __init__(
         self,
@@ -502,10 +510,8 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -545,6 +551,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         target_embeds,
         callback_steps,
         prompt_embeds=None,
+        edit_direction=None,
     ):
         if (callback_steps is None) or (
             callback_steps is not None and (not isinstance(callback_steps, int) or callback_steps <= 0)
@@ -553,7 +560,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
                 f"`callback_steps` has to be a positive integer but is {callback_steps} of type"
                 f" {type(callback_steps)}."
             )
-        if source_embeds is None and target_embeds is None:
+        if source_embeds is None and target_embeds is None and edit_direction is None:
             raise ValueError("`source_embeds` and `target_embeds` cannot be undefined.")
 
         if prompt is not None and prompt_embeds is not None:
@@ -602,7 +609,19 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         return (embs_target.mean(0) - embs_source.mean(0)).unsqueeze(0)
 
     @paddle.no_grad()
-    def get_embeds(self, prompt: List[str], batch_size: int = 16) -> paddle.Tensor:
+    def get_embeds(self, prompt: List[str], batch_size: int = 16, use_cache: bool = True) -> paddle.Tensor:
+        """
+        Returns the mean text embeddings of `prompt`. With `use_cache` the result is kept, keyed by the prompts, so
+        building the same edit direction again does not encode the (usually hundreds of) sentences again.
+        """
+        cache_key = tuple(prompt)
+        if use_cache:
+            if getattr(self, "_embeds_cache", None) is None:
+                self._embeds_cache = OrderedDict()
+            if cache_key in self._embeds_cache:
+                self._embeds_cache.move_to_end(cache_key)
+                return self._embeds_cache[cache_key]
+
         num_prompts = len(prompt)
         embeds = []
         for i in range(0, num_prompts, batch_size):
@@ -618,7 +637,12 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
 
             embeds.append(self.text_encoder(input_ids)[0])
 
-        return paddle.concat(embeds, axis=0).mean(0)[None]
+        embeds = paddle.concat(embeds, axis=0).mean(0)[None]
+        if use_cache:
+            self._embeds_cache[cache_key] = embeds
+            if len(self._embeds_cache) > self._embeds_cache_size:
+                self._embeds_cache.popitem(last=False)
+        return embeds
 
     def prepare_image_latents(self, image, batch_size, dtype, generator=None):
         if not isinstance(image, (paddle.Tensor, PIL.Image.Image, list)):
@@ -705,6 +729,8 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
         cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        inversion: Optional[DiffusionInversion] = None,
+        edit_direction: Optional[paddle.Tensor] = None,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -768,6 +794,14 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
             callback_steps (`int`, *optional*, defaults to 1):
                 The frequency at which the `callback` function will be called. If not specified, the callback will be
                 called at every step.
+            inversion (`DiffusionInversion`, *optional*):
+                The inversion of the image returned by [`~StableDiffusionPix2PixZeroPipeline.invert`]. It provides the
+                default `latents` and `prompt_embeds`, and the reference cross-attention maps are stored in it: further
+                edits with the same latents, prompt and settings skip the reconstruction pass.
+            edit_direction (`paddle.Tensor`, *optional*):
+                A precomputed edit direction, e.g. one returned by
+                [`~StableDiffusionPix2PixZeroPipeline.construct_direction`]. `source_embeds` and `target_embeds` are
+                ignored when it is given.
 
         Examples:
 
@@ -782,6 +816,12 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         height = height or self.unet.config.sample_size * self.vae_scale_factor
         width = width or self.unet.config.sample_size * self.vae_scale_factor
 
+        if inversion is not None:
+            if latents is None:
+                latents = inversion.latents
+            if prompt is None and prompt_embeds is None:
+                prompt_embeds = inversion.prompt_embeds
+
         # 1. Check inputs. Raise error if not correct
         self.check_inputs(
             prompt,
@@ -790,6 +830,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
             target_embeds,
             callback_steps,
             prompt_embeds,
+            edit_direction,
         )
 
         # 3. Define call parameters
@@ -842,38 +883,73 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         # use them for guiding the subsequent image generation.
         self.unet = prepare_unet(self.unet)
 
-        # 7. Denoising loop where we obtain the cross-attention maps.
-        num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
-        with self.progress_bar(total=num_inference_steps) as progress_bar:
-            for i, t in enumerate(timesteps):
-                # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
-                latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
-
-                # predict the noise residual
-                noise_pred = self.unet(
-                    latent_model_input,
-                    t,
-                    encoder_hidden_states=prompt_embeds,
-                    cross_attention_kwargs={"timestep": t},
-                ).sample
+        # the reference maps only depend on the reconstruction inputs, an inversion keeps them for the next edits
+        reference_attn_processors = {
+            name: processor for name, processor in self.unet.attn_processors.items() if processor.is_pix2pix_zero
+        }
+        reference_key = None
+        if inversion is not None:
+            reference_key = {
+                "latents": hash_image(latents_init),
+                "prompt_embeds": hash_image(prompt_embeds),
+                "num_inference_steps": num_inference_steps,
+                "guidance_scale": guidance_scale,
+                "eta": eta,
+                "scheduler": self.scheduler.__class__.__name__,
+            }
+        reuse_reference = (
+            reference_key is not None
+            and inversion.cross_attention_maps is not None
+            and inversion.config.get("reference") == reference_key
+        )
 
-                # perform guidance
-                if do_classifier_free_guidance:
-                    noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+        if reuse_reference:
+            for name, processor in reference_attn_processors.items():
+                processor.reference_cross_attn_map = dict(inversion.cross_attention_maps[name])
+        else:
+            # 7. Denoising loop where we obtain the cross-attention maps.
+            num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
+            with self.progress_bar(total=num_inference_steps) as progress_bar:
+                for i, t in enumerate(timesteps):
+                    # expand the latents if we are doing classifier free guidance
+                    latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                    latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
 
-                # compute the previous noisy sample x_t -> x_t-1
-                latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+                    # predict the noise residual
+                    noise_pred = self.unet(
+                        latent_model_input,
+                        t,
+                        encoder_hidden_states=prompt_embeds,
+                        cross_attention_kwargs={"timestep": t},
+                    ).sample
 
-                # call the callback, if provided
-                if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
-                    progress_bar.update()
-                    if callback is not None and i % callback_steps == 0:
-                        callback(i, t, latents)
+                    # perform guidance
+                    if do_classifier_free_guidance:
+                        noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                        noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+                    # compute the previous noisy sample x_t -> x_t-1
+                    latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+
+                    # call the callback, if provided
+                    if i == len(timesteps) - 1 or (
+                        (i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0
+                    ):
+                        progress_bar.update()
+                        if callback is not None and i % callback_steps == 0:
+                            callback(i, t, latents)
+
+            if reference_key is not None:
+                # the edit loop pops the maps from the processors, keep shallow copies
+                inversion.cross_attention_maps = {
+                    name: dict(processor.reference_cross_attn_map)
+                    for name, processor in reference_attn_processors.items()
+                }
+                inversion.config["reference"] = reference_key
 
         # 8. Compute the edit directions.
-        edit_direction = self.construct_direction(source_embeds, target_embeds)
+        if edit_direction is None:
+            edit_direction = self.construct_direction(source_embeds, target_embeds)
 
         # 9. Edit the prompt embeddings as per the edit directions discovered.
         prompt_embeds_edit = prompt_embeds.clone()
@@ -970,6 +1046,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         lambda_kl: float = 20.0,
         num_reg_steps: int = 5,
         num_auto_corr_rolls: int = 5,
+        inversion_cache: Optional[InversionCache] = None,
     ):
         r"""
         Function used to generate inverted latents given a prompt and image.
@@ -1020,6 +1097,9 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
                 Number of regularization loss steps
             num_auto_corr_rolls (`int`, *optional*, defaults to 5):
                 Number of auto correction roll steps
+            inversion_cache (`InversionCache`, *optional*):
+                A cache of inversions. An image already inverted with the same prompt, settings, inverse scheduler
+                config and generator state is not inverted again, its cached inversion is returned.
 
         Examples:
 
@@ -1028,7 +1108,8 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
             `tuple`:
             [`~pipelines.stable_diffusion.pipeline_stable_diffusion_pix2pix_zero.Pix2PixInversionPipelineOutput`] if
             `return_dict` is True, otherwise a `tuple. When returning a tuple, the first element is the inverted
-            latents tensor and then second is the corresponding decoded image.
+            latents tensor and then second is the corresponding decoded image. The output also holds the
+            [`DiffusionInversion`] of the image, which can be passed to the pipeline call.
         """
         # 1. Define call parameters
         if prompt is not None and isinstance(prompt, str):
@@ -1045,6 +1126,25 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         # corresponds to doing no classifier free guidance.
         do_classifier_free_guidance = guidance_scale > 1.0
 
+        inversion_config = {
+            "prompt": prompt if prompt_embeds is None else hash_image(prompt_embeds),
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "lambda_auto_corr": lambda_auto_corr,
+            "lambda_kl": lambda_kl,
+            "num_reg_steps": num_reg_steps,
+            "num_auto_corr_rolls": num_auto_corr_rolls,
+            "inverse_scheduler": [self.inverse_scheduler.__class__.__name__, dict(self.inverse_scheduler.config)],
+            # the generator draws the latents of the image and the rolls of the auto correlation loss
+            "generator": get_rng_state_tracker().state_key(generator),
+        }
+        inversion = None
+        if inversion_cache is not None:
+            cache_key = inversion_cache.make_key(image, **inversion_config)
+            inversion = inversion_cache.get(cache_key)
+        if inversion is not None:
+            return self._inversion_output(inversion, output_type, return_dict)
+
         # 3. Preprocess image
         image = preprocess(image)
 
@@ -1063,6 +1163,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         # 4. Prepare timesteps
         self.inverse_scheduler.set_timesteps(num_inference_steps)
         timesteps = self.inverse_scheduler.timesteps
+        step_latents = []
 
         # 6. Rejig the UNet so that we can obtain the cross-attenion maps and
         # use them for guiding the subsequent image generation.
@@ -1116,6 +1217,7 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
 
                 # compute the previous noisy sample x_t -> x_t-1
                 latents = self.inverse_scheduler.step(noise_pred, t, latents).prev_sample
+                step_latents.append(latents)
 
                 # call the callback, if provided
                 if i == len(timesteps) - 1 or (
@@ -1126,9 +1228,24 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
                         callback(i, t, latents)
 
         inverted_latents = latents.detach().clone()
+        inversion = DiffusionInversion(
+            latents=inverted_latents,
+            timesteps=[int(t) for t in timesteps[1:-1]],
+            # the caption embeddings, without the unconditional ones
+            prompt_embeds=prompt_embeds[-batch_size:],
+            step_latents=step_latents,
+            config=inversion_config,
+        )
+        if inversion_cache is not None:
+            inversion_cache.put(cache_key, inversion)
+
+        return self._inversion_output(inversion, output_type, return_dict)
+
+    def _inversion_output(self, inversion: DiffusionInversion, output_type: str = "pil", return_dict: bool = True):
+        inverted_latents = inversion.latents.clone()
 
         # 8. Post-processing
-        image = self.decode_latents(latents.detach())
+        image = self.decode_latents(inverted_latents)
 
         # 9. Convert to PIL.
         if output_type == "pil":
@@ -1137,4 +1254,4 @@ class StableDiffusionPix2PixZeroPipeline(DiffusionPipeline):
         if not return_dict:
             return (inverted_latents, image)
 
-        return Pix2PixInversionPipelineOutput(latents=inverted_latents, images=image)
+        return Pix2PixInversionPipelineOutput(latents=inverted_latents, images=image, inversion=inversion)
@@ -28,7 +28,7 @@ from ...schedulers import KarrasDiffusionSchedulers
 from ...utils import logging, randn_tensor, replace_example_docstring
 from ..pipeline_utils import DiffusionPipeline
 from . import StableDiffusionPipelineOutput
-from .safety_checker import StableDiffusionSafetyChecker
+from .safety_checker import StableDiffusionSafetyChecker, preprocess_safety_checker_input
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -52,8 +52,16 @@ if not hasattr(math, "isqrt"):
 
 # processes and stores attention probabilities
 class CrossAttnStoreProcessor:
+    """
+    Attention processor storing, for every sample, the sum over the queries of the head averaged self-attention
+    probabilities, i.e. how much attention every latent pixel receives. This is all the self-attention guidance needs
+    from the attention maps, so the full `(batch size * heads, pixels, pixels)` probabilities are not kept.
+    """
+
     def __init__(self):
-        self.attention_probs = None
+        self.attention_map = None
+        # whether the next calls store their attention map
+        self.enabled = True
 
     def __call__(
         self,
@@ -79,8 +87,9 @@ class CrossAttnStoreProcessor:
         value = attn.head_to_batch_dim(value)
 
         attention_probs = attn.get_attention_scores(query, key, attention_mask)
-        # we need to flatten this (0, 1)
-        self.attention_probs = attention_probs.flatten(0, 1)
+        if self.enabled:
+            # (batch size, heads, pixels, pixels) -> (batch size, pixels)
+            self.attention_map = attention_probs.mean(1).sum(1)
         hidden_states = paddle.matmul(attention_probs, value)
         hidden_states = attn.batch_to_head_dim(hidden_states)
 
@@ -304,10 +313,8 @@ class StableDiffusionSAGPipeline(DiffusionPipeline):
     # Copied from ppdiffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.run_safety_checker
     def run_safety_checker(self, image, dtype):
         if self.safety_checker is not None:
-            safety_checker_input = self.feature_extractor(self.numpy_to_pil(image), return_tensors="pd")
-            image, has_nsfw_concept = self.safety_checker(
-                images=image, clip_input=safety_checker_input.pixel_values.cast(dtype)
-            )
+            clip_input = preprocess_safety_checker_input(image, self.feature_extractor, dtype)
+            image, has_nsfw_concept = self.safety_checker(images=image, clip_input=clip_input)
         else:
             has_nsfw_concept = None
         return image, has_nsfw_concept
@@ -425,6 +432,9 @@ class StableDiffusionSAGPipeline(DiffusionPipeline):
         callback: Optional[Callable[[int, int, paddle.Tensor], None]] = None,
         callback_steps: Optional[int] = 1,
         cross_attention_kwargs: Optional[Dict[str, Any]] = None,
+        sag_start: float = 0.0,
+        sag_end: float = 1.0,
+        fuse_sag_batch: bool = False,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -488,6 +498,16 @@ class StableDiffusionSAGPipeline(DiffusionPipeline):
                 A kwargs dictionary that if specified is passed along to the `AttnProcessor` as defined under
                 `self.processor` in
                 [diffusers.cross_attention](https://github.com/huggingface/diffusers/blob/main/src/diffusers/models/cross_attention.py).
+            sag_start (`float`, *optional*, defaults to 0.0):
+                The fraction of the denoising steps after which self-attention guidance starts to be applied.
+            sag_end (`float`, *optional*, defaults to 1.0):
+                The fraction of the denoising steps after which self-attention guidance stops being applied. Steps
+                without guidance need a single UNet call instead of two.
+            fuse_sag_batch (`bool`, *optional*, defaults to `False`):
+                Whether to predict the noise of the degraded latents in the same UNet call as the classifier free
+                guidance predictions. The degraded latents then have to be built from the prediction and the attention
+                map of the previous step, re-noised to the current timestep, instead of those of the current step.
+                This approximation saves the second, serial UNet call of every guided step but the first one.
 
         Examples:
 
@@ -555,66 +575,86 @@ class StableDiffusionSAGPipeline(DiffusionPipeline):
 
         # 7. Denoising loop
         store_processor = CrossAttnStoreProcessor()
-        self.unet.mid_block.attentions[0].transformer_blocks[0].attn1.processor = store_processor
+        attn1 = self.unet.mid_block.attentions[0].transformer_blocks[0].attn1
+        original_processor = attn1.processor
+        attn1.processor = store_processor
+        # classifier-free guidance produces two chunks of attention map
+        # and we only use unconditional one according to equation (24)
+        # in https://arxiv.org/pdf/2210.00939.pdf
+        sag_prompt_embeds = prompt_embeds.chunk(2)[0] if do_classifier_free_guidance else prompt_embeds
+        sag_batch_size = latents.shape[0]
+        # prediction of x0, attention map and noise of the previous step, to degrade the latents of the fused batch
+        sag_state = None
         num_warmup_steps = len(timesteps) - num_inference_steps * self.scheduler.order
-        with self.progress_bar(total=num_inference_steps) as progress_bar:
-            for i, t in enumerate(timesteps):
-                # expand the latents if we are doing classifier free guidance
-                latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
-                latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
-
-                # predict the noise residual
-                noise_pred = self.unet(
-                    latent_model_input,
-                    t,
-                    encoder_hidden_states=prompt_embeds,
-                    cross_attention_kwargs=cross_attention_kwargs,
-                ).sample
-
-                # perform guidance
-                if do_classifier_free_guidance:
-                    noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                    noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
-
-                # perform self-attention guidance with the stored self-attentnion map
-                if do_self_attention_guidance:
-                    # classifier-free guidance produces two chunks of attention map
-                    # and we only use unconditional one according to equation (24)
-                    # in https://arxiv.org/pdf/2210.00939.pdf
+        try:
+            with self.progress_bar(total=num_inference_steps) as progress_bar:
+                for i, t in enumerate(timesteps):
+                    apply_sag = do_self_attention_guidance and not (
+                        i / len(timesteps) < sag_start or (i + 1) / len(timesteps) > sag_end
+                    )
+                    fuse_sag = apply_sag and fuse_sag_batch and sag_state is not None
+                    store_processor.enabled = apply_sag
+
+                    # expand the latents if we are doing classifier free guidance
+                    latent_model_input = paddle.concat([latents] * 2) if do_classifier_free_guidance else latents
+                    latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
+                    encoder_hidden_states = prompt_embeds
+                    if fuse_sag:
+                        # self-attention-based degrading of the latents with the previous prediction, which then
+                        # goes through the UNet together with the classifier free guidance batch
+                        degraded_latents = self.sag_masking(sag_state[0], sag_state[1], t, sag_state[2])
+                        latent_model_input = paddle.concat([latent_model_input, degraded_latents])
+                        encoder_hidden_states = paddle.concat([prompt_embeds, sag_prompt_embeds])
+
+                    # predict the noise residual
+                    noise_pred = self.unet(
+                        latent_model_input,
+                        t,
+                        encoder_hidden_states=encoder_hidden_states,
+                        cross_attention_kwargs=cross_attention_kwargs,
+                    ).sample
+                    if fuse_sag:
+                        noise_pred, degraded_pred = noise_pred[:-sag_batch_size], noise_pred[-sag_batch_size:]
+
+                    # perform guidance
                     if do_classifier_free_guidance:
-                        # DDIM-like prediction of x0
-                        pred_x0 = self.pred_x0(latents, noise_pred_uncond, t)
-                        # get the stored attention maps
-                        uncond_attn, cond_attn = store_processor.attention_probs.chunk(2)
-                        # self-attention-based degrading of latents
-                        degraded_latents = self.sag_masking(
-                            pred_x0, uncond_attn, t, self.pred_epsilon(latents, noise_pred_uncond, t)
-                        )
-                        uncond_emb, _ = prompt_embeds.chunk(2)
-                        # forward and give guidance
-                        degraded_pred = self.unet(degraded_latents, t, encoder_hidden_states=uncond_emb).sample
-                        noise_pred += sag_scale * (noise_pred_uncond - degraded_pred)
+                        noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                        noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+                        sag_noise_pred = noise_pred_uncond
                     else:
+                        sag_noise_pred = noise_pred
+
+                    # perform self-attention guidance with the stored self-attentnion map
+                    if apply_sag:
                         # DDIM-like prediction of x0
-                        pred_x0 = self.pred_x0(latents, noise_pred, t)
-                        # get the stored attention maps
-                        cond_attn = store_processor.attention_probs
-                        # self-attention-based degrading of latents
-                        degraded_latents = self.sag_masking(
-                            pred_x0, cond_attn, t, self.pred_epsilon(latents, noise_pred, t)
-                        )
-                        # forward and give guidance
-                        degraded_pred = self.unet(degraded_latents, t, encoder_hidden_states=prompt_embeds).sample
-                        noise_pred += sag_scale * (noise_pred - degraded_pred)
-
-                # compute the previous noisy sample x_t -> x_t-1
-                latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
-
-                # call the callback, if provided
-                if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
-                    progress_bar.update()
-                    if callback is not None and i % callback_steps == 0:
-                        callback(i, t, latents)
+                        pred_x0 = self.pred_x0(latents, sag_noise_pred, t)
+                        pred_epsilon = self.pred_epsilon(latents, sag_noise_pred, t)
+                        # get the stored attention maps, the unconditional ones come first
+                        attn_map = store_processor.attention_map[:sag_batch_size]
+                        if not fuse_sag:
+                            # self-attention-based degrading of latents
+                            degraded_latents = self.sag_masking(pred_x0, attn_map, t, pred_epsilon)
+                            # forward and give guidance
+                            degraded_pred = self.unet(
+                                degraded_latents, t, encoder_hidden_states=sag_prompt_embeds
+                            ).sample
+                        noise_pred += sag_scale * (sag_noise_pred - degraded_pred)
+                        sag_state = (pred_x0, attn_map, pred_epsilon) if fuse_sag_batch else None
+                    else:
+                        sag_state = None
+
+                    # compute the previous noisy sample x_t -> x_t-1
+                    latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+
+                    # call the callback, if provided
+                    if i == len(timesteps) - 1 or (
+                        (i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0
+                    ):
+                        progress_bar.update()
+                        if callback is not None and i % callback_steps == 0:
+                            callback(i, t, latents)
+        finally:
+            attn1.processor = original_processor
 
         # 8. Post-processing
         image = self.decode_latents(latents)
@@ -633,16 +673,19 @@ class StableDiffusionSAGPipeline(DiffusionPipeline):
 
     def sag_masking(self, original_latents, attn_map, t, eps):
         # Same masking process as in SAG paper: https://arxiv.org/pdf/2210.00939.pdf
-        bh, hw1, hw2 = attn_map.shape
         b, latent_channel, latent_h, latent_w = original_latents.shape
-        h = self.unet.attention_head_dim
-        if isinstance(h, list):
-            h = h[-1]
-        map_size = math.isqrt(hw1)
+        if attn_map.ndim == 3:
+            # full attention probabilities of shape (batch size * heads, pixels, pixels)
+            bh, hw1, hw2 = attn_map.shape
+            h = self.unet.attention_head_dim
+            if isinstance(h, list):
+                h = h[-1]
+            attn_map = attn_map.reshape([b, h, hw1, hw2]).mean(1, keepdim=False).sum(1, keepdim=False)
+        # attention received by every pixel, of shape (batch size, pixels), as stored by `CrossAttnStoreProcessor`
+        map_size = math.isqrt(attn_map.shape[1])
 
         # Produce attention mask
-        attn_map = attn_map.reshape([b, h, hw1, hw2])
-        attn_mask = attn_map.mean(1, keepdim=False).sum(1, keepdim=False) > 1.0
+        attn_mask = attn_map > 1.0
         attn_mask = (
             attn_mask.reshape([b, map_size, map_size])
             .unsqueeze(1)
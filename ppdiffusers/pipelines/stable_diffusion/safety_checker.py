@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+
 import numpy as np
 import paddle
 import paddle.nn.functional as F
@@ -22,7 +24,7 @@ from paddlenlp.transformers import (
     CLIPVisionModel,
 )
 
-from ...utils import logging
+from ...utils import logging, pd_round_half_to_even
 
 logger = logging.get_logger(__name__)
 
@@ -33,6 +35,98 @@ def cosine_distance(image_embeds, text_embeds):
     return paddle.matmul(normalized_image_embeds, normalized_text_embeds, transpose_y=True)
 
 
+def _get_size(size):
+    # the sizes of the feature extractors are either integers or dictionaries
+    if isinstance(size, dict):
+        return size["shortest_edge"] if "shortest_edge" in size else (size["height"], size["width"])
+    return size
+
+
+def _bicubic(x: np.ndarray) -> np.ndarray:
+    # the bicubic filter of PIL, with a = -0.5
+    x = np.abs(x)
+    return np.where(
+        x < 1.0, (1.5 * x - 2.5) * x * x + 1.0, np.where(x < 2.0, (((x - 5.0) * x + 8.0) * x - 4.0) * -0.5, 0.0)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _bicubic_resize_weights(in_size: int, out_size: int) -> np.ndarray:
+    # the fixed point weights of the antialiased bicubic resampling of PIL from `in_size` to `out_size` pixels, as in
+    # `precompute_coeffs` and `normalize_coeffs_8bpc` of its Resample.c
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = 2.0 * filterscale
+    weights = np.zeros([out_size, in_size])
+    for x in range(out_size):
+        center = (x + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size)
+        w = _bicubic((np.arange(xmin, xmax) - center + 0.5) * (1.0 / filterscale))
+        weights[x, xmin:xmax] = w / w.sum() if w.sum() != 0 else w
+    return np.trunc(weights * (1 << 22) + np.where(weights < 0, -0.5, 0.5))
+
+
+def _resize_bicubic(images: paddle.Tensor, size) -> paddle.Tensor:
+    # the PIL resize of the 8 bit images, the rows first and then the columns, with its integer arithmetic: the float64
+    # sums of the products of the pixels and of the 22 bit weights are exact
+    height, width = images.shape[2:]
+    images = images.astype("float64")
+    if size[1] != width:
+        weights = paddle.to_tensor(_bicubic_resize_weights(width, size[1]).T)
+        images = paddle.floor((paddle.matmul(images, weights) + (1 << 21)) / (1 << 22)).clip(0.0, 255.0)
+    if size[0] != height:
+        weights = paddle.to_tensor(_bicubic_resize_weights(height, size[0]))
+        images = paddle.floor((paddle.matmul(weights, images) + (1 << 21)) / (1 << 22)).clip(0.0, 255.0)
+    return images.astype("float32")
+
+
+def preprocess_safety_checker_input(images, feature_extractor, dtype=None) -> paddle.Tensor:
+    """
+    The CLIP input of the safety checker, computed from the images of a pipeline with batched tensor ops on the device
+    instead of going through PIL images and `feature_extractor` on the CPU. It reproduces the quantization to 8 bits,
+    the bicubic resizing of PIL, the center cropping and the normalization of `feature_extractor`, so that it only
+    differs from it by the float rounding of the normalization.
+
+    Args:
+        images (`np.ndarray` or `paddle.Tensor`):
+            The images, of shape `[batch_size, height, width, 3]`, either float in `[0, 1]` or uint8.
+        feature_extractor ([`CLIPFeatureExtractor`]): the feature extractor of the pipeline.
+        dtype (`paddle.dtype`, *optional*): the dtype of the returned input, float32 by default.
+    """
+    if isinstance(images, np.ndarray):
+        images = paddle.to_tensor(images)
+    if images.dtype == paddle.uint8:
+        images = images.astype("float32").transpose([0, 3, 1, 2])
+    else:
+        # the PIL images are quantized to 8 bits
+        images = pd_round_half_to_even(images.astype("float32").transpose([0, 3, 1, 2]) * 255.0)
+
+    if getattr(feature_extractor, "do_resize", True):
+        shortest_edge = _get_size(feature_extractor.size)
+        height, width = images.shape[2:]
+        if isinstance(shortest_edge, tuple):
+            size = list(shortest_edge)
+        elif height <= width:
+            size = [shortest_edge, int(shortest_edge * width / height)]
+        else:
+            size = [int(shortest_edge * height / width), shortest_edge]
+        images = _resize_bicubic(images, size)
+    if getattr(feature_extractor, "do_center_crop", True):
+        crop_size = _get_size(feature_extractor.crop_size)
+        crop_height, crop_width = crop_size if isinstance(crop_size, tuple) else (crop_size, crop_size)
+        height, width = images.shape[2:]
+        top, left = (height - crop_height) // 2, (width - crop_width) // 2
+        images = images[:, :, top : top + crop_height, left : left + crop_width]
+
+    images = images * getattr(feature_extractor, "rescale_factor", 1 / 255)
+    if getattr(feature_extractor, "do_normalize", True):
+        mean = paddle.to_tensor(feature_extractor.image_mean, dtype="float32").reshape([1, 3, 1, 1])
+        std = paddle.to_tensor(feature_extractor.image_std, dtype="float32").reshape([1, 3, 1, 1])
+        images = (images - mean) / std
+    return images.cast(dtype) if dtype is not None else images
+
+
 class StableDiffusionSafetyChecker(CLIPPretrainedModel):
     config_class = CLIPVisionConfig
 
@@ -50,46 +144,78 @@ class StableDiffusionSafetyChecker(CLIPPretrainedModel):
         self.register_buffer("concept_embeds_weights", paddle.ones([17]))
         self.register_buffer("special_care_embeds_weights", paddle.ones([3]))
 
-    @paddle.no_grad()
-    def forward(self, clip_input, images):
+        self._normalized_concepts = None
+
+    def set_state_dict(self, *args, **kwargs):
+        # the normalized concepts of the previous weights are stale
+        self._normalized_concepts = None
+        return super().set_state_dict(*args, **kwargs)
+
+    set_dict = load_dict = set_state_dict
+
+    def normalized_concepts(self):
+        """
+        The normalized embeddings of the special care and the other concepts, computed once for the loaded weights and
+        their dtype instead of at every call.
+        """
+        dtype = self.concept_embeds.dtype
+        if self._normalized_concepts is None or self._normalized_concepts[0] != dtype:
+            with paddle.no_grad():
+                self._normalized_concepts = (
+                    dtype,
+                    F.normalize(self.special_care_embeds),
+                    F.normalize(self.concept_embeds),
+                )
+        return self._normalized_concepts[1:]
+
+    def detect_nsfw_concepts(
+        self,
+        clip_input: paddle.Tensor,
+        special_care_embeds: paddle.Tensor,
+        concept_embeds: paddle.Tensor,
+        round_scores: bool = True,
+    ) -> paddle.Tensor:
+        """
+        Whether each image shows a NSFW concept, for the whole batch at once: the cosine similarity of the image to a
+        concept is above the threshold of the concept, and the thresholds are lowered by 0.01 for the images showing a
+        special care concept.
+
+        Args:
+            clip_input (`paddle.Tensor`): the CLIP input of the images.
+            special_care_embeds (`paddle.Tensor`): the normalized embeddings of the special care concepts.
+            concept_embeds (`paddle.Tensor`): the normalized embeddings of the other concepts.
+            round_scores (`bool`, *optional*, defaults to `True`):
+                Round the scores to 3 decimals before comparing them to 0, as the original safety checker does.
+        """
         pooled_output = self.clip(clip_input)[1]  # pooled_output
-        image_embeds = paddle.matmul(pooled_output, self.vision_projection)
+        image_embeds = F.normalize(paddle.matmul(pooled_output, self.vision_projection))
 
         # we always cast to float32 as this does not cause significant overhead and is compatible with bfloat16
-        special_cos_dist = cosine_distance(image_embeds, self.special_care_embeds).astype("float32").numpy()
-        cos_dist = cosine_distance(image_embeds, self.concept_embeds).astype("float32").numpy()
-
-        result = []
-        batch_size = image_embeds.shape[0]
-        for i in range(batch_size):
-            result_img = {"special_scores": {}, "special_care": [], "concept_scores": {}, "bad_concepts": []}
+        special_cos_dist = paddle.matmul(image_embeds, special_care_embeds, transpose_y=True).astype("float32")
+        cos_dist = paddle.matmul(image_embeds, concept_embeds, transpose_y=True).astype("float32")
 
-            # increase this value to create a stronger `nfsw` filter
-            # at the cost of increasing the possibility of filtering benign images
-            adjustment = 0.0
-
-            for concept_idx in range(len(special_cos_dist[0])):
-                concept_cos = special_cos_dist[i][concept_idx]
-                concept_threshold = self.special_care_embeds_weights[concept_idx].item()
-                result_img["special_scores"][concept_idx] = round(concept_cos - concept_threshold + adjustment, 3)
-                if result_img["special_scores"][concept_idx] > 0:
-                    result_img["special_care"].append({concept_idx, result_img["special_scores"][concept_idx]})
-                    adjustment = 0.01
+        # increase this value to create a stronger `nsfw` filter
+        # at the cost of increasing the possibility of filtering benign images
+        adjustment = 0.0
 
-            for concept_idx in range(len(cos_dist[0])):
-                concept_cos = cos_dist[i][concept_idx]
-                concept_threshold = self.concept_embeds_weights[concept_idx].item()
-                result_img["concept_scores"][concept_idx] = round(concept_cos - concept_threshold + adjustment, 3)
-                if result_img["concept_scores"][concept_idx] > 0:
-                    result_img["bad_concepts"].append(concept_idx)
+        special_scores = special_cos_dist - self.special_care_embeds_weights.astype("float32") + adjustment
+        if round_scores:
+            special_scores = paddle.round(special_scores * 1000)
+        special_care = paddle.any(special_scores > 0, axis=1, keepdim=True)
+        special_adjustment = special_care.astype("float32") * 0.01
 
-            result.append(result_img)
+        concept_scores = cos_dist - self.concept_embeds_weights.astype("float32") + adjustment + special_adjustment
+        if round_scores:
+            concept_scores = paddle.round(concept_scores * 1000)
+        return paddle.any(concept_scores > 0, axis=1)
 
-        has_nsfw_concepts = [len(res["bad_concepts"]) > 0 for res in result]
+    @paddle.no_grad()
+    def forward(self, clip_input, images):
+        has_nsfw_concepts = self.detect_nsfw_concepts(clip_input, *self.normalized_concepts()).numpy()
 
-        for idx, has_nsfw_concept in enumerate(has_nsfw_concepts):
-            if has_nsfw_concept:
-                images[idx] = np.zeros(images[idx].shape)  # black image
+        if has_nsfw_concepts.any():
+            images[has_nsfw_concepts] = 0.0  # black image
+        has_nsfw_concepts = has_nsfw_concepts.tolist()
 
         if any(has_nsfw_concepts):
             logger.warning(
@@ -100,25 +226,10 @@ class StableDiffusionSafetyChecker(CLIPPretrainedModel):
         return images, has_nsfw_concepts
 
     def forward_fastdeploy(self, clip_input: paddle.Tensor, images: paddle.Tensor):
-        pooled_output = self.clip(clip_input)[1]  # pooled_output
-        image_embeds = paddle.matmul(pooled_output, self.vision_projection)
-
-        special_cos_dist = cosine_distance(image_embeds, self.special_care_embeds)
-        cos_dist = cosine_distance(image_embeds, self.concept_embeds)
-
-        # increase this value to create a stronger `nsfw` filter
-        # at the cost of increasing the possibility of filtering benign images
-        adjustment = 0.0
-
-        special_scores = special_cos_dist - self.special_care_embeds_weights + adjustment
-        # special_scores = special_scores.round(decimals=3)
-        special_care = paddle.any(special_scores > 0, axis=1)
-        special_adjustment = special_care * 0.01
-        special_adjustment = special_adjustment.unsqueeze(1).expand([-1, cos_dist.shape[1]])
-
-        concept_scores = (cos_dist - self.concept_embeds_weights) + special_adjustment
-        # concept_scores = concept_scores.round(decimals=3)
-        has_nsfw_concepts = paddle.any(concept_scores > 0, axis=1)
+        # the exported scores are not rounded
+        has_nsfw_concepts = self.detect_nsfw_concepts(
+            clip_input, F.normalize(self.special_care_embeds), F.normalize(self.concept_embeds), round_scores=False
+        )
 
         images[has_nsfw_concepts] = 0.0  # black image
 
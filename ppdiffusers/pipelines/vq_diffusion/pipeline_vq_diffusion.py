@@ -29,10 +29,19 @@ logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
 INF = 1e9
 
+# number of most likely classes `VQDiffusionPipeline.truncate` sorts first, the whole distribution is only sorted if
+# they do not reach the truncation rate
+TRUNCATION_TOP_K = 64
 
-# paddle logsumexp may has bug
+
+# Copied from ppdiffusers.schedulers.scheduling_vq_diffusion.logsumexp
 def logsumexp(x, axis=None, keepdim=False):
-    return paddle.log(x.exp().sum(axis=axis, keepdim=keepdim))
+    # shifted by the maximum, so that it does neither overflow nor underflow in float16
+    maximum = x.max(axis=axis, keepdim=True)
+    out = maximum + paddle.log(paddle.exp(x - maximum).sum(axis=axis, keepdim=True))
+    if not keepdim:
+        out = out.squeeze(axis)
+    return out
 
 
 class LearnedClassifierFreeSamplingEmbeddings(ModelMixin, ConfigMixin):
@@ -321,20 +330,26 @@ class VQDiffusionPipeline(DiffusionPipeline):
         Truncates log_p_x_0 such that for each column vector, the total cumulative probability is `truncation_rate` The
         lowest probabilities that would increase the cumulative probability above `truncation_rate` are set to zero.
         """
-        sorted_log_p_x_0, indices = paddle.topk(log_p_x_0, k=log_p_x_0.shape[1], axis=1)
-        sorted_p_x_0 = paddle.exp(sorted_log_p_x_0)
-        keep_mask = (sorted_p_x_0.cumsum(axis=1) < truncation_rate).cast("int64")
-
-        # Ensure that at least the largest probability is not zeroed out
-        all_true = paddle.full_like(keep_mask[:, 0:1, :], 1)
-        keep_mask = paddle.concat((all_true, keep_mask), axis=1)
-        keep_mask = keep_mask[:, :-1, :]
-
-        keep_mask = paddle.take_along_axis(keep_mask, indices.argsort(1), axis=1).cast(
-            "bool"
-        )  # keep_mask.gather(indices.argsort(1), axis=1)
-        rv = log_p_x_0.clone()
+        # Only the most likely classes are sorted when every pixel reaches the truncation rate within them, which is
+        # usually the case long before the whole distribution is. Otherwise (and always for a truncation rate of 1)
+        # the whole distribution is sorted.
+        num_classes = log_p_x_0.shape[1]
+        k = num_classes if truncation_rate >= 1.0 else min(TRUNCATION_TOP_K, num_classes)
+        sorted_log_p_x_0 = paddle.topk(log_p_x_0, k=k, axis=1)[0]
+        cumulative_p_x_0 = paddle.exp(sorted_log_p_x_0).cumsum(axis=1)
+        if k < num_classes and not bool((cumulative_p_x_0[:, -1] >= truncation_rate).all()):
+            k = num_classes
+            sorted_log_p_x_0 = paddle.topk(log_p_x_0, k=k, axis=1)[0]
+            cumulative_p_x_0 = paddle.exp(sorted_log_p_x_0).cumsum(axis=1)
+
+        # The classes whose cumulative probability stays below `truncation_rate` are kept, as well as the one
+        # crossing it. This ensures that at least the largest probability is not zeroed out.
+        num_kept = (cumulative_p_x_0 < truncation_rate).cast("int64").sum(axis=1, keepdim=True) + 1
+        num_kept = num_kept.clip(max=k)
+        threshold = paddle.take_along_axis(sorted_log_p_x_0, num_kept - 1, axis=1)
+        keep_mask = log_p_x_0 >= threshold
+
         # rv[~keep_mask] = -INF  # -inf = log(0)
-        rv = paddle.where(keep_mask, rv, paddle.to_tensor(-INF, dtype="float32"))
+        rv = paddle.where(keep_mask, log_p_x_0, paddle.full_like(log_p_x_0, -INF))
 
         return rv
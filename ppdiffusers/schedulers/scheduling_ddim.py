@@ -25,6 +25,7 @@ import paddle
 from ..configuration_utils import ConfigMixin, register_to_config
 from ..utils import BaseOutput, randn_tensor
 from .scheduling_utils import KarrasDiffusionSchedulers, SchedulerMixin
+from .timestep_spacing import get_timestep_schedule
 
 
 @dataclass
@@ -111,6 +112,12 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
             prediction type of the scheduler function, one of `epsilon` (predicting the noise of the diffusion
             process), `sample` (directly predicting the noisy sample`) or `v_prediction` (see section 2.4
             https://imagen.research.google/video/paper.pdf)
+        timestep_spacing (`str` or `List[int]`, *optional*):
+            spacing of the inference grid, one of `"linspace"`, `"leading"`, `"trailing"`, `"karras"`, `"exponential"`
+            or `"polyexponential"`, or the decreasing timesteps themselves. See
+            [`~schedulers.timestep_spacing.get_timestep_schedule`]. Timesteps are rounded to integers and duplicates
+            dropped. When `None`, timesteps are multiples of `num_train_timesteps // num_inference_steps` shifted by
+            `steps_offset`.
     """
 
     _compatibles = [e.name for e in KarrasDiffusionSchedulers]
@@ -128,6 +135,7 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
         set_alpha_to_one: bool = True,
         steps_offset: int = 0,
         prediction_type: str = "epsilon",
+        timestep_spacing: Optional[Union[str, List[int]]] = None,
     ):
         if trained_betas is not None:
             self.betas = paddle.to_tensor(trained_betas, dtype="float32")
@@ -156,6 +164,7 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
 
         # setable values
         self.num_inference_steps = None
+        self.custom_timesteps = False
         self.timesteps = paddle.to_tensor(np.arange(0, num_train_timesteps)[::-1].copy().astype(np.int64))
 
     def scale_model_input(self, sample: paddle.Tensor, timestep: Optional[int] = None) -> paddle.Tensor:
@@ -182,14 +191,24 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
 
         return variance
 
-    def set_timesteps(self, num_inference_steps: int):
+    def set_timesteps(self, num_inference_steps: Optional[int] = None, timesteps: Optional[List[int]] = None):
         """
         Sets the discrete timesteps used for the diffusion chain. Supporting function to be run before inference.
 
         Args:
-            num_inference_steps (`int`):
+            num_inference_steps (`int`, *optional*):
                 the number of diffusion steps used when generating samples with a pre-trained model.
+            timesteps (`List[int]`, *optional*):
+                custom decreasing timesteps, overriding `num_inference_steps` and the `timestep_spacing` config.
         """
+        if timesteps is not None or self.config.timestep_spacing is not None:
+            timesteps, _ = get_timestep_schedule(
+                self.config, self.alphas_cumprod, num_inference_steps, timesteps, discrete=True
+            )
+            self.num_inference_steps = len(timesteps)
+            self.custom_timesteps = True
+            self.timesteps = paddle.to_tensor(timesteps)
+            return
 
         if num_inference_steps > self.config.num_train_timesteps:
             raise ValueError(
@@ -199,6 +218,7 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
             )
 
         self.num_inference_steps = num_inference_steps
+        self.custom_timesteps = False
         step_ratio = self.config.num_train_timesteps // self.num_inference_steps
         # creates integer timesteps by multiplying by ratio
         # casting to int to avoid issues when num_inference_step is power of 3
@@ -206,6 +226,24 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
         self.timesteps = paddle.to_tensor(timesteps)
         self.timesteps += self.config.steps_offset
 
+    # Copied from ppdiffusers.schedulers.scheduling_ddpm.DDPMScheduler.previous_timestep
+    def previous_timestep(self, timestep):
+        """
+        Returns the timestep following `timestep` in the inference grid, or `-1` after the last one.
+        """
+        if self.custom_timesteps:
+            index = (self.timesteps == timestep).nonzero()
+            if len(index) == 0 or index.item() == len(self.timesteps) - 1:
+                prev_t = -1
+            else:
+                prev_t = self.timesteps[index.item() + 1]
+        else:
+            num_inference_steps = (
+                self.num_inference_steps if self.num_inference_steps else self.config.num_train_timesteps
+            )
+            prev_t = timestep - self.config.num_train_timesteps // num_inference_steps
+        return prev_t
+
     def step(
         self,
         model_output: paddle.Tensor,
@@ -260,7 +298,7 @@ class DDIMScheduler(SchedulerMixin, ConfigMixin):
         # - pred_prev_sample -> "x_t-1"
 
         # 1. get previous step value (=t-1)
-        prev_timestep = timestep - self.config.num_train_timesteps // self.num_inference_steps
+        prev_timestep = self.previous_timestep(timestep)
 
         # 2. compute alphas, betas
         alpha_prod_t = self.alphas_cumprod[timestep]
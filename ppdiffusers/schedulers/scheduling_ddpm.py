@@ -25,6 +25,7 @@ import paddle.nn.functional as F
 from ..configuration_utils import ConfigMixin, register_to_config
 from ..utils import BaseOutput, randn_tensor
 from .scheduling_utils import KarrasDiffusionSchedulers, SchedulerMixin
+from .timestep_spacing import get_timestep_schedule
 
 
 @dataclass
@@ -104,6 +105,11 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
             prediction type of the scheduler function, one of `epsilon` (predicting the noise of the diffusion
             process), `sample` (directly predicting the noisy sample`) or `v_prediction` (see section 2.4
             https://imagen.research.google/video/paper.pdf)
+        timestep_spacing (`str` or `List[int]`, *optional*):
+            spacing of the inference grid, one of `"linspace"`, `"leading"`, `"trailing"`, `"karras"`, `"exponential"`
+            or `"polyexponential"`, or the decreasing timesteps themselves. See
+            [`~schedulers.timestep_spacing.get_timestep_schedule`]. Timesteps are rounded to integers and duplicates
+            dropped. When `None`, timesteps are multiples of `num_train_timesteps // num_inference_steps`.
     """
 
     _compatibles = [e.name for e in KarrasDiffusionSchedulers]
@@ -121,6 +127,7 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
         clip_sample: bool = True,
         prediction_type: str = "epsilon",
         clip_sample_range: Optional[float] = 1.0,
+        timestep_spacing: Optional[Union[str, List[int]]] = None,
     ):
         if trained_betas is not None:
             self.betas = paddle.to_tensor(trained_betas, dtype=paddle.float32)
@@ -150,6 +157,7 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
 
         # setable values
         self.num_inference_steps = None
+        self.custom_timesteps = False
         self.timesteps = paddle.to_tensor(np.arange(0, num_train_timesteps)[::-1].copy())
 
         self.variance_type = variance_type
@@ -168,14 +176,24 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
         """
         return sample
 
-    def set_timesteps(self, num_inference_steps: int):
+    def set_timesteps(self, num_inference_steps: Optional[int] = None, timesteps: Optional[List[int]] = None):
         """
         Sets the discrete timesteps used for the diffusion chain. Supporting function to be run before inference.
 
         Args:
-            num_inference_steps (`int`):
+            num_inference_steps (`int`, *optional*):
                 the number of diffusion steps used when generating samples with a pre-trained model.
+            timesteps (`List[int]`, *optional*):
+                custom decreasing timesteps, overriding `num_inference_steps` and the `timestep_spacing` config.
         """
+        if timesteps is not None or self.config.timestep_spacing is not None:
+            timesteps, _ = get_timestep_schedule(
+                self.config, self.alphas_cumprod, num_inference_steps, timesteps, discrete=True
+            )
+            self.num_inference_steps = len(timesteps)
+            self.custom_timesteps = True
+            self.timesteps = paddle.to_tensor(timesteps)
+            return
 
         if num_inference_steps > self.config.num_train_timesteps:
             raise ValueError(
@@ -185,14 +203,31 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
             )
 
         self.num_inference_steps = num_inference_steps
+        self.custom_timesteps = False
 
         step_ratio = self.config.num_train_timesteps // self.num_inference_steps
         timesteps = (np.arange(0, num_inference_steps) * step_ratio).round()[::-1].copy().astype(np.int64)
         self.timesteps = paddle.to_tensor(timesteps)
 
+    def previous_timestep(self, timestep):
+        """
+        Returns the timestep following `timestep` in the inference grid, or `-1` after the last one.
+        """
+        if self.custom_timesteps:
+            index = (self.timesteps == timestep).nonzero()
+            if len(index) == 0 or index.item() == len(self.timesteps) - 1:
+                prev_t = -1
+            else:
+                prev_t = self.timesteps[index.item() + 1]
+        else:
+            num_inference_steps = (
+                self.num_inference_steps if self.num_inference_steps else self.config.num_train_timesteps
+            )
+            prev_t = timestep - self.config.num_train_timesteps // num_inference_steps
+        return prev_t
+
     def _get_variance(self, t, predicted_variance=None, variance_type=None):
-        num_inference_steps = self.num_inference_steps if self.num_inference_steps else self.config.num_train_timesteps
-        prev_t = t - self.config.num_train_timesteps // num_inference_steps
+        prev_t = self.previous_timestep(t)
         alpha_prod_t = self.alphas_cumprod[t]
         alpha_prod_t_prev = self.alphas_cumprod[prev_t] if prev_t >= 0 else self.one
         current_beta_t = 1 - alpha_prod_t / alpha_prod_t_prev
@@ -254,8 +289,7 @@ class DDPMScheduler(SchedulerMixin, ConfigMixin):
 
         """
         t = timestep
-        num_inference_steps = self.num_inference_steps if self.num_inference_steps else self.config.num_train_timesteps
-        prev_t = timestep - self.config.num_train_timesteps // num_inference_steps
+        prev_t = self.previous_timestep(t)
 
         if model_output.shape[1] == sample.shape[1] * 2 and self.variance_type in ["learned", "learned_range"]:
             model_output, predicted_variance = paddle.split(model_output, sample.shape[1], axis=1)
@@ -23,6 +23,7 @@ import paddle
 
 from ..configuration_utils import ConfigMixin, register_to_config
 from .scheduling_utils import KarrasDiffusionSchedulers, SchedulerMixin, SchedulerOutput
+from .timestep_spacing import get_timestep_schedule
 
 
 # Copied from ppdiffusers.schedulers.scheduling_ddpm.betas_for_alpha_bar
@@ -104,6 +105,11 @@ class DEISMultistepScheduler(SchedulerMixin, ConfigMixin):
             whether to use lower-order solvers in the final steps. Only valid for < 15 inference steps. We empirically
             find this trick can stabilize the sampling of DEIS for steps < 15, especially for steps <= 10.
 
+        timestep_spacing (`str` or `List[int]`, *optional*):
+            spacing of the inference grid, one of `"linspace"`, `"leading"`, `"trailing"`, `"karras"`, `"exponential"`
+            or `"polyexponential"`, or the decreasing timesteps themselves. See
+            [`~schedulers.timestep_spacing.get_timestep_schedule`]. Timesteps are rounded to integers and duplicates
+            dropped. When `None`, timesteps are evenly spaced.
     """
 
     _compatibles = [e.name for e in KarrasDiffusionSchedulers]
@@ -125,6 +131,7 @@ class DEISMultistepScheduler(SchedulerMixin, ConfigMixin):
         algorithm_type: str = "deis",
         solver_type: str = "logrho",
         lower_order_final: bool = True,
+        timestep_spacing: Optional[Union[str, List[int]]] = None,
     ):
         if trained_betas is not None:
             self.betas = paddle.to_tensor(trained_betas, dtype=paddle.float32)
@@ -171,21 +178,37 @@ class DEISMultistepScheduler(SchedulerMixin, ConfigMixin):
         self.model_outputs = [None] * solver_order
         self.lower_order_nums = 0
 
-    def set_timesteps(self, num_inference_steps: int):
+    def set_timesteps(self, num_inference_steps: Optional[int] = None, timesteps: Optional[List[int]] = None):
         """
         Sets the timesteps used for the diffusion chain. Supporting function to be run before inference.
 
         Args:
-            num_inference_steps (`int`):
+            num_inference_steps (`int`, *optional*):
                 the number of diffusion steps used when generating samples with a pre-trained model.
+            timesteps (`List[int]`, *optional*):
+                custom decreasing timesteps, overriding `num_inference_steps` and the `timestep_spacing` config.
         """
-        self.num_inference_steps = num_inference_steps
-        timesteps = (
-            np.linspace(0, self.num_train_timesteps - 1, num_inference_steps + 1)
-            .round()[::-1][:-1]
-            .copy()
-            .astype(np.int64)
-        )
+        if timesteps is not None:
+            timesteps, _ = get_timestep_schedule(self.config, self.alphas_cumprod, timesteps=timesteps, discrete=True)
+            # the last update always lands on timestep 0, so it is not a point of the grid itself
+            timesteps = timesteps[timesteps > 0]
+        elif self.config.timestep_spacing is not None:
+            timesteps, _ = get_timestep_schedule(self.config, self.alphas_cumprod, num_inference_steps, discrete=True)
+            if timesteps[-1] == 0:
+                # as in the default grid, the last update lands on timestep 0, so the grid is built with one more point
+                # and the final 0 is dropped
+                timesteps, _ = get_timestep_schedule(
+                    self.config, self.alphas_cumprod, num_inference_steps + 1, discrete=True
+                )
+                timesteps = timesteps[:-1]
+        else:
+            timesteps = (
+                np.linspace(0, self.num_train_timesteps - 1, num_inference_steps + 1)
+                .round()[::-1][:-1]
+                .copy()
+                .astype(np.int64)
+            )
+        self.num_inference_steps = len(timesteps)
         self.timesteps = paddle.to_tensor(timesteps)
         self.model_outputs = [
             None,
@@ -0,0 +1,444 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# DISCLAIMER: This file is strongly influenced by https://github.com/LuChengTHU/dpm-solver
+
+import math
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import paddle
+
+from ..configuration_utils import ConfigMixin, register_to_config
+from .scheduling_utils import SchedulerMixin, SchedulerOutput
+
+
+# Copied from ppdiffusers.schedulers.scheduling_ddpm.betas_for_alpha_bar
+def betas_for_alpha_bar(num_diffusion_timesteps, max_beta=0.999):
+    """
+    Create a beta schedule that discretizes the given alpha_t_bar function, which defines the cumulative product of
+    (1-beta) over time from t = [0,1].
+
+    Contains a function alpha_bar that takes an argument t and transforms it to the cumulative product of (1-beta) up
+    to that part of the diffusion process.
+
+
+    Args:
+        num_diffusion_timesteps (`int`): the number of betas to produce.
+        max_beta (`float`): the maximum beta to use; use values lower than 1 to
+                     prevent singularities.
+
+    Returns:
+        betas (`np.ndarray`): the betas used by the scheduler to step the model outputs
+    """
+
+    def alpha_bar(time_step):
+        return math.cos((time_step + 0.008) / 1.008 * math.pi / 2) ** 2
+
+    betas = []
+    for i in range(num_diffusion_timesteps):
+        t1 = i / num_diffusion_timesteps
+        t2 = (i + 1) / num_diffusion_timesteps
+        betas.append(min(1 - alpha_bar(t2) / alpha_bar(t1), max_beta))
+    return paddle.to_tensor(betas, dtype=paddle.float32)
+
+
+class DPMSolverAdaptiveTimesteps:
+    """
+    Lazily yields the timesteps at which [`DPMSolverAdaptiveScheduler`] wants the model to be evaluated. The next
+    timestep depends on the error estimate of the previous `step`, so the sequence is only known while iterating.
+
+    `len()` returns the model evaluation budget set by `set_timesteps`, sampling usually stops before it is reached.
+    """
+
+    def __init__(self, scheduler: "DPMSolverAdaptiveScheduler"):
+        self.scheduler = scheduler
+
+    def __iter__(self):
+        while self.scheduler.next_timestep is not None:
+            yield paddle.to_tensor(self.scheduler.next_timestep, dtype=paddle.float32)
+
+    def __len__(self):
+        return self.scheduler.num_inference_steps
+
+
+class DPMSolverAdaptiveScheduler(SchedulerMixin, ConfigMixin):
+    """
+    Adaptive step size DPM-Solver (DPM-Solver-12 and DPM-Solver-23, see algorithm 4 of
+    https://arxiv.org/abs/2206.00927). Every step integrates the probability flow ODE with two solvers of consecutive
+    orders that share their model evaluations; their difference is an estimate of the local error, which decides
+    whether the step is accepted and how large the next step will be. Instead of a number of steps, the sampling
+    accuracy is set by the tolerances `rtol` and `atol`: easy samples finish with few model evaluations, hard ones get
+    more.
+
+    The timesteps are not known in advance, `scheduler.timesteps` is an iterable that yields the timestep of the next
+    model evaluation after every call to `step`, so the scheduler works with the usual denoising loop:
+
+    ```py
+    >>> scheduler.set_timesteps(num_inference_steps=100)  # a budget of model evaluations, not a number of steps
+    >>> for t in scheduler.timesteps:
+    ...     model_output = unet(latents, t).sample
+    ...     latents = scheduler.step(model_output, t, latents).prev_sample
+    >>> scheduler.nfe  # number of function (model) evaluations used
+    ```
+
+    The sample returned by `step` is the input of the next model evaluation, which is an intermediate point of the
+    solver until the last call that returns the final sample.
+
+    As the timesteps can not be sliced, the scheduler does not support the `strength` of the image to image pipelines,
+    which start from a partially noised image.
+
+    [`~ConfigMixin`] takes care of storing all config attributes that are passed in the scheduler's `__init__`
+    function, such as `num_train_timesteps`. They can be accessed via `scheduler.config.num_train_timesteps`.
+    [`SchedulerMixin`] provides general loading and saving functionality via the [`SchedulerMixin.save_pretrained`] and
+    [`~SchedulerMixin.from_pretrained`] functions.
+
+    Args:
+        num_train_timesteps (`int`): number of diffusion steps used to train the model.
+        beta_start (`float`): the starting `beta` value of inference.
+        beta_end (`float`): the final `beta` value.
+        beta_schedule (`str`):
+            the beta schedule, a mapping from a beta range to a sequence of betas for stepping the model. Choose from
+            `linear`, `scaled_linear`, or `squaredcos_cap_v2`.
+        trained_betas (`np.ndarray`, optional):
+            option to pass an array of betas directly to the constructor to bypass `beta_start`, `beta_end` etc.
+        solver_order (`int`, default `2`):
+            the order of the higher order solver; `2` pairs DPM-Solver-1 with DPM-Solver-2 (two model evaluations per
+            step), `3` pairs DPM-Solver-2 with DPM-Solver-3 (three model evaluations per step).
+        prediction_type (`str`, default `epsilon`, optional):
+            prediction type of the scheduler function, one of `epsilon` (predicting the noise of the diffusion
+            process), `sample` (directly predicting the noisy sample`) or `v_prediction` (see section 2.4
+            https://imagen.research.google/video/paper.pdf)
+        rtol (`float`, default `0.05`):
+            the relative tolerance of the local error.
+        atol (`float`, default `0.0078`):
+            the absolute tolerance of the local error.
+        h_init (`float`, default `0.05`):
+            the size of the first step, in half log signal-to-noise ratio (`lambda`).
+        theta (`float`, default `0.9`):
+            safety factor applied to the step size predicted from the error estimate.
+    """
+
+    # not part of `KarrasDiffusionSchedulers`, the pipelines starting from a partially noised image slice the timesteps
+    _compatibles = []
+    order = 1
+
+    @register_to_config
+    def __init__(
+        self,
+        num_train_timesteps: int = 1000,
+        beta_start: float = 0.0001,
+        beta_end: float = 0.02,
+        beta_schedule: str = "linear",
+        trained_betas: Optional[Union[np.ndarray, List[float]]] = None,
+        solver_order: int = 2,
+        prediction_type: str = "epsilon",
+        rtol: float = 0.05,
+        atol: float = 0.0078,
+        h_init: float = 0.05,
+        theta: float = 0.9,
+    ):
+        if trained_betas is not None:
+            self.betas = paddle.to_tensor(trained_betas, dtype=paddle.float32)
+        elif beta_schedule == "linear":
+            self.betas = paddle.linspace(beta_start, beta_end, num_train_timesteps, dtype=paddle.float32)
+        elif beta_schedule == "scaled_linear":
+            # this schedule is very specific to the latent diffusion model.
+            self.betas = (
+                paddle.linspace(beta_start**0.5, beta_end**0.5, num_train_timesteps, dtype=paddle.float32) ** 2
+            )
+        elif beta_schedule == "squaredcos_cap_v2":
+            # Glide cosine schedule
+            self.betas = betas_for_alpha_bar(num_train_timesteps)
+        else:
+            raise NotImplementedError(f"{beta_schedule} does is not implemented for {self.__class__}")
+
+        if solver_order not in [2, 3]:
+            raise NotImplementedError(f"solver_order {solver_order} is not implemented for {self.__class__}")
+
+        self.alphas = 1.0 - self.betas
+        self.alphas_cumprod = paddle.cumprod(self.alphas, 0)
+
+        # The step sizes are chosen on the host: the noise schedule is interpolated piecewise linearly in
+        # log(alpha_t) over the (continuous) training timesteps, as done by DPM-Solver for discrete-time models.
+        self.train_timesteps = np.arange(num_train_timesteps, dtype=np.float64)
+        self.log_alpha_array = 0.5 * np.log(np.array(self.alphas_cumprod.numpy(), dtype=np.float64))
+
+        # standard deviation of the initial noise distribution
+        self.init_noise_sigma = 1.0
+
+        # setable values
+        self.num_inference_steps = None
+        self.timesteps = DPMSolverAdaptiveTimesteps(self)
+        self._reset()
+
+    def _reset(self):
+        self.next_timestep = None
+        # number of function (model) evaluations, accepted and rejected steps of the current sampling
+        self.nfe = 0
+        self.num_accepted_steps = 0
+        self.num_rejected_steps = 0
+        self.step_timesteps = []
+
+        self._sample = None
+        self._lower_sample = None
+        self._model_outputs = []
+        self._eval_sample = None
+        self._s = None
+        self._h = None
+        self._t = None
+        self._t_lambda = None
+        self._points = []
+        self._forced = False
+
+    def set_timesteps(self, num_inference_steps: Optional[int] = None):
+        """
+        Resets the sampler to start from the noisiest timestep. Supporting function to be run before inference.
+
+        Args:
+            num_inference_steps (`int`, *optional*):
+                the maximal number of model evaluations. Once the budget can not afford the step sizes chosen from the
+                error estimate, the remaining steps are spread evenly over it. Defaults to `num_train_timesteps`.
+        """
+        self.num_inference_steps = num_inference_steps or self.config.num_train_timesteps
+        if self.num_inference_steps < self.config.solver_order:
+            raise ValueError(
+                f"`num_inference_steps` must be at least `solver_order` ({self.config.solver_order}), but is"
+                f" {self.num_inference_steps}."
+            )
+        self._reset()
+        self._s = self.train_timesteps[-1]
+        self._h = self.config.h_init
+        self.next_timestep = self._s
+
+    def _log_alpha(self, t):
+        return np.interp(t, self.train_timesteps, self.log_alpha_array)
+
+    def _alpha_sigma_lambda(self, t):
+        log_alpha = self._log_alpha(t)
+        alpha = np.exp(log_alpha)
+        sigma = np.sqrt(1.0 - np.exp(2.0 * log_alpha))
+        return alpha, sigma, log_alpha - np.log(sigma)
+
+    def _inverse_lambda(self, lamb):
+        log_alpha = -0.5 * np.logaddexp(0.0, -2.0 * lamb)
+        return np.interp(log_alpha, self.log_alpha_array[::-1], self.train_timesteps[::-1])
+
+    def convert_model_output(self, model_output: paddle.Tensor, timestep: float, sample: paddle.Tensor) -> paddle.Tensor:
+        """
+        Convert the model output to the noise prediction integrated by DPM-Solver.
+
+        Args:
+            model_output (`paddle.Tensor`): direct output from learned diffusion model.
+            timestep (`float`): current (continuous) timestep in the diffusion chain.
+            sample (`paddle.Tensor`):
+                current instance of sample being created by diffusion process.
+
+        Returns:
+            `paddle.Tensor`: the converted model output.
+        """
+        if self.config.prediction_type == "epsilon":
+            return model_output
+        alpha_t, sigma_t, _ = self._alpha_sigma_lambda(timestep)
+        if self.config.prediction_type == "sample":
+            return (sample - alpha_t * model_output) / sigma_t
+        elif self.config.prediction_type == "v_prediction":
+            return alpha_t * model_output + sigma_t * sample
+        else:
+            raise ValueError(
+                f"prediction_type given as {self.config.prediction_type} must be one of `epsilon`, `sample`, or"
+                " `v_prediction` for the DPMSolverAdaptiveScheduler."
+            )
+
+    def _intermediate_update(self, index: int) -> paddle.Tensor:
+        """Computes the sample at the intermediate point `index` (1 for `s1`, 2 for `s2`) of the current step."""
+        s, sample = self._s, self._sample
+        alpha_s, _, lambda_s = self._alpha_sigma_lambda(s)
+        point = self._points[index - 1]
+        alpha_p, sigma_p, lambda_p = self._alpha_sigma_lambda(point)
+        h_p = lambda_p - lambda_s
+        model_s = self._model_outputs[0]
+        x = (alpha_p / alpha_s) * sample - (sigma_p * np.expm1(h_p)) * model_s
+        if index == 2:
+            # second intermediate point of DPM-Solver-3, see https://arxiv.org/abs/2206.00927
+            _, _, lambda_s1 = self._alpha_sigma_lambda(self._points[0])
+            r1, r2 = (lambda_s1 - lambda_s) / (self._t_lambda - lambda_s), h_p / (self._t_lambda - lambda_s)
+            phi_22 = np.expm1(h_p) / h_p - 1.0
+            x = x - (r2 / r1) * (sigma_p * phi_22) * (self._model_outputs[1] - model_s)
+        return x
+
+    def _begin_step(self) -> paddle.Tensor:
+        """Chooses the end of the next step and returns the sample at its first intermediate point."""
+        order = self.config.solver_order
+        _, _, lambda_s = self._alpha_sigma_lambda(self._s)
+        _, _, lambda_0 = self._alpha_sigma_lambda(self.train_timesteps[0])
+        remaining = lambda_0 - lambda_s
+
+        # this step needs `order - 1` more evaluations, each following one `order`. When the evaluation budget can
+        # not afford the adaptive step size anymore, the remaining steps are spread evenly and always accepted.
+        budget = self.num_inference_steps - self.nfe - (order - 1)
+        min_h = remaining / max(1 + budget // order, 1)
+        self._forced = self._h < min_h
+        h = min(max(self._h, min_h), remaining)
+        self._t = self.train_timesteps[0] if h >= remaining else self._inverse_lambda(lambda_s + h)
+        self._t_lambda = lambda_s + h
+
+        ratios = [0.5] if order == 2 else [1.0 / 3.0, 2.0 / 3.0]
+        self._points = [self._inverse_lambda(lambda_s + r * h) for r in ratios]
+        self.next_timestep = self._points[0]
+        return self._intermediate_update(1)
+
+    def _finish_step(self) -> paddle.Tensor:
+        """Computes both solutions of the current step, accepts or rejects it and returns the next model input."""
+        order = self.config.solver_order
+        sample, model_outputs = self._sample, self._model_outputs
+        alpha_s, _, lambda_s = self._alpha_sigma_lambda(self._s)
+        alpha_t, sigma_t, lambda_t = self._alpha_sigma_lambda(self._t)
+        h = self._t_lambda - lambda_s
+        phi_1 = np.expm1(h)
+        _, _, lambda_s1 = self._alpha_sigma_lambda(self._points[0])
+        r1 = (lambda_s1 - lambda_s) / h
+
+        x_t = (alpha_t / alpha_s) * sample - (sigma_t * phi_1) * model_outputs[0]
+        if order == 2:
+            # DPM-Solver-1 (DDIM) and DPM-Solver-2
+            lower = x_t
+            higher = x_t - (0.5 / r1) * (sigma_t * phi_1) * (model_outputs[1] - model_outputs[0])
+        else:
+            # DPM-Solver-2 and DPM-Solver-3
+            _, _, lambda_s2 = self._alpha_sigma_lambda(self._points[1])
+            r2 = (lambda_s2 - lambda_s) / h
+            phi_2 = phi_1 / h - 1.0
+            lower = x_t - (0.5 / r1) * (sigma_t * phi_1) * (model_outputs[1] - model_outputs[0])
+            higher = x_t - (1.0 / r2) * (sigma_t * phi_2) * (model_outputs[2] - model_outputs[0])
+
+        # scaled root mean square of the local error estimate, the worst sample of the batch decides
+        delta = paddle.maximum(
+            paddle.full_like(lower, self.config.atol),
+            self.config.rtol * paddle.maximum(lower.abs(), self._lower_sample.abs()),
+        )
+        error = ((higher - lower) / delta).reshape([lower.shape[0], -1]).square().mean(axis=1).sqrt().max()
+        error = max(float(error), 1e-8)
+
+        # steps forced by the evaluation budget are accepted, their error estimate still adapts the next step size
+        if error <= 1.0 or self._forced:
+            self.num_accepted_steps += 1
+            self.step_timesteps.append(float(self._t))
+            self._sample, self._lower_sample = higher, lower
+            self._s, lambda_s = self._t, lambda_t
+            self._model_outputs = []
+            _, _, lambda_0 = self._alpha_sigma_lambda(self.train_timesteps[0])
+            self._h = min(self.config.theta * h * error ** (-1.0 / order), lambda_0 - lambda_s)
+            if self._s <= self.train_timesteps[0]:
+                self.next_timestep = None
+            else:
+                self.next_timestep = self._s
+            return self._sample
+
+        # rejected: retry from the same point with a smaller step, reusing the model output at `s`
+        self.num_rejected_steps += 1
+        self._h = self.config.theta * h * error ** (-1.0 / order)
+        self._model_outputs = self._model_outputs[:1]
+        return self._begin_step()
+
+    def step(
+        self,
+        model_output: paddle.Tensor,
+        timestep: Union[float, paddle.Tensor],
+        sample: paddle.Tensor,
+        return_dict: bool = True,
+    ) -> Union[SchedulerOutput, Tuple]:
+        """
+        Step function propagating the sample with the adaptive DPM-Solver. It must be called with the model output at
+        the timestep last yielded by `scheduler.timesteps`.
+
+        Args:
+            model_output (`paddle.Tensor`): direct output from learned diffusion model.
+            timestep (`float` or `paddle.Tensor`): current timestep in the diffusion chain.
+            sample (`paddle.Tensor`):
+                current instance of sample being created by diffusion process, i.e. the sample returned by the
+                previous call to `step`.
+            return_dict (`bool`): option for returning tuple rather than SchedulerOutput class
+
+        Returns:
+            [`~scheduling_utils.SchedulerOutput`] or `tuple`: [`~scheduling_utils.SchedulerOutput`] if `return_dict` is
+            True, otherwise a `tuple`. When returning a tuple, the first element is the sample tensor, which is the
+            input of the next model evaluation or, once `scheduler.next_timestep` is `None`, the final sample.
+
+        """
+        if self.num_inference_steps is None:
+            raise ValueError(
+                "Number of inference steps is 'None', you need to run 'set_timesteps' after creating the scheduler"
+            )
+        if self.next_timestep is None:
+            raise ValueError("The sampling is finished, you need to run 'set_timesteps' to start a new one.")
+
+        if self._sample is None:
+            self._sample = self._lower_sample = self._eval_sample = sample
+
+        self.nfe += 1
+        self._model_outputs.append(self.convert_model_output(model_output, self.next_timestep, self._eval_sample))
+
+        if len(self._model_outputs) == 1:
+            prev_sample = self._begin_step()
+        elif len(self._model_outputs) < self.config.solver_order:
+            self.next_timestep = self._points[len(self._model_outputs) - 1]
+            prev_sample = self._intermediate_update(len(self._model_outputs))
+        else:
+            prev_sample = self._finish_step()
+        self._eval_sample = prev_sample
+
+        if not return_dict:
+            return (prev_sample,)
+
+        return SchedulerOutput(prev_sample=prev_sample)
+
+    def scale_model_input(self, sample: paddle.Tensor, *args, **kwargs) -> paddle.Tensor:
+        """
+        Ensures interchangeability with schedulers that need to scale the denoising model input depending on the
+        current timestep.
+
+        Args:
+            sample (`paddle.Tensor`): input sample
+
+        Returns:
+            `paddle.Tensor`: scaled input sample
+        """
+        return sample
+
+    # Copied from ppdiffusers.schedulers.scheduling_dpmsolver_multistep.DPMSolverMultistepScheduler.add_noise
+    def add_noise(
+        self,
+        original_samples: paddle.Tensor,
+        noise: paddle.Tensor,
+        timesteps: paddle.Tensor,
+    ) -> paddle.Tensor:
+        # Make sure alphas_cumprod and timestep have same dtype as original_samples
+        self.alphas_cumprod = self.alphas_cumprod.cast(original_samples.dtype)
+
+        sqrt_alpha_prod = self.alphas_cumprod[timesteps] ** 0.5
+        sqrt_alpha_prod = sqrt_alpha_prod.flatten()
+        while len(sqrt_alpha_prod.shape) < len(original_samples.shape):
+            sqrt_alpha_prod = sqrt_alpha_prod.unsqueeze(-1)
+
+        sqrt_one_minus_alpha_prod = (1 - self.alphas_cumprod[timesteps]) ** 0.5
+        sqrt_one_minus_alpha_prod = sqrt_one_minus_alpha_prod.flatten()
+        while len(sqrt_one_minus_alpha_prod.shape) < len(original_samples.shape):
+            sqrt_one_minus_alpha_prod = sqrt_one_minus_alpha_prod.unsqueeze(-1)
+
+        noisy_samples = sqrt_alpha_prod * original_samples + sqrt_one_minus_alpha_prod * noise
+        return noisy_samples
+
+    def __len__(self):
+        return self.config.num_train_timesteps
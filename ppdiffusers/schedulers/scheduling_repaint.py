@@ -171,6 +171,19 @@ class RePaintScheduler(SchedulerMixin, ConfigMixin):
         jump_length: int = 10,
         jump_n_sample: int = 10,
     ):
+        """
+        Sets the jump schedule used for the diffusion chain and precomputes the coefficients of
+        [`~RePaintScheduler.step`] and [`~RePaintScheduler.undo_step`] for all of its timesteps. Supporting function to
+        be run before inference.
+
+        Args:
+            num_inference_steps (`int`):
+                the number of diffusion steps used when generating samples with a pre-trained model.
+            jump_length (`int`, defaults to 10):
+                the number of steps taken forward in time before going backward in time for a single jump.
+            jump_n_sample (`int`, defaults to 10):
+                the number of times a forward time jump is made for a given time sample.
+        """
         num_inference_steps = min(self.config.num_train_timesteps, num_inference_steps)
         self.num_inference_steps = num_inference_steps
 
@@ -191,9 +204,41 @@ class RePaintScheduler(SchedulerMixin, ConfigMixin):
                     t = t + 1
                     timesteps.append(t)
 
-        timesteps = np.array(timesteps) * (self.config.num_train_timesteps // self.num_inference_steps)
+        step_ratio = self.config.num_train_timesteps // self.num_inference_steps
+        timesteps = np.array(timesteps)
+        # `True` where the schedule goes back up in time, i.e. where `undo_step` has to be called instead of `step`
+        self.undo_steps = np.concatenate([[False], timesteps[1:] > timesteps[:-1]])
+
+        timesteps = timesteps * step_ratio
         self.timesteps = paddle.to_tensor(timesteps)
 
+        # Coefficients are kept on the host as python floats and looked up with `timestep // step_ratio`, so that
+        # stepping through the (long) jump schedule needs neither device gathers nor device -> host synchronizations.
+        alphas_cumprod = self.alphas_cumprod.numpy().astype(np.float64)
+        betas = self.betas.numpy().astype(np.float64)
+        step_timesteps = np.arange(num_inference_steps) * step_ratio
+        alpha_prod_t = alphas_cumprod[step_timesteps]
+        alpha_prod_t_prev = np.concatenate([[float(self.final_alpha_cumprod)], alpha_prod_t[:-1]])
+        variance = ((1 - alpha_prod_t_prev) / (1 - alpha_prod_t)) * (1 - alpha_prod_t / alpha_prod_t_prev)
+        self._alpha_prod_t = alpha_prod_t.tolist()
+        self._alpha_prod_t_prev = alpha_prod_t_prev.tolist()
+        self._variance = variance.tolist()
+
+        # `undo_step` applies `step_ratio` forward diffusion steps x <- sqrt(1 - beta) * x + sqrt(beta) * noise, which
+        # sum up to x <- sample_coeff * x + sum_i noise_coeffs[i] * noise_i
+        undo_betas = betas[step_timesteps[:, None] + np.arange(step_ratio)[None, :]]
+        sqrt_alphas = (1 - undo_betas) ** 0.5
+        remaining = np.cumprod(sqrt_alphas[:, ::-1], axis=1)[:, ::-1]
+        self._undo_sample_coeff = remaining[:, 0].tolist()
+        self._undo_noise_coeffs = (
+            undo_betas**0.5 * np.concatenate([remaining[:, 1:], np.ones_like(remaining[:, :1])], axis=1)
+        ).tolist()
+
+    def _step_index(self, timestep):
+        if isinstance(timestep, paddle.Tensor):
+            timestep = int(timestep)
+        return timestep, timestep // (self.config.num_train_timesteps // self.num_inference_steps)
+
     def _get_variance(self, t):
         prev_timestep = t - self.config.num_train_timesteps // self.num_inference_steps
 
@@ -247,12 +292,11 @@ class RePaintScheduler(SchedulerMixin, ConfigMixin):
             returning a tuple, the first element is the sample tensor.
 
         """
-        t = timestep
-        prev_timestep = timestep - self.config.num_train_timesteps // self.num_inference_steps
+        t, step_index = self._step_index(timestep)
 
         # 1. compute alphas, betas
-        alpha_prod_t = self.alphas_cumprod[t]
-        alpha_prod_t_prev = self.alphas_cumprod[prev_timestep] if prev_timestep >= 0 else self.final_alpha_cumprod
+        alpha_prod_t = self._alpha_prod_t[step_index]
+        alpha_prod_t_prev = self._alpha_prod_t_prev[step_index]
         beta_prod_t = 1 - alpha_prod_t
 
         # 2. compute predicted original sample from predicted noise also called
@@ -272,24 +316,22 @@ class RePaintScheduler(SchedulerMixin, ConfigMixin):
 
         # 5. Add noise
         noise = randn_tensor(model_output.shape, generator=generator, dtype=model_output.dtype)
-        std_dev_t = self.eta * self._get_variance(timestep) ** 0.5
-
-        variance = 0
-        if t > 0 and self.eta > 0:
-            variance = std_dev_t * noise
+        std_dev_t = self.eta * self._variance[step_index] ** 0.5
 
         # 6. compute "direction pointing to x_t" of formula (12)
         # from https://arxiv.org/pdf/2010.02502.pdf
         pred_sample_direction = (1 - alpha_prod_t_prev - std_dev_t**2) ** 0.5 * model_output
 
         # 7. compute x_{t-1} of formula (12) from https://arxiv.org/pdf/2010.02502.pdf
-        prev_unknown_part = alpha_prod_t_prev**0.5 * pred_original_sample + pred_sample_direction + variance
+        prev_unknown_part = alpha_prod_t_prev**0.5 * pred_original_sample + pred_sample_direction
+        if t > 0 and self.eta > 0:
+            prev_unknown_part = prev_unknown_part + std_dev_t * noise
 
         # 8. Algorithm 1 Line 5 https://arxiv.org/pdf/2201.09865.pdf
         prev_known_part = (alpha_prod_t_prev**0.5) * original_image + ((1 - alpha_prod_t_prev) ** 0.5) * noise
 
-        # 9. Algorithm 1 Line 8 https://arxiv.org/pdf/2201.09865.pdf
-        pred_prev_sample = mask * prev_known_part + (1.0 - mask) * prev_unknown_part
+        # 9. Algorithm 1 Line 8 https://arxiv.org/pdf/2201.09865.pdf, `mask` may hold a different mask per sample
+        pred_prev_sample = prev_unknown_part + mask * (prev_known_part - prev_unknown_part)
 
         if not return_dict:
             return (
@@ -300,14 +342,18 @@ class RePaintScheduler(SchedulerMixin, ConfigMixin):
         return RePaintSchedulerOutput(prev_sample=pred_prev_sample, pred_original_sample=pred_original_sample)
 
     def undo_step(self, sample, timestep, generator=None):
-        n = self.config.num_train_timesteps // self.num_inference_steps
+        """
+        Diffuses `sample` forward from `timestep` to the next inference timestep (Algorithm 1 Line 10
+        https://arxiv.org/pdf/2201.09865.pdf). The `num_train_timesteps // num_inference_steps` single diffusion steps
+        are applied at once with the coefficients precomputed in `set_timesteps`.
+        """
+        _, step_index = self._step_index(timestep)
 
-        for i in range(n):
-            beta = self.betas[timestep + i]
+        sample = self._undo_sample_coeff[step_index] * sample
+        # the noise is still drawn once per diffusion step so that seeded results do not change
+        for noise_coeff in self._undo_noise_coeffs[step_index]:
             noise = randn_tensor(sample.shape, generator=generator, dtype=sample.dtype)
-
-            # 10. Algorithm 1 Line 10 https://arxiv.org/pdf/2201.09865.pdf
-            sample = (1 - beta) ** 0.5 * sample + beta**0.5 * noise
+            sample = sample + noise_coeff * noise
 
         return sample
 
@@ -24,13 +24,24 @@ from ..utils import BaseOutput, rand_tensor
 from .scheduling_utils import SchedulerMixin
 
 
+# log(1e-30), the log probability `index_to_log_onehot` uses for the zero entries of the one-hot vectors
+LOG_ZERO = float(np.log(1e-30))
+
+
 def logaddexp(a, b):
-    return paddle.log(a.exp() + b.exp())
+    # shifted by the maximum, so that it does neither overflow nor underflow in float16
+    maximum = paddle.maximum(a, b)
+    return maximum + paddle.log1p(paddle.exp(-paddle.abs(a - b)))
 
 
 # (TODO junnyu) paddle logsumexp may has bug
 def logsumexp(x, axis=None, keepdim=False):
-    return paddle.log(x.exp().sum(axis=axis, keepdim=keepdim))
+    # shifted by the maximum, so that it does neither overflow nor underflow in float16
+    maximum = x.max(axis=axis, keepdim=True)
+    out = maximum + paddle.log(paddle.exp(x - maximum).sum(axis=axis, keepdim=True))
+    if not keepdim:
+        out = out.squeeze(axis)
+    return out
 
 
 @dataclass
@@ -73,8 +84,9 @@ def gumbel_noised(logits: paddle.Tensor, generator: Optional[paddle.Generator])
     Apply gumbel noise to `logits`
     """
     uniform = rand_tensor(logits.shape, generator=generator)
+    # computed in float32, `1e-30` underflows in float16
     gumbel_noise = -paddle.log(-paddle.log(uniform + 1e-30) + 1e-30)
-    noised = gumbel_noise + logits
+    noised = gumbel_noise.cast(logits.dtype) + logits
     return noised
 
 
@@ -192,6 +204,11 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
         self.log_cumprod_bt = log_cumprod_bt.cast("float32")
         self.log_cumprod_ct = log_cumprod_ct.cast("float32")
 
+        # The transition matrices only depend on the timestep through (a, b, c), see equation (7). Their log values
+        # are kept on the host as python floats, so that building the matrices of a step needs neither device
+        # gathers nor host synchronizations.
+        self._transition_tables = None
+
         # setable values
         self.num_inference_steps = None
         self.timesteps = paddle.to_tensor(np.arange(0, num_train_timesteps)[::-1].copy())
@@ -207,6 +224,31 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
         self.num_inference_steps = num_inference_steps
         timesteps = np.arange(0, self.num_inference_steps)[::-1].copy()
         self.timesteps = paddle.to_tensor(timesteps)
+        self._transition_tables = self._compute_transition_tables()
+
+    def _compute_transition_tables(self):
+        """
+        Computes, for every training timestep, the log of `a`, `b`, `c` and `a + b` of the single step and of the
+        cumulative transition matrices. Index `-1` wraps around like the tensors they are derived from.
+        """
+        tables = {}
+        for name in ["at", "bt", "ct", "cumprod_at", "cumprod_bt", "cumprod_ct"]:
+            tables[name] = getattr(self, f"log_{name}").cast("float64").numpy()
+        tables["abt"] = np.logaddexp(tables["at"], tables["bt"])
+        tables["cumprod_abt"] = np.logaddexp(tables["cumprod_at"], tables["cumprod_bt"])
+        return {name: values.tolist() for name, values in tables.items()}
+
+    def _transition(self, t: int, cumulative: bool):
+        if self._transition_tables is None:
+            self._transition_tables = self._compute_transition_tables()
+        prefix = "cumprod_" if cumulative else ""
+        tables = self._transition_tables
+        return (
+            tables[f"{prefix}at"][t],
+            tables[f"{prefix}bt"][t],
+            tables[f"{prefix}ct"][t],
+            tables[f"{prefix}abt"][t],
+        )
 
     def step(
         self,
@@ -242,7 +284,7 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
             [`~schedulers.scheduling_utils.VQDiffusionSchedulerOutput`] if `return_dict` is True, otherwise a `tuple`.
             When returning a tuple, the first element is the sample tensor.
         """
-        if timestep == 0:
+        if int(timestep) == 0:
             log_p_x_t_min_1 = model_output
         else:
             log_p_x_t_min_1 = self.q_posterior(model_output, sample, timestep)
@@ -285,14 +327,13 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
             `paddle.Tensor` of shape `(batch size, num classes, num latent pixels)`:
                 The log probabilities for the predicted classes of the image at timestep `t-1`. I.e. Equation (11).
         """
-        log_onehot_x_t = index_to_log_onehot(x_t, self.num_embed)
+        t = int(t)
+        dtype = log_p_x_0.dtype
 
-        log_q_x_t_given_x_0 = self.log_Q_t_transitioning_to_known_class(
-            t=t, x_t=x_t, log_onehot_x_t=log_onehot_x_t, cumulative=True
-        )
+        log_q_x_t_given_x_0 = self.log_Q_t_transitioning_to_known_class(t=t, x_t=x_t, cumulative=True, dtype=dtype)
 
         log_q_t_given_x_t_min_1 = self.log_Q_t_transitioning_to_known_class(
-            t=t, x_t=x_t, log_onehot_x_t=log_onehot_x_t, cumulative=False
+            t=t, x_t=x_t, cumulative=False, dtype=dtype
         )
 
         # p_0(x_0=C_0 | x_t) / q(x_t | x_0=C_0)          ...      p_n(x_0=C_0 | x_t) / q(x_t | x_0=C_0)
@@ -376,7 +417,13 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
         return log_p_x_t_min_1
 
     def log_Q_t_transitioning_to_known_class(
-        self, *, t: paddle.Tensor, x_t: paddle.Tensor, log_onehot_x_t: paddle.Tensor, cumulative: bool
+        self,
+        *,
+        t: Union[int, paddle.Tensor],
+        x_t: paddle.Tensor,
+        log_onehot_x_t: Optional[paddle.Tensor] = None,
+        cumulative: bool,
+        dtype: str = "float32",
     ):
         """
         Returns the log probabilities of the rows from the (cumulative or non-cumulative) transition matrix for each
@@ -386,19 +433,22 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
         is the same structure except the parameters (alpha, beta, gamma) are the cumulative analogs.
 
         Args:
-            t (paddle.Tensor):
+            t (`int` or `paddle.Tensor`):
                 The timestep that determines which transition matrix is used.
 
             x_t (`paddle.Tensor` of shape `(batch size, num latent pixels)`):
                 The classes of each latent pixel at time `t`.
 
-            log_onehot_x_t (`paddle.Tensor` of shape `(batch size, num classes, num latent pixels)`):
-                The log one-hot vectors of `x_t`
+            log_onehot_x_t (`paddle.Tensor` of shape `(batch size, num classes, num latent pixels)`, *optional*):
+                The log one-hot vectors of `x_t`. Unused, the matrix is built from `x_t` directly.
 
             cumulative (`bool`):
                 If cumulative is `False`, we use the single step transition matrix `t-1`->`t`. If cumulative is `True`,
                 we use the cumulative transition matrix `0`->`t`.
 
+            dtype (`str`, *optional*, defaults to `"float32"`):
+                The dtype of the returned log probabilities.
+
         Returns:
             `paddle.Tensor` of shape `(batch size, num classes - 1, num latent pixels)`:
                 Each _column_ of the returned matrix is a _row_ of log probabilities of the complete probability
@@ -430,67 +480,39 @@ class VQDiffusionScheduler(SchedulerMixin, ConfigMixin):
                 q_0_cumulative(x_t | x_0 = C_{k-1}) ... q_n_cumulative(x_t | x_0 = C_{k-1})
                 ```
         """
-        if cumulative:
-            a = self.log_cumprod_at[t]
-            b = self.log_cumprod_bt[t]
-            c = self.log_cumprod_ct[t]
-        else:
-            a = self.log_at[t]
-            b = self.log_bt[t]
-            c = self.log_ct[t]
+        _, b, c, log_a_plus_b = self._transition(int(t), cumulative)
+
+        # Column `n` of the matrix is `a + b` in the row of the class of `x_t[n]` and `b` in the other rows (equation
+        # 7), i.e. what `logaddexp(log_onehot_x_t + a, b)` evaluates to. Building it by comparing class indices avoids
+        # exponentiating and taking the log of the whole (batch size, num classes, num latent pixels) tensor, and
+        # stays finite in float16.
+        classes = paddle.arange(self.num_embed - 1, dtype=x_t.dtype).reshape([1, -1, 1])
+        is_class = (x_t.unsqueeze(1) == classes).cast(dtype)
+        # The whole column of each masked pixel is `c`
+        is_masked = (x_t == self.mask_class).unsqueeze(1).cast(dtype)
+        log_Q_t = is_class * (log_a_plus_b - b) + is_masked * (c - b) + b
 
         if not cumulative:
-            # The values in the onehot vector can also be used as the logprobs for transitioning
-            # from masked latent pixels. If we are not calculating the cumulative transitions,
-            # we need to save these vectors to be re-appended to the final matrix so the values
-            # aren't overwritten.
+            # The last row holds the log probabilities of transitioning from a masked latent pixel, which are those
+            # of the one-hot vector of the masked class:
             #
-            # `P(x_t!=mask|x_{t-1=mask}) = 0` and 0 will be the value of the last row of the onehot vector
-            # if x_t is not masked
+            # `P(x_t!=mask|x_{t-1=mask}) = 0` if x_t is not masked
             #
-            # `P(x_t=mask|x_{t-1=mask}) = 1` and 1 will be the value of the last row of the onehot vector
-            # if x_t is masked
-            log_onehot_x_t_transitioning_from_masked = log_onehot_x_t[:, -1, :].unsqueeze(1)
-
-        # `index_to_log_onehot` will add onehot vectors for masked pixels,
-        # so the default one hot matrix has one too many rows. See the doc string
-        # for an explanation of the dimensionality of the returned matrix.
-        log_onehot_x_t = log_onehot_x_t[:, :-1, :]
-
-        # this is a cheeky trick to produce the transition probabilities using log one-hot vectors.
-        #
-        # Don't worry about what values this sets in the columns that mark transitions
-        # to masked latent pixels. They are overwrote later with the `mask_class_mask`.
-        #
-        # Looking at the below logspace formula in non-logspace, each value will evaluate to either
-        # `1 * a + b = a + b` where `log_Q_t` has the one hot value in the column
-        # or
-        # `0 * a + b = b` where `log_Q_t` has the 0 values in the column.
-        #
-        # See equation 7 for more details.
-        log_Q_t = logaddexp(log_onehot_x_t + a, b)
-
-        # The whole column of each masked pixel is `c`
-        mask_class_mask = x_t == self.mask_class
-        mask_class_mask = mask_class_mask.unsqueeze(1).expand([-1, self.num_embed - 1, -1])
-        # log_Q_t[mask_class_mask] = c
-        log_Q_t = paddle.where(mask_class_mask, c, log_Q_t)
-
-        if not cumulative:
+            # `P(x_t=mask|x_{t-1=mask}) = 1` if x_t is masked
+            log_onehot_x_t_transitioning_from_masked = (1 - is_masked) * LOG_ZERO
             log_Q_t = paddle.concat((log_Q_t, log_onehot_x_t_transitioning_from_masked), axis=1)
 
         return log_Q_t
 
     def apply_cumulative_transitions(self, q, t):
         bsz = q.shape[0]
-        a = self.log_cumprod_at[t]
-        b = self.log_cumprod_bt[t]
-        c = self.log_cumprod_ct[t]
+        a, b, c, _ = self._transition(int(t), cumulative=True)
 
         num_latent_pixels = q.shape[2]
-        c = c.expand([bsz, 1, num_latent_pixels])
+        c = paddle.full([bsz, 1, num_latent_pixels], c, dtype=q.dtype)
 
-        q = logaddexp(q + a, b)
+        # logaddexp(q + a, b), written with a softplus of the difference so that it is stable in float16
+        q = F.softplus(q + (a - b)) + b
         q = paddle.concat((q, c), axis=1)
 
         return q
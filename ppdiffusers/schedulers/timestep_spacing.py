@@ -0,0 +1,202 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Timestep / sigma spacing schedules shared by the discrete schedulers.
+
+A scheduler selects a spacing with its `timestep_spacing` config attribute and obtains the grid for a given number
+of inference steps with [`get_timestep_schedule`]. Schedules are cached per (config, number of steps), so calling
+`set_timesteps` repeatedly with the same arguments does not recompute them.
+"""
+from collections import OrderedDict
+from typing import Any, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+# spacings defined on the timestep axis
+TIMESTEP_SPACINGS = ["linspace", "leading", "trailing"]
+# spacings defined on the noise level (sigma) axis, converted back to timesteps through the training schedule
+SIGMA_SPACINGS = ["karras", "exponential", "polyexponential"]
+
+_SCHEDULE_CACHE_SIZE = 64
+_schedule_cache = OrderedDict()
+
+
+def linspace_timesteps(num_train_timesteps: int, num_inference_steps: int) -> np.ndarray:
+    """Evenly spaced timesteps including both ends of the training range, as in the k-diffusion samplers."""
+    return np.linspace(0, num_train_timesteps - 1, num_inference_steps, dtype=np.float64)[::-1].copy()
+
+
+def leading_timesteps(num_train_timesteps: int, num_inference_steps: int, steps_offset: int = 0) -> np.ndarray:
+    """Multiples of `num_train_timesteps // num_inference_steps` starting at 0, as in DDIM and DDPM."""
+    step_ratio = num_train_timesteps // num_inference_steps
+    timesteps = (np.arange(0, num_inference_steps) * step_ratio).round()[::-1].astype(np.float64)
+    return timesteps + steps_offset
+
+
+def trailing_timesteps(num_train_timesteps: int, num_inference_steps: int) -> np.ndarray:
+    """
+    Evenly spaced timesteps ending at the last training timestep, see table 2 of "Common Diffusion Noise Schedules
+    and Sample Steps are Flawed" (https://arxiv.org/abs/2305.08891).
+    """
+    step_ratio = num_train_timesteps / num_inference_steps
+    return np.round(np.arange(num_train_timesteps, 0, -step_ratio)).astype(np.float64)[:num_inference_steps] - 1
+
+
+def karras_sigmas(sigma_min: float, sigma_max: float, num_inference_steps: int, rho: float = 7.0) -> np.ndarray:
+    """Noise levels of Karras et al. (2022) https://arxiv.org/abs/2206.00364, eq. (5)."""
+    ramp = np.linspace(0, 1, num_inference_steps)
+    min_inv_rho = sigma_min ** (1 / rho)
+    max_inv_rho = sigma_max ** (1 / rho)
+    return (max_inv_rho + ramp * (min_inv_rho - max_inv_rho)) ** rho
+
+
+def exponential_sigmas(sigma_min: float, sigma_max: float, num_inference_steps: int) -> np.ndarray:
+    """Noise levels evenly spaced in log-sigma."""
+    return np.exp(np.linspace(np.log(sigma_max), np.log(sigma_min), num_inference_steps))
+
+
+def polyexponential_sigmas(
+    sigma_min: float, sigma_max: float, num_inference_steps: int, rho: float = 1.0
+) -> np.ndarray:
+    """Noise levels with a polynomial in log-sigma, as in k-diffusion's `get_sigmas_polyexponential`."""
+    ramp = np.linspace(1, 0, num_inference_steps) ** rho
+    return np.exp(ramp * (np.log(sigma_max) - np.log(sigma_min)) + np.log(sigma_min))
+
+
+def sigmas_to_timesteps(sigmas: np.ndarray, train_sigmas: np.ndarray) -> np.ndarray:
+    """
+    Maps noise levels to (fractional) training timesteps by interpolating the training schedule in log-sigma.
+
+    Args:
+        sigmas (`np.ndarray`): the noise levels to convert.
+        train_sigmas (`np.ndarray`): the noise level of every training timestep, increasing with the timestep.
+    """
+    log_train_sigmas = np.log(train_sigmas)
+    log_sigmas = np.log(np.clip(sigmas, train_sigmas[0], train_sigmas[-1]))
+    return np.interp(log_sigmas, log_train_sigmas, np.arange(len(train_sigmas), dtype=np.float64))
+
+
+def _hashable(value):
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_hashable(v) for v in np.asarray(value).tolist()) if len(value) > 0 else ()
+    return value
+
+
+def _unique_descending(timesteps: np.ndarray) -> np.ndarray:
+    # rounding a dense sigma grid can map neighbouring steps to the same integer timestep
+    _, index = np.unique(timesteps, return_index=True)
+    return timesteps[np.sort(index)]
+
+
+def _compute_schedule(spacing, num_inference_steps, num_train_timesteps, train_sigmas, steps_offset, discrete):
+    if isinstance(spacing, str) and spacing in SIGMA_SPACINGS:
+        sigma_min, sigma_max = float(train_sigmas[0]), float(train_sigmas[-1])
+        if spacing == "karras":
+            sigmas = karras_sigmas(sigma_min, sigma_max, num_inference_steps)
+        elif spacing == "exponential":
+            sigmas = exponential_sigmas(sigma_min, sigma_max, num_inference_steps)
+        else:
+            sigmas = polyexponential_sigmas(sigma_min, sigma_max, num_inference_steps)
+        timesteps = sigmas_to_timesteps(sigmas, train_sigmas)
+    else:
+        if isinstance(spacing, str):
+            if spacing == "linspace":
+                timesteps = linspace_timesteps(num_train_timesteps, num_inference_steps)
+            elif spacing == "leading":
+                timesteps = leading_timesteps(num_train_timesteps, num_inference_steps, steps_offset)
+            elif spacing == "trailing":
+                timesteps = trailing_timesteps(num_train_timesteps, num_inference_steps)
+            else:
+                raise ValueError(
+                    f"{spacing} is not a supported timestep spacing. Choose one of"
+                    f" {TIMESTEP_SPACINGS + SIGMA_SPACINGS} or pass the timesteps themselves."
+                )
+        else:
+            timesteps = np.asarray(spacing, dtype=np.float64)
+            if timesteps.ndim != 1 or len(timesteps) == 0:
+                raise ValueError("Custom timesteps must be a non-empty 1-D sequence.")
+            if np.any(timesteps[1:] >= timesteps[:-1]):
+                raise ValueError(f"Custom timesteps must be in strictly decreasing order, got {timesteps.tolist()}.")
+            if timesteps[0] > num_train_timesteps - 1 or timesteps[-1] < 0:
+                raise ValueError(f"Custom timesteps must lie within [0, {num_train_timesteps - 1}].")
+        timesteps = np.clip(timesteps, 0, num_train_timesteps - 1)
+        sigmas = np.interp(timesteps, np.arange(num_train_timesteps), train_sigmas)
+
+    if discrete:
+        timesteps = _unique_descending(timesteps.round()).astype(np.int64)
+        sigmas = train_sigmas[timesteps]
+    return timesteps, sigmas
+
+
+def get_timestep_schedule(
+    config: Mapping[str, Any],
+    alphas_cumprod: Union[np.ndarray, "paddle.Tensor"],  # noqa: F821
+    num_inference_steps: Optional[int] = None,
+    timesteps: Optional[List[float]] = None,
+    discrete: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the inference grid of a scheduler from its `timestep_spacing` config attribute.
+
+    Args:
+        config (`Mapping[str, Any]`):
+            the scheduler config. `num_train_timesteps`, `timestep_spacing` and `steps_offset` are read from it, the
+            whole config is used as the cache key.
+        alphas_cumprod (`np.ndarray` or `paddle.Tensor`): the cumulative product of alphas of the training schedule.
+        num_inference_steps (`int`, *optional*): the number of denoising steps.
+        timesteps (`List[float]`, *optional*):
+            custom decreasing timesteps, overriding `timestep_spacing` and `num_inference_steps`.
+        discrete (`bool`, defaults to `False`):
+            whether the scheduler can only evaluate integer timesteps. Timesteps are then rounded and duplicates are
+            dropped, so the grid may be shorter than `num_inference_steps` for dense sigma spacings.
+
+    Returns:
+        `Tuple[np.ndarray, np.ndarray]`: the decreasing timesteps (`float64`, or `int64` when `discrete`) and the
+        matching noise levels `sigma_t = sqrt((1 - alpha_t) / alpha_t)`.
+    """
+    spacing = timesteps if timesteps is not None else config.get("timestep_spacing", None)
+    if spacing is None:
+        raise ValueError("Either pass `timesteps` or set `timestep_spacing` in the scheduler config.")
+    if timesteps is None and num_inference_steps is None:
+        raise ValueError("`num_inference_steps` is required when no custom `timesteps` are given.")
+
+    key = (
+        _hashable({k: v for k, v in config.items() if not k.startswith("_")}),
+        _hashable(spacing),
+        num_inference_steps if timesteps is None else None,
+        discrete,
+    )
+    if key in _schedule_cache:
+        _schedule_cache.move_to_end(key)
+    else:
+        if not isinstance(alphas_cumprod, np.ndarray):
+            alphas_cumprod = alphas_cumprod.numpy()
+        alphas_cumprod = np.asarray(alphas_cumprod, dtype=np.float64)
+        train_sigmas = ((1 - alphas_cumprod) / alphas_cumprod) ** 0.5
+        _schedule_cache[key] = _compute_schedule(
+            spacing,
+            num_inference_steps,
+            config["num_train_timesteps"],
+            train_sigmas,
+            config.get("steps_offset", 0),
+            discrete,
+        )
+        if len(_schedule_cache) > _SCHEDULE_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+
+    schedule_timesteps, schedule_sigmas = _schedule_cache[key]
+    # hand out copies, schedulers modify their grids in place
+    return schedule_timesteps.copy(), schedule_sigmas.copy()
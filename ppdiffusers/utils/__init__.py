@@ -85,7 +85,14 @@ from .load_utils import safetensors_load, smart_load, torch_load
 from .logging import get_logger
 from .outputs import BaseOutput
 from .paddle_utils import rand_tensor, randint_tensor, randn_tensor
-from .pil_utils import PIL_INTERPOLATION
+from .pil_utils import (
+    ENCODED_IMAGE_FORMATS,
+    PIL_INTERPOLATION,
+    encode_images,
+    numpy_to_pil,
+    pd_round_half_to_even,
+    pd_to_uint8,
+)
 
 if is_paddle_available():
     from .testing_utils import (
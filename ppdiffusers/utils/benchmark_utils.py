@@ -0,0 +1,160 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark utilities: helpers shared by the `ppdiffusers-cli` benchmark commands.
+"""
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from .import_utils import is_paddle_available
+from .logging import get_logger
+
+logger = get_logger(__name__)  # pylint: disable=invalid-name
+
+if is_paddle_available():
+    import paddle
+
+# Tensor methods that force the host to wait for the device and copy data back.
+HOST_SYNC_METHODS = ["item", "numpy", "tolist", "__array__", "__bool__", "__float__", "__int__", "__index__"]
+
+
+def synchronize():
+    """Blocks until all queued device work is finished so that wall-clock timings are meaningful."""
+    if is_paddle_available() and paddle.device.is_compiled_with_cuda() and "gpu" in paddle.device.get_device():
+        paddle.device.cuda.synchronize()
+
+
+class HostSyncCounter:
+    """
+    Context manager counting device -> host synchronizations (`.item()`, `.numpy()`, `bool(tensor)`, ...) performed
+    on `paddle.Tensor` objects while it is active.
+
+    Examples:
+
+    ```py
+    >>> with HostSyncCounter() as counter:
+    ...     scheduler.step(model_output, t, sample)
+    >>> counter.count
+    ```
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.counts = {}
+        self._originals = {}
+
+    def _wrap(self, name, method):
+        def wrapper(tensor, *args, **kwargs):
+            self.count += 1
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return method(tensor, *args, **kwargs)
+
+        return wrapper
+
+    def __enter__(self):
+        for name in HOST_SYNC_METHODS:
+            method = getattr(paddle.Tensor, name, None)
+            if method is None:
+                continue
+            self._originals[name] = method
+            setattr(paddle.Tensor, name, self._wrap(name, method))
+        return self
+
+    def __exit__(self, *exc):
+        for name, method in self._originals.items():
+            setattr(paddle.Tensor, name, method)
+        self._originals = {}
+        return False
+
+
+class MemoryTracker:
+    """
+    Context manager recording the peak memory used while it is active. On GPU the peak of the paddle allocator is
+    reported, on CPU the peak of python-level allocations traced by `tracemalloc`.
+    """
+
+    def __init__(self):
+        self.peak_bytes = 0
+        self.device = "cpu"
+
+    def __enter__(self):
+        if paddle.device.is_compiled_with_cuda() and "gpu" in paddle.device.get_device():
+            self.device = "gpu"
+            self._start = paddle.device.cuda.max_memory_allocated()
+        else:
+            self._was_tracing = tracemalloc.is_tracing()
+            if not self._was_tracing:
+                tracemalloc.start()
+            tracemalloc.clear_traces()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device == "gpu":
+            self.peak_bytes = max(paddle.device.cuda.max_memory_allocated() - self._start, 0)
+        else:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            if not self._was_tracing:
+                tracemalloc.stop()
+        return False
+
+
+class Timer:
+    """Context manager measuring the wall time (in seconds) of its body, synchronizing the device on both ends."""
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        synchronize()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        synchronize()
+        self.elapsed = time.perf_counter() - self._start
+        return False
+
+
+def benchmark_environment() -> Dict[str, Any]:
+    """Returns the environment information stored alongside every benchmark report."""
+    from ..version import VERSION
+
+    info = {"ppdiffusers_version": VERSION, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if is_paddle_available():
+        info["paddle_version"] = paddle.__version__
+        info["device"] = paddle.device.get_device()
+    return info
+
+
+def save_benchmark_report(report: Dict[str, Any], output_path: Optional[str] = None) -> str:
+    """
+    Writes a benchmark report as JSON.
+
+    Args:
+        report (`Dict[str, Any]`): the report, must be JSON serializable.
+        output_path (`str`, *optional*): file to write, defaults to `benchmark_report.json` in the working directory.
+
+    Returns:
+        `str`: the path of the written report.
+    """
+    output_path = output_path or "benchmark_report.json"
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=False)
+    logger.info(f"Benchmark report saved in {output_path}")
+    return output_path
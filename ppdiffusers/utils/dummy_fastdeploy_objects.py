@@ -16,6 +16,21 @@
 from . import DummyObject, requires_backends
 
 
+class FastDeployPipelinePool(metaclass=DummyObject):
+    _backends = ["fastdeploy"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["fastdeploy"])
+
+    @classmethod
+    def from_config(cls, *args, **kwargs):
+        requires_backends(cls, ["fastdeploy"])
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        requires_backends(cls, ["fastdeploy"])
+
+
 class FastDeployRuntimeModel(metaclass=DummyObject):
     _backends = ["fastdeploy"]
 
@@ -29,3 +44,18 @@ class FastDeployRuntimeModel(metaclass=DummyObject):
     @classmethod
     def from_pretrained(cls, *args, **kwargs):
         requires_backends(cls, ["fastdeploy"])
+
+
+class FastDeployRuntimePool(metaclass=DummyObject):
+    _backends = ["fastdeploy"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["fastdeploy"])
+
+    @classmethod
+    def from_config(cls, *args, **kwargs):
+        requires_backends(cls, ["fastdeploy"])
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        requires_backends(cls, ["fastdeploy"])
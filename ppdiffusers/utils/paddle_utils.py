@@ -29,13 +29,16 @@ if is_paddle_available():
     class RNGStatesTracker:
         def __init__(self):
             self.states_ = {}
+            self.seeds_ = {}
 
         def reset(self):
             self.states_ = {}
+            self.seeds_ = {}
 
         def remove(self, generator_name=None):
             if generator_name is not None:
                 del self.states_[generator_name]
+                self.seeds_.pop(generator_name, None)
 
         def manual_seed(self, seed, generator_name=None):
             if generator_name is None:
@@ -46,8 +49,21 @@ if is_paddle_available():
             paddle.seed(seed)
             self.states_[generator_name] = paddle.get_cuda_rng_state()
             paddle.set_cuda_rng_state(orig_rng_state)
+            # the seed and the number of draws identify the state of the generator
+            self.seeds_[generator_name] = [seed, 0]
             return generator_name
 
+        def state_key(self, generator_name=None):
+            """
+            A key of the current random state of a generator (or of a list of generators), the same for the generators
+            seeded with the same seed that drew as many times. `None` for no generator.
+            """
+            if isinstance(generator_name, (list, tuple)):
+                return [self.state_key(name) for name in generator_name]
+            if generator_name is None:
+                return None
+            return tuple(self.seeds_.get(generator_name, [generator_name, 0]))
+
         @contextlib.contextmanager
         def rng_state(self, generator_name=None):
             if generator_name is not None:
@@ -55,6 +71,8 @@ if is_paddle_available():
                     raise ValueError("state {} does not exist".format(generator_name))
                 orig_cuda_rng_state = paddle.get_cuda_rng_state()
                 paddle.set_cuda_rng_state(self.states_[generator_name])
+                if generator_name in self.seeds_:
+                    self.seeds_[generator_name][1] += 1
                 try:
                     yield
                 finally:
@@ -12,10 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
 import PIL.Image
 import PIL.ImageOps
 from packaging import version
 
+from .import_utils import is_paddle_available
+
+if is_paddle_available():
+    import paddle
+
 if version.parse(version.parse(PIL.__version__).base_version) >= version.parse("9.1.0"):
     PIL_INTERPOLATION = {
         "linear": PIL.Image.Resampling.BILINEAR,
@@ -32,3 +43,79 @@ else:
         "lanczos": PIL.Image.LANCZOS,
         "nearest": PIL.Image.NEAREST,
     }
+
+# the `output_type`s of the pipelines returning encoded images, and their PIL formats
+ENCODED_IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+def pd_round_half_to_even(images: "paddle.Tensor") -> "paddle.Tensor":
+    """
+    Rounds the non-negative values of `images` to the nearest integer and the halves to the nearest even integer, as
+    `np.round` does, while `paddle.round` rounds the halves away from zero.
+    """
+    rounded = paddle.round(images)
+    # the difference is exact, so only the halves rounded to an odd integer are moved down
+    halves_to_odd = paddle.logical_and(rounded - images == 0.5, rounded % 2 == 1)
+    return rounded - halves_to_odd.cast(rounded.dtype)
+
+
+def pd_to_uint8(images: "paddle.Tensor", value_range: Tuple[float, float] = (0.0, 1.0)) -> np.ndarray:
+    """
+    Converts a batch of images of shape `[batch_size, channels, height, width]` with values in `value_range` to uint8
+    numpy images of shape `[batch_size, height, width, channels]`. The scaling, clipping, rounding and transposition
+    run on the device, so that the host only receives a quarter of the bytes of float32 images. The images are the same
+    as the ones of `numpy_to_pil` on the float32 images in `[0, 1]`: the same float32 operations, and the halves are
+    rounded to even as `np.round` does.
+    """
+    low, high = value_range
+    # e.g. `images / 2 + 0.5` for images in [-1, 1], in the dtype of the images as in `decode_latents`
+    images = (images / (high - low) - low / (high - low)).clip(0, 1)
+    images = pd_round_half_to_even(images.cast("float32") * 255.0)
+    return images.cast("uint8").transpose([0, 2, 3, 1]).numpy()
+
+
+def numpy_to_pil(images: np.ndarray) -> List[PIL.Image.Image]:
+    """
+    Converts a numpy image or a batch of numpy images, either float in `[0, 1]` or uint8, to PIL images.
+    """
+    if images.ndim == 3:
+        images = images[None, ...]
+    if images.dtype != np.uint8:
+        images = (images * 255).round().astype("uint8")
+    if images.shape[-1] == 1:
+        # special case for grayscale (single channel) images
+        return [PIL.Image.fromarray(image.squeeze(), mode="L") for image in images]
+    return [PIL.Image.fromarray(image) for image in images]
+
+
+def encode_images(
+    images: Union[np.ndarray, List[PIL.Image.Image]],
+    format: str = "PNG",
+    max_workers: Optional[int] = None,
+    **save_kwargs,
+) -> List[bytes]:
+    """
+    Encodes images to the bytes of PNG, JPEG or WebP files, e.g. to serve them. The images are encoded in a thread
+    pool, the PIL encoders release the GIL.
+
+    Args:
+        images (`np.ndarray` or `List[PIL.Image.Image]`):
+            A batch of numpy images, either float in `[0, 1]` or uint8, or a list of PIL images.
+        format (`str`, *optional*, defaults to `"PNG"`): the format of the files.
+        max_workers (`int`, *optional*): the number of threads, the number of images or of CPUs by default.
+        save_kwargs: the arguments of `PIL.Image.Image.save`, e.g. the `quality` of JPEG and WebP files.
+    """
+    if isinstance(images, np.ndarray):
+        images = numpy_to_pil(images)
+    format = ENCODED_IMAGE_FORMATS.get(format.lower(), format.upper())
+
+    def encode(image):
+        buffer = BytesIO()
+        image.save(buffer, format=format, **save_kwargs)
+        return buffer.getvalue()
+
+    max_workers = max_workers or min(len(images), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return [encode(image) for image in images]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(encode, images))
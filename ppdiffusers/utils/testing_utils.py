@@ -17,12 +17,16 @@ import logging
 import os
 import random
 import re
+import threading
+import time
 import unittest
 import urllib.parse
 from distutils.util import strtobool
 from io import BytesIO, StringIO
 from pathlib import Path
-from typing import Optional, Union
+from collections import namedtuple
+from typing import Callable, List, Optional, Tuple, Union
+from unittest import mock
 
 import numpy as np
 import PIL.Image
@@ -443,3 +447,109 @@ class CaptureLogger:
 
     def __repr__(self):
         return f"captured: {self.out}\n"
+
+
+StubTensorInfo = namedtuple("StubTensorInfo", ["name", "shape", "dtype"])
+
+
+def _stub_pdtensor2fdtensor(pdtensor, name: str = "", share_with_raw_ptr: bool = False):
+    return pdtensor
+
+
+def stub_fastdeploy_tensors():
+    """
+    Patches the conversion of the paddle tensors bound to the runtimes by [`FastDeployRuntimeModel.bound_infer`] and
+    `zero_copy_infer` to FastDeploy tensors, so that the [`StubFastDeployRuntime`]s bind the paddle tensors themselves,
+    with or without `fastdeploy`. Use it as a context manager, a decorator, or with `start` and `stop`.
+    """
+    from ..pipelines import fastdeploy_utils
+
+    return mock.patch.object(fastdeploy_utils, "pdtensor2fdtensor", _stub_pdtensor2fdtensor, create=True)
+
+
+class StubFastDeployRuntime:
+    """
+    A stand-in for `fastdeploy.Runtime`, to test and load test [`FastDeployRuntimeModel`]s and their pools without a
+    backend. `infer` sleeps for `latency` seconds, releasing the GIL like a real runtime, and returns `fn` of its
+    inputs. `zero_copy_infer` does the same with the tensors bound by `bind_input_tensor`, and writes the outputs in
+    place into the tensors bound by `bind_output_tensor`: the bound tensors are paddle tensors, see
+    [`stub_fastdeploy_tensors`]. The clones share `fn`, as the clones of a runtime share its weights, and the call
+    statistics `stats`: the number of calls, of clones, of bound tensors, and the largest number of calls running at
+    the same time.
+
+    Args:
+        inputs (`List[Tuple[str, List[int]]]`): the names and shapes of the inputs.
+        outputs (`List[Tuple[str, List[int]]]`): the names and shapes of the outputs.
+        fn (`Callable`, *optional*):
+            Computes the list of numpy outputs from the numpy inputs, passed by name. Defaults to halving the first
+            input.
+        latency (`float`, *optional*, defaults to 0.0): the seconds of every call.
+    """
+
+    def __init__(
+        self,
+        inputs: List[Tuple[str, List[int]]],
+        outputs: List[Tuple[str, List[int]]],
+        fn: Optional[Callable] = None,
+        latency: float = 0.0,
+        stats: Optional[dict] = None,
+        lock: Optional[threading.Lock] = None,
+    ):
+        self.inputs = [StubTensorInfo(name, shape, "FP32") for name, shape in inputs]
+        self.outputs = [StubTensorInfo(name, shape, "FP32") for name, shape in outputs]
+        self.fn = fn or (lambda **kwargs: [0.5 * next(iter(kwargs.values()))])
+        self.latency = latency
+        self.stats = (
+            stats if stats is not None else {"calls": 0, "clones": 0, "binds": 0, "active": 0, "max_active": 0}
+        )
+        self._lock = lock or threading.Lock()
+        self.bound_inputs = {}
+        self.bound_outputs = {}
+
+    def num_inputs(self):
+        return len(self.inputs)
+
+    def num_outputs(self):
+        return len(self.outputs)
+
+    def get_input_info(self, index):
+        return self.inputs[index]
+
+    def get_output_info(self, index):
+        return self.outputs[index]
+
+    def clone(self):
+        inputs = [info[:2] for info in self.inputs]
+        outputs = [info[:2] for info in self.outputs]
+        runtime = StubFastDeployRuntime(inputs, outputs, self.fn, self.latency, self.stats, self._lock)
+        with self._lock:
+            self.stats["clones"] += 1
+        return runtime
+
+    def infer(self, inputs):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["active"] += 1
+            self.stats["max_active"] = max(self.stats["max_active"], self.stats["active"])
+        try:
+            time.sleep(self.latency)
+            return [np.asarray(output, dtype=np.float32) for output in self.fn(**inputs)]
+        finally:
+            with self._lock:
+                self.stats["active"] -= 1
+
+    def bind_input_tensor(self, name, tensor):
+        with self._lock:
+            self.stats["binds"] += 1
+        self.bound_inputs[name] = tensor
+
+    def bind_output_tensor(self, name, tensor):
+        with self._lock:
+            self.stats["binds"] += 1
+        self.bound_outputs[name] = tensor
+
+    def zero_copy_infer(self):
+        outputs = self.infer({name: tensor.numpy() for name, tensor in self.bound_inputs.items()})
+        for info, output in zip(self.outputs, outputs):
+            if info.name in self.bound_outputs:
+                paddle.assign(output, output=self.bound_outputs[info.name])
@@ -64,6 +64,35 @@ class RepaintPipelineFastTests(PipelineTesterMixin, unittest.TestCase):
         expected_slice = np.array([0.08341709, 0.54262626, 0.549711  , 0.00903523, 0.        ,  1.        , 0.05136755, 0.5604646 , 0.6273578 ])
         assert np.abs(image_slice.flatten() - expected_slice).max() < 0.001
 
+    def test_repaint_batched_masks(self):
+        components = self.get_dummy_components()
+        sd_pipe = RePaintPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        inputs = self.get_dummy_inputs()
+        image = inputs['image']
+        masks = [(image > 0).cast('float32'), (image < 0.5).cast('float32')]
+
+        # one image, one mask per sample
+        inputs['mask_image'] = paddle.concat(masks)
+        images = sd_pipe(**inputs).images
+
+        assert images.shape == (2, 32, 32, 3)
+        expected_known = (image / 2 + 0.5).clip(0, 1).transpose([0, 2, 3, 1]).numpy()[0]
+        for output, mask in zip(images, masks):
+            known = mask.transpose([0, 2, 3, 1]).numpy()[0] > 0.5
+            # the known region of every sample is taken from the original image with its own mask
+            assert np.abs(output[known] - expected_known[known]).max() < 1e-5
+        assert np.abs(images[0] - images[1]).max() > 1e-3
+
+    def test_repaint_batch_mismatch(self):
+        components = self.get_dummy_components()
+        sd_pipe = RePaintPipeline(**components)
+        inputs = self.get_dummy_inputs()
+        inputs['image'] = paddle.concat([inputs['image']] * 2)
+        inputs['mask_image'] = paddle.concat([inputs['mask_image']] * 3)
+        with self.assertRaises(ValueError):
+            sd_pipe(**inputs)
+
 
 @nightly
 @require_paddle_gpu
@@ -31,6 +31,10 @@ from ppdiffusers import (
 from ppdiffusers.pipelines.semantic_stable_diffusion import (
     SemanticStableDiffusionPipeline as StableDiffusionPipeline,
 )
+from ppdiffusers.pipelines.semantic_stable_diffusion.custom_quantile import (
+    quantile,
+    topk_quantile,
+)
 from ppdiffusers.utils import floats_tensor, nightly
 from ppdiffusers.utils.testing_utils import require_paddle_gpu
 
@@ -127,6 +131,43 @@ class SafeDiffusionPipelineFastTests(unittest.TestCase):
         assert np.abs(image_from_tuple_slice.flatten() - expected_slice).max(
             ) < 0.01
 
+    def test_topk_quantile(self):
+        paddle.seed(0)
+        x = paddle.randn([3, 2, 4, 256])
+        q = [0.9, 0.5, 1.0]
+        out = topk_quantile(x, q)
+        assert out.shape == [3, 2, 4]
+        for c in range(3):
+            expected = quantile(x[c], q[c], axis=2)
+            assert np.abs(out[c].numpy() - expected.numpy()).max() < 1e-12
+
+    def test_semantic_diffusion_edit_concepts(self):
+        unet = self.dummy_cond_unet
+        scheduler = DDIMScheduler(beta_start=0.00085, beta_end=0.012,
+            beta_schedule='scaled_linear', clip_sample=False,
+            set_alpha_to_one=False)
+        vae = self.dummy_vae
+        bert = self.dummy_text_encoder
+        tokenizer = CLIPTokenizer.from_pretrained(
+            'hf-internal-testing/tiny-random-clip')
+        sd_pipe = StableDiffusionPipeline(unet=unet, scheduler=scheduler,
+            vae=vae, text_encoder=bert, tokenizer=tokenizer, safety_checker
+            =None, feature_extractor=self.dummy_extractor)
+        sd_pipe.set_progress_bar_config(disable=None)
+        prompt = 'A painting of a squirrel eating a burger'
+        edit_kwargs = dict(editing_prompt=['smiling', 'glasses'],
+            reverse_editing_direction=[False, True], edit_warmup_steps=[1,
+            2], edit_cooldown_steps=[3, None], edit_threshold=[0.9, 0.5],
+            edit_guidance_scale=[4.0, 6.0], edit_weights=[1.0, 2.0])
+        generator = paddle.Generator().manual_seed(0)
+        image = sd_pipe([prompt], generator=generator, guidance_scale=6.0,
+            num_inference_steps=4, output_type='np', **edit_kwargs).images
+        assert image.shape == (1, 64, 64, 3)
+        assert sd_pipe.edit_estimates.shape == [5, 2, 1, 4, 32, 32]
+        # no semantic guidance before the warmup of every concept is over
+        assert float(sd_pipe.sem_guidance[0].abs().max()) == 0.0
+        assert float(sd_pipe.sem_guidance[2].abs().max()) > 0.0
+
     def test_semantic_diffusion_no_safety_checker(self):
         pipe = StableDiffusionPipeline.from_pretrained(
             'hf-internal-testing/tiny-stable-diffusion-lms-pipe',
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 import gc
+import os
 import random
+import tempfile
 import unittest
 
 import numpy as np
@@ -27,6 +29,7 @@ from ppdiffusers import (
     DDIMScheduler,
     UNet2DConditionModel,
 )
+from ppdiffusers.pipelines.stable_diffusion import DiffusionInversion, InversionCache
 from ppdiffusers.utils import floats_tensor, load_image, load_numpy, slow
 from ppdiffusers.utils.testing_utils import require_paddle_gpu
 
@@ -135,6 +138,55 @@ class CycleDiffusionPipelineFastTests(PipelineTesterMixin, unittest.TestCase):
                                     0.49804688, 0.36279297, 0.6484375 , 0.45361328])
         assert np.abs(image_slice.flatten() - expected_slice).max() < 0.01
 
+    def test_stable_diffusion_cycle_inversion(self):
+        components = self.get_dummy_components()
+        pipe = CycleDiffusionPipeline(**components)
+        pipe.set_progress_bar_config(disable=None)
+        inputs = self.get_dummy_inputs()
+        inputs["source_guidance_scale"] = 2.0
+        paddle.seed(0)
+        images = pipe(**inputs).images
+
+        inputs = self.get_dummy_inputs()
+        paddle.seed(0)
+        inversion = pipe.invert(
+            inputs["source_prompt"],
+            inputs["image"],
+            strength=inputs["strength"],
+            num_inference_steps=inputs["num_inference_steps"],
+            source_guidance_scale=2.0,
+            eta=inputs["eta"],
+            generator=inputs["generator"],
+        )
+        assert len(inversion.step_noise) == len(inversion.timesteps)
+        edit_inputs = {k: inputs[k] for k in ["prompt", "num_inference_steps", "eta", "strength", "guidance_scale"]}
+        edited_images = pipe(**edit_inputs, inversion=inversion, output_type="numpy").images
+        assert np.abs(edited_images - images).max() < 1e-4
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            inversion.save(os.path.join(tmpdirname, "inversion.pdparams"))
+            loaded_inversion = DiffusionInversion.load(os.path.join(tmpdirname, "inversion.pdparams"))
+        loaded_images = pipe(**edit_inputs, inversion=loaded_inversion, output_type="numpy").images
+        assert np.abs(loaded_images - edited_images).max() < 1e-6
+
+        with self.assertRaises(ValueError):
+            pipe(**{**edit_inputs, "strength": 0.5}, inversion=inversion)
+
+    def test_stable_diffusion_cycle_inversion_cache(self):
+        components = self.get_dummy_components()
+        pipe = CycleDiffusionPipeline(**components)
+        pipe.set_progress_bar_config(disable=None)
+        inputs = self.get_dummy_inputs()
+        cache = InversionCache(max_entries=1)
+        inversion = pipe.invert(inputs["source_prompt"], inputs["image"], num_inference_steps=2, inversion_cache=cache)
+        cached_inversion = pipe.invert(
+            inputs["source_prompt"], inputs["image"].clone(), num_inference_steps=2, inversion_cache=cache
+        )
+        assert cached_inversion is inversion
+        other_inversion = pipe.invert("A horse", inputs["image"], num_inference_steps=2, inversion_cache=cache)
+        assert other_inversion is not inversion
+        assert len(cache) == 1
+
 
 @slow
 @require_paddle_gpu
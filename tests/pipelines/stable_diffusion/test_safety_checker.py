@@ -0,0 +1,160 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+
+from paddlenlp.transformers import CLIPFeatureExtractor, CLIPVisionConfig
+from ppdiffusers.pipelines.stable_diffusion.safety_checker import (
+    StableDiffusionSafetyChecker,
+    cosine_distance,
+    preprocess_safety_checker_input,
+)
+from ppdiffusers.utils import numpy_to_pil
+
+
+def per_concept_nsfw_concepts(safety_checker, clip_input):
+    # the per image and per concept loop of the safety checker before it was vectorized
+    pooled_output = safety_checker.clip(clip_input)[1]
+    image_embeds = paddle.matmul(pooled_output, safety_checker.vision_projection)
+    special_cos_dist = cosine_distance(image_embeds, safety_checker.special_care_embeds).astype("float32").numpy()
+    cos_dist = cosine_distance(image_embeds, safety_checker.concept_embeds).astype("float32").numpy()
+
+    has_nsfw_concepts = []
+    for i in range(image_embeds.shape[0]):
+        adjustment = 0.0
+        for concept_idx in range(len(special_cos_dist[0])):
+            concept_threshold = safety_checker.special_care_embeds_weights[concept_idx].item()
+            if round(special_cos_dist[i][concept_idx] - concept_threshold + adjustment, 3) > 0:
+                adjustment = 0.01
+        bad_concepts = []
+        for concept_idx in range(len(cos_dist[0])):
+            concept_threshold = safety_checker.concept_embeds_weights[concept_idx].item()
+            if round(cos_dist[i][concept_idx] - concept_threshold + adjustment, 3) > 0:
+                bad_concepts.append(concept_idx)
+        has_nsfw_concepts.append(len(bad_concepts) > 0)
+    return has_nsfw_concepts
+
+
+class StableDiffusionSafetyCheckerTests(unittest.TestCase):
+    def get_dummy_safety_checker(self):
+        paddle.seed(0)
+        config = CLIPVisionConfig(
+            hidden_size=32,
+            projection_dim=32,
+            intermediate_size=37,
+            layer_norm_eps=1e-05,
+            num_attention_heads=4,
+            num_hidden_layers=5,
+            image_size=32,
+            patch_size=4,
+        )
+        safety_checker = StableDiffusionSafetyChecker(config)
+        safety_checker.eval()
+        return safety_checker
+
+    def get_dummy_clip_input(self, batch_size=3):
+        paddle.seed(1)
+        return paddle.randn([batch_size, 3, 32, 32])
+
+    def set_concepts(self, safety_checker, special_care_embeds, special_care_weights, concept_embeds, concept_weights):
+        state_dict = safety_checker.state_dict()
+        state_dict["special_care_embeds"] = paddle.to_tensor(special_care_embeds, dtype="float32")
+        state_dict["special_care_embeds_weights"] = paddle.to_tensor(special_care_weights, dtype="float32")
+        state_dict["concept_embeds"] = paddle.to_tensor(concept_embeds, dtype="float32")
+        state_dict["concept_embeds_weights"] = paddle.to_tensor(concept_weights, dtype="float32")
+        safety_checker.set_state_dict(state_dict)
+
+    def test_preprocess_safety_checker_input_matches_feature_extractor(self):
+        # the resizing and the quantization are exact, the normalization differs by float rounding
+        rng = np.random.RandomState(0)
+        for feature_extractor in [CLIPFeatureExtractor(), CLIPFeatureExtractor(size=32, crop_size=32)]:
+            for height, width in [(64, 64), (224, 224), (256, 384), (96, 40)]:
+                images = rng.rand(2, height, width, 3).astype("float32")
+                expected = feature_extractor(numpy_to_pil(images), return_tensors="pd").pixel_values.numpy()
+                clip_input = preprocess_safety_checker_input(images, feature_extractor).numpy()
+                assert clip_input.shape == expected.shape
+                assert np.abs(clip_input - expected).max() < 1e-5
+
+                uint8_images = (images * 255).round().astype("uint8")
+                uint8_input = preprocess_safety_checker_input(uint8_images, feature_extractor).numpy()
+                assert np.abs(uint8_input - expected).max() < 1e-5
+
+    def test_safety_checker_matches_per_concept_loop(self):
+        safety_checker = self.get_dummy_safety_checker()
+        clip_input = self.get_dummy_clip_input()
+        with paddle.no_grad():
+            pooled_output = safety_checker.clip(clip_input)[1]
+            image_embeds = F.normalize(paddle.matmul(pooled_output, safety_checker.vision_projection))
+        image_embeds = image_embeds.numpy().astype("float64")
+        # the concept i has a positive cosine similarity to the image i and is orthogonal to the other images
+        concepts = np.linalg.pinv(image_embeds).T
+        concepts /= np.linalg.norm(concepts, axis=1, keepdims=True)
+        similarities = np.diag(image_embeds @ concepts.T)
+
+        rng = np.random.RandomState(0)
+        special_care_embeds = rng.randn(3, 32)
+        special_care_weights = np.full([3], 2.0)
+        concept_embeds = rng.randn(17, 32)
+        concept_weights = np.full([17], 2.0)
+        # the image 0 shows a special care concept, which lowers the threshold of its concept 0 below its similarity
+        special_care_embeds[0], special_care_weights[0] = concepts[0], similarities[0] - 0.01
+        concept_embeds[0], concept_weights[0] = concepts[0], similarities[0] + 0.005
+        # the image 1 is above the threshold of its concept 1
+        concept_embeds[1], concept_weights[1] = concepts[1], similarities[1] - 0.01
+        # the image 2 is below the threshold of its concept 2 without special care
+        concept_embeds[2], concept_weights[2] = concepts[2], similarities[2] + 0.005
+        self.set_concepts(safety_checker, special_care_embeds, special_care_weights, concept_embeds, concept_weights)
+
+        images = np.ones([3, 8, 8, 3], dtype="float32")
+        images, has_nsfw_concepts = safety_checker(clip_input, images)
+        assert has_nsfw_concepts == [True, True, False]
+        assert has_nsfw_concepts == per_concept_nsfw_concepts(safety_checker, clip_input)
+        assert (images[0] == 0).all() and (images[1] == 0).all() and (images[2] == 1).all()
+
+        # without the special care concept, the image 0 stays below the threshold of its concept 0
+        special_care_weights[0] = 2.0
+        self.set_concepts(safety_checker, special_care_embeds, special_care_weights, concept_embeds, concept_weights)
+        _, has_nsfw_concepts = safety_checker(clip_input, np.ones([3, 8, 8, 3], dtype="float32"))
+        assert has_nsfw_concepts == [False, True, False]
+        assert has_nsfw_concepts == per_concept_nsfw_concepts(safety_checker, clip_input)
+
+    def test_safety_checker_matches_per_concept_loop_random_thresholds(self):
+        safety_checker = self.get_dummy_safety_checker()
+        clip_input = self.get_dummy_clip_input(batch_size=8)
+        rng = np.random.RandomState(0)
+        for _ in range(5):
+            special_care_embeds, concept_embeds = rng.randn(3, 32), rng.randn(17, 32)
+            self.set_concepts(safety_checker, special_care_embeds, np.zeros([3]), concept_embeds, np.zeros([17]))
+            with paddle.no_grad():
+                pooled_output = safety_checker.clip(clip_input)[1]
+                image_embeds = paddle.matmul(pooled_output, safety_checker.vision_projection)
+                special_cos_dist = cosine_distance(image_embeds, safety_checker.special_care_embeds).numpy()
+                cos_dist = cosine_distance(image_embeds, safety_checker.concept_embeds).numpy()
+            # thresholds around the similarities, so that some images are flagged and some only with special care
+            special_care_weights = np.quantile(special_cos_dist, 0.75, axis=0) + rng.uniform(-0.01, 0.01, [3])
+            concept_weights = np.quantile(cos_dist, 0.9, axis=0) + rng.uniform(0.0, 0.01, [17])
+            self.set_concepts(
+                safety_checker, special_care_embeds, special_care_weights, concept_embeds, concept_weights
+            )
+            _, has_nsfw_concepts = safety_checker(clip_input, np.ones([8, 8, 8, 3], dtype="float32"))
+            assert has_nsfw_concepts == per_concept_nsfw_concepts(safety_checker, clip_input)
+
+            self.set_concepts(safety_checker, special_care_embeds, np.full([3], 2.0), concept_embeds, concept_weights)
+            _, has_concepts_without_special_care = safety_checker(clip_input, np.ones([8, 8, 8, 3], dtype="float32"))
+            assert has_concepts_without_special_care == per_concept_nsfw_concepts(safety_checker, clip_input)
+            assert sum(has_concepts_without_special_care) < sum(has_nsfw_concepts)
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import gc
+import json
+import os
 import tempfile
 import unittest
 
@@ -27,6 +29,7 @@ from ppdiffusers import (
     DPMSolverMultistepScheduler,
     EulerAncestralDiscreteScheduler,
     EulerDiscreteScheduler,
+    HeunDiscreteScheduler,
     LMSDiscreteScheduler,
     PNDMScheduler,
     StableDiffusionPipeline,
@@ -357,6 +360,179 @@ class StableDiffusionPipelineFastTests(PipelineTesterMixin, unittest.TestCase):
         assert image_shape == (192, 192)
 
 
+    def test_stable_diffusion_stream(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        paddle.seed(0)
+        image = sd_pipe(**self.get_dummy_inputs()).images
+        paddle.seed(0)
+        stream = sd_pipe.stream(**self.get_dummy_inputs(), preview_steps=2)
+        events = list(stream)
+        assert [event.step for event in events] == [0, 1]
+        assert events[0].images.shape == (1, 64, 64, 3)
+        assert events[1].images is None
+        assert np.abs(stream.output.images - image).max() < 1e-06
+        # leaving the iteration cancels the remaining steps
+        unet_calls = []
+        sd_pipe.unet.register_forward_post_hook(lambda layer, inputs,
+            outputs: unet_calls.append(1))
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 50
+        stream = sd_pipe.stream(**inputs)
+        for event in stream:
+            if event.step == 1:
+                break
+        assert stream.cancelled and stream.output is None
+        assert len(unet_calls) < 50
+
+    def test_stable_diffusion_guidance_end(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        unet_batch_sizes = []
+        sd_pipe.unet.register_forward_post_hook(lambda layer, inputs,
+            outputs: unet_batch_sizes.append(inputs[0].shape[0]))
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 4
+        image = sd_pipe(**inputs, guidance_end=0.5).images
+        # the steps after `guidance_end` run a single batch UNet call
+        assert unet_batch_sizes == [2, 2, 1, 1]
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 4
+        inputs['guidance_scale'] = [6.0, 6.0, 1.0, 1.0]
+        scheduled_image = sd_pipe(**inputs).images
+        assert np.abs(scheduled_image - image).max() < 1e-06
+        # a second order scheduler guides both evaluations of a step
+        sd_pipe.scheduler = HeunDiscreteScheduler.from_config(sd_pipe.
+            scheduler.config)
+        unet_batch_sizes.clear()
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 5
+        image = sd_pipe(**inputs, guidance_end=0.5).images
+        assert unet_batch_sizes == [2, 2, 2, 1, 1, 1, 1, 1, 1]
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 5
+        inputs['guidance_scale'] = [6.0, 6.0, 1.0, 1.0, 1.0]
+        scheduled_image = sd_pipe(**inputs).images
+        assert np.abs(scheduled_image - image).max() < 1e-06
+        with self.assertRaises(ValueError):
+            sd_pipe(**self.get_dummy_inputs(), guidance_end=1.5)
+
+    def test_stable_diffusion_generate_batch(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        unet_batch_sizes = []
+        sd_pipe.unet.register_forward_post_hook(lambda layer, inputs,
+            outputs: unet_batch_sizes.append(inputs[0].shape[0]))
+        requests = [{'prompt': 'a cat', 'seed': 0, 'num_inference_steps': 2
+            }, {'prompt': 'a dog', 'height': 32, 'width': 64, 'seed': 1,
+            'num_inference_steps': 2}, {'prompt': 'a cat', 'negative_prompt':
+            'blurry', 'seed': 2, 'num_inference_steps': 2}]
+        output = sd_pipe.generate_batch(requests, output_type='numpy')
+        assert [image.shape for image in output.images] == [(64, 64, 3), (
+            32, 64, 3), (64, 64, 3)]
+        # the two 64x64 requests share their UNet calls
+        assert unet_batch_sizes == [4, 4, 2, 2]
+        image = sd_pipe('a dog', height=32, width=64, num_inference_steps=2,
+            generator=paddle.Generator().manual_seed(1), output_type='numpy'
+            ).images[0]
+        # up to the float rounding of the prompts encoded in a batch
+        assert np.abs(output.images[1] - image).max() < 1e-04
+
+    def test_stable_diffusion_async_safety_checker(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        output = sd_pipe(**self.get_dummy_inputs())
+        future = sd_pipe(**self.get_dummy_inputs(), async_safety_checker=True)
+        async_output = future.result()
+        assert np.abs(async_output.images - output.images).max() < 1e-06
+        assert async_output.nsfw_content_detected is None
+
+    def test_stable_diffusion_device_map(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        output = sd_pipe(**self.get_dummy_inputs())
+        sd_pipe.set_device_map({'text_encoder': 'cpu', 'unet': 'cpu', 'vae': 'cpu'})
+        assert sd_pipe.unet._device_hook.device == 'cpu'
+        assert sd_pipe.unet.dtype == paddle.float32
+        device_map_output = sd_pipe(**self.get_dummy_inputs())
+        assert np.abs(device_map_output.images - output.images).max() < 1e-06
+        sd_pipe.remove_device_hooks()
+        assert not hasattr(sd_pipe.unet, '_device_hook')
+        with self.assertRaises(ValueError):
+            sd_pipe.set_device_map({'tokenizer': 'cpu'})
+
+    def test_stable_diffusion_sequential_offload(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        output = sd_pipe(**self.get_dummy_inputs())
+        sd_pipe.enable_sequential_offload(device='cpu', offload_device='cpu')
+        offload_output = sd_pipe(**self.get_dummy_inputs())
+        assert np.abs(offload_output.images - output.images).max() < 1e-06
+        # every component is staged once per call, the UNet for the whole denoising loop
+        hooks = [getattr(sd_pipe, name)._device_hook for name in ['text_encoder', 'unet', 'vae']]
+        assert [hook.num_onloads for hook in hooks] == [1, 1, 1]
+        assert hooks[0].offload_group.resident is hooks[2]
+
+    def test_stable_diffusion_optimize_for(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        output = sd_pipe(**self.get_dummy_inputs())
+        plan = sd_pipe.optimize_for(memory_budget='1GB', batch_size=2,
+            device='cpu')
+        assert plan.fits
+        assert (plan.attention, plan.vae_slicing, plan.sequential_offload
+            ) == ('default', False, False)
+        # a budget below the fastest plan selects slicing or offload
+        plan = sd_pipe.optimize_for(memory_budget=plan.peak_bytes - 1,
+            batch_size=2, device='cpu')
+        assert plan.fits and plan.peak_bytes < plan.memory_budget
+        assert plan.attention != 'default' or plan.vae_slicing
+        optimized_output = sd_pipe(**self.get_dummy_inputs())
+        assert np.abs(optimized_output.images - output.images).max() < 1e-05
+        plan = sd_pipe.optimize_for(memory_budget='1KB', batch_size=2,
+            device='cpu')
+        assert not plan.fits
+        assert (plan.attention, plan.vae_slicing, plan.sequential_offload
+            ) == ('max', True, True)
+        assert 'estimated peak' in str(plan)
+
+    def test_stable_diffusion_profile(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        output = sd_pipe(**self.get_dummy_inputs())
+        with sd_pipe.profile() as profiler:
+            profiled_output = sd_pipe(**self.get_dummy_inputs())
+        assert np.abs(profiled_output.images - output.images).max() < 1e-06
+        # the wrappers are removed on leaving the block
+        assert 'forward' not in sd_pipe.unet.__dict__
+        assert 'step' not in sd_pipe.scheduler.__dict__
+        summary = profiler.summary()
+        num_steps = self.get_dummy_inputs()['num_inference_steps']
+        assert summary['text_encoding']['calls'] == 1
+        assert summary['denoising_step']['calls'] == num_steps
+        assert summary['unet.down_blocks.0']['calls'] == num_steps
+        assert summary['unet.mid_block']['calls'] == num_steps
+        assert summary['vae_decode']['calls'] == 1
+        assert 'denoising_step' in profiler.summary_table()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, 'trace.json')
+            profiler.export_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+        stages = [event for event in trace['traceEvents'] if event['ph'] ==
+            'X']
+        assert len(stages) == len(profiler.events)
+        assert all(event['dur'] >= 0 for event in stages)
+
+
 @slow
 @require_paddle_gpu
 class StableDiffusionPipelineSlowTests(unittest.TestCase):
@@ -0,0 +1,171 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+import paddle
+
+from paddlenlp.transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+from ppdiffusers import (
+    AutoencoderKL,
+    DataParallelRunner,
+    DDIMScheduler,
+    DiffusionPipeline,
+    GenerationResult,
+    StableDiffusionPipeline,
+    UNet2DConditionModel,
+)
+from ppdiffusers.pipelines.stable_diffusion import GenerationRequest
+
+
+class StableDiffusionDataParallelTests(unittest.TestCase):
+    def get_dummy_pipeline(self):
+        paddle.seed(0)
+        unet = UNet2DConditionModel(
+            block_out_channels=(32, 64),
+            layers_per_block=2,
+            sample_size=32,
+            in_channels=4,
+            out_channels=4,
+            down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+            up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+            cross_attention_dim=32,
+        )
+        scheduler = DDIMScheduler(
+            beta_start=0.00085,
+            beta_end=0.012,
+            beta_schedule="scaled_linear",
+            clip_sample=False,
+            set_alpha_to_one=False,
+        )
+        paddle.seed(0)
+        vae = AutoencoderKL(
+            block_out_channels=[32, 64],
+            in_channels=3,
+            out_channels=3,
+            down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+            up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+            latent_channels=4,
+        )
+        paddle.seed(0)
+        text_encoder_config = CLIPTextConfig(
+            bos_token_id=0,
+            eos_token_id=2,
+            hidden_size=32,
+            intermediate_size=37,
+            layer_norm_eps=1e-05,
+            num_attention_heads=4,
+            num_hidden_layers=5,
+            pad_token_id=1,
+            vocab_size=1000,
+        )
+        text_encoder = CLIPTextModel(text_encoder_config).eval()
+        tokenizer = CLIPTokenizer.from_pretrained("hf-internal-testing/tiny-random-clip")
+        return StableDiffusionPipeline(
+            unet=unet,
+            scheduler=scheduler,
+            vae=vae,
+            text_encoder=text_encoder,
+            tokenizer=tokenizer,
+            safety_checker=None,
+            feature_extractor=None,
+            requires_safety_checker=False,
+        )
+
+    def test_data_parallel_runner(self):
+        pipe = self.get_dummy_pipeline()
+        pipe.set_progress_bar_config(disable=True)
+        prompts = ["A painting of a squirrel eating a burger", "An astronaut riding a horse", "A red bicycle"] * 2
+        request_defaults = {"num_inference_steps": 2, "height": 64, "width": 64}
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe.save_pretrained(tmpdirname)
+            with DataParallelRunner(
+                tmpdirname, num_workers=2, batch_size=1, seed=0, request_defaults=request_defaults
+            ) as runner:
+                results = list(runner.run(iter(prompts)))
+
+                assert [result.index for result in results] == list(range(len(prompts)))
+                assert [result.request.seed for result in results] == list(range(len(prompts)))
+                assert sum(metrics["images"] for metrics in runner.metrics.values()) == len(prompts)
+                assert all(metrics["load_seconds"] is not None for metrics in runner.metrics.values())
+
+            expected = pipe.generate_batch([result.request for result in results], max_batch_size=1).images
+            for result, image in zip(results, expected):
+                assert result.path is None
+                # the float32 results of another process may differ in their last bits, e.g. with the memory
+                # alignment of the BLAS calls, which moves the few pixels next to a rounding boundary by one level
+                assert np.abs(np.asarray(result.image, dtype=int) - np.asarray(image, dtype=int)).max() <= 1
+
+    def test_data_parallel_runner_output_dir(self):
+        pipe = self.get_dummy_pipeline()
+        prompts = ["A painting of a squirrel eating a burger", "An astronaut riding a horse", "A red bicycle"]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe.save_pretrained(os.path.join(tmpdirname, "pipeline"))
+            output_dir = os.path.join(tmpdirname, "images")
+            with DataParallelRunner(
+                os.path.join(tmpdirname, "pipeline"),
+                num_workers=2,
+                batch_size=2,
+                output_dir=output_dir,
+                output_format="jpeg",
+                request_defaults={"num_inference_steps": 2, "height": 64, "width": 64},
+            ) as runner:
+                results = list(runner.run(prompts))
+
+            assert [result.image for result in results] == [None] * len(prompts)
+            assert [os.path.basename(result.path) for result in results] == [
+                "00000000.jpeg",
+                "00000001.jpeg",
+                "00000002.jpeg",
+            ]
+            assert sorted(os.listdir(output_dir)) == ["00000000.jpeg", "00000001.jpeg", "00000002.jpeg"]
+
+    def test_data_parallel_runner_downloads_without_loading(self):
+        runner = DataParallelRunner("org/pipeline", num_workers=1, from_pretrained_kwargs={"paddle_dtype": "float16"})
+        with patch.object(DiffusionPipeline, "download", return_value="/cache/org/pipeline") as download:
+            with patch.object(DiffusionPipeline, "from_pretrained") as from_pretrained:
+                assert runner._local_folder() == "/cache/org/pipeline"
+        # the pipeline is only downloaded, the workers load it
+        download.assert_called_once_with("org/pipeline", paddle_dtype="float16")
+        from_pretrained.assert_not_called()
+
+    def test_data_parallel_runner_bounds_the_reordered_results(self):
+        runner = DataParallelRunner("org/pipeline", num_workers=2, batch_size=2, seed=0)
+        runner.metrics = {rank: {"images": 0, "chunks": 0, "busy_seconds": 0.0} for rank in range(2)}
+        chunks, submitted, yielded = [], [], []
+
+        def put(chunk):
+            chunks.append(chunk)
+            submitted.extend(chunk)
+
+        def receive():
+            # the oldest chunk is the slowest one, the results of the next chunks come first
+            chunk = chunks.pop() if len(chunks) > 1 else chunks.pop(0)
+            assert len(submitted) - len(yielded) <= runner.max_pending_chunks * runner.batch_size
+            return "results", 0, [GenerationResult(index, request) for index, request in chunk], 1.0
+
+        requests = [GenerationRequest("A red bicycle") for _ in range(21)]
+        runner._tasks = Mock(put=put)
+        with patch.object(runner, "start"), patch.object(runner, "_receive", side_effect=receive):
+            for result in runner.run(requests):
+                yielded.append(result)
+
+        assert [result.index for result in yielded] == list(range(len(requests)))
+        assert [result.request.seed for result in yielded] == list(range(len(requests)))
+        # the seeds are drawn on copies, the requests can be run again
+        assert [request.seed for request in requests] == [None] * len(requests)
@@ -0,0 +1,122 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+import paddle
+
+from paddlenlp.transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+from ppdiffusers import (
+    AutoencoderKL,
+    DDIMScheduler,
+    StableDiffusionPipeline,
+    UNet2DConditionModel,
+)
+from ppdiffusers.commands.export import export_fastdeploy_pipeline
+from ppdiffusers.utils import FASTDEPLOY_MODEL_NAME, FASTDEPLOY_WEIGHTS_NAME
+
+
+class StableDiffusionFastDeployExportTests(unittest.TestCase):
+    def get_dummy_pipeline(self):
+        paddle.seed(0)
+        unet = UNet2DConditionModel(
+            block_out_channels=(32, 64),
+            layers_per_block=2,
+            sample_size=32,
+            in_channels=4,
+            out_channels=4,
+            down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+            up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+            cross_attention_dim=32,
+        )
+        scheduler = DDIMScheduler(
+            beta_start=0.00085,
+            beta_end=0.012,
+            beta_schedule="scaled_linear",
+            clip_sample=False,
+            set_alpha_to_one=False,
+        )
+        paddle.seed(0)
+        vae = AutoencoderKL(
+            block_out_channels=[32, 64],
+            in_channels=3,
+            out_channels=3,
+            down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+            up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+            latent_channels=4,
+        )
+        paddle.seed(0)
+        text_encoder_config = CLIPTextConfig(
+            bos_token_id=0,
+            eos_token_id=2,
+            hidden_size=32,
+            intermediate_size=37,
+            layer_norm_eps=1e-05,
+            num_attention_heads=4,
+            num_hidden_layers=5,
+            pad_token_id=1,
+            vocab_size=1000,
+        )
+        text_encoder = CLIPTextModel(text_encoder_config).eval()
+        tokenizer = CLIPTokenizer.from_pretrained("hf-internal-testing/tiny-random-clip")
+        return StableDiffusionPipeline(
+            unet=unet,
+            scheduler=scheduler,
+            vae=vae,
+            text_encoder=text_encoder,
+            tokenizer=tokenizer,
+            safety_checker=None,
+            feature_extractor=None,
+            requires_safety_checker=False,
+        )
+
+    def test_export_dynamic_shapes(self):
+        pipe = self.get_dummy_pipeline()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            report = export_fastdeploy_pipeline(pipe, tmpdirname)
+
+            assert set(report["components"]) == {"text_encoder", "unet", "vae_encoder", "vae_decoder"}
+            for result in report["components"].values():
+                assert result["valid"], result
+            assert report["components"]["unet"]["inputs"]["sample"] == [-1, 4, -1, -1]
+            for name in report["components"]:
+                assert os.path.isfile(os.path.join(tmpdirname, name, FASTDEPLOY_MODEL_NAME))
+                assert os.path.isfile(os.path.join(tmpdirname, name, FASTDEPLOY_WEIGHTS_NAME))
+
+            with open(os.path.join(tmpdirname, "model_index.json")) as f:
+                model_index = json.load(f)
+            assert model_index["_class_name"] == "FastDeployStableDiffusionPipeline"
+            assert model_index["unet"] == ["ppdiffusers", "FastDeployRuntimeModel"]
+            assert model_index["safety_checker"] == [None, None]
+            assert os.path.isdir(os.path.join(tmpdirname, "tokenizer"))
+            assert os.path.isdir(os.path.join(tmpdirname, "scheduler"))
+
+    def test_export_static_shapes(self):
+        pipe = self.get_dummy_pipeline()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            report = export_fastdeploy_pipeline(
+                pipe, tmpdirname, components=["unet", "vae_decoder"], batch_size=1, height=64, width=64
+            )
+
+            assert list(report["components"]) == ["unet", "vae_decoder"]
+            assert report["components"]["unet"]["inputs"]["sample"] == [2, 4, 32, 32]
+            assert report["components"]["vae_decoder"]["inputs"]["latent_sample"] == [1, 4, 32, 32]
+            for result in report["components"].values():
+                assert result["valid"], result
+            # the FastDeploy pipeline can not be loaded from a partial export
+            assert not os.path.exists(os.path.join(tmpdirname, "model_index.json"))
+            assert not os.path.exists(os.path.join(tmpdirname, "text_encoder"))
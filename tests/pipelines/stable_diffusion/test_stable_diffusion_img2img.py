@@ -15,6 +15,7 @@
 import gc
 import random
 import unittest
+from unittest.mock import patch
 
 import numpy as np
 import paddle
@@ -24,7 +25,9 @@ from paddlenlp.transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
 from ppdiffusers import (
     AutoencoderKL,
     DDIMScheduler,
+    DPMSolverAdaptiveScheduler,
     DPMSolverMultistepScheduler,
+    HeunDiscreteScheduler,
     LMSDiscreteScheduler,
     PNDMScheduler,
     StableDiffusionImg2ImgPipeline,
@@ -34,6 +37,13 @@ from ppdiffusers.utils import floats_tensor, load_image, load_numpy, nightly, sl
 from ppdiffusers.utils.testing_utils import require_paddle_gpu
 
 
+def seeded_randn_tensor(shape, generator=None, dtype=None):
+    # the paddle generators only seed the GPU, so the rows are drawn from numpy with their integer seeds instead
+    seeds = generator if isinstance(generator, list) else [generator] * shape[0]
+    noise = np.concatenate([np.random.RandomState(seed).randn(1, *shape[1:]) for seed in seeds])
+    return paddle.to_tensor(noise, dtype=dtype or 'float32')
+
+
 class StableDiffusionImg2ImgPipelineFastTests(PipelineTesterMixin, unittest
     .TestCase):
     pipeline_class = StableDiffusionImg2ImgPipeline
@@ -151,6 +161,89 @@ class StableDiffusionImg2ImgPipelineFastTests(PipelineTesterMixin, unittest
             ).images
         assert images.shape == (batch_size * num_images_per_prompt, 32, 32, 3)
 
+    def test_stable_diffusion_img2img_image_cache(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionImg2ImgPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        inputs = self.get_dummy_inputs()
+        paddle.seed(0)
+        image = sd_pipe(**inputs).images
+        cache = sd_pipe.enable_image_cache(max_bytes=1024 ** 2)
+        for _ in range(2):
+            inputs = self.get_dummy_inputs()
+            paddle.seed(0)
+            cached_image = sd_pipe(**inputs).images
+            assert np.abs(cached_image - image).max() < 1e-6
+        assert cache.misses == 1 and cache.hits == 1
+        # the cache is shared with other pipelines and bounded by bytes
+        other_pipe = StableDiffusionImg2ImgPipeline(**components)
+        other_pipe.enable_image_cache(cache)
+        other_pipe(**self.get_dummy_inputs(), strength=0.5)
+        assert cache.hits == 2
+        cache.max_bytes = cache.num_bytes
+        other_pipe(**self.get_dummy_inputs(seed=1))
+        assert len(cache) == 1 and cache.num_bytes <= cache.max_bytes
+        sd_pipe.disable_image_cache()
+        assert sd_pipe.image_cache is None
+
+
+    def test_stable_diffusion_img2img_per_sample_strength(self):
+        components = self.get_dummy_components()
+        components['scheduler'] = DDIMScheduler(beta_start=0.00085,
+            beta_end=0.012, beta_schedule='scaled_linear')
+        sd_pipe = StableDiffusionImg2ImgPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        unet_calls = []
+        sd_pipe.unet.register_forward_post_hook(lambda layer, inputs,
+            outputs: unet_calls.append(inputs[0].shape[0]))
+        inputs = self.get_dummy_inputs()
+        inputs['prompt'] = [inputs['prompt']] * 2
+        inputs['num_inference_steps'] = 4
+        image = sd_pipe(**inputs, strength=[0.5, 1.0]).images
+        assert image.shape == (2, 32, 32, 3)
+        # the second prompt runs 4 steps, the first one joins it for the last 2
+        assert unet_calls == [2, 2, 4, 4]
+        # every row is the image of a single call with its strength and its seed
+        inputs['image'] = paddle.concat([inputs['image']] * 2)
+        inputs['generator'] = [0, 1]
+        with patch(f'{StableDiffusionImg2ImgPipeline.__module__}.randn_tensor', seeded_randn_tensor), patch(
+            'ppdiffusers.models.vae.randn_tensor', seeded_randn_tensor):
+            images = sd_pipe(**inputs, strength=[0.5, 1.0]).images
+            for seed, strength in enumerate([0.5, 1.0]):
+                single_inputs = self.get_dummy_inputs()
+                single_inputs['num_inference_steps'] = 4
+                single_inputs['generator'] = seed
+                single_image = sd_pipe(**single_inputs, strength=strength).images
+                # up to the float rounding of the batched UNet calls
+                assert np.abs(images[seed] - single_image[0]).max() < 1e-4
+        with self.assertRaises(ValueError):
+            sd_pipe(**self.get_dummy_inputs(), strength=[0.5, 1.0])
+
+    def test_stable_diffusion_img2img_heun_strength(self):
+        components = self.get_dummy_components()
+        components['scheduler'] = HeunDiscreteScheduler(beta_start=0.00085,
+            beta_end=0.012, beta_schedule='scaled_linear')
+        sd_pipe = StableDiffusionImg2ImgPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        unet_calls = []
+        sd_pipe.unet.register_forward_post_hook(lambda layer, inputs,
+            outputs: unet_calls.append(inputs[0].shape[0]))
+        inputs = self.get_dummy_inputs()
+        inputs['num_inference_steps'] = 4
+        sd_pipe(**inputs, strength=0.5)
+        # 2 steps of a second order scheduler
+        assert len(unet_calls) == 3
+
+    def test_stable_diffusion_img2img_adaptive_scheduler(self):
+        components = self.get_dummy_components()
+        assert DPMSolverAdaptiveScheduler not in components['scheduler'].compatibles
+        components['scheduler'] = DPMSolverAdaptiveScheduler.from_config(
+            components['scheduler'].config)
+        sd_pipe = StableDiffusionImg2ImgPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        with self.assertRaises(ValueError):
+            sd_pipe(**self.get_dummy_inputs())
+
 
 @slow
 @require_paddle_gpu
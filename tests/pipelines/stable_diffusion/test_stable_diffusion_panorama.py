@@ -107,14 +107,39 @@ class StableDiffusionPanoramaPipelineFastTests(PipelineTesterMixin,
         expected_slice = np.array([0.32321337, 0.1593099 , 0.26984212, 0.22570723, 0.23723063,   0.47428307, 0.1708372 , 0.11924201, 0.32899845])
         assert np.abs(image_slice.flatten() - expected_slice).max() < 0.01
 
+    def get_overlapping_views(self, panorama_height, panorama_width):
+        # 32x32 latent views every 8 latent pixels of the 32x64 latents of a 64x128 image
+        return [(0, 32, w_start, w_start + 32) for w_start in range(0, 40, 8)]
+
     def test_stable_diffusion_panorama_pndm(self):
         components = self.get_dummy_components()
-        components['scheduler'] = PNDMScheduler()
+        components['scheduler'] = PNDMScheduler(skip_prk_steps=True)
         sd_pipe = StableDiffusionPanoramaPipeline(**components)
         sd_pipe.set_progress_bar_config(disable=None)
+        sd_pipe.get_views = self.get_overlapping_views
+        inputs = self.get_dummy_inputs()
+        inputs.update(height=64, width=128, num_inference_steps=3)
+        image = sd_pipe(**inputs).images
         inputs = self.get_dummy_inputs()
-        with self.assertRaises(ValueError):
-            _ = sd_pipe(**inputs).images
+        inputs.update(height=64, width=128, num_inference_steps=3)
+        image_batched = sd_pipe(**inputs, view_batch_size=2).images
+        assert image.shape == (1, 64, 128, 3)
+        # every batch of views keeps its own multistep history
+        assert np.abs(image - image_batched).max() < 0.001
+
+    def test_stable_diffusion_panorama_view_batch_size(self):
+        components = self.get_dummy_components()
+        sd_pipe = StableDiffusionPanoramaPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        sd_pipe.get_views = self.get_overlapping_views
+        inputs = self.get_dummy_inputs()
+        inputs.update(height=64, width=128)
+        image = sd_pipe(**inputs).images
+        for view_batch_size in [2, 5]:
+            inputs = self.get_dummy_inputs()
+            inputs.update(height=64, width=128)
+            image_batched = sd_pipe(**inputs, view_batch_size=view_batch_size).images
+            assert np.abs(image - image_batched).max() < 0.001
 
     def test_stable_diffusion_panorama_num_images_per_prompt(self):
         components = self.get_dummy_components()
@@ -32,6 +32,7 @@ from ppdiffusers import (
     StableDiffusionPix2PixZeroPipeline,
     UNet2DConditionModel,
 )
+from ppdiffusers.pipelines.stable_diffusion import InversionCache
 from ppdiffusers.utils import load_numpy, slow
 from ppdiffusers.utils.testing_utils import require_paddle_gpu
 from ppdiffusers.utils.load_utils import torch_load
@@ -167,6 +168,67 @@ class StableDiffusionPix2PixZeroPipelineFastTests(PipelineTesterMixin,
             ).images
         assert images.shape == (batch_size * num_images_per_prompt, 64, 64, 3)
 
+    def test_stable_diffusion_pix2pix_zero_inversion_reuse(self):
+        components = self.get_dummy_components()
+        components['inverse_scheduler'] = DDIMInverseScheduler()
+        sd_pipe = StableDiffusionPix2PixZeroPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        paddle.seed(0)
+        image = paddle.rand([1, 3, 64, 64]) * 2 - 1
+        source_embeds = paddle.randn([2, 77, 32])
+        target_embeds = paddle.randn([2, 77, 32])
+        prompt = 'A painting of a squirrel eating a burger'
+        cache = InversionCache()
+        output = sd_pipe.invert(prompt, image, num_inference_steps=4,
+            output_type='numpy', inversion_cache=cache)
+        inversion = output.inversion
+        assert sd_pipe.invert(prompt, image, num_inference_steps=4,
+            output_type='numpy', inversion_cache=cache).inversion is inversion
+
+        inputs = {'prompt': prompt, 'num_inference_steps': 2,
+            'guidance_scale': 6.0, 'output_type': 'numpy'}
+        paddle.seed(0)
+        images = sd_pipe(**inputs, latents=inversion.latents,
+            source_embeds=source_embeds, target_embeds=target_embeds).images
+        paddle.seed(0)
+        first_edit = sd_pipe(**inputs, inversion=inversion,
+            source_embeds=source_embeds, target_embeds=target_embeds).images
+        assert inversion.cross_attention_maps is not None
+        # the second edit reuses the reference cross-attention maps and the edit direction
+        edit_direction = sd_pipe.construct_direction(source_embeds, target_embeds)
+        paddle.seed(0)
+        second_edit = sd_pipe(**inputs, inversion=inversion,
+            edit_direction=edit_direction).images
+        assert np.abs(first_edit - images).max() < 1e-4
+        assert np.abs(second_edit - images).max() < 1e-4
+
+    def test_stable_diffusion_pix2pix_zero_inversion_cache_key(self):
+        components = self.get_dummy_components()
+        components['inverse_scheduler'] = DDIMInverseScheduler()
+        sd_pipe = StableDiffusionPix2PixZeroPipeline(**components)
+        sd_pipe.set_progress_bar_config(disable=None)
+        paddle.seed(0)
+        image = paddle.rand([1, 3, 64, 64]) * 2 - 1
+        prompt = 'A painting of a squirrel eating a burger'
+        cache = InversionCache()
+
+        def invert(seed):
+            generator = paddle.Generator().manual_seed(seed)
+            return sd_pipe.invert(prompt, image, num_inference_steps=4,
+                generator=generator, output_type='numpy',
+                inversion_cache=cache).inversion
+        inversion = invert(0)
+        other_inversion = invert(1)
+        assert other_inversion is not inversion
+        assert len(cache) == 2
+        # a generator seeded with the same seed is in the same state
+        assert invert(0) is inversion
+        assert len(cache) == 2
+        # another config of the inverse scheduler is another inversion
+        sd_pipe.inverse_scheduler = DDIMInverseScheduler(clip_sample=False)
+        assert invert(0) is not inversion
+        assert len(cache) == 3
+
 
 @slow
 @require_paddle_gpu
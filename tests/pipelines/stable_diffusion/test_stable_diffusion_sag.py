@@ -26,6 +26,7 @@ from ppdiffusers import (
     StableDiffusionSAGPipeline,
     UNet2DConditionModel,
 )
+from ppdiffusers.commands.benchmark_sag import UNetCallCounter
 from ppdiffusers.utils import slow
 from ppdiffusers.utils.testing_utils import require_paddle_gpu
 
@@ -100,6 +101,49 @@ class StableDiffusionSAGPipelineFastTests(PipelineTesterMixin, unittest.TestCase
         }
         return inputs
 
+    def get_sag_pipeline(self):
+        sag_pipe = self.pipeline_class(**self.get_dummy_components())
+        sag_pipe.set_progress_bar_config(disable=None)
+        return sag_pipe
+
+    def test_sag_steps_window(self):
+        sag_pipe = self.get_sag_pipeline()
+        inputs = self.get_dummy_inputs()
+        inputs["num_inference_steps"] = 4
+
+        with UNetCallCounter(sag_pipe.unet) as counter:
+            image_no_sag = sag_pipe(**{**inputs, "sag_scale": 0.0, "generator": paddle.Generator().manual_seed(0)})[0]
+        assert counter.count == 4
+        with UNetCallCounter(sag_pipe.unet) as counter:
+            image_empty_window = sag_pipe(**{**inputs, "sag_end": 0.0, "generator": paddle.Generator().manual_seed(0)})[0]
+        assert counter.count == 4
+        assert np.abs(image_no_sag - image_empty_window).max() < 1e-5
+
+        with UNetCallCounter(sag_pipe.unet) as counter:
+            sag_pipe(**{**inputs, "sag_end": 0.5, "generator": paddle.Generator().manual_seed(0)})
+        assert counter.count == 6
+
+    def test_sag_fused_batch(self):
+        sag_pipe = self.get_sag_pipeline()
+        inputs = self.get_dummy_inputs()
+        inputs["num_inference_steps"] = 4
+
+        for guidance_scale in [1.0, 6.0]:
+            inputs["guidance_scale"] = guidance_scale
+            with UNetCallCounter(sag_pipe.unet) as counter:
+                image = sag_pipe(**{**inputs, "fuse_sag_batch": True})[0]
+            # only the first guided step needs a separate degraded prediction
+            assert counter.count == 5
+            assert image.shape == (1, 64, 64, 3)
+            assert np.isfinite(image).all()
+
+    def test_sag_restores_attention_processors(self):
+        sag_pipe = self.get_sag_pipeline()
+        processors = sag_pipe.unet.attn_processors
+        sag_pipe(**self.get_dummy_inputs())
+        for name, processor in sag_pipe.unet.attn_processors.items():
+            assert processor is processors[name], name
+
 
 @slow
 @require_paddle_gpu
@@ -124,6 +124,38 @@ class StableDiffusionAttendAndExcitePipelineFastTests(PipelineTesterMixin, unitt
     def test_inference_batch_single_identical(self):
         self._test_inference_batch_single_identical(relax_max_difference=False)
 
+    def test_gradient_checkpointing(self):
+        components = self.get_dummy_components()
+        pipe = self.pipeline_class(**components)
+        pipe.set_progress_bar_config(disable=None)
+        attn_processors = pipe.unet.attn_processors
+
+        inputs = self.get_dummy_inputs()
+        inputs["thresholds"] = {0: 0.99}
+        image = pipe(**inputs, gradient_checkpointing=False).images
+        inputs = self.get_dummy_inputs()
+        inputs["thresholds"] = {0: 0.99}
+        image_checkpointing = pipe(**inputs, gradient_checkpointing=True).images
+        self.assertLess(np.abs(image - image_checkpointing).max(), 1e-4)
+
+        # the attention processors and the trainable weights are restored after the call
+        for name, processor in pipe.unet.attn_processors.items():
+            self.assertIs(processor, attn_processors[name])
+        self.assertTrue(all(not parameter.stop_gradient for parameter in pipe.unet.parameters()))
+
+    def test_refinement_time_budget(self):
+        components = self.get_dummy_components()
+        pipe = self.pipeline_class(**components)
+        pipe.set_progress_bar_config(disable=None)
+
+        inputs = self.get_dummy_inputs()
+        image_no_budget = pipe(**inputs, refinement_time_budget=0.0).images
+        inputs = self.get_dummy_inputs()
+        inputs["max_iter_to_alter"] = 0
+        inputs["thresholds"] = {}
+        image_no_alter = pipe(**inputs).images
+        self.assertLess(np.abs(image_no_budget - image_no_alter).max(), 1e-5)
+
 
 @require_paddle_gpu
 @slow
@@ -17,6 +17,7 @@ import unittest
 
 import numpy as np
 import paddle
+import paddle.nn.functional as F
 
 from paddlenlp.transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
 from ppdiffusers import (
@@ -25,6 +26,7 @@ from ppdiffusers import (
     VQDiffusionScheduler,
     VQModel,
 )
+from ppdiffusers.commands.benchmark_vq_diffusion import reference_truncate
 from ppdiffusers.pipelines.vq_diffusion.pipeline_vq_diffusion import (
     LearnedClassifierFreeSamplingEmbeddings,
 )
@@ -171,6 +173,17 @@ class VQDiffusionPipelineFastTests(unittest.TestCase):
         assert np.abs(image_slice.flatten() - expected_slice).max() < 0.01
         assert np.abs(image_from_tuple_slice.flatten() - expected_slice).max() < 0.01
 
+    def test_truncate(self):
+        paddle.seed(0)
+        # more classes than the partially sorted top-k
+        log_p_x_0 = F.log_softmax(4 * paddle.randn([2, 1024, 16]), axis=1)
+        for truncation_rate in [0.1, 0.5, 0.9, 1.0]:
+            truncated = VQDiffusionPipeline.truncate(None, log_p_x_0, truncation_rate)
+            expected = reference_truncate(log_p_x_0, truncation_rate)
+            assert ((truncated > -1e9) == (expected > -1e9)).all()
+            # the most likely class is always kept
+            assert (truncated.max(axis=1) == log_p_x_0.max(axis=1)).all()
+
 
 @slow
 @require_paddle_gpu
@@ -0,0 +1,99 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+import paddle
+
+from ppdiffusers import DDIMScheduler
+from ppdiffusers.commands.benchmark_schedulers import (
+    DEFAULT_SCHEDULE_CONFIG,
+    GaussianDenoiser,
+    run_scheduler_benchmark,
+)
+from ppdiffusers.commands.benchmark_vq_diffusion import run_vq_diffusion_benchmark
+from ppdiffusers.utils.benchmark_utils import HostSyncCounter
+
+
+class HostSyncCounterTest(unittest.TestCase):
+    def test_counts_syncs(self):
+        x = paddle.to_tensor([1.0, 2.0])
+        with HostSyncCounter() as counter:
+            x.sum().item()
+            x.numpy()
+            y = x * 2
+        assert counter.count == 2
+        assert counter.counts == {"item": 1, "numpy": 1}
+        # the original methods are restored
+        assert paddle.Tensor.item.__name__ == "item"
+        assert y.shape == [2]
+
+
+class SchedulerBenchmarkTest(unittest.TestCase):
+    def test_gaussian_denoiser_recovers_data(self):
+        scheduler = DDIMScheduler.from_config(DEFAULT_SCHEDULE_CONFIG)
+        model = GaussianDenoiser(scheduler.alphas_cumprod)
+        scheduler.set_timesteps(100)
+        paddle.seed(0)
+        sample = paddle.randn([8, 4, 16, 16])
+        for t in scheduler.timesteps:
+            sample = scheduler.step(model(sample, t), t, sample).prev_sample
+        sample = sample.transpose([1, 0, 2, 3]).reshape([4, -1]).numpy()
+        assert abs(sample.mean(axis=1) - model.data_mean).max() < 0.05
+        assert abs(sample.std(axis=1) - model.data_std).max() < 0.05
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            output = os.path.join(tmpdirname, "report.json")
+            report = run_scheduler_benchmark(
+                schedulers=["DDIMScheduler", "HeunDiscreteScheduler", "VQDiffusionScheduler"],
+                steps=[5, 10],
+                batch_size=1,
+                sample_size=8,
+                output=output,
+            )
+            with open(output) as f:
+                saved = json.load(f)
+
+        assert saved["results"].keys() == report["results"].keys() == {"DDIMScheduler", "HeunDiscreteScheduler"}
+        assert "VQDiffusionScheduler" in saved["skipped"]
+
+        ddim_runs = report["results"]["DDIMScheduler"]["runs"]
+        assert [run["num_inference_steps"] for run in ddim_runs] == [5, 10]
+        assert [run["model_evaluations"] for run in ddim_runs] == [5, 10]
+        # Heun evaluates the model twice per step but the last one
+        heun_runs = report["results"]["HeunDiscreteScheduler"]["runs"]
+        assert [run["model_evaluations"] for run in heun_runs] == [9, 19]
+        # more steps bring DDIM closer to the ODE solution
+        assert ddim_runs[1]["ode_rmse"] < ddim_runs[0]["ode_rmse"]
+        for run in ddim_runs + heun_runs:
+            for key in ["time_per_step_ms", "host_syncs_per_step", "peak_step_memory_bytes", "std_error"]:
+                assert run[key] >= 0
+
+
+class VQDiffusionBenchmarkTest(unittest.TestCase):
+    def test_report(self):
+        report = run_vq_diffusion_benchmark(
+            num_classes=257, num_latent_pixels=16, batch_size=2, timesteps=[99, 1], truncation_rates=[0.5], repeats=1
+        )
+        assert [run["timestep"] for run in report["q_posterior"]] == [99, 1]
+        for run in report["q_posterior"]:
+            # same posterior as the previous implementation
+            assert run["max_error"] < 1e-4
+            assert run["current"]["time_ms"] >= 0
+        for run in report["truncate"]:
+            assert run["mismatch_rate"] < 1e-3
@@ -0,0 +1,197 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+import numpy as np
+import paddle
+
+from ppdiffusers import DDIMScheduler, DiffusionPipeline
+from ppdiffusers.commands.benchmark_fastdeploy import run_fastdeploy_load_test
+from ppdiffusers.pipelines.fastdeploy_utils import (
+    FastDeployPipelinePool,
+    FastDeployRuntimeModel,
+    FastDeployRuntimePool,
+)
+from ppdiffusers.utils.testing_utils import (
+    StubFastDeployRuntime,
+    stub_fastdeploy_tensors,
+)
+
+
+def get_stub_unet(latency=0.0):
+    runtime = StubFastDeployRuntime(
+        inputs=[("sample", [1, 4, 8, 8])], outputs=[("out", [1, 4, 8, 8])], latency=latency
+    )
+    return FastDeployRuntimeModel(model=runtime)
+
+
+class StubPipeline(DiffusionPipeline):
+    def __init__(self, unet, scheduler):
+        super().__init__()
+        self.register_modules(unet=unet, scheduler=scheduler)
+
+    def __call__(self, seed, num_inference_steps=3):
+        self.scheduler.set_timesteps(num_inference_steps)
+        latents = paddle.full([1, 4, 8, 8], float(seed))
+        for t in self.scheduler.timesteps:
+            noise_pred = self.unet.bound_infer({"sample": latents}, output_shapes={"out": latents.shape})["out"]
+            latents = self.scheduler.step(noise_pred, t, latents).prev_sample
+        return latents
+
+
+class FastDeployRuntimeModelTests(unittest.TestCase):
+    def setUp(self):
+        patcher = stub_fastdeploy_tensors()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bound_infer_allocates_buffers_once_per_shape(self):
+        unet = get_stub_unet()
+        output_shapes = {"out": [1, 4, 8, 8]}
+        outputs = [unet.bound_infer({"sample": paddle.full([1, 4, 8, 8], float(i))}, output_shapes) for i in range(3)]
+        assert len(unet._bindings) == 1
+        # the outputs are the bound buffers, overwritten by every call
+        assert outputs[0]["out"] is outputs[2]["out"]
+        assert np.allclose(outputs[2]["out"].numpy(), 1.0)
+
+        output = unet.bound_infer({"sample": paddle.full([2, 4, 8, 8], 4.0)}, {"out": [2, 4, 8, 8]})["out"]
+        assert len(unet._bindings) == 2
+        assert output.shape == [2, 4, 8, 8] and np.allclose(output.numpy(), 2.0)
+
+    def test_bound_infer_reuses_binding_across_steps(self):
+        unet = get_stub_unet()
+        output_shapes = {"out": [1, 4, 8, 8]}
+        for step in range(5):
+            output = unet.bound_infer({"sample": paddle.full([1, 4, 8, 8], float(step))}, output_shapes)["out"]
+            assert np.allclose(output.numpy(), 0.5 * step)
+        # the input and the output buffers were bound by the first step only
+        assert unet.model.stats["binds"] == 2
+        assert unet.model.stats["calls"] == 5
+
+        # the runtime holds a single set of bound tensors, another shape or a copying call rebinds the buffers
+        unet.bound_infer({"sample": paddle.ones([2, 4, 8, 8])}, {"out": [2, 4, 8, 8]})
+        unet(sample=np.ones([1, 4, 8, 8], dtype="float32"))
+        output = unet.bound_infer({"sample": paddle.ones([1, 4, 8, 8])}, output_shapes)["out"]
+        assert unet.model.stats["binds"] == 6
+        assert np.allclose(output.numpy(), 0.5)
+
+    def test_bound_infer_falls_back_past_max_bindings(self):
+        unet = get_stub_unet()
+        unet.max_bindings = 2
+        for batch_size in [1, 2]:
+            unet.bound_infer({"sample": paddle.ones([batch_size, 4, 8, 8])}, {"out": [batch_size, 4, 8, 8]})
+        binds = unet.model.stats["binds"]
+
+        output = unet.bound_infer({"sample": paddle.ones([3, 4, 8, 8])}, {"out": [3, 4, 8, 8]})["out"]
+        assert len(unet._bindings) == 2
+        assert unet.model.stats["binds"] == binds
+        assert output.shape == [3, 4, 8, 8] and np.allclose(output.numpy(), 0.5)
+
+    def test_bound_infer_falls_back_without_output_shapes(self):
+        unet = get_stub_unet()
+        output = unet.bound_infer({"sample": paddle.ones([1, 4, 8, 8])})["out"]
+        assert len(unet._bindings) == 0
+        assert unet.model.stats["binds"] == 0
+        assert np.allclose(output.numpy(), 0.5)
+
+    def test_zero_copy_infer_runs_once_after_binding_all_outputs(self):
+        runtime = StubFastDeployRuntime(
+            inputs=[("sample", [1, 4, 8, 8])],
+            outputs=[("out", [1, 4, 8, 8]), ("out_2", [1, 4, 8, 8])],
+            fn=lambda sample: [0.5 * sample, 2.0 * sample],
+        )
+        unet = FastDeployRuntimeModel(model=runtime)
+        outputs = {"out": paddle.zeros([1, 4, 8, 8]), "out_2": paddle.zeros([1, 4, 8, 8])}
+        unet.zero_copy_infer({"sample": paddle.ones([1, 4, 8, 8])}, outputs)
+        assert runtime.stats["calls"] == 1
+        assert np.allclose(outputs["out"].numpy(), 0.5)
+        assert np.allclose(outputs["out_2"].numpy(), 2.0)
+
+
+class FastDeployRuntimePoolTests(unittest.TestCase):
+    def setUp(self):
+        patcher = stub_fastdeploy_tensors()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_calls(self):
+        unet = get_stub_unet(latency=0.05)
+        pool = FastDeployRuntimePool(unet, num_instances=4)
+        assert unet.model.stats["clones"] == 3
+
+        outputs = {}
+
+        def call(index):
+            inputs = {"sample": paddle.full([1, 4, 8, 8], float(index))}
+            outputs[index] = pool.bound_infer(inputs, output_shapes={"out": [1, 4, 8, 8]})["out"]
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # the four calls ran at the same time, each on its own instance and its own bound buffers
+        assert unet.model.stats["max_active"] == 4
+        assert unet.model.stats["binds"] == 8
+        for index, output in outputs.items():
+            assert np.allclose(output.numpy(), 0.5 * index)
+
+    def test_checkout_timeout(self):
+        pool = FastDeployRuntimePool(get_stub_unet(), num_instances=1)
+        with pool.checkout():
+            with self.assertRaises(TimeoutError):
+                with pool.checkout(timeout=0.01):
+                    pass
+        with pool.checkout(timeout=0.01) as instance:
+            assert instance is pool.instances[0]
+
+    def test_load_test(self):
+        report = run_fastdeploy_load_test(
+            get_stub_unet(latency=0.01),
+            lambda index: {"sample": paddle.full([1, 4, 8, 8], float(index))},
+            output_shapes={"out": [1, 4, 8, 8]},
+            num_instances=[1, 4],
+            concurrency=4,
+            num_requests=8,
+            steps=3,
+        )
+        assert set(report["results"]) == {"1", "4"}
+        for result in report["results"].values():
+            assert result["mismatched_requests"] == 0
+        assert report["results"]["4"]["speedup"] > 1.5
+
+
+class FastDeployPipelinePoolTests(unittest.TestCase):
+    def setUp(self):
+        patcher = stub_fastdeploy_tensors()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pipeline_pool(self):
+        pipe = StubPipeline(unet=get_stub_unet(latency=0.02), scheduler=DDIMScheduler())
+        expected = [pipe(seed).numpy() for seed in range(4)]
+
+        with FastDeployPipelinePool(pipe, num_instances=2) as pool:
+            clone = pool.pipelines[1]
+            assert clone.unet is not pipe.unet and clone.scheduler is not pipe.scheduler
+            futures = [pool.submit(seed) for seed in range(4)]
+            outputs = [future.result().numpy() for future in futures]
+
+        for output, expected_output in zip(outputs, expected):
+            assert np.allclose(output, expected_output)
+        assert pipe.unet.model.stats["max_active"] == 2
+        assert all(instance.unet._bindings for instance in pool.pipelines)
@@ -28,6 +28,7 @@ from ppdiffusers import (
     DDIMScheduler,
     DDPMScheduler,
     DEISMultistepScheduler,
+    DPMSolverAdaptiveScheduler,
     DPMSolverMultistepScheduler,
     DPMSolverSinglestepScheduler,
     EulerAncestralDiscreteScheduler,
@@ -1202,6 +1203,177 @@ class DPMSolverMultistepSchedulerTest(SchedulerCommonTest):
         assert abs(result_mean.item() - 0.2251) < 1e-3
 
 
+class DPMSolverAdaptiveSchedulerTest(unittest.TestCase):
+    def get_scheduler_config(self, **kwargs):
+        config = {
+            "num_train_timesteps": 1000,
+            "beta_start": 0.00085,
+            "beta_end": 0.012,
+            "beta_schedule": "scaled_linear",
+            "solver_order": 2,
+            "prediction_type": "epsilon",
+        }
+
+        config.update(**kwargs)
+        return config
+
+    def full_loop(self, num_inference_steps=None, **config):
+        from ppdiffusers.commands.benchmark_schedulers import GaussianDenoiser
+
+        scheduler = DPMSolverAdaptiveScheduler(**self.get_scheduler_config(**config))
+        model = GaussianDenoiser(scheduler.alphas_cumprod)
+        generator = paddle.Generator().manual_seed(0)
+        sample = paddle.randn([2, 4, 8, 8], generator=generator)
+
+        scheduler.set_timesteps(num_inference_steps)
+        for t in scheduler.timesteps:
+            residual = model(sample, t)
+            sample = scheduler.step(residual, t, sample).prev_sample
+
+        return scheduler, model, sample
+
+    def test_from_pretrained(self):
+        scheduler = DPMSolverAdaptiveScheduler(**self.get_scheduler_config(rtol=0.01))
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            scheduler.save_pretrained(tmpdirname)
+            new_scheduler = DPMSolverAdaptiveScheduler.from_pretrained(tmpdirname)
+
+        assert scheduler.config == new_scheduler.config
+
+    def test_tolerance_controls_evaluations(self):
+        loose, _, _ = self.full_loop(rtol=0.2)
+        tight, _, _ = self.full_loop(rtol=0.01)
+
+        assert loose.nfe < tight.nfe
+        assert loose.next_timestep is None and tight.next_timestep is None
+
+    def test_budget(self):
+        for solver_order in [2, 3]:
+            for num_inference_steps in [6, 10, 20]:
+                scheduler, _, _ = self.full_loop(
+                    num_inference_steps=num_inference_steps, solver_order=solver_order, rtol=0.001
+                )
+                assert scheduler.nfe <= num_inference_steps
+                assert scheduler.next_timestep is None
+
+    def test_full_loop(self):
+        for solver_order in [2, 3]:
+            _, model, sample = self.full_loop(solver_order=solver_order)
+            sample_mean = sample.mean(axis=[0, 2, 3]).numpy()
+            assert np.abs(sample_mean - model.data_mean).max() < 0.25
+
+
+class TimestepSpacingTest(unittest.TestCase):
+    scheduler_classes = (
+        DDIMScheduler,
+        DDPMScheduler,
+        DEISMultistepScheduler,
+        DPMSolverMultistepScheduler,
+        DPMSolverSinglestepScheduler,
+        EulerAncestralDiscreteScheduler,
+        EulerDiscreteScheduler,
+        HeunDiscreteScheduler,
+        KDPM2AncestralDiscreteScheduler,
+        KDPM2DiscreteScheduler,
+        LMSDiscreteScheduler,
+        UniPCMultistepScheduler,
+    )
+
+    def get_scheduler_config(self, **kwargs):
+        config = {
+            "num_train_timesteps": 1000,
+            "beta_start": 0.00085,
+            "beta_end": 0.012,
+            "beta_schedule": "scaled_linear",
+        }
+
+        config.update(**kwargs)
+        return config
+
+    def test_spacings(self):
+        from ppdiffusers.schedulers.timestep_spacing import (
+            SIGMA_SPACINGS,
+            TIMESTEP_SPACINGS,
+        )
+
+        for scheduler_class in self.scheduler_classes:
+            for spacing in TIMESTEP_SPACINGS + SIGMA_SPACINGS:
+                scheduler = scheduler_class(**self.get_scheduler_config(timestep_spacing=spacing))
+                scheduler.set_timesteps(10)
+                timesteps = scheduler.timesteps.numpy()
+
+                # second order schedulers repeat or interleave every timestep but the first
+                num_timesteps = 10 if scheduler.order == 1 else 2 * 10 - 1
+                assert len(timesteps) == num_timesteps, f"{scheduler_class.__name__} {spacing}: {timesteps}"
+                assert timesteps.max() <= 999 and timesteps.min() >= 0
+                if scheduler.order == 1:
+                    assert (np.diff(timesteps) < 0).all(), f"{scheduler_class.__name__} {spacing}: {timesteps}"
+
+    def test_default_spacing_unchanged(self):
+        for scheduler_class in self.scheduler_classes:
+            scheduler = scheduler_class(**self.get_scheduler_config())
+            scheduler.set_timesteps(25)
+            timesteps = scheduler.timesteps.numpy()
+            if scheduler_class in (DDIMScheduler, DDPMScheduler):
+                expected = np.arange(0, 25)[::-1] * 40
+            elif scheduler_class in (
+                DEISMultistepScheduler,
+                DPMSolverMultistepScheduler,
+                DPMSolverSinglestepScheduler,
+                UniPCMultistepScheduler,
+            ):
+                expected = np.linspace(0, 999, 26).round()[::-1][:-1]
+            else:
+                expected = np.linspace(0, 999, 25)[::-1]
+            if scheduler_class in (HeunDiscreteScheduler, KDPM2DiscreteScheduler, KDPM2AncestralDiscreteScheduler):
+                # second order schedulers repeat or interleave every timestep but the first
+                timesteps = np.concatenate([timesteps[:1], timesteps[2::2]])
+            assert np.allclose(timesteps, expected)
+
+    def test_karras_sigmas(self):
+        scheduler = EulerDiscreteScheduler(**self.get_scheduler_config(timestep_spacing="karras"))
+        scheduler.set_timesteps(20)
+        sigmas = scheduler.sigmas.numpy()
+        train_sigmas = ((1 - scheduler.alphas_cumprod.numpy()) / scheduler.alphas_cumprod.numpy()) ** 0.5
+
+        assert len(sigmas) == 21 and sigmas[-1] == 0.0
+        assert np.allclose(sigmas[[0, -2]], train_sigmas[[-1, 0]], rtol=1e-4)
+        # karras sigmas are evenly spaced in sigma ** (1 / rho)
+        assert np.allclose(np.diff(sigmas[:-1] ** (1 / 7.0)), (sigmas[-2] ** (1 / 7.0) - sigmas[0] ** (1 / 7.0)) / 19)
+
+    def test_custom_timesteps(self):
+        timesteps = [999, 800, 500, 200, 10]
+        for scheduler_class in (DDIMScheduler, DDPMScheduler, DPMSolverMultistepScheduler, EulerDiscreteScheduler):
+            scheduler = scheduler_class(**self.get_scheduler_config())
+            scheduler.set_timesteps(timesteps=timesteps)
+            assert scheduler.timesteps.numpy().tolist() == timesteps
+            assert scheduler.num_inference_steps == len(timesteps)
+
+            sample = paddle.ones([1, 3, 8, 8])
+            for t in scheduler.timesteps:
+                sample = scheduler.step(0.1 * sample, t, scheduler.scale_model_input(sample, t)).prev_sample
+            assert not paddle.isnan(sample).any()
+
+        with self.assertRaises(ValueError):
+            scheduler.set_timesteps(timesteps=[10, 500])
+
+    def test_previous_timestep(self):
+        scheduler = DDIMScheduler(**self.get_scheduler_config())
+        scheduler.set_timesteps(timesteps=[999, 800, 500])
+        assert scheduler.previous_timestep(paddle.to_tensor(800)) == 500
+        assert scheduler.previous_timestep(paddle.to_tensor(500)) == -1
+
+    def test_cache(self):
+        from ppdiffusers.schedulers.timestep_spacing import get_timestep_schedule
+
+        scheduler = DPMSolverMultistepScheduler(**self.get_scheduler_config(timestep_spacing="karras"))
+        first, _ = get_timestep_schedule(scheduler.config, scheduler.alphas_cumprod, 15)
+        first[:] = 0
+        second, _ = get_timestep_schedule(scheduler.config, scheduler.alphas_cumprod, 15)
+        assert second[0] > 900
+
+
 class PNDMSchedulerTest(SchedulerCommonTest):
     scheduler_classes = (PNDMScheduler,)
     forward_default_kwargs = (("num_inference_steps", 50),)
@@ -12,10 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import unittest
 
+import numpy as np
+import paddle
+import PIL.Image
+
 from ppdiffusers import __version__
-from ppdiffusers.utils import deprecate
+from ppdiffusers.utils import deprecate, encode_images, numpy_to_pil, pd_to_uint8
 
 
 class DeprecateTester(unittest.TestCase):
@@ -149,3 +154,28 @@ class DeprecateTester(unittest.TestCase):
             deprecate(("deprecated_arg", self.higher_version, "This message is better!!!"), standard_warn=False)
         assert str(warning.warning) == "This message is better!!!"
         assert "test_utils.py" in warning.filename
+
+
+class PILUtilsTester(unittest.TestCase):
+    def test_pd_to_uint8(self):
+        images = paddle.rand([2, 3, 8, 16]) * 2.4 - 1.2
+        expected = ((images.numpy().transpose(0, 2, 3, 1) / 2 + 0.5).clip(0, 1) * 255).round().astype("uint8")
+        output = pd_to_uint8(images, value_range=(-1.0, 1.0))
+        assert output.dtype == np.uint8 and output.shape == (2, 8, 16, 3)
+        assert np.array_equal(output, expected)
+        assert [np.asarray(image) for image in numpy_to_pil(output)][1].tolist() == output[1].tolist()
+
+        # the values half way between two levels are rounded to even, as in `numpy_to_pil`
+        values = ((np.arange(255) + 0.5) / 255).astype("float32")
+        values = values[values * np.float32(255) % 1 == 0.5]
+        assert len(values) > 0
+        output = pd_to_uint8(paddle.to_tensor(values).reshape([1, 1, 1, -1]))
+        assert np.array_equal(output.flatten(), (values * 255).round().astype("uint8"))
+
+    def test_encode_images(self):
+        images = (np.random.RandomState(0).rand(3, 8, 8, 3) * 255).astype("uint8")
+        for format in ["png", "webp"]:
+            encoded = encode_images(images, format, max_workers=2, lossless=True)
+            decoded = [np.asarray(PIL.Image.open(io.BytesIO(data)).convert("RGB")) for data in encoded]
+            assert np.array_equal(np.stack(decoded), images)
+        assert encode_images(numpy_to_pil(images), "jpeg")[0][:2] == b"\xff\xd8"